@@ -123,6 +123,7 @@ def run_migration():
             
             db.commit()
             print("✅ Migration completed successfully!")
+            return True
             
         except Exception as e:
             db.rollback()
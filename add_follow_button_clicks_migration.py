@@ -46,11 +46,14 @@ def run_migration():
             
             conn.commit()
             print("✅ Migration completed successfully!")
+            return True
             
     except Exception as e:
         print(f"❌ Migration failed: {str(e)}")
         import traceback
         traceback.print_exc()
+        return False
 
 if __name__ == "__main__":
-    run_migration()
+    success = run_migration()
+    exit(0 if success else 1)
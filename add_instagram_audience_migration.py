@@ -16,13 +16,13 @@ def run_migration():
             
             if 'instagram_audience' in existing_tables:
                 print("✅ instagram_audience table already exists")
-                return
+                return True
             
             # Create instagram_audience table
             print("🔄 Creating instagram_audience table...")
             
             # Check database type for compatibility
-            db_type = str(engine.url).split("://")[0]
+            db_type = engine.dialect.name
             
             if db_type == "postgresql":
                 # PostgreSQL syntax
@@ -124,11 +124,13 @@ def run_migration():
                 """))
             
             print("✅ instagram_audience table created successfully!")
+            return True
             
     except Exception as e:
-        print(f"⚠️ Migration warning (table may already exist): {str(e)}")
-        # Don't raise - migration is idempotent
+        print(f"❌ instagram_audience migration failed: {str(e)}")
+        return False
 
 
 if __name__ == "__main__":
-    run_migration()
+    success = run_migration()
+    exit(0 if success else 1)
@@ -14,10 +14,9 @@ def run_migration():
             print("✅ Added profile_picture_url column")
             return True
     except Exception as e:
-        # Column might already exist or other error - log but don't fail
-        print(f"⚠️ profile_picture_url column migration: {e}")
-        # Still return True since IF NOT EXISTS should handle it gracefully
-        return True
+        # IF NOT EXISTS already covers an existing column, so this is a real failure
+        print(f"❌ profile_picture_url column migration: {e}")
+        return False
 
 if __name__ == "__main__":
     success = run_migration()
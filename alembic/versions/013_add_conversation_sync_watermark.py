@@ -0,0 +1,39 @@
+"""Add synced_updated_time to conversations for delta sync.
+
+Revision ID: 013_conversation_sync_watermark
+Revises: 8b9a4e4c6d39
+Create Date: 2026-10-18
+
+Stores the Graph API updated_time of each conversation as of its last
+successful sync, so instagram_sync only fetches conversations (and message
+pages) that changed since then.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "013_conversation_sync_watermark"
+down_revision: Union[str, None] = "8b9a4e4c6d39"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add conversations.synced_updated_time (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            """
+            ALTER TABLE conversations
+            ADD COLUMN IF NOT EXISTS synced_updated_time TIMESTAMP;
+            """
+        )
+    )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("ALTER TABLE conversations DROP COLUMN IF EXISTS synced_updated_time;"))
@@ -0,0 +1,36 @@
+"""Add followers.unfollowed_at and an (instagram_account_id, username) index.
+
+Revision ID: 014_follower_unfollowed_at
+Revises: 013_conversation_sync_watermark
+Create Date: 2026-10-18
+
+fetch_followers_for_account now diffs the fetched follower list against the
+stored one in bulk. Removed followers are kept with unfollowed_at set instead
+of being ignored, and the index serves the per-account username load.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "014_follower_unfollowed_at"
+down_revision: Union[str, None] = "013_conversation_sync_watermark"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add column and index (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("ALTER TABLE followers ADD COLUMN IF NOT EXISTS unfollowed_at TIMESTAMP;"))
+    conn.execute(sa.text(
+        "CREATE INDEX IF NOT EXISTS ix_followers_account_username ON followers (instagram_account_id, username);"
+    ))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP INDEX IF EXISTS ix_followers_account_username;"))
+    conn.execute(sa.text("ALTER TABLE followers DROP COLUMN IF EXISTS unfollowed_at;"))
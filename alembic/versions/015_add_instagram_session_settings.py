@@ -0,0 +1,34 @@
+"""Add encrypted_session_settings to instagram_accounts.
+
+Revision ID: 015_instagram_session_settings
+Revises: 014_follower_unfollowed_at
+Create Date: 2026-10-18
+
+Stores the Fernet-encrypted instagrapi session settings (dump_settings) so the
+client pool can resume a logged-in session instead of doing a full login for
+every automation run.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "015_instagram_session_settings"
+down_revision: Union[str, None] = "014_follower_unfollowed_at"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add instagram_accounts.encrypted_session_settings (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text(
+        "ALTER TABLE instagram_accounts ADD COLUMN IF NOT EXISTS encrypted_session_settings TEXT;"
+    ))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("ALTER TABLE instagram_accounts DROP COLUMN IF EXISTS encrypted_session_settings;"))
@@ -0,0 +1,32 @@
+"""Add a lower(email) functional index on users.
+
+Revision ID: 016_users_email_lower_index
+Revises: 015_instagram_session_settings
+Create Date: 2026-10-18
+
+get_current_user_id looks users up case-insensitively by email when the
+supabase_id lookup misses. ILIKE could not use the plain email index, so the
+lookup is now func.lower(email) = lower(:email), served by this index.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "016_users_email_lower_index"
+down_revision: Union[str, None] = "015_instagram_session_settings"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the index (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email));"))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP INDEX IF EXISTS ix_users_email_lower;"))
@@ -0,0 +1,45 @@
+"""Add tracked_links for short tracking-link codes.
+
+Revision ID: 017_tracked_links
+Revises: 016_users_email_lower_index
+Create Date: 2026-10-18
+
+generate_tracking_url used to put the target URL and every id into a long
+query string that /track/redirect parsed on each click. Links are now stored
+once under a short code (/api/analytics/r/{code}) and resolved from an
+in-process LRU, falling back to this table's primary key.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "017_tracked_links"
+down_revision: Union[str, None] = "016_users_email_lower_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the table (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS tracked_links (
+            code VARCHAR(16) PRIMARY KEY,
+            target_url TEXT NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            rule_id INTEGER REFERENCES automation_rules(id) ON DELETE CASCADE,
+            instagram_account_id INTEGER REFERENCES instagram_accounts(id) ON DELETE CASCADE,
+            media_id VARCHAR,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """))
+    conn.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_tracked_links_user_id ON tracked_links (user_id);"))
+    conn.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_tracked_links_rule_id ON tracked_links (rule_id);"))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS tracked_links;"))
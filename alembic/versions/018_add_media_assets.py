@@ -0,0 +1,55 @@
+"""Add media_assets / media_refs for content-addressed DM media uploads.
+
+Revision ID: 018_media_assets
+Revises: 017_tracked_links
+Create Date: 2026-10-18
+
+Uploads used to be written to uploads/dm-media/{user_id}/{uuid}_{name}, so the
+same promo video uploaded twice was stored twice. Files are now stored once per
+sha256 (media_assets, with the detected MIME type and size) and each user gets
+a reference (media_refs) with its own public path.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "018_media_assets"
+down_revision: Union[str, None] = "017_tracked_links"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the tables (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS media_assets (
+            sha256 VARCHAR(64) PRIMARY KEY,
+            content_type VARCHAR(100) NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            storage_path VARCHAR NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """))
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS media_refs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            sha256 VARCHAR(64) NOT NULL REFERENCES media_assets(sha256) ON DELETE CASCADE,
+            public_path VARCHAR NOT NULL UNIQUE,
+            original_filename VARCHAR,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            CONSTRAINT uq_media_refs_user_sha256 UNIQUE (user_id, sha256)
+        );
+    """))
+    conn.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_media_refs_user_id ON media_refs (user_id);"))
+    conn.execute(sa.text("CREATE INDEX IF NOT EXISTS ix_media_refs_sha256 ON media_refs (sha256);"))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS media_refs;"))
+    conn.execute(sa.text("DROP TABLE IF EXISTS media_assets;"))
@@ -0,0 +1,34 @@
+"""Add fetch_count / last_fetched_at to media_refs.
+
+Revision ID: 019_media_fetch_counts
+Revises: 018_media_assets
+Create Date: 2026-10-18
+
+The /uploads server counts GETs per file in memory and adds them to
+media_refs.fetch_count in batches, so users can see how often Instagram pulled
+an attachment without a write per request.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "019_media_fetch_counts"
+down_revision: Union[str, None] = "018_media_assets"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the columns (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("ALTER TABLE media_refs ADD COLUMN IF NOT EXISTS fetch_count BIGINT NOT NULL DEFAULT 0;"))
+    conn.execute(sa.text("ALTER TABLE media_refs ADD COLUMN IF NOT EXISTS last_fetched_at TIMESTAMP;"))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("ALTER TABLE media_refs DROP COLUMN IF EXISTS last_fetched_at;"))
+    conn.execute(sa.text("ALTER TABLE media_refs DROP COLUMN IF EXISTS fetch_count;"))
@@ -0,0 +1,112 @@
+"""Add user_data_versions, its triggers, and indexes for ETag version stamps.
+
+Revision ID: 020_user_data_versions
+Revises: 019_media_fetch_counts
+Create Date: 2026-10-18
+
+Dashboard/inbox GETs answer If-None-Match with a 304 after one small query
+(app/services/data_versions.py). That query reads:
+
+- user_data_versions.version, bumped by row triggers on the tables that change
+  rarely and carry no timestamp (accounts, rules, lead updates/deletes, plan
+  and subscription changes);
+- max(id) / max(updated_at) on the append-heavy tables, which the composite
+  indexes below turn into single index probes. No triggers on those tables, so
+  webhook writes never contend on the version row.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "020_user_data_versions"
+down_revision: Union[str, None] = "019_media_fetch_counts"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (trigger name, table, events)
+_TRIGGERS = [
+    ("trg_instagram_accounts_data_version", "instagram_accounts", "INSERT OR UPDATE OR DELETE"),
+    ("trg_automation_rules_data_version", "automation_rules", "INSERT OR UPDATE OR DELETE"),
+    ("trg_captured_leads_data_version", "captured_leads", "UPDATE OR DELETE"),
+    ("trg_users_data_version", "users", "UPDATE OF plan_tier, email"),
+    ("trg_subscriptions_data_version", "subscriptions", "INSERT OR UPDATE OR DELETE"),
+]
+
+_INDEXES = [
+    ("ix_analytics_events_user_id_id", "analytics_events", "user_id, id"),
+    ("ix_dm_logs_user_id_id", "dm_logs", "user_id, id"),
+    ("ix_captured_leads_user_id_id", "captured_leads", "user_id, id"),
+    ("ix_messages_account_id_id", "messages", "instagram_account_id, id"),
+    ("ix_conversations_account_id_id", "conversations", "instagram_account_id, id"),
+    ("ix_conversations_account_updated_at", "conversations", "instagram_account_id, updated_at"),
+]
+
+
+def upgrade() -> None:
+    """Create table, trigger function, triggers and indexes (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS user_data_versions (
+            user_id INTEGER PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """))
+    conn.execute(sa.text("""
+        CREATE OR REPLACE FUNCTION public.bump_user_data_version()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            changed RECORD;
+            owner_id INTEGER;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := OLD;
+            ELSE
+                changed := NEW;
+            END IF;
+
+            IF TG_TABLE_NAME = 'users' THEN
+                owner_id := changed.id;
+            ELSIF TG_TABLE_NAME = 'automation_rules' THEN
+                SELECT user_id INTO owner_id FROM instagram_accounts WHERE id = changed.instagram_account_id;
+                IF owner_id IS NULL AND TG_OP = 'UPDATE' THEN
+                    -- Rule detached from its account (disconnect): attribute to the previous owner
+                    SELECT user_id INTO owner_id FROM instagram_accounts WHERE id = OLD.instagram_account_id;
+                END IF;
+            ELSE
+                owner_id := changed.user_id;
+            END IF;
+
+            IF owner_id IS NOT NULL THEN
+                INSERT INTO user_data_versions (user_id, version, updated_at)
+                VALUES (owner_id, 1, NOW())
+                ON CONFLICT (user_id) DO UPDATE
+                SET version = user_data_versions.version + 1, updated_at = NOW();
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """))
+    for name, table, events in _TRIGGERS:
+        conn.execute(sa.text(f"DROP TRIGGER IF EXISTS {name} ON {table};"))
+        conn.execute(sa.text(f"""
+            CREATE TRIGGER {name}
+            AFTER {events} ON {table}
+            FOR EACH ROW
+            EXECUTE FUNCTION public.bump_user_data_version();
+        """))
+    for name, table, columns in _INDEXES:
+        conn.execute(sa.text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns});"))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    for name, _, _ in _INDEXES:
+        conn.execute(sa.text(f"DROP INDEX IF EXISTS {name};"))
+    for name, table, _ in _TRIGGERS:
+        conn.execute(sa.text(f"DROP TRIGGER IF EXISTS {name} ON {table};"))
+    conn.execute(sa.text("DROP FUNCTION IF EXISTS public.bump_user_data_version();"))
+    conn.execute(sa.text("DROP TABLE IF EXISTS user_data_versions;"))
@@ -0,0 +1,92 @@
+"""Add inbox_counters and conversations.unread_count, backfilled from messages.
+
+Revision ID: 021_inbox_counters
+Revises: 020_user_data_versions
+Create Date: 2026-10-18
+
+/conversations/stats becomes a primary-key read of inbox_counters, which is
+maintained in the transaction that stores each message (app/services/inbox_counters.py).
+The backfill uses the same definitions as reconcile_inbox_counters(); it is
+safe to re-run, and so is scripts/reconcile_inbox_counters.py afterwards.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "021_inbox_counters"
+down_revision: Union[str, None] = "020_user_data_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create table and column, then backfill (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        ALTER TABLE conversations ADD COLUMN IF NOT EXISTS unread_count INTEGER NOT NULL DEFAULT 0;
+    """))
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS inbox_counters (
+            instagram_account_id INTEGER PRIMARY KEY REFERENCES instagram_accounts(id) ON DELETE CASCADE,
+            user_id INTEGER NOT NULL,
+            conversations INTEGER NOT NULL DEFAULT 0,
+            messages_in BIGINT NOT NULL DEFAULT 0,
+            messages_out BIGINT NOT NULL DEFAULT 0,
+            unread INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """))
+    # Unread per conversation: incoming messages after the last outgoing one
+    conn.execute(sa.text("""
+        UPDATE conversations t SET unread_count = fresh.n
+        FROM (
+            SELECT c.id,
+                (SELECT count(*) FROM messages m
+                 WHERE m.conversation_id = c.id AND m.is_from_bot IS NOT TRUE
+                   AND m.created_at > COALESCE(
+                       (SELECT max(o.created_at) FROM messages o WHERE o.conversation_id = c.id AND o.is_from_bot),
+                       '-infinity')) AS n
+            FROM conversations c
+        ) fresh
+        WHERE t.id = fresh.id AND t.unread_count <> fresh.n;
+    """))
+    conn.execute(sa.text("""
+        INSERT INTO inbox_counters
+            (instagram_account_id, user_id, conversations, messages_in, messages_out, unread, updated_at)
+        SELECT
+            a.id,
+            a.user_id,
+            COALESCE(conv.total, 0),
+            (SELECT count(*) FROM messages m
+             WHERE m.instagram_account_id = a.id AND m.user_id = a.user_id AND m.is_from_bot IS NOT TRUE
+               AND (a.igsid IS NULL OR m.sender_id <> a.igsid)),
+            (SELECT count(*) FROM messages m
+             WHERE m.instagram_account_id = a.id AND m.user_id = a.user_id AND m.is_from_bot),
+            COALESCE(conv.unread, 0),
+            NOW() AT TIME ZONE 'utc'
+        FROM instagram_accounts a
+        LEFT JOIN LATERAL (
+            SELECT count(*) AS total, sum(c.unread_count) AS unread
+            FROM conversations c
+            WHERE c.instagram_account_id = a.id AND c.user_id = a.user_id
+              AND (a.igsid IS NULL OR c.participant_id <> a.igsid)
+              AND (a.username IS NULL OR c.participant_name IS DISTINCT FROM a.username)
+        ) conv ON TRUE
+        ON CONFLICT (instagram_account_id) DO UPDATE SET
+            user_id = EXCLUDED.user_id,
+            conversations = EXCLUDED.conversations,
+            messages_in = EXCLUDED.messages_in,
+            messages_out = EXCLUDED.messages_out,
+            unread = EXCLUDED.unread,
+            updated_at = EXCLUDED.updated_at;
+    """))
+
+
+def downgrade() -> None:
+    """Drop table and column."""
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS inbox_counters;"))
+    conn.execute(sa.text("ALTER TABLE conversations DROP COLUMN IF EXISTS unread_count;"))
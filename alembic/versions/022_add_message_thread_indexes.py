@@ -0,0 +1,42 @@
+"""Add the thread-read index on messages and a partial index of unlinked messages.
+
+Revision ID: 022_message_thread_indexes
+Revises: 021_inbox_counters
+Create Date: 2026-10-18
+
+GET /conversations/by-id/{conversation_id}/messages pages a thread with
+ORDER BY created_at DESC, id DESC and a (created_at, id) keyset cursor; the
+first index turns every page into one range scan of LIMIT entries, whatever
+the thread's length. The partial index holds only messages that were never
+linked to a conversation, so checking an account for them is free once
+link_unlinked_messages() has run.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "022_message_thread_indexes"
+down_revision: Union[str, None] = "021_inbox_counters"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        CREATE INDEX IF NOT EXISTS ix_messages_conversation_created_id
+        ON messages (conversation_id, created_at DESC, id DESC);
+    """))
+    conn.execute(sa.text("""
+        CREATE INDEX IF NOT EXISTS ix_messages_unlinked
+        ON messages (instagram_account_id) WHERE conversation_id IS NULL;
+    """))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP INDEX IF EXISTS ix_messages_unlinked;"))
+    conn.execute(sa.text("DROP INDEX IF EXISTS ix_messages_conversation_created_id;"))
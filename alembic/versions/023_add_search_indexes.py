@@ -0,0 +1,80 @@
+"""Add full-text search columns and indexes on messages and captured_leads.
+
+Revision ID: 023_search_indexes
+Revises: 022_message_thread_indexes
+Create Date: 2026-10-18
+
+Backs GET /api/instagram/messages/search and GET /api/leads/search
+(app/services/search.py):
+
+- search_vector: tsvector generated columns ('simple' config: DMs are
+  multilingual, and names/emails must not be stemmed), each with a GIN index
+- pg_trgm GIN indexes for substring / fuzzy matches, when the extension is
+  available on the server (the search falls back to prefix matching if not)
+- recency indexes, so a common word is answered by walking the newest rows
+  instead of ranking every match
+
+Adding a STORED generated column rewrites the table once; on large tables run
+this migration off-peak.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "023_search_indexes"
+down_revision: Union[str, None] = "022_message_thread_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MESSAGE_TEXT = "coalesce(message_text, content, '')"
+LEAD_TEXT = "coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, '')"
+
+# (table, generated tsvector expression)
+_VECTORS = [
+    ("messages", f"to_tsvector('simple', {MESSAGE_TEXT})"),
+    ("captured_leads", f"to_tsvector('simple', {LEAD_TEXT})"),
+]
+
+# (name, table, index definition)
+_INDEXES = [
+    ("ix_messages_search_vector", "messages", "USING gin (search_vector)"),
+    ("ix_captured_leads_search_vector", "captured_leads", "USING gin (search_vector)"),
+    ("ix_messages_account_created_id", "messages", "(instagram_account_id, created_at DESC, id DESC)"),
+    ("ix_captured_leads_user_captured_id", "captured_leads", "(user_id, captured_at DESC, id DESC)"),
+]
+
+_TRGM_INDEXES = [
+    ("ix_messages_text_trgm", "messages", f"USING gin (({MESSAGE_TEXT}) gin_trgm_ops)"),
+    ("ix_captured_leads_text_trgm", "captured_leads", f"USING gin (({LEAD_TEXT}) gin_trgm_ops)"),
+]
+
+
+def upgrade() -> None:
+    """Extension (if available), generated columns and indexes (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    has_trgm = conn.execute(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    )).scalar() is not None
+    if has_trgm:
+        conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm;"))
+    else:
+        print("⚠️ pg_trgm is not available on this server; search uses prefix matching only")
+
+    for table, expression in _VECTORS:
+        conn.execute(sa.text(f"""
+            ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({expression}) STORED;
+        """))
+    for name, table, definition in _INDEXES + (_TRGM_INDEXES if has_trgm else []):
+        conn.execute(sa.text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition};"))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    for name, _, _ in _INDEXES + _TRGM_INDEXES:
+        conn.execute(sa.text(f"DROP INDEX IF EXISTS {name};"))
+    for table, _ in _VECTORS:
+        conn.execute(sa.text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector;"))
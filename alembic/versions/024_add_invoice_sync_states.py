@@ -0,0 +1,45 @@
+"""Add invoice_sync_states: per-customer watermark for the Dodo invoice sync.
+
+Revision ID: 024_invoice_sync_states
+Revises: 023_search_indexes
+Create Date: 2026-10-18
+
+The invoice sync (app/services/invoice_sync.py) used to page through every
+payment of the customer on each run; it now asks Dodo only for payments
+created after last_payment_at. No backfill: a customer without a row gets one
+full sync, which sets the watermark.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "024_invoice_sync_states"
+down_revision: Union[str, None] = "023_search_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create table (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS invoice_sync_states (
+            dodo_customer_id VARCHAR PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            last_payment_at TIMESTAMP,
+            last_payment_id VARCHAR,
+            synced_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """))
+    conn.execute(sa.text("""
+        CREATE INDEX IF NOT EXISTS ix_invoice_sync_states_user_id ON invoice_sync_states (user_id);
+    """))
+
+
+def downgrade() -> None:
+    """Drop table."""
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS invoice_sync_states;"))
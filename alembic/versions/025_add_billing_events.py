@@ -0,0 +1,55 @@
+"""Add billing_events: idempotent inbox for Dodo billing webhooks.
+
+Revision ID: 025_billing_events
+Revises: 024_invoice_sync_states
+Create Date: 2026-10-18
+
+POST /webhooks/dodo stores each event under its webhook-id
+(INSERT ... ON CONFLICT DO NOTHING, so retries are no-ops) and answers at
+once; app/services/billing_events.py applies pending events in order per
+subscription. The partial index serves the worker's "oldest pending event of
+each key" lookup and stays small because applied events leave it.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "025_billing_events"
+down_revision: Union[str, None] = "024_invoice_sync_states"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create table and index (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        CREATE TABLE IF NOT EXISTS billing_events (
+            webhook_id VARCHAR PRIMARY KEY,
+            seq BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            event_type VARCHAR,
+            ordering_key VARCHAR NOT NULL,
+            payload JSON NOT NULL,
+            event_at TIMESTAMP NOT NULL,
+            received_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            status VARCHAR NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            processed_at TIMESTAMP,
+            last_error TEXT
+        );
+    """))
+    conn.execute(sa.text("""
+        CREATE INDEX IF NOT EXISTS ix_billing_events_pending
+        ON billing_events (ordering_key, event_at, seq)
+        WHERE status = 'pending';
+    """))
+
+
+def downgrade() -> None:
+    """Drop table."""
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS billing_events;"))
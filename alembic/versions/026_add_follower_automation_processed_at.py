@@ -0,0 +1,45 @@
+"""Add followers.automation_processed_at and a partial index on unprocessed followers.
+
+Revision ID: 026_follower_processed_at
+Revises: 025_billing_events
+Create Date: 2026-10-18
+
+The new_follower automation marks each follower once its rules ran, so a
+later beat (or one resuming after the per-account time budget ran out) skips
+it instead of sending the DM again. Followers already inside the detection
+window at deploy time are marked processed: the old code had already been
+DMing them on every beat.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "026_follower_processed_at"
+down_revision: Union[str, None] = "025_billing_events"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add column, mark the current window processed, add index (idempotent for repeated deploys)."""
+    conn = op.get_bind()
+    conn.execute(sa.text("ALTER TABLE followers ADD COLUMN IF NOT EXISTS automation_processed_at TIMESTAMP;"))
+    conn.execute(sa.text("""
+        UPDATE followers SET automation_processed_at = timezone('utc', now())
+        WHERE automation_processed_at IS NULL
+          AND fetched_at >= timezone('utc', now()) - interval '1 hour';
+    """))
+    conn.execute(sa.text("""
+        CREATE INDEX IF NOT EXISTS ix_followers_automation_pending
+        ON followers (instagram_account_id, fetched_at, id)
+        WHERE automation_processed_at IS NULL AND unfollowed_at IS NULL;
+    """))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP INDEX IF EXISTS ix_followers_automation_pending;"))
+    conn.execute(sa.text("ALTER TABLE followers DROP COLUMN IF EXISTS automation_processed_at;"))
@@ -0,0 +1,316 @@
+"""
+ASGI app serving uploaded DM media (/uploads/...).
+
+Instagram's servers fetch a DM attachment once per recipient, so a campaign
+turns into bursts of identical file downloads. Compared with StaticFiles:
+
+- Content-addressed files (dm-media/{user_id}/{sha256}{ext}, see media_store)
+  never change, so they get `Cache-Control: public, max-age=31536000, immutable`
+  and a strong ETag that is the sha256 computed at upload time (no hashing or
+  stat-derived tags at request time). Older uuid-named uploads get a
+  size/mtime ETag and a one-day max-age.
+- If-None-Match -> 304; single `Range: bytes=...` requests (video seeking)
+  -> 206, honouring If-Range; unsatisfiable ranges -> 416.
+- Zero-copy: when the ASGI server advertises the zero-copy send
+  (`http.response.zerocopysend`) or path send (`http.response.pathsend`)
+  extension, the file descriptor / path is handed to the server for sendfile.
+  Otherwise the file is read in MEDIA_READ_CHUNK_BYTES chunks on a dedicated
+  thread pool, so media bursts never occupy the default threadpool that sync
+  webhook/API handlers run on, and at most MEDIA_MAX_CONCURRENT_TRANSFERS
+  bodies are streamed at once per process (others wait their turn).
+- Fetches are counted per file in memory and flushed to media_refs.fetch_count
+  every MEDIA_FETCH_FLUSH_SECONDS (same write-coalescing as audience_activity).
+
+Mounted at /uploads by app.main. `uvicorn app.media_app:app` runs it as
+a separate process (set MEDIA_PUBLIC_URL to that host) when media should not
+share workers with the API at all.
+"""
+import asyncio
+import atexit
+import os
+import re
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+LEGACY_CACHE_CONTROL = "public, max-age=86400"
+READ_CHUNK_BYTES = int(os.getenv("MEDIA_READ_CHUNK_BYTES", str(256 * 1024)))
+MAX_CONCURRENT_TRANSFERS = int(os.getenv("MEDIA_MAX_CONCURRENT_TRANSFERS", "32"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("MEDIA_FETCH_FLUSH_SECONDS", "30"))
+
+_CONTENT_ADDRESSED_NAME = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]+)?$")
+_UPLOAD_TMP_PARTS = ("dm-media", "blobs", "tmp")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CONTENT_TYPES = {
+    ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif",
+    ".webp": "image/webp", ".mp4": "video/mp4", ".mov": "video/quicktime", ".webm": "video/webm",
+    ".mp3": "audio/mpeg", ".m4a": "audio/mp4", ".ogg": "audio/ogg", ".wav": "audio/wav",
+}
+
+_read_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("MEDIA_READ_POOL_SIZE", "8")), thread_name_prefix="media-read"
+)
+
+# public_path (e.g. uploads/dm-media/7/<sha>.mp4) -> fetches not yet written
+_pending_fetches: Dict[str, int] = {}
+_pending_lock = threading.Lock()
+_flusher_thread: Optional[threading.Thread] = None
+_flusher_stop = threading.Event()
+
+
+# -- fetch counter --------------------------------------------------------------------
+
+def count_fetch(public_path: str) -> None:
+    with _pending_lock:
+        _pending_fetches[public_path] = _pending_fetches.get(public_path, 0) + 1
+    _ensure_flusher_started()
+
+
+def flush_fetch_counts() -> int:
+    """Add pending counts to media_refs.fetch_count in one statement. Returns the number of paths flushed."""
+    with _pending_lock:
+        if not _pending_fetches:
+            return 0
+        batch = dict(_pending_fetches)
+        _pending_fetches.clear()
+
+    from sqlalchemy import BigInteger, String, column, update, values
+    from app.db.session import engine
+    from app.models.media_asset import MediaRef
+
+    fetched = values(
+        column("public_path", String), column("fetches", BigInteger), name="fetched",
+    ).data(list(batch.items()))
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                update(MediaRef)
+                .where(MediaRef.public_path == fetched.c.public_path)
+                .values(
+                    fetch_count=MediaRef.fetch_count + fetched.c.fetches,
+                    last_fetched_at=datetime.utcnow(),
+                )
+            )
+    except Exception as e:
+        print(f"⚠️ Failed to flush media fetch counts for {len(batch)} files: {str(e)}")
+        with _pending_lock:
+            for path, n in batch.items():
+                _pending_fetches[path] = _pending_fetches.get(path, 0) + n
+        return 0
+    return len(batch)
+
+
+def _flush_loop() -> None:
+    while not _flusher_stop.wait(FLUSH_INTERVAL_SECONDS):
+        flush_fetch_counts()
+
+
+def _ensure_flusher_started() -> None:
+    global _flusher_thread
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+    with _pending_lock:
+        if _flusher_thread is not None and _flusher_thread.is_alive():
+            return
+        _flusher_stop.clear()
+        _flusher_thread = threading.Thread(target=_flush_loop, name="media-fetch-flusher", daemon=True)
+        _flusher_thread.start()
+
+
+def stop_fetch_flusher() -> None:
+    """Stop the background flusher and write whatever is still pending."""
+    _flusher_stop.set()
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        _flusher_thread.join(timeout=5)
+    if _pending_fetches:
+        flush_fetch_counts()
+
+
+atexit.register(stop_fetch_flusher)
+
+
+# -- serving ----------------------------------------------------------------------
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) for a single satisfiable byte range, None if unsatisfiable. Raises ValueError if unusable."""
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        raise ValueError("unsupported range")  # multi-range or other units: serve the whole file
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError("empty range")
+    if not first:
+        length = int(last)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+def _route_path(scope) -> str:
+    """Path below the mount point (Mount keeps the full path and puts the prefix in root_path)."""
+    path, root_path = scope.get("path", ""), scope.get("root_path", "")
+    return path[len(root_path):] if root_path and path.startswith(root_path) else path
+
+
+def _read_chunk(fd: int, offset: int, length: int) -> bytes:
+    return os.pread(fd, length, offset)
+
+
+class MediaFiles:
+    """Read-only file server for a directory (see module docstring)."""
+
+    def __init__(self, directory: str, count_prefix: str = "uploads"):
+        self.directory = Path(directory).resolve()
+        self.count_prefix = count_prefix
+        self._transfers = asyncio.Semaphore(MAX_CONCURRENT_TRANSFERS)
+
+    def _resolve(self, path: str) -> Optional[Tuple[Path, os.stat_result]]:
+        relative = path.lstrip("/")
+        if not relative or "\x00" in relative:
+            return None
+        full = (self.directory / relative).resolve()
+        if not full.is_relative_to(self.directory):
+            return None
+        if full.relative_to(self.directory).parts[:3] == _UPLOAD_TMP_PARTS:
+            return None  # Uploads still being written
+        try:
+            st = os.stat(full)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return full, st
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await self._send_status(send, 405, {"allow": "GET, HEAD"})
+            return
+
+        resolved = self._resolve(_route_path(scope))
+        if resolved is None:
+            await self._send_status(send, 404)
+            return
+        full, st = resolved
+        size = st.st_size
+        relative = full.relative_to(self.directory)
+        match = _CONTENT_ADDRESSED_NAME.match(full.name)
+        if match:
+            etag = f'"{match.group(1)}"'
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            etag = f'"{size:x}-{st.st_mtime_ns:x}"'
+            cache_control = LEGACY_CACHE_CONTROL
+
+        headers = {
+            "content-type": _CONTENT_TYPES.get(full.suffix.lower(), "application/octet-stream"),
+            "etag": etag,
+            "cache-control": cache_control,
+            "last-modified": formatdate(st.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+        }
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            await self._send_status(send, 304, {k: v for k, v in headers.items() if k != "content-type"})
+            return
+
+        start, end, status_code = 0, size - 1, 200
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and size > 0 and (not if_range or if_range.strip() == etag):
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                byte_range = (0, size - 1)
+            if byte_range is None:
+                await self._send_status(send, 416, {"content-range": f"bytes */{size}", "accept-ranges": "bytes"})
+                return
+            start, end = byte_range
+            if (start, end) != (0, size - 1):
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+        length = end - start + 1 if size else 0
+        headers["content-length"] = str(length)
+
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        })
+        if method == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        count_fetch(f"{self.count_prefix}/{relative.as_posix()}")
+        extensions = scope.get("extensions") or {}
+        async with self._transfers:
+            await self._send_file(send, extensions, full, start, length, size)
+
+    async def _send_file(self, send, extensions, full: Path, start: int, length: int, size: int) -> None:
+        if "http.response.pathsend" in extensions and start == 0 and length == size:
+            await send({"type": "http.response.pathsend", "path": str(full)})
+            return
+        loop = asyncio.get_running_loop()
+        fd = await loop.run_in_executor(_read_pool, os.open, str(full), os.O_RDONLY)
+        try:
+            if "http.response.zerocopysend" in extensions:
+                await send({"type": "http.response.zerocopysend", "file": fd, "offset": start, "count": length})
+                return
+            offset, remaining = start, length
+            while remaining > 0:
+                chunk = await loop.run_in_executor(_read_pool, _read_chunk, fd, offset, min(READ_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break  # File truncated underneath us
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    async def _send_status(send, status_code: int, headers: Optional[dict] = None) -> None:
+        headers = dict(headers or {})
+        headers.setdefault("content-length", "0")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": b""})
+
+
+def create_media_app():
+    """Standalone app serving only /uploads, for `uvicorn app.media_app:app`."""
+    from contextlib import asynccontextmanager
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from app.services.media_store import UPLOADS_ROOT
+
+    @asynccontextmanager
+    async def lifespan(_app):
+        yield
+        stop_fetch_flusher()
+
+    UPLOADS_ROOT.mkdir(parents=True, exist_ok=True)
+    return Starlette(
+        routes=[Mount("/uploads", app=MediaFiles(str(UPLOADS_ROOT)), name="uploads")],
+        lifespan=lifespan,
+    )
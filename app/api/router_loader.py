@@ -0,0 +1,120 @@
+"""
+Lazy router registration for app.main.
+
+Importing every router module up front (instagram.py alone is ~8,000 lines)
+delays the moment a new instance can answer its first request. Routers listed
+in LAZY_ROUTERS are instead imported and included the first time a request hits
+their prefix (or /docs / /openapi.json, which need the full route table). Right
+after startup a background thread pre-imports them, so in practice only the
+requests that arrive in the first few hundred milliseconds pay the import.
+
+Set LAZY_ROUTERS=0 to include everything at import time (old behaviour).
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+from fastapi import FastAPI
+
+LAZY_ROUTERS_ENABLED = os.getenv("LAZY_ROUTERS", "1") != "0"
+
+# Paths that render the whole API and therefore need every router
+_FULL_SCHEMA_PATHS = ("/openapi.json", "/docs", "/redoc")
+
+
+class RouterSpec(NamedTuple):
+    module: str
+    prefix: str
+    tags: List[str]
+
+
+class LazyRouterLoader:
+    """Includes routers on first use; safe to call from the event loop and a warm-up thread."""
+
+    def __init__(self, app: FastAPI, specs: List[RouterSpec]):
+        self.app = app
+        self._pending = list(specs)
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def _matches(self, spec: RouterSpec, path: str) -> bool:
+        return path == spec.prefix or path.startswith(spec.prefix + "/")
+
+    def _include(self, spec: RouterSpec) -> None:
+        started = time.perf_counter()
+        module = importlib.import_module(spec.module)
+        self.app.include_router(module.router, prefix=spec.prefix, tags=spec.tags)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"📦 Router {spec.module} loaded in {elapsed_ms:.0f} ms", file=sys.stderr)
+
+    def load_for_path(self, path: str) -> None:
+        """Include every pending router whose prefix matches path (all of them for schema/docs paths)."""
+        if not self._pending:
+            return
+        load_all = path in _FULL_SCHEMA_PATHS
+        with self._lock:
+            wanted = [s for s in self._pending if load_all or self._matches(s, path)]
+            if not wanted:
+                return
+            for spec in wanted:
+                self._include(spec)
+                self._pending.remove(spec)
+            # Routes changed: regenerate the OpenAPI schema on next request
+            self.app.openapi_schema = None
+
+    def load_all(self) -> None:
+        self.load_for_path(_FULL_SCHEMA_PATHS[0])
+
+    def prewarm_imports(self) -> None:
+        """Import pending router modules (no route changes), so later includes are instant."""
+        for spec in list(self._pending):
+            try:
+                importlib.import_module(spec.module)
+            except Exception as e:
+                print(f"⚠️ Router pre-import failed for {spec.module}: {str(e)}", file=sys.stderr)
+
+
+class LazyRouterMiddleware:
+    """ASGI middleware that loads the routers a request needs before routing happens."""
+
+    def __init__(self, app, loader: Optional[LazyRouterLoader] = None):
+        self.app = app
+        self.loader = loader
+
+    async def __call__(self, scope, receive, send):
+        if self.loader is not None and self.loader.pending and scope["type"] in ("http", "websocket"):
+            self.loader.load_for_path(scope.get("path", ""))
+        await self.app(scope, receive, send)
+
+
+def register_routers(app: FastAPI, specs: List[RouterSpec]) -> Optional[LazyRouterLoader]:
+    """Include specs eagerly, or install the lazy loader and return it."""
+    if not LAZY_ROUTERS_ENABLED:
+        for spec in specs:
+            module = importlib.import_module(spec.module)
+            app.include_router(module.router, prefix=spec.prefix, tags=spec.tags)
+        return None
+    loader = LazyRouterLoader(app, specs)
+    app.add_middleware(LazyRouterMiddleware, loader=loader)
+    return loader
+
+
+def start_router_warmup(loader: Optional[LazyRouterLoader]) -> None:
+    """Pre-import lazy routers in a background thread, then include them on the event loop."""
+    if loader is None or not loader.pending:
+        return
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+
+    def _warm():
+        loader.prewarm_imports()
+        loop.call_soon_threadsafe(loader.load_all)
+
+    threading.Thread(target=_warm, name="router-warmup", daemon=True).start()
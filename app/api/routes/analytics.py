@@ -3,7 +3,8 @@ Analytics API routes for tracking automation performance.
 """
 from typing import Optional, List
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse, HTMLResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, desc, case, cast, String
@@ -14,6 +15,9 @@ from app.models.automation_rule import AutomationRule
 from app.models.instagram_account import InstagramAccount
 from app.dependencies.auth import get_current_user_id
 from app.utils.encryption import decrypt_credentials
+from app.services.data_versions import not_modified
+from app.services.metrics import record_cache
+from app.services.link_tracking import ResolvedLink, get_cached_link, is_instagram_profile_url, record_click, resolve_link
 from pydantic import BaseModel
 import requests
 import hashlib
@@ -36,10 +40,12 @@ def _get_cached_response(cache_key: str):
         cached_data, timestamp = _analytics_cache[cache_key]
         age = (datetime.utcnow() - timestamp).total_seconds()
         if age < _cache_ttl_seconds:
+            record_cache("analytics", True)
             return cached_data
         else:
             # Remove expired cache
             del _analytics_cache[cache_key]
+    record_cache("analytics", False)
     return None
 
 def _set_cached_response(cache_key: str, data: dict):
@@ -76,14 +82,6 @@ def invalidate_analytics_cache_for_user(user_id: int):
         _analytics_cache.pop(k, None)
 
 
-def _is_instagram_profile_url(url: str) -> bool:
-    u = (url or "").lower()
-    if "instagram.com" not in u:
-        return False
-    rest = u.split("instagram.com")[-1].strip("/").split("?")[0]
-    return len(rest) > 0 and "/" not in rest
-
-
 def _username_from_instagram_url(url: str) -> Optional[str]:
     try:
         p = urlparse(url)
@@ -158,6 +156,62 @@ def _html_redirect_page(dest_url: str, deep_link_url: Optional[str] = None, labe
         )
 
 
+_NO_CACHE_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Pragma": "no-cache",
+    "Expires": "0"
+}
+
+
+def _redirect_response(request: Request, target_url: str, is_profile: bool):
+    """Redirect (deep link for Instagram profiles on mobile / in-app browsers, else plain 302 or HTML)."""
+    redirect_to = target_url
+    deep_link_url = None
+
+    if is_profile:
+        username = _username_from_instagram_url(target_url)
+        if username:
+            redirect_to = f"https://www.instagram.com/{username}"
+            # Instagram native app deep link for mobile devices
+            deep_link_url = f"instagram://user?username={username}"
+
+    if is_profile and redirect_to.startswith("https://www.instagram.com/"):
+        user_agent = request.headers.get("user-agent", "").lower()
+        is_mobile = _user_agent_looks_mobile(user_agent)
+        # Instagram / Facebook in-app browsers (iOS and Android)
+        is_instagram_browser = any(x in user_agent for x in ("instagram", "fbios", "fban", "fbav"))
+        # For Instagram in-app browser or mobile: direct 302 to the deep link opens the native app
+        # immediately without showing an intermediate page
+        if (is_instagram_browser or is_mobile) and deep_link_url:
+            try:
+                return RedirectResponse(url=deep_link_url, status_code=302, headers=_NO_CACHE_HEADERS)
+            except Exception as e:
+                print(f"⚠️ Direct redirect failed, using HTML fallback: {e}")
+                return HTMLResponse(content=_instant_deep_link_redirect(deep_link_url), headers=_NO_CACHE_HEADERS)
+
+        # For desktop: use HTML redirect with web URL
+        html = _html_redirect_page(redirect_to, deep_link_url=None, label="Instagram profile")
+        return HTMLResponse(content=html)
+    return RedirectResponse(url=redirect_to, status_code=302)
+
+
+@router.get("/r/{code}")
+async def redirect_short_link(code: str, request: Request):
+    """
+    Short tracking link (see app.services.link_tracking). Resolves the code from the
+    in-process LRU (one primary-key read on a miss), queues the click for the background
+    writer and redirects without waiting on the database. Instagram profile links log
+    PROFILE_VISIT and bump automation stats; other links log LINK_CLICKED.
+    """
+    link = get_cached_link(code)
+    if link is None:
+        link = await run_in_threadpool(resolve_link, code)
+    if link is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Link not found")
+    record_click(link)
+    return _redirect_response(request, link.target_url, link.is_profile)
+
+
 @router.get("/track/redirect")
 async def track_link_click(
     request: Request,
@@ -166,12 +220,10 @@ async def track_link_click(
     user_id: Optional[int] = Query(None, description="Business owner user ID"),
     media_id: Optional[str] = Query(None, description="Instagram media ID"),
     instagram_account_id: Optional[int] = Query(None, description="Instagram account ID"),
-    db: Session = Depends(get_db)
 ):
     """
-    Track link clicks and redirect to target URL.
-    For Instagram profile URLs (Visit Profile button): logs PROFILE_VISIT, updates
-    automation stats, then redirects. Other links log LINK_CLICKED only.
+    Legacy long-form tracking link (DMs sent before short links). Same behaviour as
+    /r/{code}: the click is queued for the background writer, then we redirect.
     """
     try:
         target_url = unquote(url)
@@ -181,96 +233,22 @@ async def track_link_click(
                 detail="Invalid URL format"
             )
 
-        is_profile = _is_instagram_profile_url(target_url)
+        is_profile = is_instagram_profile_url(target_url)
 
         if user_id and rule_id:
-            if is_profile:
-                event = AnalyticsEvent(
-                    user_id=user_id,
-                    rule_id=rule_id,
-                    instagram_account_id=instagram_account_id,
-                    media_id=media_id,
-                    event_type=EventType.PROFILE_VISIT,
-                    event_metadata={
-                        "url": target_url,
-                        "clicked_at": datetime.utcnow().isoformat(),
-                        "source": "visit_profile_button",
-                    },
-                )
-                db.add(event)
-                db.commit()
-                try:
-                    from app.services.lead_capture import update_automation_stats
-                    update_automation_stats(rule_id, "profile_visit", db)
-                except Exception as su:
-                    print(f"⚠️ update_automation_stats(profile_visit) failed: {su}")
-                print(f"✅ Tracked profile visit: rule_id={rule_id}, url={target_url[:50]}...")
-            else:
-                event = AnalyticsEvent(
-                    user_id=user_id,
-                    rule_id=rule_id,
-                    instagram_account_id=instagram_account_id,
-                    media_id=media_id,
-                    event_type=EventType.LINK_CLICKED,
-                    event_metadata={
-                        "url": target_url,
-                        "clicked_at": datetime.utcnow().isoformat(),
-                    },
-                )
-                db.add(event)
-                db.commit()
-                print(f"✅ Tracked link click: rule_id={rule_id}, url={target_url[:50]}...")
+            record_click(ResolvedLink(
+                code=None,
+                target_url=target_url,
+                user_id=user_id,
+                rule_id=rule_id,
+                media_id=media_id,
+                instagram_account_id=instagram_account_id,
+                is_profile=is_profile,
+            ))
         else:
             print(f"⚠️ Link click tracking skipped: missing user_id or rule_id")
 
-        redirect_to = target_url
-        deep_link_url = None
-        
-        if is_profile:
-            username = _username_from_instagram_url(target_url)
-            if username:
-                redirect_to = f"https://www.instagram.com/{username}"
-                # Generate Instagram native app deep link for mobile devices
-                # Format: instagram://user?username={username}
-                deep_link_url = f"instagram://user?username={username}"
-        
-        # Check if user is on mobile/Instagram in-app browser
-        user_agent = request.headers.get("user-agent", "").lower()
-        is_mobile = _user_agent_looks_mobile(user_agent)
-        # For Instagram in-app browser, always use deep link to open native app
-        # Check for common Instagram user agent patterns (Instagram, Facebook iOS/Android browsers)
-        is_instagram_browser = any(x in user_agent for x in ("instagram", "fbios", "fban", "fbav"))
-        
-        print(f"🔍 User-Agent: {user_agent[:100]}... | is_mobile: {is_mobile} | is_instagram_browser: {is_instagram_browser}")
-        print(f"🔍 Profile URL: {redirect_to} | Deep link: {deep_link_url}")
-        
-        # FIXED: For Instagram in-app browser or mobile, try direct 302 redirect first, then HTML fallback
-        # This opens the native app immediately without showing intermediate page
-        if is_profile and redirect_to.startswith("https://www.instagram.com/"):
-            # For Instagram in-app browser or mobile: try direct 302 redirect to deep link first
-            if (is_instagram_browser or is_mobile) and deep_link_url:
-                print(f"✅ Mobile/Instagram browser detected - redirecting to deep link: {deep_link_url}")
-                # Try direct 302 redirect first (fastest, no page shown)
-                try:
-                    return RedirectResponse(url=deep_link_url, status_code=302, headers={
-                        "Cache-Control": "no-cache, no-store, must-revalidate",
-                        "Pragma": "no-cache",
-                        "Expires": "0"
-                    })
-                except Exception as e:
-                    print(f"⚠️ Direct redirect failed, using HTML fallback: {e}")
-                    # Fallback to instant HTML redirect if 302 doesn't work
-                    html = _instant_deep_link_redirect(deep_link_url)
-                    return HTMLResponse(content=html, headers={
-                        "Cache-Control": "no-cache, no-store, must-revalidate",
-                        "Pragma": "no-cache",
-                        "Expires": "0"
-                    })
-            
-            # For desktop: use HTML redirect with web URL
-            html = _html_redirect_page(redirect_to, deep_link_url=None, label="Instagram profile")
-            return HTMLResponse(content=html)
-        return RedirectResponse(url=redirect_to, status_code=302)
+        return _redirect_response(request, target_url, is_profile)
     except HTTPException:
         raise
     except Exception as e:
@@ -304,6 +282,8 @@ class AnalyticsSummary(BaseModel):
 
 @router.get("/dashboard", response_model=AnalyticsSummary)
 def get_analytics_dashboard(
+    request: Request,
+    response: Response,
     days: int = Query(7, ge=1, le=90, description="Number of days to analyze"),
     rule_id: Optional[int] = Query(None, description="Filter by specific rule ID"),
     instagram_account_id: Optional[int] = Query(None, description="Filter by Instagram account"),
@@ -317,8 +297,15 @@ def get_analytics_dashboard(
     - Total triggers, DMs sent, leads collected
     - Button clicks (Follow, I'm following, Profile visits)
     - Top performing posts/media
+    
+    Supports ETag / If-None-Match: unchanged events and rules -> 304 after one query.
     """
     try:
+        cached = not_modified(request, response, db, "analytics_dashboard", user_id, "analytics",
+                              params=(days, rule_id, instagram_account_id))
+        if cached is not None:
+            return cached
+        
         # Check cache first
         cache_key = _get_cache_key(user_id, days, rule_id, instagram_account_id)
         cached_response = _get_cached_response(cache_key)
@@ -667,6 +654,8 @@ class MediaAnalytics(BaseModel):
 
 @router.get("/media", response_model=List[MediaAnalytics])
 def get_media_analytics(
+    request: Request,
+    response: Response,
     days: int = Query(30, ge=1, le=90, description="Number of days to analyze"),
     instagram_account_id: Optional[int] = Query(None, description="Filter by Instagram account"),
     db: Session = Depends(get_db),
@@ -676,8 +665,14 @@ def get_media_analytics(
     Get analytics for each media item (post/reel/story/live).
     Returns analytics grouped by media_id with rule information.
     OPTIMIZED: Uses aggregated queries and caching for performance.
+    Supports ETag / If-None-Match like /dashboard.
     """
     try:
+        cached = not_modified(request, response, db, "media_analytics", user_id, "analytics",
+                              params=(days, instagram_account_id))
+        if cached is not None:
+            return cached
+        
         # Check cache first
         cache_key = f"media_analytics_{user_id}_{days}_{instagram_account_id}"
         cached_response = _get_cached_response(cache_key)
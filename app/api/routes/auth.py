@@ -304,7 +304,11 @@ def cleanup_user_by_email(email: str, db: Session = Depends(get_db)):
         db.delete(user)
         deleted_count += 1
     
+    deleted_ids = [user.id for user in users]
     db.commit()
+    from app.dependencies.auth import invalidate_user_cache
+    for deleted_id in deleted_ids:
+        invalidate_user_cache(deleted_id)
     
     return {
         "message": f"Successfully deleted {deleted_count} user(s) with email: {email}",
@@ -16,6 +16,7 @@ from app.services.instagram_usage_tracker import (
     check_and_reset_usage
 )
 from app.utils.instagram_limits import validate_automation_config
+from app.services.media_registry import warm_rule_media
 
 router = APIRouter()
 
@@ -70,6 +71,7 @@ def create_automation_rule(
     db.add(rule)
     db.commit()
     db.refresh(rule)
+    warm_rule_media(rule.config)
 
     # Increment persistent global tracker for this Instagram account (IGSID)
     # This ensures limits persist across disconnect/reconnect
@@ -197,6 +199,7 @@ def update_automation_rule(
     # When rule config changes (e.g. follower → email or phone), reset pre-DM state.
     # If switching to phone: keep senders who were waiting for email so we still reply with "We need your phone, not your email".
     if rule_update.config is not None:
+        warm_rule_media(rule.config)
         try:
             from app.services.pre_dm_handler import reset_pre_dm_state_for_rule
             reset_pre_dm_state_for_rule(rule_id, new_config=rule.config)
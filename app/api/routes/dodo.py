@@ -5,7 +5,6 @@ Replace Stripe with Dodo credentials in .env (see DODO_INTEGRATION.md).
 """
 import os
 import traceback
-from decimal import Decimal
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, status, Body, Request
 from sqlalchemy.orm import Session
@@ -462,12 +461,18 @@ async def _sync_invoices_from_dodo_api(
     }
 
     try:
-        from app.models.invoice import Invoice
-        from datetime import datetime
+        from app.services.invoice_sync import (
+            payment_to_invoice_row,
+            save_sync_watermark,
+            sync_since,
+            upsert_invoices,
+        )
 
         # Fetch payments from Dodo API for this customer
         # Dodo API endpoint: GET /payments?customer_id={customer_id}
-        # Supports pagination: page_size (max 100), page_number (0-based)
+        # Supports pagination: page_size (max 100), page_number (0-based); created_at_gte limits
+        # the fetch to payments since the customer's watermark (None = first, full sync)
+        since = sync_since(db, customer_id)
         payments_url = f"{DODO_BASE_URL}/payments"
         payments: list = []
         page_number = 0
@@ -476,6 +481,8 @@ async def _sync_invoices_from_dodo_api(
         async with httpx.AsyncClient(timeout=15.0) as client:
             while True:
                 params = {"customer_id": customer_id, "page_size": page_size, "page_number": page_number}
+                if since is not None:
+                    params["created_at_gte"] = since.isoformat() + "Z"
                 r = await client.get(payments_url, headers=headers, params=params)
 
                 if r.status_code != 200:
@@ -501,78 +508,19 @@ async def _sync_invoices_from_dodo_api(
                     break
                 page_number += 1
 
-        synced_count = 0
-        created_count = 0
-        updated_count = 0
-
+        rows = []
         for payment in payments:
             try:
-                # Extract payment data (adjust field names based on Dodo's actual API response)
-                payment_id = payment.get("payment_id") or payment.get("id")
-                invoice_id = payment.get("invoice_id")
-                invoice_url = payment.get("invoice_url")
-                total_amount = payment.get("total_amount") or payment.get("amount")
-                currency = (payment.get("currency") or "USD").upper()
-                status = (payment.get("status") or "succeeded").lower()
-                created_at_str = payment.get("created_at") or payment.get("created")
-
-                if not total_amount or not payment_id:
-                    continue
-
-                # Parse timestamp
-                paid_at = None
-                if created_at_str:
-                    try:
-                        paid_at = datetime.fromisoformat(created_at_str.replace("Z", "+00:00"))
-                    except Exception:
-                        paid_at = None
-
-                # Check if invoice already exists
-                invoice = None
-                if invoice_id:
-                    invoice = db.query(Invoice).filter(
-                        Invoice.provider_invoice_id == invoice_id
-                    ).first()
-                if not invoice and payment_id:
-                    invoice = db.query(Invoice).filter(
-                        Invoice.provider_payment_id == payment_id
-                    ).first()
-
-                # Dodo API sends amount in minor units (e.g. cents). Store exact decimal (e.g. 11.81) — never round.
-                amount_major = (Decimal(str(total_amount)) / 100).quantize(Decimal("0.01"))
-
-                if invoice:
-                    # Update existing invoice
-                    invoice.amount = amount_major
-                    invoice.currency = currency
-                    invoice.status = status
-                    invoice.invoice_url = invoice_url or invoice.invoice_url
-                    invoice.paid_at = paid_at or invoice.paid_at
-                    updated_count += 1
-                else:
-                    # Create new invoice
-                    invoice = Invoice(
-                        user_id=user_id,
-                        provider="dodo",
-                        provider_invoice_id=invoice_id,
-                        provider_payment_id=payment_id,
-                        amount=amount_major,
-                        currency=currency,
-                        status=status,
-                        invoice_url=invoice_url,
-                        paid_at=paid_at,
-                    )
-                    db.add(invoice)
-                    created_count += 1
-
-                synced_count += 1
-
+                row = payment_to_invoice_row(user_id, payment)
             except Exception as e:
                 print(f"[Dodo] Error syncing payment {payment.get('payment_id', 'unknown')}: {str(e)}")
-                import traceback
-                traceback.print_exc()
                 continue
+            if row:
+                rows.append(row)
 
+        created_count, updated_count = upsert_invoices(db, rows)
+        synced_count = created_count + updated_count
+        save_sync_watermark(db, customer_id, user_id, rows)
         db.commit()
 
         return {
@@ -580,6 +528,7 @@ async def _sync_invoices_from_dodo_api(
             "synced": synced_count,
             "created": created_count,
             "updated": updated_count,
+            "since": since.isoformat() if since else None,
         }
 
     except HTTPException:
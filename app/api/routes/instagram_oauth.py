@@ -363,6 +363,7 @@ async def instagram_oauth_callback(
             if new_account.igsid:
                 # Get or create tracker for this (user_id, igsid) combination
                 tracker = get_or_create_tracker(user_id, new_account.igsid, db)
+                db.commit()
                 print(f"✅ Tracker for user {user_id}, IGSID {new_account.igsid}: rules={tracker.rules_created_count}, dms={tracker.dms_sent_count}")
             
             # Reconnect any disconnected automation rules for this user + IGSID
@@ -615,6 +616,7 @@ def save_or_update_instagram_account(
         from app.services.instagram_usage_tracker import get_or_create_tracker
         if existing_account.igsid:
             get_or_create_tracker(user_id, existing_account.igsid, db)
+            db.commit()
         
         return existing_account
     else:
@@ -639,6 +641,7 @@ def save_or_update_instagram_account(
         if new_account.igsid:
             # Get or create tracker for this (user_id, igsid) combination
             tracker = get_or_create_tracker(user_id, new_account.igsid, db)
+            db.commit()
             print(f"✅ Tracker for user {user_id}, IGSID {new_account.igsid}: rules={tracker.rules_created_count}, dms={tracker.dms_sent_count}")
         
         return new_account
@@ -1139,6 +1142,7 @@ async def exchange_instagram_code(
             # If this is first time this user connects this Instagram account, tracker is created fresh
             # If user reconnects same Instagram account, existing tracker is found (limits persist)
             tracker = get_or_create_tracker(user_id, new_account.igsid, db)
+            db.commit()
             print(f"✅ Tracker for user {user_id}, IGSID {new_account.igsid}: rules={tracker.rules_created_count}, dms={tracker.dms_sent_count}")
         
         # Reconnect any disconnected automation rules for this user + IGSID
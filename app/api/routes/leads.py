@@ -1,7 +1,7 @@
 """
 API endpoints for managing captured leads.
 """
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.db.session import get_db
@@ -9,6 +9,7 @@ from app.models.captured_lead import CapturedLead
 from app.models.automation_rule import AutomationRule
 from app.models.instagram_account import InstagramAccount
 from app.dependencies.auth import get_current_user_id
+from app.services.data_versions import not_modified
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -35,6 +36,8 @@ class CapturedLeadResponse(BaseModel):
 
 @router.get("/leads", response_model=List[CapturedLeadResponse])
 def get_captured_leads(
+    request: Request,
+    response: Response,
     authorization: str = Header(None),
     automation_rule_id: Optional[int] = None,
     instagram_account_id: Optional[int] = None,
@@ -45,8 +48,14 @@ def get_captured_leads(
     Get all captured leads for the current user.
     Optionally filter by automation_rule_id or instagram_account_id.
     Excludes leads with NULL instagram_account_id (disconnected accounts) to match analytics behavior.
+    Supports ETag / If-None-Match: no new or changed leads -> 304 after one query.
     """
     try:
+        cached = not_modified(request, response, db, "leads", user_id, "leads",
+                              params=(automation_rule_id, instagram_account_id))
+        if cached is not None:
+            return cached
+        
         query = db.query(CapturedLead).filter(
             CapturedLead.user_id == user_id,
             CapturedLead.instagram_account_id.isnot(None)  # Exclude disconnected account leads
@@ -73,6 +82,35 @@ def get_captured_leads(
         return []
 
 
+@router.get("/leads/search")
+def search_captured_leads(
+    q: str,
+    instagram_account_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Search the current user's captured leads by name, email or phone (fragments
+    work too). Exact word matches first, then partial, newest first; keyset-paginated.
+    """
+    from app.services.search import InvalidSearch, search_leads
+    try:
+        results, next_cursor = search_leads(db, user_id, q, instagram_account_id, limit, cursor)
+    except InvalidSearch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error searching leads for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to search leads")
+    return {
+        "results": results,
+        "count": len(results),
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+
+
 @router.get("/leads/stats")
 def get_leads_stats(
     authorization: str = Header(None),
@@ -1,29 +1,55 @@
 """
 Upload routes for DM automation media (image, video, voice).
-Files are stored under uploads/dm-media/{user_id}/ and served via the same API.
+Files are stored content-addressed (see app.services.media_store) and served via the same API
+at uploads/dm-media/{user_id}/{sha256}{ext}.
 """
+import asyncio
 import os
-import uuid
-from pathlib import Path
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from app.dependencies.auth import get_current_user_id
+from app.db.session import SessionLocal
+from app.services.media_registry import MediaInfo, register_media
+from app.services.media_store import SNIFF_BYTES, MediaUploadWriter, get_executor, sniff_content_type
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
 
 router = APIRouter()
 
-# Base directory for uploads (relative to project root)
-UPLOAD_DIR = Path(__file__).resolve().parent.parent.parent.parent / "uploads" / "dm-media"
 MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB for video/audio
+_MULTIPART_OVERHEAD = 64 * 1024  # Headers/boundaries allowed on top of the file in Content-Length
 ALLOWED_IMAGE_VIDEO = {"image/jpeg", "image/png", "image/gif", "image/webp", "video/mp4", "video/quicktime", "video/webm"}
 ALLOWED_AUDIO = {"audio/mpeg", "audio/mp3", "audio/mp4", "audio/ogg", "audio/wav", "audio/webm", "audio/x-m4a"}
 
+_TOO_LARGE_DETAIL = f"File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)}MB."
+
+_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
 
-def _get_content_type(file: UploadFile) -> str:
-    ct = (file.content_type or "").strip().lower()
-    if ct:
+def _get_content_type(content_type: Optional[str], filename: Optional[str]) -> str:
+    ct = (content_type or "").strip().lower()
+    if ct and ct != "application/octet-stream":
         return ct
     # Fallback from filename
-    name = (file.filename or "").lower()
+    name = (filename or "").lower()
     if name.endswith((".jpg", ".jpeg")):
         return "image/jpeg"
     if name.endswith(".png"):
@@ -40,59 +66,179 @@ def _get_content_type(file: UploadFile) -> str:
         return "video/webm"
     if name.endswith((".mp3", ".mpeg")):
         return "audio/mpeg"
-    if name.endswith((".m4a", ".mp4")):
+    if name.endswith(".m4a"):
         return "audio/mp4"
     if name.endswith(".ogg"):
         return "audio/ogg"
     if name.endswith(".wav"):
         return "audio/wav"
-    return ""
+    return ct
+
+
+def _public_base_url() -> str:
+    # Dedicated media host (app/media_app.py) if configured, so media fetches stay off the API workers
+    base_url = os.getenv("MEDIA_PUBLIC_URL", "").rstrip("/")
+    if not base_url:
+        # Public URL: use API base URL from env so Instagram/backend can fetch the file
+        base_url = os.getenv("API_PUBLIC_URL", "").rstrip("/")
+    if not base_url:
+        base_url = os.getenv("BASE_URL", "").rstrip("/")
+    if not base_url:
+        # Fallback: NEXT_PUBLIC_API_URL (often set on Render) points to backend
+        base_url = os.getenv("NEXT_PUBLIC_API_URL", "http://localhost:8000").rstrip("/").rstrip("/api")
+    return base_url
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _type_not_allowed(content_type: str) -> HTTPException:
+    return _bad_request(
+        "File type not allowed. Use image (JPEG/PNG/GIF/WebP), video (MP4/MOV/WebM), "
+        f"or audio (MP3/M4A/OGG/WAV). Got: {content_type or 'unknown'}"
+    )
+
+
+class _FilePart:
+    """State for the multipart parser callbacks: headers of the current part and buffered file bytes."""
+
+    def __init__(self):
+        self.headers = {}
+        self._field = b""
+        self._value = b""
+        self.in_file = False
+        self.done = False
+        self.filename: Optional[str] = None
+        self.declared_type = ""
+        self.pending = bytearray()
+
+    def callbacks(self) -> dict:
+        def on_part_begin():
+            self.headers = {}
 
+        def on_header_field(data, start, end):
+            self._field += data[start:end]
 
-@router.post("/dm-media")
+        def on_header_value(data, start, end):
+            self._value += data[start:end]
+
+        def on_header_end():
+            self.headers[self._field.decode("latin-1").lower()] = self._value.decode("latin-1")
+            self._field = b""
+            self._value = b""
+
+        def on_headers_finished():
+            _, params = parse_options_header(self.headers.get("content-disposition", ""))
+            name = params.get(b"name", b"").decode("latin-1")
+            if name == "file" and not self.done:
+                self.in_file = True
+                filename = params.get(b"filename")
+                self.filename = filename.decode("utf-8", "replace") if filename is not None else None
+                self.declared_type = self.headers.get("content-type", "")
+
+        def on_part_data(data, start, end):
+            if self.in_file:
+                self.pending += data[start:end]
+
+        def on_part_end():
+            if self.in_file:
+                self.in_file = False
+                self.done = True
+
+        return {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        }
+
+
+@router.post("/dm-media", openapi_extra=_UPLOAD_OPENAPI)
 async def upload_dm_media(
-    file: UploadFile = File(...),
+    request: Request,
     user_id: int = Depends(get_current_user_id),
 ):
     """
-    Upload a single file for DM automation: image, video, or audio.
+    Upload a single file (form field "file") for DM automation: image, video, or audio.
     Returns a public URL that can be stored in automation config (dm_media_url or dm_voice_message_url).
+
+    The body is streamed: chunks are written and hashed on the upload thread pool as they
+    arrive and the upload is aborted as soon as it exceeds MAX_FILE_SIZE. Identical files
+    are stored once; the detected MIME type is recorded with the file.
     """
-    if not file.filename or not file.filename.strip():
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing filename")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + _MULTIPART_OVERHEAD:
+        raise _bad_request(_TOO_LARGE_DETAIL)
+
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if ctype != b"multipart/form-data" or not boundary:
+        raise _bad_request("Expected multipart/form-data with a file field")
 
-    content_type = _get_content_type(file)
+    part = _FilePart()
+    parser = MultipartParser(boundary, part.callbacks())
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    writer: Optional[MediaUploadWriter] = None
     allowed = ALLOWED_IMAGE_VIDEO | ALLOWED_AUDIO
-    if content_type not in allowed:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Use image (JPEG/PNG/GIF/WebP), video (MP4/MOV/WebM), or audio (MP3/M4A/OGG/WAV). Got: {content_type or 'unknown'}"
-        )
-
-    # Read and check size
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)}MB."
-        )
-
-    # Save to uploads/dm-media/{user_id}/{uuid}_{sanitized_filename}
-    user_dir = UPLOAD_DIR / str(user_id)
-    user_dir.mkdir(parents=True, exist_ok=True)
-    safe_name = "".join(c for c in file.filename if c.isalnum() or c in "._- ").strip() or "file"
-    unique_name = f"{uuid.uuid4().hex}_{safe_name}"
-    file_path = user_dir / unique_name
-    file_path.write_bytes(content)
-
-    # Public URL: use API base URL from env so Instagram/backend can fetch the file
-    base_url = os.getenv("API_PUBLIC_URL", "").rstrip("/")
-    if not base_url:
-        base_url = os.getenv("BASE_URL", "").rstrip("/")
-    if not base_url:
-        # Fallback: NEXT_PUBLIC_API_URL (often set on Render) points to backend
-        base_url = os.getenv("NEXT_PUBLIC_API_URL", "http://localhost:8000").rstrip("/").rstrip("/api")
-    relative_path = f"uploads/dm-media/{user_id}/{unique_name}"
-    url = f"{base_url}/{relative_path}"
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if not part.pending:
+                if part.done:
+                    break  # Rest of the body is other fields
+                continue
+            if writer is None:
+                if not part.filename or not part.filename.strip():
+                    raise _bad_request("Missing filename")
+                # Reject before writing anything when neither the declared type nor the magic bytes are allowed
+                declared = _get_content_type(part.declared_type, part.filename)
+                if declared not in allowed and len(part.pending) >= SNIFF_BYTES:
+                    if sniff_content_type(bytes(part.pending[:SNIFF_BYTES]), declared) not in allowed:
+                        raise _type_not_allowed(declared)
+                writer = await loop.run_in_executor(executor, MediaUploadWriter)
+            if writer.size + len(part.pending) > MAX_FILE_SIZE:
+                raise _bad_request(_TOO_LARGE_DETAIL)
+            data = bytes(part.pending)
+            part.pending.clear()
+            await loop.run_in_executor(executor, writer.write, data)
+            if part.done:
+                break
+        parser.finalize()
+
+        if writer is None:
+            if part.filename is not None and not part.filename.strip():
+                raise _bad_request("Missing filename")
+            raise _bad_request("Missing file" if part.filename is None else "Empty file")
+
+        declared = _get_content_type(part.declared_type, part.filename)
+        content_type = sniff_content_type(writer.head, declared) or declared
+        if content_type not in allowed:
+            raise _type_not_allowed(content_type)
+
+        def _commit():
+            db = SessionLocal()
+            try:
+                return writer.commit(db, user_id, content_type, part.filename)
+            finally:
+                db.close()
+
+        stored = await run_in_threadpool(_commit)
+    except BaseException:
+        if writer is not None:
+            await loop.run_in_executor(executor, writer.abort)
+        raise
 
-    return {"url": url, "filename": file.filename}
+    url = f"{_public_base_url()}/{stored.public_path}"
+    register_media(url, MediaInfo(stored.content_type, stored.size, stored.sha256))
+    return {
+        "url": url,
+        "filename": part.filename,
+        "content_type": stored.content_type,
+        "size": stored.size,
+        "sha256": stored.sha256,
+    }
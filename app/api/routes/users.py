@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
 from app.db.session import get_db
@@ -27,6 +27,8 @@ from app.schemas.auth import (
 )
 from app.utils.auth import hash_password, verify_password
 from app.dependencies.auth import get_current_user_id
+from app.services.data_versions import not_modified
+from app.services.metrics import background_task, record_cache
 from datetime import datetime, timedelta
 
 router = APIRouter()
@@ -38,11 +40,14 @@ _SUBSCRIPTION_CACHE_TTL_SECONDS = 60
 
 def _get_subscription_cached(user_id: int):
     if user_id not in _subscription_cache:
+        record_cache("subscription", False)
         return None
     data, ts = _subscription_cache[user_id]
     if (datetime.utcnow() - ts).total_seconds() >= _SUBSCRIPTION_CACHE_TTL_SECONDS:
         del _subscription_cache[user_id]
+        record_cache("subscription", False)
         return None
+    record_cache("subscription", True)
     return data
 
 
@@ -240,10 +245,18 @@ def get_user_accounts(
 
 @router.get("/me/dashboard", response_model=DashboardStatsResponse)
 def get_dashboard_stats(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     user_id: int = Depends(get_current_user_id)
 ):
-    """Get dashboard statistics for current user"""
+    """Get dashboard statistics for current user (ETag / If-None-Match supported)"""
+    # 304 if accounts, rules, plan and DM log are unchanged since the client's copy (one query)
+    cached = not_modified(request, response, db, "me_dashboard", user_id, "dm_logs",
+                          params=(datetime.utcnow().date(),))
+    if cached is not None:
+        return cached
+    
     # OPTIMIZED: Get user and accounts in single query with join
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -389,6 +402,8 @@ def get_subscription(
                             continue
                     if tracker.rules_created_count > max_rules_created:
                         max_rules_created = tracker.rules_created_count
+                if len(tracker_by_igsid) < len(igsids):
+                    db.commit()  # Persist the trackers created above
             rules_count = max_rules_created
             
             # DMs count: Count DMs sent by this user in current billing cycle (user-based tracking)
@@ -489,10 +504,15 @@ def get_subscription(
         return default_response
 
 
+@background_task("invoice_sync")
 async def _background_sync_invoices(user_id: int) -> None:
-    """Run Dodo invoice sync in a separate DB session so list_invoices can return immediately."""
+    """
+    Run Dodo invoice sync in a separate DB session so list_invoices can return immediately.
+    The caller must have claimed the sync (claim_invoice_sync); it is released here.
+    """
     from app.db.session import SessionLocal
     from app.api.routes.dodo import _sync_invoices_from_dodo_api
+    from app.services.invoice_sync import release_invoice_sync
     db = SessionLocal()
     try:
         await _sync_invoices_from_dodo_api(db, user_id, raise_on_error=False)
@@ -500,6 +520,7 @@ async def _background_sync_invoices(user_id: int) -> None:
         print(f"[Invoices] Background sync error: {str(e)}")
     finally:
         db.close()
+        release_invoice_sync(user_id)
 
 
 @router.get("/invoices")
@@ -511,7 +532,8 @@ async def list_invoices(
     List invoices for the current user (most recent first).
 
     Returns DB invoices immediately so the page loads fast. Sync from Dodo API
-    runs in the background; next request or refresh will see updated data.
+    runs in the background (at most once per INVOICE_SYNC_DEBOUNCE_SECONDS per
+    user, fetching only new payments); next request or refresh will see updated data.
     """
     # Return invoices from DB immediately (no wait for Dodo API — avoids ~15s lag on refresh)
     invoices = (
@@ -522,8 +544,10 @@ async def list_invoices(
     )
 
     # Sync from Dodo in background (fire-and-forget; use new session so request session is not held)
-    import asyncio
-    asyncio.create_task(_background_sync_invoices(user_id))
+    from app.services.invoice_sync import claim_invoice_sync
+    if claim_invoice_sync(user_id):
+        import asyncio
+        asyncio.create_task(_background_sync_invoices(user_id))
 
     return [
         {
@@ -599,7 +623,7 @@ def delete_user_account(
 ):
     """Delete user account and all associated data. Order respects FK constraints.
     Also deletes the user from Supabase Auth."""
-    from app.dependencies.auth import verify_supabase_token
+    from app.dependencies.auth import verify_supabase_token, invalidate_user_cache
     import os
     import requests
     
@@ -744,6 +768,7 @@ def delete_user_account(
         try:
             db.delete(user)
             db.commit()
+            invalidate_user_cache(user_id)
             print(f"[DELETE] Successfully deleted user {user_id} and all associated data")
         except Exception as e:
             print(f"[DELETE] Error deleting user: {e}")
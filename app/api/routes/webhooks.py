@@ -7,6 +7,7 @@ import json
 import hmac
 import hashlib
 import base64
+import time
 from datetime import datetime
 from decimal import Decimal
 from fastapi import APIRouter, Request, HTTPException, status, Depends
@@ -15,6 +16,7 @@ from app.db.session import get_db
 from app.models.user import User
 from app.models.subscription import Subscription
 from app.models.invoice import Invoice
+from app.services.metrics import WEBHOOK_ACK_SECONDS
 
 router = APIRouter()
 
@@ -81,25 +83,51 @@ async def dodo_webhook(request: Request, db: Session = Depends(get_db)):
     """
     Dodo Payments webhook. Register this URL in Dodo dashboard (test mode):
     https://your-backend.com/webhooks/dodo
+
+    Only verifies and stores the event (deduplicated by webhook-id), then
+    answers; app/services/billing_events.py applies it in the background.
     """
-    payload = await request.body()
-    sig_header = request.headers.get("webhook-signature")
-    webhook_id = request.headers.get("webhook-id")
-    webhook_timestamp = request.headers.get("webhook-timestamp")
+    started = time.perf_counter()
+    try:
+        payload = await request.body()
+        sig_header = request.headers.get("webhook-signature")
+        webhook_id = request.headers.get("webhook-id")
+        webhook_timestamp = request.headers.get("webhook-timestamp")
+
+        if DODO_WEBHOOK_SECRET and not _verify_dodo_signature(
+            payload, sig_header, webhook_id, webhook_timestamp
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid webhook signature"
+            )
 
-    if DODO_WEBHOOK_SECRET and not _verify_dodo_signature(
-        payload, sig_header, webhook_id, webhook_timestamp
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid webhook signature"
-        )
+        try:
+            data = json.loads(payload)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON")
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON")
 
-    try:
-        data = json.loads(payload)
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON")
+        # Unsigned deliveries (no secret configured) may lack webhook-id: dedupe on the body instead
+        if not webhook_id:
+            webhook_id = "sha256:" + hashlib.sha256(payload).hexdigest()
 
+        from app.services.billing_events import enqueue_billing_event, wake_billing_event_worker
+
+        is_new = enqueue_billing_event(db, webhook_id, data, webhook_timestamp)
+        db.commit()
+        print(f"[Dodo webhook] {'queued' if is_new else 'duplicate'} type={data.get('type')} webhook_id={webhook_id}")
+        if is_new:
+            wake_billing_event_worker()
+
+        return {"status": "success"}
+    finally:
+        WEBHOOK_ACK_SECONDS.labels("dodo").observe(time.perf_counter() - started)
+
+
+def apply_dodo_event(db: Session, data: dict) -> None:
+    """Apply one stored Dodo event (called by the billing event worker, never in the request)."""
     event_type = data.get("type")
     # Dodo payload shape: {"type": "...", "data": {...}}
     obj = data.get("data") or {}
@@ -120,8 +148,6 @@ async def dodo_webhook(request: Request, db: Session = Depends(get_db)):
     elif event_type in ("payment.succeeded", "payment.failed"):
         _handle_payment_event(db, obj, event_type)
 
-    return {"status": "success"}
-
 
 def _handle_subscription_active(
     db: Session,
@@ -0,0 +1,250 @@
+"""
+One-shot schema bootstrap.
+
+Runs the schema work that used to happen in every uvicorn worker's startup
+event (backup ALTERs, Base.metadata.create_all, Alembic upgrade, EventType enum
+repair, invoices.amount type fix) exactly once per schema version:
+
+    python bootstrap_schema.py
+
+The work is guarded by a Postgres advisory lock, so workers or deploy steps
+that start together never race on DDL. When every step succeeds it records a schema
+fingerprint (hash of the Alembic revision files, the ORM table/column layout and
+BOOTSTRAP_VERSION) in schema_bootstrap. Web workers only compare that stored
+fingerprint with the one computed from the code (a single primary-key read);
+if they differ (e.g. local `uvicorn` without the deploy step) the worker runs
+the bootstrap itself under the same lock and the other workers just wait.
+A bootstrap where any step only logged a warning records nothing, so the next
+start runs it again.
+
+Bump BOOTSTRAP_VERSION whenever the steps in _run_bootstrap_steps change.
+"""
+import hashlib
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.db.base import Base
+from app.db.session import engine
+
+BOOTSTRAP_VERSION = "2"
+# Arbitrary constant shared by every process that bootstraps this database
+BOOTSTRAP_LOCK_ID = 7_402_117_001
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+_ALEMBIC_VERSIONS_DIR = _PROJECT_ROOT / "alembic" / "versions"
+
+_fingerprint: Optional[str] = None
+
+
+def schema_fingerprint() -> str:
+    """Fingerprint of the schema this code expects (cached per process)."""
+    global _fingerprint
+    if _fingerprint is not None:
+        return _fingerprint
+
+    import app.models  # noqa: F401 — register every model with Base
+
+    digest = hashlib.sha256()
+    digest.update(f"bootstrap:{BOOTSTRAP_VERSION}\n".encode())
+    if _ALEMBIC_VERSIONS_DIR.exists():
+        for path in sorted(_ALEMBIC_VERSIONS_DIR.glob("*.py")):
+            digest.update(path.name.encode())
+            digest.update(path.read_bytes())
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        for col in table.columns:
+            digest.update(f"{table.name}.{col.name}:{col.type!r}:{col.nullable}\n".encode())
+    _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+
+def get_stored_fingerprint(conn) -> Optional[str]:
+    """Fingerprint recorded by the last successful bootstrap, or None."""
+    try:
+        row = conn.execute(text("SELECT fingerprint FROM schema_bootstrap WHERE id = 1")).fetchone()
+    except Exception:
+        conn.rollback()
+        return None
+    return row[0] if row else None
+
+
+def verify_schema_fingerprint() -> bool:
+    """True when the database was bootstrapped for this code's schema (one cheap query)."""
+    with engine.connect() as conn:
+        return get_stored_fingerprint(conn) == schema_fingerprint()
+
+
+def _run_alembic_upgrade() -> bool:
+    """Run Alembic migrations to head. Uses alembic.ini and DATABASE_URL. False if they were skipped."""
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_ini = _PROJECT_ROOT / "alembic.ini"
+    if not alembic_ini.exists():
+        print("⚠️ alembic.ini not found, skipping Alembic migrations", file=sys.stderr)
+        return False
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        print(
+            "⚠️ DATABASE_URL is not set. Alembic migrations will not run. "
+            "Set DATABASE_URL in your deployment (e.g. Render env) to your Supabase connection string.",
+            file=sys.stderr,
+        )
+        return False
+    # Normalize postgres:// -> postgresql:// for SQLAlchemy
+    if db_url.startswith("postgres://"):
+        db_url = "postgresql://" + db_url[10:]
+    alembic_cfg = Config(str(alembic_ini))
+    alembic_cfg.set_main_option("sqlalchemy.url", db_url)
+    command.upgrade(alembic_cfg, "head")
+    return True
+
+
+def _run_bootstrap_steps() -> bool:
+    """Run every bootstrap step. True only if none of them failed or was skipped."""
+    ok = True
+    # Run free_tier schema first so column exists before any User query (avoids UndefinedColumn on first request)
+    try:
+        print("🔄 Ensuring users.free_tier_used and free_tier_usage table...", file=sys.stderr)
+        with engine.connect() as conn:
+            conn.execute(text(
+                "ALTER TABLE users ADD COLUMN IF NOT EXISTS free_tier_used BOOLEAN NOT NULL DEFAULT false"
+            ))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS free_tier_usage (
+                    email_normalized VARCHAR(255) PRIMARY KEY,
+                    used_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+                )
+            """))
+            conn.commit()
+        print("✅ users.free_tier_used and free_tier_usage verified", file=sys.stderr)
+    except Exception as e:
+        print(f"⚠️ free_tier schema check: {e}", file=sys.stderr)
+        ok = False
+
+    print("🔄 Creating database tables...", file=sys.stderr)
+    Base.metadata.create_all(bind=engine)
+    print("✅ Database tables created", file=sys.stderr)
+
+    print("🔄 Running Alembic migrations...", file=sys.stderr)
+    # Raises on failure so the DB is never marked bootstrapped out of sync
+    if _run_alembic_upgrade():
+        print("✅ Alembic migrations completed", file=sys.stderr)
+    else:
+        ok = False
+
+    # Validate and ensure EventType enum values exist (recurring missing-enum-value issue)
+    try:
+        print("🔄 Validating EventType enum values...", file=sys.stderr)
+        from app.utils.enum_validator import validate_eventtype_enum, ensure_eventtype_enum_values
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            is_valid, missing = validate_eventtype_enum(db)
+            if not is_valid:
+                print(f"⚠️  Missing enum values detected: {missing}. Attempting to add them...", file=sys.stderr)
+                if ensure_eventtype_enum_values(db):
+                    is_valid, still_missing = validate_eventtype_enum(db)
+                    if is_valid:
+                        print("✅ All enum values now exist in database", file=sys.stderr)
+                    else:
+                        print(f"⚠️  Warning: Some enum values still missing after auto-fix: {still_missing}", file=sys.stderr)
+                        ok = False
+                else:
+                    print("⚠️  Failed to auto-fix missing enum values. Check migrations.", file=sys.stderr)
+                    ok = False
+            else:
+                print("✅ EventType enum validation passed", file=sys.stderr)
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"⚠️  Enum validation warning: {str(e)}", file=sys.stderr)
+        ok = False
+
+    # Backup columns in case the matching migrations didn't run (e.g. on Render)
+    backup_columns = [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS profile_picture_url VARCHAR",
+        "ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS billing_interval VARCHAR(20) DEFAULT 'monthly'",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS notify_product_updates BOOLEAN NOT NULL DEFAULT true",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS notify_billing BOOLEAN NOT NULL DEFAULT true",
+    ]
+    try:
+        print("🔄 Checking backup columns...", file=sys.stderr)
+        with engine.connect() as conn:
+            for statement in backup_columns:
+                conn.execute(text(statement))
+            conn.commit()
+        print("✅ Backup columns verified", file=sys.stderr)
+    except Exception as e:
+        print(f"⚠️ Backup column check warning: {str(e)}", file=sys.stderr)
+        ok = False
+
+    # Ensure invoices.amount is NUMERIC so 11.81 is stored correctly (not rounded to 12)
+    try:
+        print("🔄 Checking invoices.amount column type...", file=sys.stderr)
+        with engine.connect() as conn:
+            r = conn.execute(text("""
+                SELECT data_type FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'invoices' AND column_name = 'amount'
+            """)).fetchone()
+            if r and r[0] in ("integer", "smallint", "bigint"):
+                conn.execute(text("""
+                    ALTER TABLE public.invoices
+                    ALTER COLUMN amount TYPE NUMERIC(12, 2) USING
+                    (CASE WHEN amount >= 100 THEN amount / 100.0 ELSE amount::numeric END)
+                """))
+                conn.commit()
+                print("✅ invoices.amount converted to NUMERIC(12,2)", file=sys.stderr)
+            else:
+                print("✅ invoices.amount already numeric", file=sys.stderr)
+    except Exception as e:
+        print(f"⚠️ invoices.amount check warning: {str(e)}", file=sys.stderr)
+        ok = False
+    return ok
+
+
+def bootstrap_schema(force: bool = False) -> bool:
+    """
+    Bring the schema up to date under the advisory lock.
+
+    Returns True if the bootstrap steps ran, False if the stored fingerprint
+    already matched (checked again after taking the lock, so concurrent callers
+    run the steps only once). The fingerprint is only recorded when every step
+    succeeded.
+    """
+    expected = schema_fingerprint()
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": BOOTSTRAP_LOCK_ID})
+        lock_conn.commit()
+        try:
+            if not force and get_stored_fingerprint(lock_conn) == expected:
+                print("✅ Schema already bootstrapped for this version", file=sys.stderr)
+                return False
+
+            if not _run_bootstrap_steps():
+                print("⚠️ Schema bootstrap incomplete; not recording the fingerprint so it runs again", file=sys.stderr)
+                return True
+
+            lock_conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS schema_bootstrap (
+                    id INTEGER PRIMARY KEY,
+                    fingerprint VARCHAR(64) NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+            """))
+            lock_conn.execute(text("""
+                INSERT INTO schema_bootstrap (id, fingerprint, applied_at)
+                VALUES (1, :fingerprint, NOW())
+                ON CONFLICT (id) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, applied_at = EXCLUDED.applied_at
+            """), {"fingerprint": expected})
+            lock_conn.commit()
+            print(f"✅ Schema bootstrapped (fingerprint {expected[:12]})", file=sys.stderr)
+            return True
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": BOOTSTRAP_LOCK_ID})
+            lock_conn.commit()
+
@@ -0,0 +1,241 @@
+"""
+Single-statement upsert helpers built on PostgreSQL INSERT ... ON CONFLICT ... DO UPDATE ... RETURNING.
+
+Each helper issues exactly one statement and returns the ORM instance for the
+resulting row (freshly inserted or already existing; upsert_conversation also
+says which). None of them commit:
+the write joins the caller's transaction, so a webhook event that touches a
+conversation, an audience row and a rule stats row pays one round-trip each
+and a single commit at the end.
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import Boolean, func, literal_column, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.automation_rule_stats import AutomationRuleStats
+from app.models.conversation import Conversation
+from app.models.instagram_audience import InstagramAudience
+from app.models.instagram_global_tracker import InstagramGlobalTracker
+
+
+# event_type -> (counter column, "last ... at" column or None)
+RULE_STATS_EVENT_COLUMNS = {
+    "triggered": ("total_triggers", "last_triggered_at"),
+    "dm_sent": ("total_dms_sent", None),
+    "comment_replied": ("total_comments_replied", None),
+    "lead_captured": ("total_leads_captured", "last_lead_captured_at"),
+    "follow_button_clicked": ("total_follow_button_clicks", "last_follow_button_clicked_at"),
+    "profile_visit": ("total_profile_visits", "last_profile_visit_at"),
+    "im_following_clicked": ("total_im_following_clicks", "last_im_following_clicked_at"),
+    "follower_gained": ("total_followers_gained", None),
+}
+
+
+def _execute_returning(db: Session, stmt, model):
+    """Run an ORM-enabled upsert and return the resulting instance (or None if no row came back)."""
+    return db.scalars(
+        stmt.returning(model),
+        execution_options={"populate_existing": True},
+    ).one_or_none()
+
+
+def _insert_or_select(db: Session, model, values: dict, key: dict, conflict_cols=None):
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING, unioned with a SELECT of the existing row.
+
+    Still one statement, but unlike DO UPDATE it never writes (or locks) an
+    existing row. If a concurrent transaction inserted the row after our
+    snapshot was taken, neither branch sees it; re-read once in that case.
+    conflict_cols defaults to the key columns.
+    """
+    table = model.__table__
+    ins = (
+        insert(table)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=[table.c[k] for k in (conflict_cols or key)])
+        .returning(*table.c)
+        .cte("ins")
+    )
+    existing = select(*table.c).where(*(table.c[k] == v for k, v in key.items()))
+    stmt = select(model).from_statement(union_all(select(*ins.c), existing).limit(1))
+    instance = db.scalars(stmt, execution_options={"populate_existing": True}).first()
+    if instance is None:
+        instance = db.query(model).filter_by(**key).first()
+    return instance
+
+
+def upsert_conversation(
+    db: Session,
+    user_id: int,
+    account_id: int,
+    participant_id: str,
+    participant_name: Optional[str] = None,
+    platform_conversation_id: Optional[str] = None,
+    last_message: Optional[str] = None,
+    updated_at: Optional[datetime] = None,
+) -> Tuple[Conversation, bool]:
+    """
+    Get or create the Conversation for (user_id, account_id, participant_id) in one statement.
+    Returns (conversation, inserted); inserted is True only when this statement created the row.
+
+    Relies on uq_conversations_user_account_participant. On conflict:
+    - participant_name is replaced when a new one is provided
+    - platform_conversation_id is only filled in if still empty
+    - last_message / updated_at are overwritten only when passed, so callers that
+      store a message can set the inbox preview in the same round-trip
+
+    inbox_counters are left to the caller (see get_or_create_conversation;
+    bulk sync reconciles them once instead).
+    """
+    now = datetime.utcnow()
+    stmt = insert(Conversation).values(
+        user_id=user_id,
+        instagram_account_id=account_id,
+        participant_id=str(participant_id),
+        participant_name=participant_name,
+        platform_conversation_id=platform_conversation_id,
+        last_message=last_message,
+        updated_at=updated_at or now,
+        created_at=now,
+    )
+    excluded = stmt.excluded
+    set_ = {
+        "participant_name": func.coalesce(excluded.participant_name, Conversation.participant_name),
+        "platform_conversation_id": func.coalesce(
+            Conversation.platform_conversation_id, excluded.platform_conversation_id
+        ),
+    }
+    if last_message is not None:
+        set_["last_message"] = excluded.last_message
+    if updated_at is not None:
+        set_["updated_at"] = excluded.updated_at
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Conversation.user_id, Conversation.instagram_account_id, Conversation.participant_id],
+        set_=set_,
+    )
+    # xmax is 0 only for a row version this statement inserted (an updated row carries our xid)
+    inserted = literal_column("(xmax = 0)", Boolean).label("inserted")
+    conversation, was_inserted = db.execute(
+        stmt.returning(Conversation, inserted),
+        execution_options={"populate_existing": True},
+    ).one()
+    return conversation, bool(was_inserted)
+
+
+def upsert_audience(
+    db: Session,
+    sender_id: str,
+    instagram_account_id: int,
+    user_id: int,
+    username: Optional[str] = None,
+    touch: bool = True,
+) -> Optional[InstagramAudience]:
+    """
+    Get or create the InstagramAudience row for a sender in one statement.
+
+    sender_id is globally unique, so the conflict target is sender_id; existing
+    rows are only returned for the same Instagram account so one tenant can
+    never read another tenant's audience row. Returns None in that (IGSIDs are
+    page-scoped, so practically impossible) cross-account case.
+
+    touch=True bumps last_interaction_at with DO UPDATE (row lock until the
+    caller commits). touch=False uses the lock-free insert-or-select form and
+    leaves last_interaction_at to app.services.audience_activity.
+    """
+    now = datetime.utcnow()
+    values = {
+        "sender_id": str(sender_id),
+        "instagram_account_id": instagram_account_id,
+        "user_id": user_id,
+        "username": username,
+        "is_following": False,
+        "first_interaction_at": now,
+        "last_interaction_at": now,
+    }
+    if not touch:
+        return _insert_or_select(
+            db,
+            InstagramAudience,
+            values=values,
+            key={"sender_id": str(sender_id), "instagram_account_id": instagram_account_id},
+            conflict_cols=["sender_id"],
+        )
+
+    stmt = insert(InstagramAudience).values(**values)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[InstagramAudience.sender_id],
+        set_={
+            "username": func.coalesce(InstagramAudience.username, excluded.username),
+            "last_interaction_at": excluded.last_interaction_at,
+        },
+        where=InstagramAudience.instagram_account_id == excluded.instagram_account_id,
+    )
+    return _execute_returning(db, stmt, InstagramAudience)
+
+
+def upsert_tracker(db: Session, user_id: int, instagram_id: str) -> InstagramGlobalTracker:
+    """
+    Get or create the InstagramGlobalTracker for (user_id, IGSID) in one statement.
+
+    Trackers are read on every plan check, so this uses the lock-free
+    insert-or-select form rather than DO UPDATE (which would hold a row lock
+    on the tracker until the caller commits).
+    """
+    now = datetime.utcnow()
+    return _insert_or_select(
+        db,
+        InstagramGlobalTracker,
+        values={
+            "user_id": user_id,
+            "instagram_id": instagram_id,
+            "dms_sent_count": 0,
+            "rules_created_count": 0,
+            "last_reset_date": now,
+            "created_at": now,
+        },
+        key={"user_id": user_id, "instagram_id": instagram_id},
+    )
+
+
+def increment_rule_stats(db: Session, rule_id: int, event_type: str, amount: int = 1) -> AutomationRuleStats:
+    """
+    Create-or-increment the AutomationRuleStats counter for event_type in one statement
+    (by amount, so batched writers can apply several events at once).
+
+    Unknown event types (or counters whose column does not exist yet) only bump updated_at.
+    """
+    now = datetime.utcnow()
+    columns = AutomationRuleStats.__table__.c
+    counter_col, last_at_col = RULE_STATS_EVENT_COLUMNS.get(event_type, (None, None))
+    if counter_col and counter_col not in columns:
+        counter_col = None
+
+    values = {
+        "automation_rule_id": rule_id,
+        "total_triggers": 0,
+        "total_dms_sent": 0,
+        "total_comments_replied": 0,
+        "total_leads_captured": 0,
+        "total_follow_button_clicks": 0,
+        "total_profile_visits": 0,
+        "total_im_following_clicks": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    set_ = {"updated_at": now}
+    if counter_col:
+        values[counter_col] = amount
+        set_[counter_col] = func.coalesce(columns[counter_col], 0) + amount
+    if last_at_col:
+        values[last_at_col] = now
+        set_[last_at_col] = now
+
+    stmt = insert(AutomationRuleStats).values(**values).on_conflict_do_update(
+        index_elements=[AutomationRuleStats.automation_rule_id],
+        set_=set_,
+    )
+    return _execute_returning(db, stmt, AutomationRuleStats)
@@ -2,68 +2,84 @@ from fastapi import Header, HTTPException, status, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 import jwt  # PyJWT
+import hashlib
 import os
-import requests
+import threading
 import time
-from typing import Optional
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func
 from app.db.session import get_db
+from app.utils.jwks import get_jwks_provider
+from app.services.metrics import record_cache
 
-# Cache for JWKS (Public Keys)
-JWKS_CACHE = None
-JWKS_CACHE_TIMESTAMP = None
-JWKS_CACHE_TTL = 3600  # Cache for 1 hour
+# Verified-token caches keyed by sha256(token); entries expire at the JWT's own exp,
+# so a cached token is never accepted after it would have failed verification.
+# Dashboards fire 5-10 calls per page view with the same token: only the first
+# pays for signature verification and the user lookup.
+_TOKEN_CACHE_MAX_SIZE = 10000
+# token -> user_id entries also expire after this many seconds: invalidate_user_cache only
+# reaches this process, so other workers see a deleted user or changed email within this bound
+_USER_ID_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_ID_CACHE_SECONDS", "60"))
+_claims_cache: Dict[str, Tuple[dict, float]] = {}
+_user_id_cache: Dict[str, Tuple[int, float]] = {}
+_token_cache_lock = threading.Lock()
 
+# Single-flight for user resolution / lazy creation: a fixed set of striped locks keyed by
+# hash(Supabase user id), so memory stays bounded however many users sign in
+_USER_RESOLVE_LOCK_STRIPES = 64
+_user_resolve_locks = [threading.Lock() for _ in range(_USER_RESOLVE_LOCK_STRIPES)]
 
-def get_jwks(supabase_url: str, force_refresh: bool = False):
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _token_from_header(authorization: Optional[str]) -> Optional[str]:
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    return authorization.replace("Bearer ", "").strip() or None
+
+
+def _cache_get(cache: Dict[str, Tuple[object, float]], key: str):
+    with _token_cache_lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.time() >= expires_at:
+            del cache[key]
+            return None
+        return value
+
+
+def _cache_put(cache: Dict[str, Tuple[object, float]], key: str, value, expires_at: Optional[float]) -> None:
+    if not expires_at or time.time() >= expires_at:
+        return  # Tokens without exp are never cached
+    with _token_cache_lock:
+        if len(cache) >= _TOKEN_CACHE_MAX_SIZE and key not in cache:
+            now = time.time()
+            for k in [k for k, (_, exp) in cache.items() if exp <= now]:
+                del cache[k]
+            if len(cache) >= _TOKEN_CACHE_MAX_SIZE:
+                # Still full: drop the entries closest to expiry
+                for k, _ in sorted(cache.items(), key=lambda kv: kv[1][1])[: _TOKEN_CACHE_MAX_SIZE // 10]:
+                    del cache[k]
+        cache[key] = (value, expires_at)
+
+
+def invalidate_user_cache(user_id: int) -> None:
     """
-    Fetch JWKS from Supabase with caching and retry logic.
-    Only caches successful fetches - failures are not cached to allow retries.
+    Forget every cached token -> user_id mapping for a user in this process (call after
+    deleting the user). Other workers drop theirs within _USER_ID_CACHE_TTL_SECONDS.
     """
-    global JWKS_CACHE, JWKS_CACHE_TIMESTAMP
-    
-    # Return cached value if it exists and is still valid (not forcing refresh)
-    if JWKS_CACHE and not force_refresh:
-        if JWKS_CACHE_TIMESTAMP:
-            age = time.time() - JWKS_CACHE_TIMESTAMP
-            if age < JWKS_CACHE_TTL:
-                return JWKS_CACHE
-    
-    # Try fetching with retries
-    max_retries = 3
-    last_error = None
-    
-    for attempt in range(max_retries):
-        try:
-            jwks_url = f"{supabase_url}/auth/v1/.well-known/jwks.json"
-            print(f"[AUTH] Fetching JWKS from: {jwks_url} (attempt {attempt + 1}/{max_retries})")
-            r = requests.get(jwks_url, timeout=10)  # Increased timeout
-            r.raise_for_status()
-            jwks_data = r.json()
-            
-            # Only cache successful fetches
-            JWKS_CACHE = jwks_data
-            JWKS_CACHE_TIMESTAMP = time.time()
-            print(f"[AUTH] Successfully fetched JWKS with {len(JWKS_CACHE.get('keys', []))} keys")
-            return JWKS_CACHE
-        except requests.exceptions.Timeout as e:
-            last_error = f"Timeout: {str(e)}"
-            print(f"[AUTH] JWKS fetch timeout (attempt {attempt + 1}/{max_retries}): {last_error}")
-            if attempt < max_retries - 1:
-                time.sleep(1)  # Wait 1 second before retry
-        except requests.exceptions.RequestException as e:
-            last_error = f"Request error: {str(e)}"
-            print(f"[AUTH] JWKS fetch request error (attempt {attempt + 1}/{max_retries}): {last_error}")
-            if attempt < max_retries - 1:
-                time.sleep(1)  # Wait 1 second before retry
-        except Exception as e:
-            last_error = f"Unexpected error: {str(e)}"
-            print(f"[AUTH] JWKS fetch unexpected error (attempt {attempt + 1}/{max_retries}): {last_error}")
-            if attempt < max_retries - 1:
-                time.sleep(1)  # Wait 1 second before retry
-    
-    # All retries failed - return None but don't cache it
-    print(f"[AUTH] Failed to fetch JWKS after {max_retries} attempts: {last_error}")
-    return None
+    with _token_cache_lock:
+        for k in [k for k, (uid, _) in _user_id_cache.items() if uid == user_id]:
+            del _user_id_cache[k]
+
+
+def _email_equals(User, email: Optional[str]):
+    """Case-insensitive email match that can use the lower(email) index (ix_users_email_lower)."""
+    return func.lower(User.email) == (email or "").lower()
 
 
 def verify_supabase_token(authorization: Optional[str] = Header(None)):
@@ -113,6 +129,13 @@ def verify_supabase_token(authorization: Optional[str] = Header(None)):
             detail="Invalid token format. Token must have header.payload.signature structure."
         )
     
+    # Already verified and not yet expired: skip header parsing, JWKS and signature checks
+    token_hash = _token_hash(token)
+    cached_payload = _cache_get(_claims_cache, token_hash)
+    record_cache("auth_claims", cached_payload is not None)
+    if cached_payload is not None:
+        return cached_payload
+
     # 1. Check Algorithm from header
     try:
         unverified_header = jwt.get_unverified_header(token)
@@ -145,31 +168,23 @@ def verify_supabase_token(authorization: Optional[str] = Header(None)):
                 detail="Server misconfiguration: SUPABASE_URL not set"
             )
         
-        # Try to get JWKS (with retries and caching)
-        jwks = get_jwks(supabase_url)
-        
-        # If fresh fetch failed, try using stale cache as fallback
-        if not jwks and JWKS_CACHE:
-            cache_age = time.time() - (JWKS_CACHE_TIMESTAMP or 0) if JWKS_CACHE_TIMESTAMP else float('inf')
-            # Use stale cache if it's less than 24 hours old
-            if cache_age < 86400:  # 24 hours
-                print(f"[AUTH] Using stale JWKS cache (age: {cache_age:.0f}s) as fallback")
-                jwks = JWKS_CACHE
-            else:
-                print(f"[AUTH] JWKS cache is too stale (age: {cache_age:.0f}s), cannot use as fallback")
-        
-        if not jwks:
-            print("[AUTH] CRITICAL: Could not fetch JWKS and no valid cache available")
+        # Shared provider: parsed keys by kid, background refresh, single-flight fetch
+        jwks_provider = get_jwks_provider(supabase_url)
+        signing_key = jwks_provider.get_signing_key(kid)
+        if signing_key is None:
+            if not jwks_provider.has_keys():
+                print("[AUTH] CRITICAL: Could not fetch JWKS and no valid cache available")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service temporarily unavailable. Please try again in a moment."
+                )
+            print(f"[AUTH] ES256 Verification failed: unknown key id {kid}")
             raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Authentication service temporarily unavailable. Please try again in a moment."
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token signature"
             )
         
         try:
-            # PyJWT automatically finds the right key from the JWKS
-            jwks_client = jwt.PyJWKClient(f"{supabase_url}/auth/v1/.well-known/jwks.json")
-            signing_key = jwks_client.get_signing_key_from_jwt(token)
-            
             # CRITICAL: We decode AND get the payload in one step.
             # We do NOT call decode() again later.
             payload = jwt.decode(
@@ -226,31 +241,23 @@ def verify_supabase_token(authorization: Optional[str] = Header(None)):
                 detail="Server misconfiguration: SUPABASE_URL not set"
             )
         
-        # Try to get JWKS (with retries and caching)
-        jwks = get_jwks(supabase_url)
-        
-        # If fresh fetch failed, try using stale cache as fallback
-        if not jwks and JWKS_CACHE:
-            cache_age = time.time() - (JWKS_CACHE_TIMESTAMP or 0) if JWKS_CACHE_TIMESTAMP else float('inf')
-            # Use stale cache if it's less than 24 hours old
-            if cache_age < 86400:  # 24 hours
-                print(f"[AUTH] Using stale JWKS cache (age: {cache_age:.0f}s) as fallback")
-                jwks = JWKS_CACHE
-            else:
-                print(f"[AUTH] JWKS cache is too stale (age: {cache_age:.0f}s), cannot use as fallback")
-        
-        if not jwks:
-            print("[AUTH] CRITICAL: Could not fetch JWKS and no valid cache available")
+        # Shared provider: parsed keys by kid, background refresh, single-flight fetch
+        jwks_provider = get_jwks_provider(supabase_url)
+        signing_key = jwks_provider.get_signing_key(kid)
+        if signing_key is None:
+            if not jwks_provider.has_keys():
+                print("[AUTH] CRITICAL: Could not fetch JWKS and no valid cache available")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service temporarily unavailable. Please try again in a moment."
+                )
+            print(f"[AUTH] RS256 Verification failed: unknown key id {kid}")
             raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Authentication service temporarily unavailable. Please try again in a moment."
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token signature"
             )
         
         try:
-            # PyJWT automatically finds the right key from the JWKS
-            jwks_client = jwt.PyJWKClient(f"{supabase_url}/auth/v1/.well-known/jwks.json")
-            signing_key = jwks_client.get_signing_key_from_jwt(token)
-            
             # CRITICAL: We decode AND get the payload in one step.
             payload = jwt.decode(
                 token,
@@ -277,6 +284,7 @@ def verify_supabase_token(authorization: Optional[str] = Header(None)):
     
     # 5. Return the payload (contains 'sub', 'email', etc.)
     if payload:
+        _cache_put(_claims_cache, token_hash, payload, payload.get("exp"))
         return payload
     
     raise HTTPException(
@@ -298,7 +306,7 @@ def _resolve_user_after_integrity_error(db: Session, email: Optional[str], supab
         db.expire_all()
         if attempt > 0:
             time.sleep(0.2 * (attempt + 1))
-        user = db.query(User).filter(User.email.ilike(email)).first() if email else None
+        user = db.query(User).filter(_email_equals(User, email)).first() if email else None
         if not user and supabase_user_id:
             user = db.query(User).filter(User.supabase_id == supabase_user_id).first()
         if user:
@@ -332,7 +340,20 @@ def get_current_user_id(
     We do NOT call decode() again.
     
     Auto-creates user if missing to prevent 404 errors for new users.
+
+    The resolved user id is cached per token (until the token's exp, at most
+    _USER_ID_CACHE_TTL_SECONDS), and
+    resolution runs single-flight per Supabase user so concurrent first requests
+    from a new user create the row once instead of racing on the unique keys.
     """
+    token = _token_from_header(authorization)
+    token_hash = _token_hash(token) if token else None
+    if token_hash:
+        cached_user_id = _cache_get(_user_id_cache, token_hash)
+        record_cache("auth_user_id", cached_user_id is not None)
+        if cached_user_id is not None:
+            return cached_user_id
+
     try:
         # Verify token and get payload (already verified, contains all claims)
         payload = verify_supabase_token(authorization)
@@ -358,7 +379,23 @@ def get_current_user_id(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token missing email claim"
         )
-    
+
+    flight_key = supabase_user_id or email.lower()
+    with _user_resolve_locks[hash(flight_key) % _USER_RESOLVE_LOCK_STRIPES]:
+        # Another request with this token may have resolved the user while we waited
+        if token_hash:
+            cached_user_id = _cache_get(_user_id_cache, token_hash)
+            if cached_user_id is not None:
+                return cached_user_id
+        user_id = _resolve_user_id(db, email, supabase_user_id)
+        if token_hash:
+            exp = payload.get("exp")
+            _cache_put(_user_id_cache, token_hash, user_id, exp and min(exp, time.time() + _USER_ID_CACHE_TTL_SECONDS))
+    return user_id
+
+
+def _resolve_user_id(db: Session, email: str, supabase_user_id: Optional[str]) -> int:
+    """Find the backend user for verified token claims, creating it on first sight (lazy sync)."""
     try:
         # Look up user: prefer supabase_id (sub) so same token always maps to same user.
         # Email-first lookup can return different users if duplicates exist or casing differs.
@@ -367,7 +404,7 @@ def get_current_user_id(
         if supabase_user_id:
             user = db.query(User).filter(User.supabase_id == supabase_user_id).first()
         if not user:
-            user = db.query(User).filter(User.email.ilike(email)).first()
+            user = db.query(User).filter(_email_equals(User, email)).first()
             # Heal: if we found by email but this row has no supabase_id, set it so future requests find by sub (fixes "two behaviours").
             if user and supabase_user_id and not user.supabase_id:
                 try:
@@ -429,7 +466,7 @@ def get_current_user_id(
         ).first() is not None
 
         # Double-check user doesn't exist (race condition protection)
-        user = db.query(User).filter(User.email.ilike(email)).first()
+        user = db.query(User).filter(_email_equals(User, email)).first()
         if user:
             print(f"[AUTH] User found on second check (race condition): {user.id}")
             return user.id
@@ -483,7 +520,7 @@ def get_current_user_id(
             # For non-integrity errors, retry lookup a few times
             for retry_attempt in range(2):
                 db.expire_all()
-                user = db.query(User).filter(User.email.ilike(email)).first()
+                user = db.query(User).filter(_email_equals(User, email)).first()
                 if user:
                     print(f"[AUTH] User found after retry {retry_attempt + 1}: {user.id}")
                     return user.id
@@ -505,7 +542,7 @@ def get_current_user_id(
             try:
                 # As a last resort, try one final lookup with a completely fresh query
                 db.expire_all()
-                final_user = db.query(User).filter(User.email.ilike(email)).first()
+                final_user = db.query(User).filter(_email_equals(User, email)).first()
                 if final_user:
                     return final_user.id
                 
@@ -543,7 +580,7 @@ def get_current_user_id(
                 # Even if creation fails, try one more lookup - maybe it was created by another process
                 try:
                     db.expire_all()
-                    last_check = db.query(User).filter(User.email.ilike(email)).first()
+                    last_check = db.query(User).filter(_email_equals(User, email)).first()
                     if last_check:
                         print(f"[AUTH] User found on absolute final check: {last_check.id}")
                         return last_check.id
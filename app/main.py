@@ -3,6 +3,9 @@ Instagram Automation Backend API
 Version: 2.1.0 - Strict Mode Lead Capture
 Last Updated: 2026-01-21
 """
+import time
+_import_started = time.perf_counter()
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -11,9 +14,6 @@ import os
 import sys
 from pathlib import Path
 
-from alembic import command
-from alembic.config import Config
-
 # Configure logging for Render compatibility
 # Render captures stdout/stderr, but logging module is more reliable
 logging.basicConfig(
@@ -29,41 +29,14 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def run_migrations() -> None:
-    """Run Alembic migrations on startup. Uses alembic.ini and DATABASE_URL.
-    Fails startup if migrations fail, so the DB is never left out of sync."""
-    project_root = Path(__file__).resolve().parent.parent
-    alembic_ini = project_root / "alembic.ini"
-    if not alembic_ini.exists():
-        logger.warning("alembic.ini not found, skipping Alembic migrations")
-        return
-    db_url = os.getenv("DATABASE_URL")
-    if not db_url:
-        logger.error(
-            "DATABASE_URL is not set. Alembic migrations will not run. "
-            "Set DATABASE_URL in your deployment (e.g. Render env) to your Supabase connection string."
-        )
-        return
-    # Normalize postgres:// -> postgresql:// for SQLAlchemy
-    if db_url.startswith("postgres://"):
-        db_url = "postgresql://" + db_url[10:]
-    try:
-        alembic_cfg = Config(str(alembic_ini))
-        alembic_cfg.set_main_option("sqlalchemy.url", db_url)
-        command.upgrade(alembic_cfg, "head")
-        logger.info("Alembic migrations completed successfully")
-    except Exception as e:
-        logger.exception("Alembic migration failed: %s", e)
-        raise  # Fail startup so DB is not left out of sync; fix migration or env and redeploy
-
-
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from app.api.routes import auth, instagram, instagram_oauth, automation, webhooks, users, dodo as dodo_router, leads, analytics, support, upload
-from app.db.session import engine
+from app.api.media_files import MediaFiles
+from app.api.router_loader import RouterSpec, register_routers, start_router_warmup
+from app.api.routes import auth
 from app.utils.disposable_email import ensure_blocklist_loaded
-from app.db.base import Base
+from app.db.session import engine
+from app.services.metrics import MetricsMiddleware, install_db_metrics, metrics_endpoint
 # Import all models to ensure they're registered with Base
 from app.models import User, Subscription, InstagramAccount, AutomationRule, DmLog, Follower, CapturedLead, AutomationRuleStats, AnalyticsEvent, Message, Conversation, InstagramAudience, InstagramGlobalTracker
 
@@ -71,137 +44,30 @@ app = FastAPI(title="Instagram Automation SaaS")
 
 @app.on_event("startup")
 async def startup_event():
-    """Create tables, then run Alembic migrations on every server restart.
-    If a migration didn't change your DB (e.g. Supabase still shows old column type):
-    1. Check deploy logs for 'Alembic migration failed' or 'DATABASE_URL is not set'.
-    2. Ensure DATABASE_URL in production (e.g. Render env) is your Supabase connection string.
-    3. If migrations fail, the server will now refuse to start until you fix the cause."""
+    """Verify the schema fingerprint; DDL only runs if the deploy bootstrap didn't.
+    Schema work (backup ALTERs, create_all, Alembic upgrade, enum repair) lives in
+    app/db/bootstrap.py and runs once per deploy via `python bootstrap_schema.py`,
+    under a Postgres advisory lock. If the fingerprint doesn't match (e.g. local
+    uvicorn without the deploy step), this worker runs the bootstrap itself; other
+    workers wait on the lock and then see the matching fingerprint.
+    If the bootstrap fails the server refuses to start so the DB is never left out of sync."""
     import sys
-    from sqlalchemy import text
-
-    # Run free_tier schema first so column exists before any User query (avoids UndefinedColumn on first request)
-    try:
-        print("🔄 Ensuring users.free_tier_used and free_tier_usage table...", file=sys.stderr)
-        with engine.connect() as conn:
-            conn.execute(text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS free_tier_used BOOLEAN NOT NULL DEFAULT false"
-            ))
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS free_tier_usage (
-                    email_normalized VARCHAR(255) PRIMARY KEY,
-                    used_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
-                )
-            """))
-            conn.commit()
-        print("✅ users.free_tier_used and free_tier_usage verified", file=sys.stderr)
-    except Exception as e:
-        print(f"⚠️ free_tier schema check: {e}", file=sys.stderr)
+    from app.db.bootstrap import bootstrap_schema, verify_schema_fingerprint
 
     try:
-        print("🔄 Creating database tables...", file=sys.stderr)
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database tables created", file=sys.stderr)
+        if verify_schema_fingerprint():
+            print("✅ Schema fingerprint verified", file=sys.stderr)
+        else:
+            print("🔄 Schema fingerprint mismatch, running bootstrap...", file=sys.stderr)
+            bootstrap_schema()
     except Exception as e:
-        print(f"⚠️ Error creating tables: {str(e)}", file=sys.stderr)
+        print(f"❌ Schema bootstrap failed (server will not start): {str(e)}", file=sys.stderr)
         raise
 
-    try:
-        print("🔄 Running Alembic migrations...", file=sys.stderr)
-        run_migrations()
-        print("✅ Alembic migrations completed", file=sys.stderr)
-    except Exception as e:
-        print(f"❌ Alembic migration failed (server will not start): {str(e)}", file=sys.stderr)
-        raise  # Fail startup so you see the error in deploy logs and fix DATABASE_URL / migration
-    
-    # CRITICAL: Validate and ensure EventType enum values exist
-    # This prevents the recurring issue where enum values are missing from the database
-    try:
-        print("🔄 Validating EventType enum values...", file=sys.stderr)
-        from app.utils.enum_validator import validate_eventtype_enum, ensure_eventtype_enum_values
-        from app.db.session import SessionLocal
-        
-        db = SessionLocal()
-        try:
-            is_valid, missing = validate_eventtype_enum(db)
-            if not is_valid:
-                print(f"⚠️  Missing enum values detected: {missing}. Attempting to add them...", file=sys.stderr)
-                if ensure_eventtype_enum_values(db):
-                    # Re-validate after adding
-                    is_valid, still_missing = validate_eventtype_enum(db)
-                    if is_valid:
-                        print("✅ All enum values now exist in database", file=sys.stderr)
-                    else:
-                        print(f"⚠️  Warning: Some enum values still missing after auto-fix: {still_missing}", file=sys.stderr)
-                        # Don't fail startup - migrations should handle this, but log the warning
-                else:
-                    print("⚠️  Failed to auto-fix missing enum values. Check migrations.", file=sys.stderr)
-            else:
-                print("✅ EventType enum validation passed", file=sys.stderr)
-        finally:
-            db.close()
-    except Exception as e:
-        print(f"⚠️  Enum validation warning: {str(e)}", file=sys.stderr)
-        # Don't fail startup - migrations should handle enum creation
-        # This is a safety check, not a blocker
-    
-    # Temporary fix: Ensure profile_picture_url column exists (backup in case migration didn't run)
-    try:
-        print("🔄 Checking profile_picture_url column...", file=sys.stderr)
-        with engine.connect() as conn:
-            conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS profile_picture_url VARCHAR"))
-            conn.commit()
-            print("✅ profile_picture_url column verified", file=sys.stderr)
-    except Exception as e:
-        print(f"⚠️ profile_picture_url column check warning: {str(e)}", file=sys.stderr)
-        # Don't fail startup if this doesn't work - migration should handle it
-
-    # Ensure subscriptions.billing_interval exists (monthly vs yearly for cancellation end date)
-    try:
-        print("🔄 Checking subscriptions.billing_interval column...", file=sys.stderr)
-        with engine.connect() as conn:
-            conn.execute(text(
-                "ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS billing_interval VARCHAR(20) DEFAULT 'monthly'"
-            ))
-            conn.commit()
-            print("✅ subscriptions.billing_interval verified", file=sys.stderr)
-    except Exception as e:
-        print(f"⚠️ billing_interval column check warning: {str(e)}", file=sys.stderr)
-
-    # Ensure notification preference columns exist (backup if Alembic 013/015 didn't run, e.g. on Render)
-    try:
-        print("🔄 Checking users notification preference columns...", file=sys.stderr)
-        with engine.connect() as conn:
-            conn.execute(text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS notify_product_updates BOOLEAN NOT NULL DEFAULT true"
-            ))
-            conn.execute(text(
-                "ALTER TABLE users ADD COLUMN IF NOT EXISTS notify_billing BOOLEAN NOT NULL DEFAULT true"
-            ))
-            conn.commit()
-            print("✅ users notify_product_updates, notify_billing columns verified", file=sys.stderr)
-    except Exception as e:
-        print(f"⚠️ Notification preference columns check warning: {str(e)}", file=sys.stderr)
-
-    # Ensure invoices.amount is NUMERIC so 11.81 is stored correctly (not rounded to 12) so 11.81 is stored correctly (not rounded to 12)
-    try:
-        print("🔄 Checking invoices.amount column type...", file=sys.stderr)
-        with engine.connect() as conn:
-            r = conn.execute(text("""
-                SELECT data_type FROM information_schema.columns
-                WHERE table_schema = 'public' AND table_name = 'invoices' AND column_name = 'amount'
-            """)).fetchone()
-            if r and r[0] in ("integer", "smallint", "bigint"):
-                conn.execute(text("""
-                    ALTER TABLE public.invoices
-                    ALTER COLUMN amount TYPE NUMERIC(12, 2) USING
-                    (CASE WHEN amount >= 100 THEN amount / 100.0 ELSE amount::numeric END)
-                """))
-                conn.commit()
-                print("✅ invoices.amount converted to NUMERIC(12,2)", file=sys.stderr)
-            else:
-                print("✅ invoices.amount already numeric", file=sys.stderr)
-    except Exception as e:
-        print(f"⚠️ invoices.amount check warning: {str(e)}", file=sys.stderr)
+    print(f"⏱️ app.main imported in {_import_ms:.0f} ms", file=sys.stderr)
+    start_router_warmup(_router_loader)
+    if os.getenv("IMPORT_TIME_REPORT") == "1":
+        _start_import_time_report()
 
     # Load disposable email blocklist at startup so production logs show it and we catch missing file early
     try:
@@ -210,6 +76,10 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️ Disposable email blocklist load warning: {str(e)}", file=sys.stderr)
 
+    # Apply billing webhooks stored but not yet applied (e.g. before a restart); see app/services/billing_events.py
+    from app.services.billing_events import start_billing_event_worker
+    start_billing_event_worker()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -227,20 +97,47 @@ app.add_middleware(
     allow_headers=["*", "ngrok-skip-browser-warning"],  # Allow ngrok bypass header
 )
 
-# Register routers
+# Prometheus metrics: per-request latency and DB usage, GET /metrics (see app/services/metrics.py)
+install_db_metrics(engine)
+app.add_middleware(MetricsMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+# Register routers. Auth is eager (it pulls in the shared auth/DB dependencies anyway);
+# the rest are imported on first request to their prefix or by the post-startup warm-up
+# (see app/api/router_loader.py). Registration order is preserved for shared prefixes.
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
-app.include_router(users.router, prefix="/users", tags=["Users"])
-app.include_router(instagram.router, prefix="/api/instagram", tags=["Instagram"])
-app.include_router(instagram_oauth.router, prefix="/api/instagram", tags=["Instagram OAuth"])
-app.include_router(automation.router, prefix="/automation", tags=["Automation"])
-app.include_router(webhooks.router, prefix="/webhooks", tags=["Webhooks"])
-app.include_router(dodo_router.router, prefix="/api/dodo", tags=["Dodo Payments"])
-app.include_router(leads.router, prefix="/api", tags=["Leads"])
-app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
-app.include_router(support.router, prefix="/support", tags=["Support"])
-app.include_router(upload.router, prefix="/upload", tags=["Upload"])
-
-# Serve uploaded DM media (image/video/voice) at /uploads/...
+_router_loader = register_routers(app, [
+    RouterSpec("app.api.routes.users", "/users", ["Users"]),
+    RouterSpec("app.api.routes.instagram", "/api/instagram", ["Instagram"]),
+    RouterSpec("app.api.routes.instagram_oauth", "/api/instagram", ["Instagram OAuth"]),
+    RouterSpec("app.api.routes.automation", "/automation", ["Automation"]),
+    RouterSpec("app.api.routes.webhooks", "/webhooks", ["Webhooks"]),
+    RouterSpec("app.api.routes.dodo", "/api/dodo", ["Dodo Payments"]),
+    RouterSpec("app.api.routes.leads", "/api", ["Leads"]),
+    RouterSpec("app.api.routes.analytics", "/api/analytics", ["Analytics"]),
+    RouterSpec("app.api.routes.support", "/support", ["Support"]),
+    RouterSpec("app.api.routes.upload", "/upload", ["Upload"]),
+])
+
+# Serve uploaded DM media (image/video/voice) at /uploads/... (immutable caching, ranges,
+# per-file fetch counts; see app/api/media_files.py and app/media_app.py for a dedicated process)
 _uploads_dir = Path(__file__).resolve().parent.parent / "uploads"
 _uploads_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(_uploads_dir)), name="uploads")
\ No newline at end of file
+app.mount("/uploads", MediaFiles(directory=str(_uploads_dir)), name="uploads")
+
+
+def _start_import_time_report() -> None:
+    """Profile a cold `import app.main` in a subprocess and print the report (IMPORT_TIME_REPORT=1)."""
+    import threading
+    from app.utils.import_profile import format_import_report, profile_imports
+
+    def _report():
+        try:
+            print(format_import_report(profile_imports("app.main", env={"LAZY_ROUTERS": os.getenv("LAZY_ROUTERS", "1")})), file=sys.stderr)
+        except Exception as e:
+            print(f"⚠️ Import-time report failed: {str(e)}", file=sys.stderr)
+
+    threading.Thread(target=_report, name="import-time-report", daemon=True).start()
+
+
+_import_ms = (time.perf_counter() - _import_started) * 1000
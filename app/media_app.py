@@ -0,0 +1,14 @@
+"""
+Media-only ASGI app: serves /uploads without the API routers.
+
+    uvicorn app.media_app:app --port 8001
+
+Point MEDIA_PUBLIC_URL at it so new upload URLs go to this process and bursts
+of Instagram media fetches never compete with webhook/API workers.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.api.media_files import create_media_app
+
+app = create_media_app()
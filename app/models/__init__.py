@@ -13,6 +13,12 @@ from app.models.instagram_audience import InstagramAudience
 from app.models.instagram_global_tracker import InstagramGlobalTracker
 from app.models.invoice import Invoice
 from app.models.free_tier_usage import FreeTierUsage
+from app.models.tracked_link import TrackedLink
+from app.models.media_asset import MediaAsset, MediaRef
+from app.models.user_data_version import UserDataVersion
+from app.models.inbox_counter import InboxCounter
+from app.models.invoice_sync_state import InvoiceSyncState
+from app.models.billing_event import BillingEvent
 
 __all__ = [
     "User",
@@ -31,4 +37,11 @@ __all__ = [
     "InstagramGlobalTracker",
     "Invoice",
     "FreeTierUsage",
+    "TrackedLink",
+    "MediaAsset",
+    "MediaRef",
+    "UserDataVersion",
+    "InboxCounter",
+    "InvoiceSyncState",
+    "BillingEvent",
 ]
@@ -0,0 +1,32 @@
+"""
+Inbox of received Dodo billing webhooks (see app/services/billing_events.py).
+
+One row per webhook-id, inserted by POST /webhooks/dodo before it answers
+200; a background worker applies pending rows in order per ordering_key
+(the Dodo subscription, else customer, else payment).
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Identity, Integer, JSON, String, Text
+from datetime import datetime
+from app.db.base import Base
+
+
+class BillingEvent(Base):
+    __tablename__ = "billing_events"
+
+    webhook_id = Column(String, primary_key=True)
+    seq = Column(BigInteger, Identity(), nullable=False)  # Arrival order, tie-break within event_at
+    event_type = Column(String, nullable=True)
+    ordering_key = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+
+    event_at = Column(DateTime, nullable=False)  # Dodo's event timestamp (else receipt time)
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    status = Column(String, default="pending", server_default="pending", nullable=False)  # pending, done, failed
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    def __repr__(self):
+        return f"<BillingEvent(webhook_id={self.webhook_id}, type={self.event_type}, status={self.status})>"
@@ -1,7 +1,9 @@
 """
 Model for storing captured leads from lead capture automation flows.
 """
-from sqlalchemy import Column, Integer, String, JSON, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Computed, Integer, String, JSON, Boolean, ForeignKey, DateTime
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from datetime import datetime
 from app.db.base import Base
 
@@ -26,5 +28,14 @@ class CapturedLead(Base):
     notified = Column(Boolean, default=False)  # Email notification sent?
     exported = Column(Boolean, default=False)  # Exported to CSV/webhook?
     
+    # Full-text search over name/email/phone (alembic 023, app/services/search.py); computed by Postgres
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone, ''))",
+            persisted=True,
+        ),
+    ))
+    
     def __repr__(self):
         return f"<CapturedLead(id={self.id}, email={self.email}, phone={self.phone}, rule_id={self.automation_rule_id})>"
@@ -1,7 +1,7 @@
 """
 Model for storing Instagram DM conversations.
 """
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, UniqueConstraint
 from datetime import datetime
 from app.db.base import Base
 
@@ -25,5 +25,16 @@ class Conversation(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
+    # Incoming messages since our last reply (app/services/inbox_counters.py)
+    unread_count = Column(Integer, default=0, server_default="0", nullable=False)
+    
+    # Graph API updated_time as of the last successful sync (delta-sync watermark, see instagram_sync)
+    synced_updated_time = Column(DateTime, nullable=True)
+    
+    # One conversation per participant (see alembic 008); target of the upsert in app/db/upsert.py
+    __table_args__ = (
+        UniqueConstraint('user_id', 'instagram_account_id', 'participant_id', name='uq_conversations_user_account_participant'),
+    )
+    
     def __repr__(self):
         return f"<Conversation(id={self.id}, participant={self.participant_name or self.participant_id}, updated_at={self.updated_at})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from datetime import datetime
 from app.db.base import Base
 
@@ -11,4 +11,14 @@ class Follower(Base):
     username = Column(String, nullable=False)
     user_id = Column(Integer, nullable=True)
     full_name = Column(String, nullable=True)
-    fetched_at = Column(DateTime, default=datetime.utcnow)
+    fetched_at = Column(DateTime, default=datetime.utcnow)  # First seen (new-follower detection keys on this)
+    unfollowed_at = Column(DateTime, nullable=True)  # Set when the account no longer appears in a fetch
+    automation_processed_at = Column(DateTime, nullable=True)  # new_follower rules ran for this follower
+
+    __table_args__ = (
+        Index('ix_followers_account_username', 'instagram_account_id', 'username'),
+        Index(
+            'ix_followers_automation_pending', 'instagram_account_id', 'fetched_at', 'id',
+            postgresql_where=(automation_processed_at.is_(None) & unfollowed_at.is_(None)),
+        ),
+    )
@@ -0,0 +1,30 @@
+"""
+Per-account inbox counters (see app/services/inbox_counters.py).
+
+Maintained in the same transaction that stores a Message or creates a
+Conversation, so /conversations/stats is a primary-key read. The reconcile
+command (scripts/reconcile_inbox_counters.py) rebuilds them from messages.
+"""
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer
+from datetime import datetime
+from app.db.base import Base
+
+
+class InboxCounter(Base):
+    __tablename__ = "inbox_counters"
+
+    instagram_account_id = Column(Integer, ForeignKey("instagram_accounts.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+
+    conversations = Column(Integer, default=0, server_default="0", nullable=False)  # Excludes self-conversations
+    messages_in = Column(BigInteger, default=0, server_default="0", nullable=False)
+    messages_out = Column(BigInteger, default=0, server_default="0", nullable=False)
+    unread = Column(Integer, default=0, server_default="0", nullable=False)  # Sum of conversations.unread_count
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<InboxCounter(account={self.instagram_account_id}, conversations={self.conversations}, "
+            f"in={self.messages_in}, out={self.messages_out}, unread={self.unread})>"
+        )
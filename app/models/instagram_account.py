@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
 from datetime import datetime
 from app.db.base import Base
 
@@ -11,6 +11,7 @@ class InstagramAccount(Base):
     username = Column(String, nullable=False)
     encrypted_credentials = Column(String, nullable=False)  # Legacy field, kept for backward compatibility
     encrypted_page_token = Column(String, nullable=True)  # Encrypted Facebook Page Access Token
+    encrypted_session_settings = Column(Text, nullable=True)  # Encrypted instagrapi dump_settings() (client pool)
     page_id = Column(String, nullable=True)  # Facebook Page ID
     igsid = Column(String, nullable=True, index=True)  # Instagram Business Account ID
     is_active = Column(Boolean, default=True)
@@ -0,0 +1,23 @@
+"""
+Per-customer watermark for the Dodo invoice sync (see app/services/invoice_sync.py).
+
+last_payment_at is the newest payment created_at stored so far, so the next
+sync only asks Dodo for payments created after it (minus a small overlap).
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from datetime import datetime
+from app.db.base import Base
+
+
+class InvoiceSyncState(Base):
+    __tablename__ = "invoice_sync_states"
+
+    dodo_customer_id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    last_payment_at = Column(DateTime, nullable=True)  # Newest payment created_at (UTC) seen for this customer
+    last_payment_id = Column(String, nullable=True)
+    synced_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<InvoiceSyncState(customer={self.dodo_customer_id}, last_payment_at={self.last_payment_at})>"
@@ -0,0 +1,43 @@
+"""
+Models for uploaded DM media.
+
+MediaAsset is one stored file, keyed by its sha256 (uploads/dm-media/blobs/...),
+so identical media is written once. MediaRef is a user's reference to an asset,
+with the public path the automation config points at.
+"""
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, DateTime, UniqueConstraint
+from datetime import datetime
+from app.db.base import Base
+
+
+class MediaAsset(Base):
+    __tablename__ = "media_assets"
+
+    sha256 = Column(String(64), primary_key=True)
+    content_type = Column(String(100), nullable=False)  # Detected from the file's magic bytes when possible
+    size_bytes = Column(BigInteger, nullable=False)
+    storage_path = Column(String, nullable=False)  # Relative to the uploads directory
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<MediaAsset(sha256={self.sha256[:12]}, type={self.content_type}, size={self.size_bytes})>"
+
+
+class MediaRef(Base):
+    __tablename__ = "media_refs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    sha256 = Column(String(64), ForeignKey("media_assets.sha256", ondelete="CASCADE"), nullable=False, index=True)
+    public_path = Column(String, nullable=False, unique=True)  # e.g. uploads/dm-media/{user_id}/{sha256}.mp4
+    original_filename = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    fetch_count = Column(BigInteger, default=0, server_default="0", nullable=False)  # GETs served from /uploads (batched)
+    last_fetched_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'sha256', name='uq_media_refs_user_sha256'),
+    )
+
+    def __repr__(self):
+        return f"<MediaRef(user_id={self.user_id}, path={self.public_path})>"
@@ -1,7 +1,9 @@
 """
 Model for storing all Instagram DM messages (both sent and received).
 """
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Computed, Integer, String, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from datetime import datetime
 from app.db.base import Base
 
@@ -34,6 +36,12 @@ class Message(Base):
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     
+    # Full-text search (alembic 023, app/services/search.py); computed by Postgres, never loaded with the row
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', coalesce(message_text, content, ''))", persisted=True),
+    ))
+    
     def __repr__(self):
         direction = "→" if self.is_from_bot else "←"
         content = self.message_text or self.content or 'None'
@@ -0,0 +1,22 @@
+"""
+Model for short tracking links (/api/analytics/r/{code}) sent in automation DMs.
+The code is derived from the link's contents, so generating the same link twice reuses one row.
+"""
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from datetime import datetime
+from app.db.base import Base
+
+
+class TrackedLink(Base):
+    __tablename__ = "tracked_links"
+
+    code = Column(String(16), primary_key=True)
+    target_url = Column(Text, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)  # Business owner
+    rule_id = Column(Integer, ForeignKey("automation_rules.id", ondelete="CASCADE"), nullable=True, index=True)
+    instagram_account_id = Column(Integer, ForeignKey("instagram_accounts.id", ondelete="CASCADE"), nullable=True)
+    media_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<TrackedLink(code={self.code}, rule_id={self.rule_id})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -19,4 +19,9 @@ class User(Base):
     plan_tier = Column(String, default="free", nullable=False)
     free_tier_used = Column(Boolean, default=False, nullable=False)  # True if re-signup after delete (no free DMs/accounts)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Serves case-insensitive email lookups in get_current_user_id (func.lower(User.email) == ...)
+        Index("ix_users_email_lower", func.lower(email)),
+    )
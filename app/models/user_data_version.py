@@ -0,0 +1,21 @@
+"""
+Per-user data version counter for conditional GETs (see app/services/data_versions.py).
+
+Bumped by Postgres triggers (alembic 020) whenever a user's accounts, rules,
+lead rows, plan or subscription change. No foreign key: triggers fire while a
+user's rows are being cascade-deleted.
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Integer
+from datetime import datetime
+from app.db.base import Base
+
+
+class UserDataVersion(Base):
+    __tablename__ = "user_data_versions"
+
+    user_id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, default=0, server_default="0", nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<UserDataVersion(user_id={self.user_id}, version={self.version})>"
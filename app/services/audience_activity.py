@@ -0,0 +1,167 @@
+"""
+Write-coalescing for InstagramAudience.last_interaction_at plus a small VIP profile cache.
+
+Hot commenters (e.g. during a live video) used to cause one UPDATE + COMMIT on
+instagram_audience per comment/DM. Instead, interactions are recorded in memory
+and a background thread flushes the latest timestamp per
+(sender_id, instagram_account_id) with one batched UPDATE every
+AUDIENCE_TOUCH_FLUSH_SECONDS. last_interaction_at is informational, so losing at
+most one interval of touches on a hard crash is acceptable (a normal exit flushes).
+
+Converted (VIP) profiles are cached for a short TTL so repeat interactions from
+a VIP skip the database entirely. Only VIP results are cached: a non-VIP who
+just gave their email on another worker must not be asked again because of a
+stale cache entry.
+"""
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, String, column, update, values
+
+from app.models.instagram_audience import InstagramAudience
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIENCE_TOUCH_FLUSH_SECONDS", "10"))
+_FLUSH_BATCH_SIZE = 1000
+_MAX_PENDING_TOUCHES = 50000  # Flush early if a burst fills the buffer
+
+_VIP_CACHE_TTL_SECONDS = 60
+_MAX_VIP_CACHE_SIZE = 10000
+
+# (sender_id, instagram_account_id) -> latest interaction time not yet written
+_pending_touches: Dict[Tuple[str, int], datetime] = {}
+_pending_lock = threading.Lock()
+
+# (sender_id, instagram_account_id) -> (status dict, cached_at monotonic)
+_vip_cache: Dict[Tuple[str, int], Tuple[dict, float]] = {}
+_vip_cache_lock = threading.Lock()
+
+_flusher_thread: Optional[threading.Thread] = None
+_flusher_stop = threading.Event()
+_flush_now = threading.Event()
+
+
+def touch_audience(sender_id: str, instagram_account_id: int, at: Optional[datetime] = None) -> None:
+    """Record an interaction; the newest timestamp per sender is written on the next flush."""
+    key = (str(sender_id), instagram_account_id)
+    at = at or datetime.utcnow()
+    with _pending_lock:
+        current = _pending_touches.get(key)
+        if current is None or at > current:
+            _pending_touches[key] = at
+        pending = len(_pending_touches)
+    _ensure_flusher_started()
+    if pending >= _MAX_PENDING_TOUCHES:
+        _flush_now.set()
+
+
+def flush_audience_touches() -> int:
+    """
+    Write all pending touches with batched UPDATE ... FROM (VALUES ...) statements.
+    Returns the number of (sender, account) pairs flushed. On failure the touches
+    are put back so the next flush retries them.
+    """
+    with _pending_lock:
+        if not _pending_touches:
+            return 0
+        batch = dict(_pending_touches)
+        _pending_touches.clear()
+
+    from app.db.session import engine
+
+    rows = [(sender_id, account_id, at) for (sender_id, account_id), at in batch.items()]
+    try:
+        with engine.begin() as conn:
+            for i in range(0, len(rows), _FLUSH_BATCH_SIZE):
+                touched = values(
+                    column("sender_id", String),
+                    column("instagram_account_id", Integer),
+                    column("touched_at", DateTime),
+                    name="touched",
+                ).data(rows[i:i + _FLUSH_BATCH_SIZE])
+                conn.execute(
+                    update(InstagramAudience)
+                    .where(
+                        InstagramAudience.sender_id == touched.c.sender_id,
+                        InstagramAudience.instagram_account_id == touched.c.instagram_account_id,
+                        InstagramAudience.last_interaction_at < touched.c.touched_at,
+                    )
+                    .values(last_interaction_at=touched.c.touched_at)
+                )
+    except Exception as e:
+        print(f"⚠️ Failed to flush {len(rows)} audience touches: {str(e)}")
+        with _pending_lock:
+            for key, at in batch.items():
+                current = _pending_touches.get(key)
+                if current is None or at > current:
+                    _pending_touches[key] = at
+        return 0
+    return len(rows)
+
+
+def _flush_loop() -> None:
+    while not _flusher_stop.is_set():
+        _flush_now.wait(FLUSH_INTERVAL_SECONDS)
+        _flush_now.clear()
+        flush_audience_touches()
+
+
+def _ensure_flusher_started() -> None:
+    global _flusher_thread
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+    with _pending_lock:
+        if _flusher_thread is not None and _flusher_thread.is_alive():
+            return
+        _flusher_stop.clear()
+        _flusher_thread = threading.Thread(target=_flush_loop, name="audience-touch-flusher", daemon=True)
+        _flusher_thread.start()
+
+
+def stop_audience_flusher() -> None:
+    """Stop the background flusher and write whatever is still pending."""
+    _flusher_stop.set()
+    _flush_now.set()
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        _flusher_thread.join(timeout=5)
+    flush_audience_touches()
+
+
+atexit.register(stop_audience_flusher)
+
+
+def get_cached_vip_status(sender_id: str, instagram_account_id: int) -> Optional[dict]:
+    """Return a cached VIP conversion status, or None if not cached / expired."""
+    key = (str(sender_id), instagram_account_id)
+    with _vip_cache_lock:
+        entry = _vip_cache.get(key)
+        if entry is None:
+            return None
+        status, cached_at = entry
+        if time.monotonic() - cached_at >= _VIP_CACHE_TTL_SECONDS:
+            del _vip_cache[key]
+            return None
+        return status
+
+
+def cache_vip_status(sender_id: str, instagram_account_id: int, status: dict) -> None:
+    """Cache a conversion status; only converted (VIP) statuses are kept."""
+    if not status.get("is_converted"):
+        return
+    key = (str(sender_id), instagram_account_id)
+    with _vip_cache_lock:
+        if len(_vip_cache) >= _MAX_VIP_CACHE_SIZE and key not in _vip_cache:
+            # Drop the oldest 10% rather than one entry per insert
+            oldest = sorted(_vip_cache.items(), key=lambda kv: kv[1][1])[: _MAX_VIP_CACHE_SIZE // 10]
+            for k, _ in oldest:
+                del _vip_cache[k]
+        _vip_cache[key] = (status, time.monotonic())
+
+
+def invalidate_vip_status(sender_id: str, instagram_account_id: int) -> None:
+    """Forget a cached status (call whenever email/phone/following changes)."""
+    with _vip_cache_lock:
+        _vip_cache.pop((str(sender_id), instagram_account_id), None)
@@ -1,21 +1,37 @@
-import json
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from app.models.automation_rule import AutomationRule
 from app.models.follower import Follower
 from app.models.instagram_account import InstagramAccount
-from app.services.instagram_client import InstagramClient
-from app.utils.encryption import decrypt_credentials
+from app.services import instagram_client_pool
 from app.utils.plan_enforcement import check_dm_limit, log_dm_sent
 
 
+class RetryLaterError(Exception):
+    """An action could not run right now (login failed, Instagram request failed); retry it on a later run."""
+
+
 class AutomationEngine:
     def __init__(self, db: Session):
         self.db = db
+        # Per-run caches: accounts are loaded once and an account whose login
+        # failed is not retried for every follower x rule in the same run
+        self._accounts: Dict[int, Optional[InstagramAccount]] = {}
+        self._auth_failed_accounts = set()
+
+    def get_account(self, instagram_account_id: int) -> Optional[InstagramAccount]:
+        """Load an InstagramAccount once per engine instead of once per rule execution."""
+        if instagram_account_id not in self._accounts:
+            self._accounts[instagram_account_id] = self.db.query(InstagramAccount).filter(
+                InstagramAccount.id == instagram_account_id
+            ).first()
+        return self._accounts[instagram_account_id]
 
     def detect_new_followers(self, instagram_account_id: int) -> List[Dict[str, Any]]:
         """
-        Detect new followers by checking followers fetched in the last hour.
+        Detect new followers: fetched in the last hour and not yet processed by
+        the new_follower rules, oldest first (the ones closest to leaving the window).
         Returns list of new follower data.
         """
         from datetime import datetime, timedelta
@@ -24,11 +40,14 @@ class AutomationEngine:
 
         new_followers = self.db.query(Follower).filter(
             Follower.instagram_account_id == instagram_account_id,
-            Follower.fetched_at >= one_hour_ago
-        ).all()
+            Follower.fetched_at >= one_hour_ago,
+            Follower.unfollowed_at.is_(None),
+            Follower.automation_processed_at.is_(None)
+        ).order_by(Follower.fetched_at, Follower.id).all()
 
         return [
             {
+                "follower_id": follower.id,
                 "user_id": follower.user_id,
                 "username": follower.username,
                 "full_name": follower.full_name
@@ -36,6 +55,14 @@ class AutomationEngine:
             for follower in new_followers
         ]
 
+    def mark_follower_processed(self, follower_id: int) -> None:
+        from datetime import datetime
+
+        self.db.query(Follower).filter(Follower.id == follower_id).update(
+            {Follower.automation_processed_at: datetime.utcnow()}, synchronize_session=False
+        )
+        self.db.commit()
+
     def get_active_rules(self, instagram_account_id: int, trigger_type: str) -> List[AutomationRule]:
         """
         Get all active automation rules for an account and trigger type.
@@ -63,13 +90,16 @@ class AutomationEngine:
                 print(f"DM limit reached: {str(e)}")
                 return False
 
-            # Decrypt credentials
-            credentials_json = decrypt_credentials(instagram_account.encrypted_credentials)
-            credentials = json.loads(credentials_json)
+            if instagram_account.id in self._auth_failed_accounts:
+                raise RetryLaterError(f"Instagram login failed earlier in this run for account {instagram_account.id}")
 
-            # Authenticate Instagram client
-            client = InstagramClient()
-            client.authenticate(credentials["username"], credentials["password"])
+            # Reuse the pooled, already-authenticated client for this account
+            try:
+                client = instagram_client_pool.get_client(instagram_account)
+            except Exception as e:
+                self._auth_failed_accounts.add(instagram_account.id)
+                print(f"Instagram login failed for account {instagram_account.id}: {str(e)}")
+                raise RetryLaterError(str(e)) from e
 
             # Get message template from config
             message_template = rule.config.get("message", "")
@@ -86,7 +116,12 @@ class AutomationEngine:
                 return False
 
             # Send DM
-            client.send_dm([user_id], message)
+            try:
+                client.send_dm([user_id], message)
+            except Exception as e:
+                # Session may have expired; log in again on the next attempt
+                instagram_client_pool.invalidate(instagram_account.id)
+                raise RetryLaterError(str(e)) from e
 
             # Log DM sent
             log_dm_sent(
@@ -101,6 +136,8 @@ class AutomationEngine:
 
             return True
 
+        except RetryLaterError:
+            raise
         except Exception as e:
             print(f"Error sending DM: {str(e)}")
             return False
@@ -113,10 +150,9 @@ class AutomationEngine:
     ) -> bool:
         """
         Execute an automation rule based on its action type.
+        Returns False when the action failed for good; raises RetryLaterError when it should be retried.
         """
-        instagram_account = self.db.query(InstagramAccount).filter(
-            InstagramAccount.id == instagram_account_id
-        ).first()
+        instagram_account = self.get_account(instagram_account_id)
 
         if not instagram_account:
             return False
@@ -126,10 +162,22 @@ class AutomationEngine:
 
         return False
 
-    def process_new_follower_trigger(self, instagram_account_id: int) -> Dict[str, Any]:
+    def process_new_follower_trigger(
+        self,
+        instagram_account_id: int,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Process new_follower trigger for an Instagram account.
         Detects new followers and executes matching automation rules.
+
+        Each follower is marked automation_processed_at (and committed) once its
+        rules ran (succeeded or failed for good), so later runs never DM it again.
+        When a rule hits a RetryLaterError (e.g. the account's login failed) the
+        follower stays unmarked, the loop stops and retry_later is set: the next
+        run picks it up again while it is within the one-hour window. deadline is
+        a time.monotonic() value; once it passes, the unmarked followers are left
+        for the next run and budget_exhausted is set in the result.
         """
         # Detect new followers
         new_followers = self.detect_new_followers(instagram_account_id)
@@ -138,23 +186,38 @@ class AutomationEngine:
             return {
                 "status": "success",
                 "new_followers_count": 0,
-                "actions_executed": 0
+                "actions_executed": 0,
+                "budget_exhausted": False,
+                "retry_later": False
             }
 
         # Get active rules for new_follower trigger
         rules = self.get_active_rules(instagram_account_id, "new_follower")
 
         actions_executed = 0
+        budget_exhausted = False
+        retry_later = False
 
         # Execute each rule for each new follower
         for follower in new_followers:
-            for rule in rules:
-                success = self.execute_rule(instagram_account_id, rule, follower)
-                if success:
-                    actions_executed += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                budget_exhausted = True
+                break
+            try:
+                for rule in rules:
+                    success = self.execute_rule(instagram_account_id, rule, follower)
+                    if success:
+                        actions_executed += 1
+            except RetryLaterError as e:
+                print(f"Deferring new_follower automation for account {instagram_account_id}: {str(e)}")
+                retry_later = True
+                break
+            self.mark_follower_processed(follower["follower_id"])
 
         return {
             "status": "success",
             "new_followers_count": len(new_followers),
-            "actions_executed": actions_executed
+            "actions_executed": actions_executed,
+            "budget_exhausted": budget_exhausted,
+            "retry_later": retry_later
         }
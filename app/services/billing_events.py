@@ -0,0 +1,209 @@
+"""
+Queued, idempotent processing of Dodo billing webhooks.
+
+POST /webhooks/dodo used to apply each event inside the request (plan
+changes, tracker resets, invoice upserts, receipt emails) with no dedup, so a
+slow handler delayed the acknowledgement and a Dodo retry applied the event
+again. Now the endpoint only verifies the signature and calls
+enqueue_billing_event(): one INSERT ... ON CONFLICT (webhook_id) DO NOTHING
+into billing_events, committed before the 200. A redelivered webhook-id is a
+no-op.
+
+A daemon thread per process applies pending events:
+
+- In order per ordering_key (subscription, else customer, else payment):
+  only the oldest pending event of a key can be claimed, by
+  (event_at, arrival seq). The claim is FOR UPDATE SKIP LOCKED, so several
+  processes share the work and two never apply the same key at once.
+- The event is marked done in the transaction that applies it. Handlers
+  commit their own writes, and the mark commits with them.
+- A failing event is retried with exponential backoff and blocks the
+  later events of its key meanwhile. After MAX_ATTEMPTS it is marked
+  "failed" and the key moves on. Set status back to 'pending' to replay it.
+- Receipt emails are sent by the handlers, so they are now off the request
+  path too.
+
+The worker wakes on every enqueue in its own process and polls every
+POLL_SECONDS for retries and for events received by other processes.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.billing_event import BillingEvent
+
+MAX_ATTEMPTS = int(os.getenv("BILLING_EVENT_MAX_ATTEMPTS", "8"))
+POLL_SECONDS = float(os.getenv("BILLING_EVENT_POLL_SECONDS", "30"))
+_RETRY_BASE_SECONDS = 5
+_RETRY_MAX_SECONDS = 3600
+_MAX_ERROR_CHARS = 2000
+
+# Oldest claimable event that is also the oldest pending event of its key
+_CLAIM_NEXT = text("""
+    SELECT e.webhook_id FROM billing_events e
+    WHERE e.status = 'pending' AND e.next_attempt_at <= :now
+      AND NOT EXISTS (
+          SELECT 1 FROM billing_events p
+          WHERE p.ordering_key = e.ordering_key AND p.status = 'pending'
+            AND (p.event_at, p.seq) < (e.event_at, e.seq)
+      )
+    ORDER BY e.event_at, e.seq
+    LIMIT 1
+    FOR UPDATE OF e SKIP LOCKED
+""")
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+_worker_stop = threading.Event()
+_wake = threading.Event()
+
+
+def ordering_key(event: dict) -> str:
+    """Events sharing a key are applied in order: the subscription, else the customer, else the payment."""
+    obj = event.get("data") or {}
+    customer = obj.get("customer") or {}
+    for prefix, value in (
+        ("sub", obj.get("subscription_id")),
+        ("cus", customer.get("customer_id") or obj.get("customer_id")),
+        ("pay", obj.get("payment_id")),
+    ):
+        if value:
+            return f"{prefix}:{value}"
+    return "none"
+
+
+def event_time(event: dict, webhook_timestamp: Optional[str] = None) -> datetime:
+    """When Dodo says the event happened (naive UTC), else the webhook-timestamp header, else now."""
+    from app.services.invoice_sync import parse_dodo_time
+
+    at = parse_dodo_time(event.get("timestamp"))
+    if at is not None:
+        return at
+    try:
+        return datetime.utcfromtimestamp(int(webhook_timestamp))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return datetime.utcnow()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """5s, 10s, 20s, ... capped at one hour."""
+    return timedelta(seconds=min(_RETRY_MAX_SECONDS, _RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)))
+
+
+def enqueue_billing_event(
+    db: Session,
+    webhook_id: str,
+    event: dict,
+    webhook_timestamp: Optional[str] = None,
+) -> bool:
+    """Store the event unless webhook_id is already stored. Does not commit. Returns True if it is new."""
+    now = datetime.utcnow()
+    stmt = (
+        insert(BillingEvent.__table__)
+        .values(
+            webhook_id=webhook_id,
+            event_type=event.get("type"),
+            ordering_key=ordering_key(event),
+            payload=event,
+            event_at=event_time(event, webhook_timestamp),
+            received_at=now,
+            next_attempt_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=["webhook_id"])
+        .returning(BillingEvent.__table__.c.webhook_id)
+    )
+    return db.execute(stmt).first() is not None
+
+
+def _record_failure(db: Session, webhook_id: str, error: Exception) -> None:
+    event = db.get(BillingEvent, webhook_id)
+    if event is None or event.status != "pending":
+        return  # The handler committed before failing: the event was applied
+    event.attempts += 1
+    event.last_error = str(error)[:_MAX_ERROR_CHARS]
+    if event.attempts >= MAX_ATTEMPTS:
+        event.status = "failed"
+        print(f"❌ [BILLING] Giving up on {event.event_type} {webhook_id} after {event.attempts} attempts: {str(error)}")
+    else:
+        event.next_attempt_at = datetime.utcnow() + retry_delay(event.attempts)
+        print(f"⚠️ [BILLING] {event.event_type} {webhook_id} failed (attempt {event.attempts}), will retry: {str(error)}")
+    db.commit()
+
+
+def process_next_billing_event() -> bool:
+    """Claim and apply one event. Returns False when nothing is claimable right now."""
+    from app.db.session import SessionLocal
+    from app.api.routes.webhooks import apply_dodo_event
+
+    db = SessionLocal()
+    try:
+        webhook_id = db.execute(_CLAIM_NEXT, {"now": datetime.utcnow()}).scalar()
+        if webhook_id is None:
+            db.rollback()
+            return False
+        event = db.get(BillingEvent, webhook_id)
+        event.status = "done"
+        event.attempts += 1
+        event.processed_at = datetime.utcnow()
+        event.last_error = None
+        payload = event.payload
+        try:
+            apply_dodo_event(db, payload)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            _record_failure(db, webhook_id, e)
+        return True
+    finally:
+        db.close()
+
+
+def drain_billing_events(limit: int = 1000) -> int:
+    """Apply claimable events until none are left (or limit). Returns the number processed."""
+    processed = 0
+    while processed < limit and process_next_billing_event():
+        processed += 1
+    return processed
+
+
+def _worker_loop() -> None:
+    while not _worker_stop.is_set():
+        try:
+            drain_billing_events()
+        except Exception as e:
+            print(f"⚠️ [BILLING] Event worker error: {str(e)}")
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+
+def start_billing_event_worker() -> None:
+    """Start this process's worker thread (idempotent)."""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return
+        _worker_stop.clear()
+        _worker_thread = threading.Thread(target=_worker_loop, name="billing-events", daemon=True)
+        _worker_thread.start()
+
+
+def wake_billing_event_worker() -> None:
+    """Process newly enqueued events now instead of at the next poll."""
+    start_billing_event_worker()
+    _wake.set()
+
+
+def stop_billing_event_worker() -> None:
+    _worker_stop.set()
+    _wake.set()
+    if _worker_thread is not None and _worker_thread.is_alive():
+        _worker_thread.join(timeout=5)
+
+
+atexit.register(stop_billing_event_worker)
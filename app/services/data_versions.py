@@ -0,0 +1,125 @@
+"""
+Cheap version stamps for conditional GETs (ETag / If-None-Match -> 304).
+
+Dashboard and inbox screens poll endpoints whose responses are full
+aggregations. Before running them, an endpoint asks for a stamp of the data
+the response depends on; if it matches the client's ETag the request ends with
+a 304 after one small query.
+
+A stamp combines, in a single round trip:
+
+- user_data_versions.version: a per-user counter bumped by Postgres triggers
+  (alembic 020) on rare edits whose rows carry no timestamp: instagram_accounts,
+  automation_rules, captured_leads updates/deletes, users.plan_tier/email and
+  subscriptions. Nothing on the webhook hot path writes it.
+- max(id) / max(updated_at) probes on the append-heavy tables (analytics_events,
+  dm_logs, captured_leads, messages, conversations), served by the composite
+  indexes from the same migration.
+- the current STAMP_BUCKET_SECONDS window, so time-windowed aggregates ("last
+  7 days", "today") and any write a stamp can't see (e.g. an id that commits
+  out of order) are never served stale for longer than one window, which is
+  the staleness the 5-minute analytics cache already had.
+"""
+import hashlib
+import os
+import time
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import text
+
+STAMP_BUCKET_SECONDS = int(os.getenv("ETAG_STAMP_BUCKET_SECONDS", "300"))
+CACHE_CONTROL = "private, no-cache"  # Browser keeps the body but revalidates every time
+
+# Stamp source -> scalar subqueries (params: user_id, account_id)
+_SOURCES = {
+    "analytics": ("(SELECT max(id) FROM analytics_events WHERE user_id = :user_id)",),
+    "dm_logs": ("(SELECT max(id) FROM dm_logs WHERE user_id = :user_id)",),
+    "leads": ("(SELECT max(id) FROM captured_leads WHERE user_id = :user_id)",),
+    "messages": ("(SELECT max(id) FROM messages WHERE instagram_account_id = :account_id)",),
+    "conversations": (
+        "(SELECT max(id) FROM conversations WHERE instagram_account_id = :account_id)",
+        "(SELECT max(updated_at) FROM conversations WHERE instagram_account_id = :account_id)",
+    ),
+    "account": ("(SELECT id FROM instagram_accounts WHERE id = :account_id AND user_id = :user_id)",),
+}
+
+
+def version_stamp(db, user_id: int, *sources: str, account_id: Optional[int] = None) -> dict:
+    """{"version": user version, source: value(s)} from one query. Account sources need account_id."""
+    columns = ["(SELECT version FROM user_data_versions WHERE user_id = :user_id)"]
+    for source in sources:
+        columns.extend(_SOURCES[source])
+    row = iter(db.execute(
+        text(f"SELECT {', '.join(columns)}"),
+        {"user_id": user_id, "account_id": account_id},
+    ).fetchone())
+    stamp = {"version": next(row) or 0}
+    for source in sources:
+        values = tuple(next(row) for _ in _SOURCES[source])
+        stamp[source] = values[0] if len(values) == 1 else values
+    return stamp
+
+
+def make_etag(resource: str, user_id: int, stamp: dict, *params) -> str:
+    """Weak ETag (same data, not byte-identical serialisation) for a resource + stamp + query params."""
+    bucket = int(time.time()) // STAMP_BUCKET_SECONDS
+    raw = "|".join(str(part) for part in (resource, user_id, bucket, *stamp.values(), *params))
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def conditional_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    304 response if the client already has this version, else None after putting
+    ETag / Cache-Control on the endpoint's response.
+    """
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return None
+
+
+def _empty(value) -> bool:
+    return value is None or (isinstance(value, tuple) and value[0] is None)
+
+
+def not_modified(
+    request: Request,
+    response: Response,
+    db,
+    resource: str,
+    user_id: int,
+    *sources: str,
+    account_id: Optional[int] = None,
+    params: tuple = (),
+    require: tuple = (),
+) -> Optional[Response]:
+    """
+    Stamp + compare in one call for an endpoint: returns the 304 to send, or None
+    to continue (ETag already set on `response`). Sources in `require` must be
+    non-null (e.g. "account" = the account belongs to the user) or no ETag is
+    used and the endpoint runs as usual. Never fails the request.
+    """
+    try:
+        stamp = version_stamp(db, user_id, *sources, account_id=account_id)
+    except Exception as e:
+        print(f"⚠️ Version stamp for {resource} failed, serving without ETag: {str(e)}")
+        db.rollback()
+        return None
+    if any(_empty(stamp.get(source)) for source in require):
+        return None
+    return conditional_response(request, response, make_etag(resource, user_id, stamp, *params))
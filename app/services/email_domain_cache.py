@@ -0,0 +1,137 @@
+"""
+Cached, coalesced DNS deliverability checks for lead-capture email domains.
+
+email-validator's check_deliverability did a blocking MX (then A/AAAA) lookup
+for every email a user typed, even for gmail.com. Here:
+
+- Results are cached per domain: deliverable for EMAIL_MX_POSITIVE_TTL_SEC,
+  undeliverable for EMAIL_MX_NEGATIVE_TTL_SEC (shorter, a domain can add MX).
+  Lookups that time out are not cached.
+- The most common mailbox providers are pre-seeded as deliverable, so they
+  never hit DNS.
+- Lookups run on a small thread pool with a hard timeout, and concurrent
+  checks for the same domain share one in-flight lookup.
+
+check_domain_deliverable() is the sync entry point used by
+validate_lead_capture_email; check_domain_deliverable_async() awaits the same
+shared lookup without blocking the event loop and backs
+validate_lead_capture_email_async (the webhook lead-capture paths).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+
+from app.services.metrics import record_cache
+
+POSITIVE_TTL_SECONDS = int(os.getenv("EMAIL_MX_POSITIVE_TTL_SEC", str(6 * 3600)))
+NEGATIVE_TTL_SECONDS = int(os.getenv("EMAIL_MX_NEGATIVE_TTL_SEC", "600"))
+_MAX_CACHE_SIZE = 50000
+_POOL_SIZE = int(os.getenv("EMAIL_MX_POOL_SIZE", "8"))
+
+# Seeded as deliverable forever: resolving these on every lead is pure waste
+TOP_PROVIDER_DOMAINS = (
+    "gmail.com", "googlemail.com", "yahoo.com", "ymail.com", "outlook.com", "hotmail.com",
+    "live.com", "msn.com", "icloud.com", "me.com", "mac.com", "aol.com", "proton.me",
+    "protonmail.com", "gmx.com", "gmx.de", "mail.com", "zoho.com", "yandex.com", "yandex.ru",
+    "mail.ru", "qq.com", "163.com", "hotmail.co.uk", "yahoo.co.uk", "yahoo.co.in",
+    "outlook.in", "rediffmail.com", "web.de", "comcast.net",
+)
+
+# domain -> (deliverable, expires_at monotonic; None = never)
+_cache: Dict[str, Tuple[bool, Optional[float]]] = {d: (True, None) for d in TOP_PROVIDER_DOMAINS}
+_cache_lock = threading.Lock()
+_in_flight: Dict[str, Future] = {}
+_executor = ThreadPoolExecutor(max_workers=_POOL_SIZE, thread_name_prefix="email-mx")
+
+
+def get_cached_deliverability(domain: str) -> Optional[bool]:
+    """Cached result for domain, or None when unknown / expired."""
+    domain = domain.lower()
+    with _cache_lock:
+        entry = _cache.get(domain)
+        if entry is not None and entry[1] is not None and time.monotonic() >= entry[1]:
+            del _cache[domain]
+            entry = None
+    record_cache("email_domain", entry is not None)
+    return entry[0] if entry is not None else None
+
+
+def _store(domain: str, deliverable: bool) -> None:
+    ttl = POSITIVE_TTL_SECONDS if deliverable else NEGATIVE_TTL_SECONDS
+    with _cache_lock:
+        if len(_cache) >= _MAX_CACHE_SIZE and domain not in _cache:
+            expiring = [(d, exp) for d, (_, exp) in _cache.items() if exp is not None]
+            for d, _ in sorted(expiring, key=lambda kv: kv[1])[: _MAX_CACHE_SIZE // 10]:
+                del _cache[d]
+        _cache[domain] = (deliverable, time.monotonic() + ttl)
+
+
+def _lookup(domain: str, domain_i18n: str, timeout: float) -> Optional[bool]:
+    """Run the DNS check. True/False are cached; None (timeout / resolver trouble) is not."""
+    from email_validator import EmailUndeliverableError
+    from email_validator.deliverability import validate_email_deliverability
+
+    try:
+        info = validate_email_deliverability(domain, domain_i18n, timeout=timeout)
+    except EmailUndeliverableError:
+        _store(domain, False)
+        return False
+    except Exception as e:
+        print(f"⚠️ MX lookup error for {domain}: {str(e)}")
+        return None
+    if info.get("unknown-deliverability"):
+        return None
+    _store(domain, True)
+    return True
+
+
+def _lookup_future(domain: str, domain_i18n: str, timeout: float) -> Future:
+    """Shared in-flight lookup for domain (started if none is running)."""
+    with _cache_lock:
+        future = _in_flight.get(domain)
+        if future is not None:
+            return future
+        future = _executor.submit(_lookup, domain, domain_i18n, timeout)
+        _in_flight[domain] = future
+
+    def _done(_):
+        with _cache_lock:
+            if _in_flight.get(domain) is future:
+                del _in_flight[domain]
+
+    future.add_done_callback(_done)
+    return future
+
+
+def check_domain_deliverable(domain: str, timeout: float, domain_i18n: Optional[str] = None) -> Optional[bool]:
+    """
+    True / False when known, None when the lookup did not finish within timeout
+    (callers treat None like email-validator's "unknown deliverability": accept).
+    """
+    domain = domain.lower()
+    cached = get_cached_deliverability(domain)
+    if cached is not None:
+        return cached
+    future = _lookup_future(domain, domain_i18n or domain, timeout)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        return None
+
+
+async def check_domain_deliverable_async(domain: str, timeout: float, domain_i18n: Optional[str] = None) -> Optional[bool]:
+    """Async variant: awaits the shared lookup without blocking the event loop."""
+    domain = domain.lower()
+    cached = get_cached_deliverability(domain)
+    if cached is not None:
+        return cached
+    future = _lookup_future(domain, domain_i18n or domain, timeout)
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        return None
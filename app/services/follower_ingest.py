@@ -0,0 +1,119 @@
+"""
+Bulk follower diff ingestion.
+
+Instead of one SELECT per fetched follower, the account's stored usernames are
+loaded once, the fetched list is diffed against them with set operations, and
+the results are written with chunked executemany INSERTs / IN (...) UPDATEs.
+"""
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models.follower import Follower
+
+CHUNK_SIZE = 1000
+
+
+def diff_followers(
+    active: Set[str],
+    unfollowed: Set[str],
+    fetched: Set[str],
+) -> Tuple[Set[str], Set[str], Set[str]]:
+    """
+    Compare stored followers with a fresh fetch.
+
+    Args:
+        active: Stored usernames that are currently following
+        unfollowed: Stored usernames previously marked as unfollowed
+        fetched: Usernames returned by the latest fetch
+
+    Returns:
+        (new, refollowed, removed)
+        - new: never seen before -> insert
+        - refollowed: marked unfollowed but following again -> clear unfollowed_at
+        - removed: stored as active but missing from the fetch -> set unfollowed_at
+    """
+    new = fetched - active - unfollowed
+    refollowed = fetched & unfollowed
+    removed = active - fetched
+    return new, refollowed, removed
+
+
+def _chunks(items: List, size: int = CHUNK_SIZE) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def ingest_followers(db: Session, instagram_account_id: int, followers: List[Dict]) -> Dict:
+    """
+    Store a fetched follower list for an account and commit.
+
+    Re-follows only clear unfollowed_at (fetched_at keeps the first-seen time),
+    so someone who unfollows and follows again is not treated as a new follower
+    by AutomationEngine.detect_new_followers.
+
+    Returns counts plus rows_per_second (fetched followers processed per second
+    of database work).
+    """
+    started = time.monotonic()
+    now = datetime.utcnow()
+
+    fetched_by_username = {f["username"]: f for f in followers if f.get("username")}
+
+    active: Set[str] = set()
+    unfollowed: Set[str] = set()
+    for username, unfollowed_at in db.query(Follower.username, Follower.unfollowed_at).filter(
+        Follower.instagram_account_id == instagram_account_id
+    ).yield_per(10000):
+        if unfollowed_at is None:
+            active.add(username)
+        else:
+            unfollowed.add(username)
+
+    new, refollowed, removed = diff_followers(active, unfollowed, set(fetched_by_username))
+
+    new_rows = [
+        {
+            "instagram_account_id": instagram_account_id,
+            "username": username,
+            "user_id": fetched_by_username[username].get("user_id"),
+            "full_name": fetched_by_username[username].get("full_name"),
+            "fetched_at": now,
+        }
+        for username in new
+    ]
+    for chunk in _chunks(new_rows):
+        db.execute(insert(Follower), chunk)
+
+    for chunk in _chunks(sorted(refollowed)):
+        db.execute(
+            update(Follower)
+            .where(Follower.instagram_account_id == instagram_account_id, Follower.username.in_(chunk))
+            .values(unfollowed_at=None)
+        )
+
+    for chunk in _chunks(sorted(removed)):
+        db.execute(
+            update(Follower)
+            .where(
+                Follower.instagram_account_id == instagram_account_id,
+                Follower.username.in_(chunk),
+                Follower.unfollowed_at.is_(None),
+            )
+            .values(unfollowed_at=now)
+        )
+
+    db.commit()
+
+    elapsed = time.monotonic() - started
+    return {
+        "followers_count": len(fetched_by_username),
+        "new_followers": len(new),
+        "refollowed": len(refollowed),
+        "unfollowed": len(removed),
+        "ingest_seconds": round(elapsed, 3),
+        "rows_per_second": round(len(fetched_by_username) / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -6,12 +6,24 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from app.models.instagram_audience import InstagramAudience
 from app.models.captured_lead import CapturedLead
+from app.db.upsert import upsert_audience
+from app.services.audience_activity import (
+    touch_audience,
+    get_cached_vip_status,
+    cache_vip_status,
+    invalidate_vip_status,
+)
 
 
 def get_or_create_audience(db: Session, sender_id: str, instagram_account_id: int, user_id: int, username: str = None) -> InstagramAudience:
     """
     Get or create an InstagramAudience record for a user.
     
+    One lock-free INSERT ... ON CONFLICT DO NOTHING / SELECT statement; it does not
+    commit, so read-only callers must commit to keep a newly created row.
+    last_interaction_at is not written here: the interaction is recorded in
+    memory and flushed in batches by app.services.audience_activity.
+    
     Args:
         db: Database session
         sender_id: Instagram user ID (sender_id)
@@ -22,30 +34,14 @@ def get_or_create_audience(db: Session, sender_id: str, instagram_account_id: in
     Returns:
         InstagramAudience instance
     """
-    audience = db.query(InstagramAudience).filter(
-        InstagramAudience.sender_id == str(sender_id),
-        InstagramAudience.instagram_account_id == instagram_account_id
-    ).first()
-    
-    if not audience:
-        audience = InstagramAudience(
-            sender_id=str(sender_id),
-            instagram_account_id=instagram_account_id,
-            user_id=user_id,
-            username=username,
-            first_interaction_at=datetime.utcnow(),
-            last_interaction_at=datetime.utcnow()
+    audience = upsert_audience(db, sender_id, instagram_account_id, user_id, username=username, touch=False)
+    if audience is None:
+        raise ValueError(
+            f"InstagramAudience for sender {sender_id} belongs to a different Instagram account than {instagram_account_id}"
         )
-        db.add(audience)
-        db.commit()
-        db.refresh(audience)
-    else:
-        # Update last interaction time
-        audience.last_interaction_at = datetime.utcnow()
-        if username and not audience.username:
-            audience.username = username
-        db.commit()
-    
+    if username and not audience.username:
+        audience.username = username
+    touch_audience(sender_id, instagram_account_id)
     return audience
 
 
@@ -68,8 +64,14 @@ def check_global_conversion_status(db: Session, sender_id: str, instagram_accoun
             - has_email: bool
             - has_phone: bool
             - is_following: bool
-            - audience: InstagramAudience instance
+            - audience: InstagramAudience instance (None when served from the VIP cache)
     """
+    # VIP profiles are cached briefly: a hot VIP commenter costs no DB work at all
+    cached = get_cached_vip_status(sender_id, instagram_account_id)
+    if cached is not None:
+        touch_audience(sender_id, instagram_account_id)
+        return dict(cached, audience=None)
+    
     # Get or create audience record
     audience = get_or_create_audience(db, sender_id, instagram_account_id, user_id, username)
     
@@ -97,7 +99,6 @@ def check_global_conversion_status(db: Session, sender_id: str, instagram_accoun
                 # Update audience with email for future lookups
                 audience.email = lead.email
                 audience.email_captured_at = lead.captured_at
-                db.commit()
         except Exception as e:
             # Fallback: If JSONB query fails, skip the check (don't block the request)
             print(f"⚠️ Error checking CapturedLead for email: {str(e)}")
@@ -124,13 +125,17 @@ def check_global_conversion_status(db: Session, sender_id: str, instagram_accoun
     # VIP = all three collected: email AND phone AND following. If any one is missed, not VIP.
     is_converted = has_email and has_phone and is_following
     
-    return {
+    status = {
         "is_converted": is_converted,
         "has_email": has_email,
         "has_phone": has_phone,
         "is_following": is_following,
-        "audience": audience
     }
+    # Persist a newly created audience row (and any email copied above); the
+    # read-only callers of this check never commit themselves
+    db.commit()
+    cache_vip_status(sender_id, instagram_account_id, status)
+    return dict(status, audience=audience)
 
 
 def update_audience_email(db: Session, sender_id: str, instagram_account_id: int, user_id: int, email: str) -> InstagramAudience:
@@ -154,8 +159,8 @@ def update_audience_email(db: Session, sender_id: str, instagram_account_id: int
     if not audience.email:
         audience.email = email
         audience.email_captured_at = datetime.utcnow()
-        db.commit()
-        db.refresh(audience)
+    db.commit()
+    invalidate_vip_status(sender_id, instagram_account_id)
     
     return audience
 
@@ -182,7 +187,7 @@ def update_audience_following(db: Session, sender_id: str, instagram_account_id:
         audience.is_following = is_following
         if is_following and not audience.follow_confirmed_at:
             audience.follow_confirmed_at = datetime.utcnow()
-        db.commit()
-        db.refresh(audience)
+    db.commit()
+    invalidate_vip_status(sender_id, instagram_account_id)
     
     return audience
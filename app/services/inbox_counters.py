@@ -0,0 +1,198 @@
+"""
+Per-account inbox counters: conversations, messages in / out, unread.
+
+/conversations/stats used to count conversations and messages on every poll.
+The counts now live in one inbox_counters row per Instagram account, updated
+in the transaction that stores the Message, so the endpoint reads one row by
+primary key and a rolled-back write never leaves a counter behind.
+
+- conversations: bumped by app.db.upsert.upsert_conversation when it inserts
+- record_incoming / record_outgoing: one statement per stored message
+- Graph API sync (bulk history) reconciles the account once when it finishes
+
+"Unread" means incoming messages since our last reply in that conversation:
+record_incoming adds one to conversations.unread_count, any outgoing message
+(UI send, automation DM, echo of a message sent from the Instagram app)
+clears it. The account's unread is the sum over its conversations.
+
+Lock order is always conversations row -> inbox_counters row, the same as the
+upsert that precedes these calls, so concurrent webhooks cannot deadlock.
+
+reconcile_inbox_counters() rebuilds everything from messages/conversations with
+the same definitions; run it after bulk deletes or imports
+(scripts/reconcile_inbox_counters.py).
+"""
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.inbox_counter import InboxCounter
+
+# Shared upsert tail: add the new row's values to an existing counter row
+_ON_CONFLICT_ADD = """
+    ON CONFLICT (instagram_account_id) DO UPDATE SET
+        conversations = inbox_counters.conversations + EXCLUDED.conversations,
+        messages_in = inbox_counters.messages_in + EXCLUDED.messages_in,
+        messages_out = inbox_counters.messages_out + EXCLUDED.messages_out,
+        unread = GREATEST(0, inbox_counters.unread + EXCLUDED.unread),
+        updated_at = EXCLUDED.updated_at
+"""
+
+_RECORD_INCOMING = text(f"""
+    WITH conv AS (
+        UPDATE conversations SET unread_count = unread_count + 1
+        WHERE id = :conversation_id
+        RETURNING unread_count
+    )
+    INSERT INTO inbox_counters AS inbox_counters
+        (instagram_account_id, user_id, conversations, messages_in, messages_out, unread, updated_at)
+    VALUES (:account_id, :user_id, 0, 1, 0, 1, NOW() AT TIME ZONE 'utc')
+    {_ON_CONFLICT_ADD}
+    RETURNING (SELECT unread_count FROM conv)
+""")
+
+_RECORD_OUTGOING = text(f"""
+    WITH prev AS (
+        SELECT id, unread_count FROM conversations WHERE id = :conversation_id FOR UPDATE
+    ), cleared AS (
+        UPDATE conversations c SET unread_count = 0
+        FROM prev
+        WHERE c.id = prev.id AND prev.unread_count > 0
+        RETURNING prev.unread_count AS n
+    )
+    INSERT INTO inbox_counters AS inbox_counters
+        (instagram_account_id, user_id, conversations, messages_in, messages_out, unread, updated_at)
+    VALUES (
+        :account_id, :user_id, 0, 0, 1,
+        -COALESCE((SELECT n FROM cleared), 0),
+        NOW() AT TIME ZONE 'utc'
+    )
+    {_ON_CONFLICT_ADD}
+""")
+
+_INCREMENT = text(f"""
+    INSERT INTO inbox_counters AS inbox_counters
+        (instagram_account_id, user_id, conversations, messages_in, messages_out, unread, updated_at)
+    VALUES (:account_id, :user_id, :conversations, :messages_in, :messages_out, :unread, NOW() AT TIME ZONE 'utc')
+    {_ON_CONFLICT_ADD}
+""")
+
+# Unread for one conversation, recomputed from messages: incoming after the last outgoing
+_UNREAD_FROM_MESSAGES = """
+    (SELECT count(*) FROM messages m
+     WHERE m.conversation_id = c.id AND m.is_from_bot IS NOT TRUE
+       AND m.created_at > COALESCE(
+           (SELECT max(o.created_at) FROM messages o WHERE o.conversation_id = c.id AND o.is_from_bot),
+           '-infinity'))
+"""
+
+_RECONCILE_UNREAD = text(f"""
+    UPDATE conversations t SET unread_count = fresh.n
+    FROM (
+        SELECT c.id, {_UNREAD_FROM_MESSAGES} AS n
+        FROM conversations c
+        WHERE CAST(:account_id AS INTEGER) IS NULL OR c.instagram_account_id = :account_id
+    ) fresh
+    WHERE t.id = fresh.id AND t.unread_count <> fresh.n
+""")
+
+# Same self-conversation / self-message exclusions the stats endpoint always applied
+_RECONCILE_COUNTERS = text("""
+    INSERT INTO inbox_counters AS inbox_counters
+        (instagram_account_id, user_id, conversations, messages_in, messages_out, unread, updated_at)
+    SELECT
+        a.id,
+        a.user_id,
+        COALESCE(conv.total, 0),
+        (SELECT count(*) FROM messages m
+         WHERE m.instagram_account_id = a.id AND m.user_id = a.user_id AND m.is_from_bot IS NOT TRUE
+           AND (a.igsid IS NULL OR m.sender_id <> a.igsid)),
+        (SELECT count(*) FROM messages m
+         WHERE m.instagram_account_id = a.id AND m.user_id = a.user_id AND m.is_from_bot),
+        COALESCE(conv.unread, 0),
+        NOW() AT TIME ZONE 'utc'
+    FROM instagram_accounts a
+    LEFT JOIN LATERAL (
+        SELECT count(*) AS total, sum(c.unread_count) AS unread
+        FROM conversations c
+        WHERE c.instagram_account_id = a.id AND c.user_id = a.user_id
+          AND (a.igsid IS NULL OR c.participant_id <> a.igsid)
+          AND (a.username IS NULL OR c.participant_name IS DISTINCT FROM a.username)
+    ) conv ON TRUE
+    WHERE CAST(:account_id AS INTEGER) IS NULL OR a.id = :account_id
+    ON CONFLICT (instagram_account_id) DO UPDATE SET
+        user_id = EXCLUDED.user_id,
+        conversations = EXCLUDED.conversations,
+        messages_in = EXCLUDED.messages_in,
+        messages_out = EXCLUDED.messages_out,
+        unread = EXCLUDED.unread,
+        updated_at = EXCLUDED.updated_at
+""")
+
+
+def increment_inbox_counters(
+    db: Session,
+    account_id: int,
+    user_id: int,
+    conversations: int = 0,
+    messages_in: int = 0,
+    messages_out: int = 0,
+    unread: int = 0,
+) -> None:
+    """Create-or-add to the account's counters in one statement (unread never goes below 0). Does not commit."""
+    db.execute(_INCREMENT, {
+        "account_id": account_id,
+        "user_id": user_id,
+        "conversations": conversations,
+        "messages_in": messages_in,
+        "messages_out": messages_out,
+        "unread": unread,
+    })
+
+
+def record_incoming(db: Session, conversation) -> None:
+    """Count one stored incoming message: messages_in + 1, unread + 1 (account and conversation)."""
+    unread_count = db.execute(_RECORD_INCOMING, {
+        "conversation_id": conversation.id,
+        "account_id": conversation.instagram_account_id,
+        "user_id": conversation.user_id,
+    }).scalar()
+    if unread_count is not None:
+        set_committed_value(conversation, "unread_count", unread_count)
+
+
+def record_outgoing(db: Session, conversation) -> None:
+    """Count one stored outgoing message: messages_out + 1, and the conversation is read again."""
+    db.execute(_RECORD_OUTGOING, {
+        "conversation_id": conversation.id,
+        "account_id": conversation.instagram_account_id,
+        "user_id": conversation.user_id,
+    })
+    set_committed_value(conversation, "unread_count", 0)
+
+
+def reconcile_inbox_counters(db: Session, account_id: Optional[int] = None) -> int:
+    """
+    Rebuild unread per conversation and the counters row of one account (or all
+    accounts) from messages/conversations. Does not commit. Returns rows written.
+    """
+    params = {"account_id": account_id}
+    db.execute(_RECONCILE_UNREAD, params)
+    return db.execute(_RECONCILE_COUNTERS, params).rowcount
+
+
+def get_inbox_counters(db: Session, account_id: int) -> Optional[InboxCounter]:
+    """
+    The account's counters by primary key. An account that has no row yet
+    (connected before the counters existed, or nothing stored so far) is
+    reconciled once and committed.
+    """
+    counters = db.get(InboxCounter, account_id)
+    if counters is not None:
+        return counters
+    if reconcile_inbox_counters(db, account_id):
+        db.commit()
+        print(f"✅ [INBOX COUNTERS] Built counters for account {account_id}")
+    return db.get(InboxCounter, account_id)
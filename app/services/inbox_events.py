@@ -0,0 +1,265 @@
+"""
+Live inbox updates over Postgres LISTEN/NOTIFY.
+
+Inbox tabs used to poll /conversations and /conversations/stats; each poll
+re-ran the dedup subquery and the per-conversation counts. Now, whenever a
+Message is stored (incoming webhook, echo, or a reply sent from the UI),
+publish_message_stored() adds a pg_notify() to the same transaction, so the
+event is delivered on commit and never for a rolled-back write. The notify runs
+in a savepoint: if it fails, the event is dropped but the message is still stored.
+
+Each worker process keeps one dedicated LISTEN connection (outside the pool)
+on a daemon thread, started on the first subscriber. Notifications are fanned
+out to the asyncio queues of the SSE streams subscribed to that account, so an
+idle inbox tab costs no queries at all, whichever worker it is connected to.
+
+A subscriber that falls MAX_QUEUED_EVENTS behind gets a "resync" event instead
+of unbounded buffering; the client refetches the conversation list once.
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from sqlalchemy import text
+
+CHANNEL = "inbox_events"
+MAX_QUEUED_EVENTS = int(os.getenv("INBOX_STREAM_MAX_QUEUED_EVENTS", "200"))
+_MAX_PAYLOAD_BYTES = 7900  # Postgres caps NOTIFY payloads at 8000 bytes
+_PREVIEW_CHARS = 1000
+_RECONNECT_SECONDS = 5
+
+RESYNC_EVENT = {"type": "resync"}
+
+
+class _Subscriber:
+    __slots__ = ("queue", "loop")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+        self.loop = loop
+
+
+# instagram_account_id -> subscribers in this process
+_subscribers: Dict[int, Set[_Subscriber]] = {}
+_subscribers_lock = threading.Lock()
+_listener_thread: Optional[threading.Thread] = None
+_listener_stop = threading.Event()
+
+
+# -- publishing -----------------------------------------------------------------------
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _encode(payload: dict) -> str:
+    return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def _size(encoded: str) -> int:
+    return len(encoded.encode())
+
+
+def _truncate_utf8(value: str, max_bytes: int) -> str:
+    return value.encode()[:max(max_bytes, 0)].decode(errors="ignore")
+
+
+def _build_payload(account_id: int, conversation, message) -> str:
+    text_value = message.message_text or message.content
+    payload = {
+        "account_id": account_id,
+        "conversation": {
+            "id": conversation.id,
+            "participant_id": conversation.participant_id,
+            "participant_name": conversation.participant_name,
+            "last_message": conversation.last_message,
+            "updated_at": _iso(conversation.updated_at),
+        },
+        "message": {
+            "id": message.id,
+            "conversation_id": conversation.id,
+            "message_id": message.message_id,
+            "text": text_value[:_PREVIEW_CHARS] if text_value else text_value,
+            "is_from_bot": message.is_from_bot,
+            "sender_username": message.sender_username,
+            "recipient_username": message.recipient_username,
+            "has_attachments": message.has_attachments,
+            "attachments": message.attachments,
+            "created_at": _iso(message.created_at),
+        },
+    }
+    encoded = _encode(payload)
+    if _size(encoded) <= _MAX_PAYLOAD_BYTES:
+        return encoded
+
+    # Too big: drop attachments, then cut the texts in bytes; the client fetches the message
+    payload["message"]["attachments"] = None
+    payload["message"]["truncated"] = True
+    encoded = _encode(payload)
+    for section, key in (("message", "text"), ("conversation", "last_message")):
+        while _size(encoded) > _MAX_PAYLOAD_BYTES and payload[section][key]:
+            value = payload[section][key]
+            excess = _size(encoded) - _MAX_PAYLOAD_BYTES
+            payload[section][key] = _truncate_utf8(value, len(value.encode()) - excess)
+            encoded = _encode(payload)
+    if _size(encoded) > _MAX_PAYLOAD_BYTES:
+        # Oversized names or ids: send only what the client needs to refetch
+        encoded = _encode({
+            "account_id": account_id,
+            "conversation": {"id": conversation.id},
+            "message": {"id": message.id, "conversation_id": conversation.id, "truncated": True},
+        })
+    return encoded
+
+
+def publish_message_stored(db, account_id: int, conversation, message) -> None:
+    """
+    Queue a new-message / conversation-updated event in the caller's transaction.
+    Call after adding the Message and before db.commit(); flushes to get the id.
+    The notify runs in a savepoint, so if it fails only the event is lost; the
+    caller's transaction (and the stored message) is unaffected.
+    """
+    if message.id is None:
+        db.flush()
+    payload = _build_payload(account_id, conversation, message)
+    try:
+        with db.begin_nested():
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+    except Exception as e:
+        print(f"⚠️ [INBOX STREAM] Could not publish event for message {message.id}: {str(e)}")
+
+
+# -- fan-out ----------------------------------------------------------------------
+
+def _offer(subscriber: _Subscriber, event: dict) -> None:
+    """Runs on the subscriber's event loop."""
+    queue = subscriber.queue
+    if queue.full():
+        # Too far behind: replace the backlog with a single resync
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC_EVENT)
+        return
+    queue.put_nowait(event)
+
+
+def dispatch(raw_payload: str) -> int:
+    """Deliver one notification to this process's subscribers. Returns how many got it."""
+    try:
+        event = json.loads(raw_payload)
+        account_id = int(event["account_id"])
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ [INBOX STREAM] Ignoring malformed notification: {str(e)}")
+        return 0
+    event.setdefault("type", "message")
+    with _subscribers_lock:
+        targets = list(_subscribers.get(account_id, ()))
+    for subscriber in targets:
+        try:
+            subscriber.loop.call_soon_threadsafe(_offer, subscriber, event)
+        except RuntimeError:
+            pass  # Loop closed; unsubscribe() will drop it
+    return len(targets)
+
+
+def _listen_connection():
+    """Dedicated DBAPI connection with the app's connect args (not taken from the pool)."""
+    from app.db.session import engine
+
+    args, kwargs = engine.dialect.create_connect_args(engine.url)
+    conn = engine.dialect.loaded_dbapi.connect(*args, **kwargs)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    return conn
+
+
+def _listen_loop() -> None:
+    conn = None
+    reconnecting = False
+    while not _listener_stop.is_set():
+        try:
+            if conn is None:
+                conn = _listen_connection()
+                print(f"✅ [INBOX STREAM] Listening on {CHANNEL}")
+                if reconnecting:
+                    with _subscribers_lock:
+                        accounts = list(_subscribers)
+                    for account_id in accounts:
+                        dispatch(json.dumps(dict(RESYNC_EVENT, account_id=account_id)))  # Events may have been missed
+            if select.select([conn], [], [], 5) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                dispatch(conn.notifies.pop(0).payload)
+        except Exception as e:
+            print(f"⚠️ [INBOX STREAM] Listener error, reconnecting in {_RECONNECT_SECONDS}s: {str(e)}")
+            try:
+                if conn is not None:
+                    conn.close()
+            except Exception:
+                pass
+            conn = None
+            reconnecting = True
+            _listener_stop.wait(_RECONNECT_SECONDS)
+    if conn is not None:
+        conn.close()
+
+
+def _ensure_listener_started() -> None:
+    global _listener_thread
+    if _listener_thread is not None and _listener_thread.is_alive():
+        return
+    with _subscribers_lock:
+        if _listener_thread is not None and _listener_thread.is_alive():
+            return
+        _listener_stop.clear()
+        _listener_thread = threading.Thread(target=_listen_loop, name="inbox-listener", daemon=True)
+        _listener_thread.start()
+
+
+def stop_listener() -> None:
+    _listener_stop.set()
+    if _listener_thread is not None and _listener_thread.is_alive():
+        _listener_thread.join(timeout=10)
+
+
+def subscribe(account_id: int) -> _Subscriber:
+    """Register the calling SSE stream (must run on its event loop) for an account's events."""
+    subscriber = _Subscriber(asyncio.get_running_loop())
+    with _subscribers_lock:
+        _subscribers.setdefault(account_id, set()).add(subscriber)
+    _ensure_listener_started()
+    return subscriber
+
+
+def unsubscribe(account_id: int, subscriber: _Subscriber) -> None:
+    with _subscribers_lock:
+        subs = _subscribers.get(account_id)
+        if subs is not None:
+            subs.discard(subscriber)
+            if not subs:
+                del _subscribers[account_id]
+
+
+def subscriber_count() -> int:
+    with _subscribers_lock:
+        return sum(len(s) for s in _subscribers.values())
+
+
+def format_sse(event: dict) -> str:
+    """SSE frames for one hub event: conversation_updated + new_message, or resync."""
+    if event.get("type") != "message":
+        return f"event: {event.get('type', 'resync')}\ndata: {{}}\n\n"
+    return (
+        f"event: conversation_updated\ndata: {json.dumps(event['conversation'])}\n\n"
+        f"event: new_message\ndata: {json.dumps(event['message'])}\n\n"
+    )
+
+
+def heartbeat_frame() -> str:
+    return f": ping {int(time.time())}\n\n"
@@ -1,14 +1,22 @@
-from instagrapi import Client
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 
 class InstagramClient:
     def __init__(self):
+        # instagrapi is heavy (~0.4s to import); only pay for it when a client is actually built
+        from instagrapi import Client
         self.client = Client()
         self.authenticated = False
 
-    def authenticate(self, username: str, password: str) -> bool:
+    def authenticate(self, username: str, password: str, settings: Optional[Dict] = None) -> bool:
+        """
+        Log in. When saved session settings (from dump_settings) are given they are
+        loaded first, so instagrapi reuses the device identity and session cookies
+        instead of performing a fresh login (fewer login challenges).
+        """
         try:
+            if settings:
+                self.client.set_settings(settings)
             self.client.login(username, password)
             self.authenticated = True
             return True
@@ -16,6 +24,10 @@ class InstagramClient:
             self.authenticated = False
             raise Exception(f"Authentication failed: {str(e)}")
 
+    def dump_settings(self) -> Dict:
+        """Session settings (device, cookies, uuids) to persist for later authenticate(settings=...)."""
+        return self.client.get_settings()
+
     def send_dm(self, user_ids: List[int], message: str) -> bool:
         if not self.authenticated:
             raise Exception("Client not authenticated")
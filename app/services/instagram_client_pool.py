@@ -0,0 +1,148 @@
+"""
+Process-wide pool of authenticated instagrapi clients keyed by Instagram account id.
+
+Logging in with instagrapi is slow and every fresh login risks a challenge, so
+automation runs used to pay one login per rule execution. The pool keeps one
+authenticated InstagramClient per account and reuses it across rule executions
+and tasks in the same process. Session settings (instagrapi dump_settings) are
+stored Fernet-encrypted on InstagramAccount.encrypted_session_settings, so a new
+process resumes the saved session instead of starting a brand-new device login.
+They are written in the pool's own short transaction, never through the
+caller's session, so a login never commits or rolls back the caller's work.
+
+Clients idle for longer than INSTAGRAM_CLIENT_IDLE_SECONDS are evicted, and the
+pool holds at most INSTAGRAM_CLIENT_POOL_SIZE clients (least recently used are
+dropped first). Call invalidate() after an action fails with the client so the
+next caller logs in again.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.instagram_account import InstagramAccount
+from app.services.instagram_client import InstagramClient
+from app.services.metrics import record_cache
+from app.utils.encryption import decrypt_credentials, encrypt_credentials
+
+IDLE_SECONDS = float(os.getenv("INSTAGRAM_CLIENT_IDLE_SECONDS", "900"))
+MAX_POOL_SIZE = int(os.getenv("INSTAGRAM_CLIENT_POOL_SIZE", "200"))
+
+# account_id -> (client, last_used monotonic)
+_clients: Dict[int, Tuple[InstagramClient, float]] = {}
+_pool_lock = threading.Lock()
+# Concurrent callers for one account log in only once: a fixed set of striped locks keyed by
+# account id, so the lock table never grows (two accounts may share a stripe)
+_ACCOUNT_LOCK_STRIPES = 64
+_account_locks = [threading.Lock() for _ in range(_ACCOUNT_LOCK_STRIPES)]
+
+
+def _account_lock(account_id: int) -> threading.Lock:
+    return _account_locks[account_id % _ACCOUNT_LOCK_STRIPES]
+
+
+def _evict_idle_locked(now: float) -> None:
+    for account_id in [a for a, (_, used) in _clients.items() if now - used >= IDLE_SECONDS]:
+        del _clients[account_id]
+    if len(_clients) > MAX_POOL_SIZE:
+        by_age = sorted(_clients.items(), key=lambda kv: kv[1][1])
+        for account_id, _ in by_age[: len(_clients) - MAX_POOL_SIZE]:
+            del _clients[account_id]
+
+
+def _load_session_settings(instagram_account: InstagramAccount) -> Optional[Dict]:
+    encrypted = getattr(instagram_account, "encrypted_session_settings", None)
+    if not encrypted:
+        return None
+    try:
+        return json.loads(decrypt_credentials(encrypted))
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable session settings for account {instagram_account.id}: {str(e)}")
+        return None
+
+
+def _save_session_settings(instagram_account: InstagramAccount, client: InstagramClient) -> None:
+    from app.db.session import engine
+
+    try:
+        encrypted = encrypt_credentials(json.dumps(client.dump_settings()))
+        with engine.begin() as conn:
+            conn.execute(
+                update(InstagramAccount.__table__)
+                .where(InstagramAccount.__table__.c.id == instagram_account.id)
+                .values(encrypted_session_settings=encrypted)
+            )
+        # Keep the caller's instance current without marking it dirty in its session
+        set_committed_value(instagram_account, "encrypted_session_settings", encrypted)
+    except Exception as e:
+        print(f"⚠️ Failed to persist session settings for account {instagram_account.id}: {str(e)}")
+
+
+def _login(instagram_account: InstagramAccount) -> InstagramClient:
+    credentials = json.loads(decrypt_credentials(instagram_account.encrypted_credentials))
+    settings = _load_session_settings(instagram_account)
+
+    client = InstagramClient()
+    try:
+        client.authenticate(credentials["username"], credentials["password"], settings=settings)
+    except Exception:
+        if not settings:
+            raise
+        # Saved session expired or was revoked: start over with a clean device
+        print(f"🔄 Saved Instagram session rejected for account {instagram_account.id}, logging in fresh")
+        client = InstagramClient()
+        client.authenticate(credentials["username"], credentials["password"])
+
+    _save_session_settings(instagram_account, client)
+    return client
+
+
+def get_client(instagram_account: InstagramAccount) -> InstagramClient:
+    """
+    Return an authenticated client for the account, logging in at most once per
+    account per process while the client stays in the pool.
+    """
+    account_id = instagram_account.id
+    with _pool_lock:
+        now = time.monotonic()
+        _evict_idle_locked(now)
+        entry = _clients.get(account_id)
+        if entry is not None:
+            _clients[account_id] = (entry[0], now)
+    if entry is not None:
+        record_cache("instagram_client", True)
+        return entry[0]
+
+    with _account_lock(account_id):
+        # Another thread may have logged in while we waited
+        with _pool_lock:
+            entry = _clients.get(account_id)
+            if entry is not None:
+                _clients[account_id] = (entry[0], time.monotonic())
+        if entry is not None:
+            record_cache("instagram_client", True)
+            return entry[0]
+
+        record_cache("instagram_client", False)
+        client = _login(instagram_account)
+
+        with _pool_lock:
+            _clients[account_id] = (client, time.monotonic())
+            _evict_idle_locked(time.monotonic())
+        return client
+
+
+def invalidate(account_id: int) -> None:
+    """Drop the pooled client for an account (e.g. after an auth or send failure)."""
+    with _pool_lock:
+        _clients.pop(account_id, None)
+
+
+def clear_pool() -> None:
+    """Drop every pooled client."""
+    with _pool_lock:
+        _clients.clear()
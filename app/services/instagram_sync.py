@@ -1,17 +1,50 @@
 """
 Service for syncing Instagram conversations and messages from Instagram Graph API.
+
+The sync engine is async: conversation message pages are fetched concurrently
+(bounded by INSTAGRAM_SYNC_CONCURRENCY) on one httpx.AsyncClient, transient
+rate limits are retried with asyncio.sleep, and only conversations whose
+Graph API updated_time moved past Conversation.synced_updated_time are fetched
+(delta sync). The watermark only advances when a conversation's fetch reached
+it: a failed page stores nothing, and a fetch capped at
+MAX_MESSAGES_PER_CONVERSATION leaves it in place. New messages are
+deduplicated with one bulk message_id IN (...) lookup, and all DB work runs in
+worker threads (asyncio.to_thread), never on the event loop. Request handlers
+call schedule_conversation_sync() so the sync runs in a background task with
+its own DB session instead of inside the request.
 """
-import time
+import asyncio
+import os
 import requests
-from typing import List, Dict, Optional
+import httpx
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timezone
+from app.db.upsert import upsert_conversation
+from app.services.inbox_counters import reconcile_inbox_counters
+from app.services.message_threads import link_unlinked_messages
 from app.models.conversation import Conversation
 from app.models.message import Message
 from app.models.instagram_account import InstagramAccount
 from app.utils.encryption import decrypt_credentials
 
 
+GRAPH_API_BASE = "https://graph.instagram.com/v21.0"
+SYNC_CONCURRENCY = int(os.getenv("INSTAGRAM_SYNC_CONCURRENCY", "5"))
+MAX_MESSAGES_PER_CONVERSATION = 100
+MAX_RETRIES_403 = 3
+RETRY_DELAYS = [5, 15, 45]  # seconds
+_DEDUP_CHUNK_SIZE = 1000
+
+# Accounts with a background sync currently running (one sync per account per process)
+_sync_in_flight: set = set()
+# Strong references to running background sync tasks (the event loop only keeps weak ones)
+_sync_tasks: set = set()
+# account_id -> result dict of the last finished background sync
+_last_sync_results: Dict[int, Dict] = {}
+
+
 def resolve_username(igsid: str, access_token: str) -> Optional[str]:
     """
     Resolve Instagram username from IGSID by calling Instagram Graph API.
@@ -24,7 +57,7 @@ def resolve_username(igsid: str, access_token: str) -> Optional[str]:
         Username if found, None otherwise
     """
     try:
-        url = f"https://graph.instagram.com/v21.0/{igsid}"
+        url = f"{GRAPH_API_BASE}/{igsid}"
         params = {
             "fields": "username",
             "access_token": access_token
@@ -43,7 +76,268 @@ def resolve_username(igsid: str, access_token: str) -> Optional[str]:
         return None
 
 
-def sync_instagram_conversations(
+async def _resolve_username_async(client: httpx.AsyncClient, sem: asyncio.Semaphore, igsid: str, access_token: str) -> Optional[str]:
+    """Async variant of resolve_username sharing the sync's client and concurrency limit."""
+    async with sem:
+        try:
+            response = await client.get(
+                f"{GRAPH_API_BASE}/{igsid}",
+                params={"fields": "username", "access_token": access_token},
+                timeout=10,
+            )
+            if response.status_code == 200:
+                return response.json().get("username")
+            print(f"⚠️ Could not resolve username for IGSID {igsid}: {response.text}")
+        except Exception as e:
+            print(f"❌ Error resolving username for {igsid}: {str(e)}")
+        return None
+
+
+def _parse_graph_time(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Graph API timestamp (e.g. 2026-01-01T10:00:00+0000) into naive UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z")
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+async def _get_with_retry(client: httpx.AsyncClient, url: str, params: Optional[dict], label: str) -> Optional[httpx.Response]:
+    """GET with retries on transient 403 rate limits (5s/15s/45s, non-blocking)."""
+    for attempt in range(MAX_RETRIES_403 + 1):
+        response = await client.get(url, params=params)
+        if response.status_code == 200:
+            return response
+        if response.status_code == 403 and attempt < MAX_RETRIES_403:
+            try:
+                is_transient = response.json().get("error", {}).get("is_transient") is True
+            except Exception:
+                is_transient = False
+            if is_transient:
+                delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)]
+                print(f"⏳ Rate limit (403 transient) for {label}, retry {attempt + 1}/{MAX_RETRIES_403} in {delay}s...")
+                await asyncio.sleep(delay)
+                continue
+        print(f"⚠️ Failed to fetch {label}: {response.status_code} - {response.text}")
+        return None
+    return None
+
+
+async def _fetch_conversation_list(client: httpx.AsyncClient, access_token: str, limit: int) -> List[dict]:
+    """Page through /me/conversations up to `limit` conversations."""
+    url = f"{GRAPH_API_BASE}/me/conversations"
+    params = {
+        "platform": "instagram",
+        "fields": "id,participants,updated_time,message_count",
+        "access_token": access_token,
+        "limit": limit,
+    }
+    conversations: List[dict] = []
+    while url and len(conversations) < limit:
+        response = await _get_with_retry(client, url, params, "conversations")
+        # Only include params on first request; `paging.next` already contains them
+        params = None
+        if response is None:
+            break
+        page = response.json()
+        conversations.extend(page.get("data", []) or [])
+        url = (page.get("paging", {}) or {}).get("next")
+    return conversations[:limit]
+
+
+async def _fetch_new_messages(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    conversation_id: str,
+    access_token: str,
+    since: Optional[datetime],
+) -> Optional[Tuple[List[dict], bool]]:
+    """
+    Fetch messages of one conversation newer than `since` (newest first, capped).
+
+    Returns (messages, complete), or None if any page failed: a partial list
+    must not be stored as if the conversation were synced. complete is False
+    when MAX_MESSAGES_PER_CONVERSATION was hit before reaching `since` (or the
+    end of the history), so older messages are still missing.
+    """
+    url = f"{GRAPH_API_BASE}/{conversation_id}/messages"
+    params = {
+        "fields": "id,from,to,message,created_time,attachments",
+        "access_token": access_token,
+        "limit": 20,  # Instagram Messaging API typically returns up to ~20 recent messages
+    }
+    messages: List[dict] = []
+    async with sem:
+        while url:
+            response = await _get_with_retry(client, url, params, f"messages for conversation {conversation_id}")
+            params = None
+            if response is None:
+                return None
+            page = response.json()
+            for msg in page.get("data", []) or []:
+                created = _parse_graph_time(msg.get("created_time"))
+                if since and created and created <= since:
+                    return messages, True
+                if len(messages) >= MAX_MESSAGES_PER_CONVERSATION:
+                    return messages, False
+                messages.append(msg)
+            url = (page.get("paging", {}) or {}).get("next")
+    return messages, True
+
+
+def _existing_message_ids(db: Session, account_id: int, message_ids: List[str]) -> set:
+    """One bulk message_id IN (...) lookup (chunked) instead of a query per message."""
+    existing = set()
+    for i in range(0, len(message_ids), _DEDUP_CHUNK_SIZE):
+        chunk = message_ids[i:i + _DEDUP_CHUNK_SIZE]
+        rows = db.query(Message.message_id).filter(
+            Message.instagram_account_id == account_id,
+            Message.message_id.in_(chunk)
+        ).all()
+        existing.update(r[0] for r in rows)
+    return existing
+
+
+def _next_watermark(previous: Optional[datetime], updated_time: Optional[datetime], complete: bool) -> Optional[datetime]:
+    """
+    New Conversation.synced_updated_time after a fetch. Only a complete fetch
+    may move it to the conversation's updated_time; after a capped fetch it
+    stays put so the next sync still treats the conversation as changed.
+    """
+    if complete and updated_time:
+        return updated_time
+    return previous
+
+
+def _load_account(db: Session, user_id: int, account_id: int) -> Tuple[InstagramAccount, str]:
+    account = db.query(InstagramAccount).filter(
+        InstagramAccount.id == account_id,
+        InstagramAccount.user_id == user_id
+    ).first()
+    
+    if not account:
+        raise ValueError(f"Instagram account {account_id} not found for user {user_id}")
+    
+    # Get access token
+    if account.encrypted_page_token:
+        access_token = decrypt_credentials(account.encrypted_page_token)
+    elif account.encrypted_credentials:
+        access_token = decrypt_credentials(account.encrypted_credentials)
+    else:
+        raise ValueError("No access token found for this account")
+    
+    if not account.igsid:
+        raise ValueError("Instagram Business Account ID (IGSID) not found")
+    return account, access_token
+
+
+def _load_watermarks(db: Session, user_id: int, account_id: int, participant_ids: List[str]) -> Dict[str, Optional[datetime]]:
+    """Delta sync: watermarks for all participants in one query."""
+    if not participant_ids:
+        return {}
+    rows = db.query(Conversation.participant_id, Conversation.synced_updated_time).filter(
+        Conversation.instagram_account_id == account_id,
+        Conversation.user_id == user_id,
+        Conversation.participant_id.in_(participant_ids)
+    ).all()
+    return {r[0]: r[1] for r in rows}
+
+
+def _message_from_graph(msg_data: dict, user_id: int, account_id: int, conversation_id: int, igsid: str) -> Message:
+    from_user = msg_data.get("from", {}) or {}
+    to_user = (msg_data.get("to", {}) or {}).get("data", [{}])
+    to_user = to_user[0] if isinstance(to_user, list) and to_user else (msg_data.get("to", {}) or {})
+    message_text = msg_data.get("message", "")
+    attachments = (msg_data.get("attachments", {}) or {}).get("data", [])
+    from_id = from_user.get("id")
+    to_id = to_user.get("id")
+    return Message(
+        user_id=user_id,
+        instagram_account_id=account_id,
+        conversation_id=conversation_id,
+        sender_id=str(from_id) if from_id else "",
+        sender_username=from_user.get("username"),
+        recipient_id=str(to_id) if to_id else "",
+        recipient_username=to_user.get("username"),
+        message_text=message_text,
+        content=message_text,
+        message_id=msg_data.get("id"),
+        platform_message_id=msg_data.get("id"),
+        is_from_bot=(from_id == igsid),
+        has_attachments=len(attachments) > 0,
+        attachments=attachments if attachments else None,
+        created_at=_parse_graph_time(msg_data.get("created_time")) or datetime.utcnow()
+    )
+
+
+def _store_fetched_conversations(
+    db: Session,
+    user_id: int,
+    account_id: int,
+    igsid: str,
+    to_fetch: List[dict],
+    fetched: list,
+) -> Tuple[int, int]:
+    """Stage new messages and advance watermarks, then commit. Returns (conversations, messages)."""
+    all_ids = [
+        m.get("id")
+        for result in fetched if isinstance(result, tuple)
+        for m in result[0] if m.get("id")
+    ]
+    existing_ids = _existing_message_ids(db, account_id, all_ids) if all_ids else set()
+    
+    conversations_fetched = 0
+    messages_synced = 0
+    for conv, result in zip(to_fetch, fetched):
+        if not isinstance(result, tuple):
+            print(f"⚠️ Error fetching messages for conversation {conv['conversation_id']}: {result}")
+            continue
+        messages, complete = result
+        print(f"📨 Fetched {len(messages)} new messages for conversation {conv['conversation_id']}" + ("" if complete else " (capped, older messages not fetched)"))
+        
+        conversation, _ = upsert_conversation(
+            db,
+            user_id=user_id,
+            account_id=account_id,
+            participant_id=conv["participant_id"],
+            participant_name=conv["participant_name"],
+            platform_conversation_id=conv["conversation_id"],
+            updated_at=conv["updated_time"],
+        )
+        
+        new_messages = []
+        for msg_data in messages:
+            message_id = msg_data.get("id")
+            if not message_id or message_id in existing_ids:
+                continue
+            existing_ids.add(message_id)
+            new_messages.append(_message_from_graph(msg_data, user_id, account_id, conversation.id, igsid))
+        if new_messages:
+            db.add_all(new_messages)
+            messages_synced += len(new_messages)
+        
+        # Advance the watermark only after this conversation's messages are staged
+        conversation.synced_updated_time = _next_watermark(conversation.synced_updated_time, conv["updated_time"], complete)
+        conversations_fetched += 1
+    
+    db.commit()
+    return conversations_fetched, messages_synced
+
+
+def _finish_sync(db: Session, account_id: int) -> None:
+    # Bulk changes skip the per-message counters; rebuild this account's once
+    reconcile_inbox_counters(db, account_id)
+    db.commit()
+
+
+async def sync_instagram_conversations(
     user_id: int,
     account_id: int,
     db: Session,
@@ -54,9 +348,14 @@ def sync_instagram_conversations(
     
     Note: Instagram Graph API doesn't have a direct /conversations endpoint like Facebook Messenger.
     We'll use alternative approaches:
-    1. Try to fetch conversations if the endpoint exists
+    1. Fetch conversations from the API, then only the message pages that changed
+       since the last sync, concurrently
     2. Fallback to using webhook-stored messages to build conversations
     
+    HTTP runs on the event loop; every DB phase runs in a worker thread
+    (asyncio.to_thread) so a large account's sync doesn't stall other requests.
+    The session is only ever used by one phase at a time.
+    
     Args:
         user_id: User ID (business owner)
         account_id: Instagram account ID
@@ -67,443 +366,343 @@ def sync_instagram_conversations(
         Dict with sync results
     """
     try:
-        # Get Instagram account
-        account = db.query(InstagramAccount).filter(
-            InstagramAccount.id == account_id,
-            InstagramAccount.user_id == user_id
-        ).first()
-        
-        if not account:
-            raise ValueError(f"Instagram account {account_id} not found for user {user_id}")
-        
-        # Get access token
-        if account.encrypted_page_token:
-            access_token = decrypt_credentials(account.encrypted_page_token)
-        elif account.encrypted_credentials:
-            access_token = decrypt_credentials(account.encrypted_credentials)
-        else:
-            raise ValueError("No access token found for this account")
-        
+        account, access_token = await asyncio.to_thread(_load_account, db, user_id, account_id)
         igsid = account.igsid
-        if not igsid:
-            raise ValueError("Instagram Business Account ID (IGSID) not found")
         
         print(f"🔄 Syncing conversations for account {account.username} (IGSID: {igsid})")
         
-        # Step 1: Try to fetch conversations from Instagram Graph API
-        # Instagram Graph API endpoint: GET /me/conversations?platform=instagram
         conversations_fetched = 0
+        conversations_unchanged = 0
         messages_synced = 0
-        
-        try:
-            conversations_url = f"https://graph.instagram.com/v21.0/me/conversations"
-            conversations_params = {
-                "platform": "instagram",
-                "fields": "id,participants,updated_time,message_count",
-                "access_token": access_token,
-                "limit": limit,
-            }
-            
-            print(f"📡 Fetching conversations from Instagram API...")
-            conversations_list: list[dict] = []
-            
-            # Follow pagination so we pull as many conversations as allowed (up to `limit`)
-            while conversations_url and len(conversations_list) < limit:
-                try:
-                    resp = requests.get(
-                        conversations_url,
-                        params=conversations_params,
-                        timeout=30,
-                    )
-                finally:
-                    # Only include params on first request; `paging.next` already contains them
-                    conversations_params = None
-                
-                if resp.status_code != 200:
-                    print(f"⚠️ Could not fetch conversations from API: {resp.status_code} - {resp.text}")
-                    break
+        sem = asyncio.Semaphore(SYNC_CONCURRENCY)
+        
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            # Step 1: Fetch conversations from Instagram Graph API (GET /me/conversations?platform=instagram)
+            try:
+                print(f"📡 Fetching conversations from Instagram API...")
+                conversations_list = await _fetch_conversation_list(client, access_token, limit)
+                print(f"✅ Fetched {len(conversations_list)} conversations from Instagram API (after pagination)")
                 
-                page_data = resp.json()
-                page_conversations = page_data.get("data", []) or []
-                conversations_list.extend(page_conversations)
-                
-                paging = page_data.get("paging", {}) or {}
-                conversations_url = paging.get("next")
-                
-                # Defensive cap in case API ignores our limit parameter
-                if len(conversations_list) >= limit:
-                    break
-            
-            print(f"✅ Fetched {len(conversations_list)} conversations from Instagram API (after pagination)")
-            # Respect caller-provided limit
-            conversations_list = conversations_list[:limit]
-            
-            if conversations_list:
-                # Process each conversation
+                # Resolve the other participant of each conversation
+                api_conversations = []
                 for conv_data in conversations_list:
                     conversation_id = conv_data.get("id")
                     participants = conv_data.get("participants", {}).get("data", [])
-                    updated_time = conv_data.get("updated_time")
-                    
                     if not conversation_id or not participants:
                         continue
-                    
-                    # Find the other participant (not our account)
-                    other_participant = None
-                    for participant in participants:
-                        participant_id = participant.get("id")
-                        if participant_id and participant_id != igsid:
-                            other_participant = participant
-                            break
-                    
-                    if not other_participant:
-                        continue
-                    
-                    participant_id = other_participant.get("id")
-                    participant_name = other_participant.get("username")
-                    
-                    # Fetch messages for this conversation
-                    messages_url = f"https://graph.instagram.com/v21.0/{conversation_id}/messages"
-                    messages_params = {
-                        "fields": "id,from,to,message,created_time,attachments",
-                        "access_token": access_token,
-                        "limit": 20,  # Instagram Messaging API typically returns up to ~20 recent messages
-                    }
-                    
-                    try:
-                        all_messages: list[dict] = []
-                        current_url = messages_url
-                        current_params = messages_params
-                        
-                        # Follow pagination to pull as many recent messages as the API allows,
-                        # but cap per-conversation to avoid unbounded sync time.
-                        MAX_MESSAGES_PER_CONVERSATION = 100
-                        MAX_RETRIES_403 = 3
-                        retry_delays = [5, 15, 45]  # seconds
-                        while current_url and len(all_messages) < MAX_MESSAGES_PER_CONVERSATION:
-                            messages_response = None
-                            for attempt in range(MAX_RETRIES_403 + 1):
-                                try:
-                                    messages_response = requests.get(
-                                        current_url,
-                                        params=current_params,
-                                        timeout=30,
-                                    )
-                                finally:
-                                    current_params = None
-                                if messages_response.status_code == 200:
-                                    break
-                                if messages_response.status_code == 403:
-                                    try:
-                                        err = messages_response.json()
-                                        if err.get("error", {}).get("is_transient") is True:
-                                            if attempt < MAX_RETRIES_403:
-                                                delay = retry_delays[min(attempt, len(retry_delays) - 1)]
-                                                print(
-                                                    f"⏳ Rate limit (403 transient) for conversation {conversation_id}, "
-                                                    f"retry {attempt + 1}/{MAX_RETRIES_403} in {delay}s..."
-                                                )
-                                                time.sleep(delay)
-                                                current_params = messages_params
-                                                continue
-                                    except Exception:
-                                        pass
-                                print(
-                                    f"⚠️ Failed to fetch messages for conversation {conversation_id}: "
-                                    f"{messages_response.status_code} - {messages_response.text}"
-                                )
-                                break
-                            if messages_response is None or messages_response.status_code != 200:
-                                break
-                            
-                            messages_data = messages_response.json()
-                            page_messages = messages_data.get("data", []) or []
-                            all_messages.extend(page_messages)
-                            
-                            paging = messages_data.get("paging", {}) or {}
-                            current_url = paging.get("next")
-                            
-                            if len(all_messages) >= MAX_MESSAGES_PER_CONVERSATION:
-                                break
-                        
-                        messages_list = all_messages
-                        print(f"📨 Fetched {len(messages_list)} messages for conversation {conversation_id}")
-                        
-                        # Find or create conversation record
-                        conversation = db.query(Conversation).filter(
-                            Conversation.instagram_account_id == account_id,
-                            Conversation.user_id == user_id,
-                            Conversation.participant_id == participant_id
-                        ).first()
-                        
-                        if not conversation:
-                            conversation = Conversation(
-                                user_id=user_id,
-                                instagram_account_id=account_id,
-                                participant_id=participant_id,
-                                participant_name=participant_name,
-                                platform_conversation_id=conversation_id,
-                                updated_at=datetime.fromisoformat(updated_time.replace('Z', '+00:00')) if updated_time else datetime.utcnow()
-                            )
-                            db.add(conversation)
-                            db.flush()  # Get conversation.id
-                        
-                        # Save messages to database
-                        for msg_data in messages_list:
-                            message_id = msg_data.get("id")
-                            from_user = msg_data.get("from", {})
-                            to_user = msg_data.get("to", {})
-                            message_text = msg_data.get("message", "")
-                            created_time = msg_data.get("created_time")
-                            attachments = msg_data.get("attachments", {}).get("data", [])
-                            
-                            from_id = from_user.get("id")
-                            to_id = to_user.get("id")
-                            
-                            # Determine if message is from bot (our account) or received
-                            is_from_bot = (from_id == igsid)
-                            
-                            # Check if message already exists
-                            existing_message = db.query(Message).filter(
-                                Message.message_id == message_id,
-                                Message.instagram_account_id == account_id
-                            ).first()
-                            
-                            if not existing_message:
-                                # Create new message
-                                message = Message(
-                                    user_id=user_id,
-                                    instagram_account_id=account_id,
-                                    conversation_id=conversation.id,
-                                    sender_id=str(from_id) if from_id else "",
-                                    sender_username=from_user.get("username"),
-                                    recipient_id=str(to_id) if to_id else "",
-                                    recipient_username=to_user.get("username"),
-                                    message_text=message_text,
-                                    content=message_text,
-                                    message_id=message_id,
-                                    platform_message_id=message_id,
-                                    is_from_bot=is_from_bot,
-                                    has_attachments=len(attachments) > 0,
-                                    attachments=attachments if attachments else None,
-                                    created_at=datetime.fromisoformat(created_time.replace('Z', '+00:00')) if created_time else datetime.utcnow()
-                                )
-                                db.add(message)
-                                messages_synced += 1
-                        
-                        conversations_fetched += 1
-                        
-                    except Exception as e:
-                        print(f"⚠️ Error fetching messages for conversation {conversation_id}: {str(e)}")
+                    other = next((p for p in participants if p.get("id") and p.get("id") != igsid), None)
+                    if not other:
                         continue
-                        
-            else:
-                print(f"⚠️ Could not fetch conversations from API: {conversations_response.status_code} - {conversations_response.text}")
-        except Exception as e:
-            print(f"⚠️ Error fetching conversations from Instagram API: {str(e)}")
-            import traceback
-            traceback.print_exc()
-        
-        # Step 2: Also build conversations from existing messages in database (fallback/enhancement)
-        # Get all unique participants from Message table
-        from sqlalchemy import func, distinct, or_
-        
-        # Get conversations from existing messages
-        # Group by sender_id first (always present), then by username (may be None)
-        incoming_participants = db.query(
-            Message.sender_id,
-            Message.sender_username,
-            func.max(Message.created_at).label('last_message_at'),
-            func.count(Message.id).label('message_count')
-        ).filter(
-            Message.instagram_account_id == account_id,
-            Message.user_id == user_id,
-            Message.is_from_bot == False,  # Received messages
-            Message.sender_id.isnot(None)  # Ensure sender_id is not None
-        ).group_by(
-            Message.sender_id,  # Group by sender_id first (always present)
-            Message.sender_username  # Then by username (may be None)
-        ).all()
-        
-        print(f"📥 Found {len(incoming_participants)} incoming message participants")
-        
-        outgoing_participants = db.query(
-            Message.recipient_id,
-            Message.recipient_username,
-            func.max(Message.created_at).label('last_message_at'),
-            func.count(Message.id).label('message_count')
-        ).filter(
-            Message.instagram_account_id == account_id,
-            Message.user_id == user_id,
-            Message.is_from_bot == True,  # Sent messages
-            Message.recipient_id.isnot(None)  # Ensure recipient_id is not None
-        ).group_by(
-            Message.recipient_id,  # Group by recipient_id first (always present)
-            Message.recipient_username  # Then by username (may be None)
-        ).all()
-        
-        print(f"📤 Found {len(outgoing_participants)} outgoing message participants")
-        
-        # Merge participants
-        participants_map = {}
-        
-        # Process incoming
-        for p in incoming_participants:
-            participant_id = str(p.sender_id)
-            if not participant_id:
-                continue
-                
-            if participant_id not in participants_map:
-                participants_map[participant_id] = {
-                    'participant_id': participant_id,
-                    'participant_name': p.sender_username,
-                    'last_message_at': p.last_message_at,
-                    'message_count': p.message_count
-                }
-            else:
-                # Update if this message is newer
-                existing_time = participants_map[participant_id]['last_message_at']
-                if p.last_message_at and (not existing_time or p.last_message_at > existing_time):
-                    participants_map[participant_id].update({
-                        'participant_name': p.sender_username or participants_map[participant_id]['participant_name'],
-                        'last_message_at': p.last_message_at,
+                    api_conversations.append({
+                        "conversation_id": conversation_id,
+                        "participant_id": str(other.get("id")),
+                        "participant_name": other.get("username"),
+                        "updated_time": _parse_graph_time(conv_data.get("updated_time")),
                     })
-                # Always add to message count
-                participants_map[participant_id]['message_count'] = participants_map[participant_id].get('message_count', 0) + p.message_count
-        
-        # Process outgoing
-        for p in outgoing_participants:
-            participant_id = str(p.recipient_id)
-            if not participant_id:
-                continue
                 
-            if participant_id not in participants_map:
-                participants_map[participant_id] = {
-                    'participant_id': participant_id,
-                    'participant_name': p.recipient_username,
-                    'last_message_at': p.last_message_at,
-                    'message_count': p.message_count
-                }
-            else:
-                # Update if this message is newer
-                existing_time = participants_map[participant_id]['last_message_at']
-                if p.last_message_at and (not existing_time or p.last_message_at > existing_time):
-                    participants_map[participant_id].update({
-                        'participant_name': p.recipient_username or participants_map[participant_id]['participant_name'],
-                        'last_message_at': p.last_message_at,
-                    })
-                # Always add to message count
-                participants_map[participant_id]['message_count'] = participants_map[participant_id].get('message_count', 0) + p.message_count
-        
-        print(f"📊 Total unique participants: {len(participants_map)}")
-        
-        # Never create/update a conversation where the participant is our own account
-        account_igsid_str = str(igsid) if igsid else None
-        account_username_str = (account.username or "").strip()
-        
-        # Create/update Conversation records
-        conversations_created = 0
-        conversations_updated = 0
-        
-        for participant_id, data in participants_map.items():
-            # Skip self: participant must not be our Instagram account
-            if account_igsid_str and participant_id == account_igsid_str:
-                print(f"⏭️ Skipping self as participant (participant_id={participant_id} == account IGSID)")
-                continue
-            # Resolve username if not available
-            participant_name = data['participant_name']
-            if not participant_name:
-                print(f"🔍 Resolving username for participant {participant_id}...")
-                participant_name = resolve_username(participant_id, access_token)
-                if participant_name:
-                    print(f"✅ Resolved username: @{participant_name}")
-            # Skip self by username (e.g. webhook uses different IGSID than stored)
-            if account_username_str and participant_name and (participant_name.strip() == account_username_str):
-                print(f"⏭️ Skipping self as participant (participant_name={participant_name} == account username)")
-                continue
-            
-            # Find or create conversation
-            conversation = db.query(Conversation).filter(
-                Conversation.instagram_account_id == account_id,
-                Conversation.user_id == user_id,
-                Conversation.participant_id == participant_id
-            ).first()
-            
-            # Get latest message for preview
-            latest_message = db.query(Message).filter(
-                Message.instagram_account_id == account_id,
-                Message.user_id == user_id,
-                or_(
-                    (Message.sender_id == participant_id),
-                    (Message.recipient_id == participant_id)
+                watermarks = await asyncio.to_thread(
+                    _load_watermarks, db, user_id, account_id, [c["participant_id"] for c in api_conversations]
                 )
-            ).order_by(Message.created_at.desc()).first()
-            
-            last_message_preview = ""
-            if latest_message:
-                last_message_preview = latest_message.get_content() or "[Media]"
-                if len(last_message_preview) > 100:
-                    last_message_preview = last_message_preview[:100] + "..."
-            
-            if conversation:
-                # Update existing conversation
-                conversation.participant_name = participant_name or conversation.participant_name
-                conversation.last_message = last_message_preview
-                conversation.updated_at = data['last_message_at'] or datetime.utcnow()
-                conversations_updated += 1
-            else:
-                # Create new conversation
-                conversation = Conversation(
-                    user_id=user_id,
-                    instagram_account_id=account_id,
-                    participant_id=participant_id,
-                    participant_name=participant_name,
-                    last_message=last_message_preview,
-                    updated_at=data['last_message_at'] or datetime.utcnow()
+                
+                to_fetch = []
+                for conv in api_conversations:
+                    since = watermarks.get(conv["participant_id"])
+                    if since and conv["updated_time"] and conv["updated_time"] <= since:
+                        conversations_unchanged += 1
+                        continue
+                    conv["since"] = since
+                    to_fetch.append(conv)
+                
+                print(f"📨 {len(to_fetch)} conversation(s) changed since last sync, {conversations_unchanged} unchanged")
+                
+                # Fetch changed conversations' message pages concurrently
+                fetched = await asyncio.gather(*(
+                    _fetch_new_messages(client, sem, conv["conversation_id"], access_token, conv["since"])
+                    for conv in to_fetch
+                ), return_exceptions=True)
+                
+                conversations_fetched, messages_synced = await asyncio.to_thread(
+                    _store_fetched_conversations, db, user_id, account_id, igsid, to_fetch, fetched
                 )
-                db.add(conversation)
-                conversations_created += 1
+            except Exception as e:
+                await asyncio.to_thread(db.rollback)
+                print(f"⚠️ Error fetching conversations from Instagram API: {str(e)}")
+                import traceback
+                traceback.print_exc()
             
-            # Update messages to link to conversation
-            if conversation.id:
-                db.query(Message).filter(
-                    Message.instagram_account_id == account_id,
-                    Message.user_id == user_id,
-                    or_(
-                        (Message.sender_id == participant_id),
-                        (Message.recipient_id == participant_id)
-                    ),
-                    Message.conversation_id.is_(None)
-                ).update({
-                    Message.conversation_id: conversation.id
-                }, synchronize_session=False)
+            # Step 2: Also build conversations from existing messages in database (fallback/enhancement)
+            rebuild = await _rebuild_conversations_from_messages(db, account, user_id, account_id, access_token, client, sem)
         
-        db.commit()
+        await asyncio.to_thread(_finish_sync, db, account_id)
         
         print(f"✅ Sync complete:")
         print(f"   - Conversations fetched from API: {conversations_fetched}")
+        print(f"   - Conversations unchanged since last sync: {conversations_unchanged}")
         print(f"   - Messages synced from API: {messages_synced}")
-        print(f"   - Conversations created: {conversations_created}")
-        print(f"   - Conversations updated: {conversations_updated}")
-        print(f"   - Total participants: {len(participants_map)}")
+        print(f"   - Conversations created: {rebuild['conversations_created']}")
+        print(f"   - Conversations updated: {rebuild['conversations_updated']}")
+        print(f"   - Total participants: {rebuild['total_participants']}")
         
         return {
             "success": True,
             "conversations_fetched_from_api": conversations_fetched,
+            "conversations_unchanged": conversations_unchanged,
             "messages_synced_from_api": messages_synced,
-            "conversations_created": conversations_created,
-            "conversations_updated": conversations_updated,
-            "total_participants": len(participants_map)
+            **rebuild,
         }
         
     except Exception as e:
-        db.rollback()
+        await asyncio.to_thread(db.rollback)
         print(f"❌ Error syncing conversations: {str(e)}")
         import traceback
         traceback.print_exc()
         raise
 
 
+def _merge_participant(participants_map: Dict[str, dict], participant_id: str, name: Optional[str], last_message_at, message_count: int) -> None:
+    if participant_id not in participants_map:
+        participants_map[participant_id] = {
+            'participant_id': participant_id,
+            'participant_name': name,
+            'last_message_at': last_message_at,
+            'message_count': message_count
+        }
+        return
+    entry = participants_map[participant_id]
+    # Update if this message is newer
+    existing_time = entry['last_message_at']
+    if last_message_at and (not existing_time or last_message_at > existing_time):
+        entry['participant_name'] = name or entry['participant_name']
+        entry['last_message_at'] = last_message_at
+    # Always add to message count
+    entry['message_count'] = entry.get('message_count', 0) + message_count
+
+
+def _collect_participants(db: Session, user_id: int, account_id: int) -> Dict[str, dict]:
+    """Participants of webhook-stored messages (incoming senders and outgoing recipients), merged by id."""
+    # Group by sender_id first (always present), then by username (may be None)
+    incoming_participants = db.query(
+        Message.sender_id,
+        Message.sender_username,
+        func.max(Message.created_at).label('last_message_at'),
+        func.count(Message.id).label('message_count')
+    ).filter(
+        Message.instagram_account_id == account_id,
+        Message.user_id == user_id,
+        Message.is_from_bot == False,  # Received messages
+        Message.sender_id.isnot(None)  # Ensure sender_id is not None
+    ).group_by(
+        Message.sender_id,
+        Message.sender_username
+    ).all()
+    
+    print(f"📥 Found {len(incoming_participants)} incoming message participants")
+    
+    outgoing_participants = db.query(
+        Message.recipient_id,
+        Message.recipient_username,
+        func.max(Message.created_at).label('last_message_at'),
+        func.count(Message.id).label('message_count')
+    ).filter(
+        Message.instagram_account_id == account_id,
+        Message.user_id == user_id,
+        Message.is_from_bot == True,  # Sent messages
+        Message.recipient_id.isnot(None)  # Ensure recipient_id is not None
+    ).group_by(
+        Message.recipient_id,
+        Message.recipient_username
+    ).all()
+    
+    print(f"📤 Found {len(outgoing_participants)} outgoing message participants")
+    
+    participants_map: Dict[str, dict] = {}
+    for p in incoming_participants:
+        if str(p.sender_id):
+            _merge_participant(participants_map, str(p.sender_id), p.sender_username, p.last_message_at, p.message_count)
+    for p in outgoing_participants:
+        if str(p.recipient_id):
+            _merge_participant(participants_map, str(p.recipient_id), p.recipient_username, p.last_message_at, p.message_count)
+    
+    print(f"📊 Total unique participants: {len(participants_map)}")
+    return participants_map
+
+
+def _newest_per_participant(rows) -> Dict[str, Message]:
+    """rows: (participant_id, Message) pairs from the sender and recipient sides; keep the newest per participant."""
+    latest: Dict[str, Message] = {}
+    for participant_id, message in rows:
+        current = latest.get(participant_id)
+        if current is None or (message.created_at or datetime.min) > (current.created_at or datetime.min):
+            latest[participant_id] = message
+    return latest
+
+
+def _latest_messages(db: Session, user_id: int, account_id: int, participant_ids: List[str]) -> Dict[str, Message]:
+    """Newest message per participant: one DISTINCT ON query per side and chunk, not one query per participant."""
+    rows = []
+    for i in range(0, len(participant_ids), _DEDUP_CHUNK_SIZE):
+        chunk = participant_ids[i:i + _DEDUP_CHUNK_SIZE]
+        for column in (Message.sender_id, Message.recipient_id):
+            side = db.query(column, Message).filter(
+                Message.instagram_account_id == account_id,
+                Message.user_id == user_id,
+                column.in_(chunk)
+            ).distinct(column).order_by(column, Message.created_at.desc()).all()
+            rows.extend(side)
+    return _newest_per_participant(rows)
+
+
+def _preview(message: Optional[Message]) -> str:
+    if not message:
+        return ""
+    preview = message.get_content() or "[Media]"
+    if len(preview) > 100:
+        preview = preview[:100] + "..."
+    return preview
+
+
+def _apply_participants(
+    db: Session,
+    account: InstagramAccount,
+    user_id: int,
+    account_id: int,
+    participants_map: Dict[str, dict],
+) -> Tuple[int, int]:
+    """Create/update Conversation rows for participants and link orphan messages. Returns (created, updated)."""
+    # Never create/update a conversation where the participant is our own account
+    account_igsid_str = str(account.igsid) if account.igsid else None
+    account_username_str = (account.username or "").strip()
+    
+    participant_ids = []
+    for participant_id, data in participants_map.items():
+        # Skip self: participant must not be our Instagram account
+        if account_igsid_str and participant_id == account_igsid_str:
+            print(f"⏭️ Skipping self as participant (participant_id={participant_id} == account IGSID)")
+            continue
+        participant_name = data['participant_name']
+        # Skip self by username (e.g. webhook uses different IGSID than stored)
+        if account_username_str and participant_name and (participant_name.strip() == account_username_str):
+            print(f"⏭️ Skipping self as participant (participant_name={participant_name} == account username)")
+            continue
+        participant_ids.append(participant_id)
+    
+    # Existing conversations and latest messages for all participants in bulk
+    existing_conversations = {}
+    latest = {}
+    if participant_ids:
+        existing_conversations = {
+            c.participant_id: c
+            for c in db.query(Conversation).filter(
+                Conversation.instagram_account_id == account_id,
+                Conversation.user_id == user_id,
+                Conversation.participant_id.in_(participant_ids)
+            ).all()
+        }
+        latest = _latest_messages(db, user_id, account_id, participant_ids)
+    
+    conversations_created = 0
+    conversations_updated = 0
+    for participant_id in participant_ids:
+        data = participants_map[participant_id]
+        participant_name = data['participant_name']
+        last_message_preview = _preview(latest.get(participant_id))
+        conversation = existing_conversations.get(participant_id)
+        if conversation:
+            # Update existing conversation
+            conversation.participant_name = participant_name or conversation.participant_name
+            conversation.last_message = last_message_preview
+            conversation.updated_at = data['last_message_at'] or datetime.utcnow()
+            conversations_updated += 1
+        else:
+            upsert_conversation(
+                db,
+                user_id=user_id,
+                account_id=account_id,
+                participant_id=participant_id,
+                participant_name=participant_name,
+                last_message=last_message_preview,
+                updated_at=data['last_message_at'] or datetime.utcnow(),
+            )
+            conversations_created += 1
+    
+    # Link messages stored without a conversation, in batches rather than one UPDATE per participant
+    db.flush()
+    messages_linked = link_unlinked_messages(db, account_id)
+    if messages_linked:
+        print(f"🔗 Linked {messages_linked} message(s) to their conversations")
+    return conversations_created, conversations_updated
+
+
+async def _rebuild_conversations_from_messages(
+    db: Session,
+    account: InstagramAccount,
+    user_id: int,
+    account_id: int,
+    access_token: str,
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+) -> Dict:
+    """Create/update Conversation rows from webhook-stored messages and link orphan messages."""
+    participants_map = await asyncio.to_thread(_collect_participants, db, user_id, account_id)
+    
+    # Resolve missing usernames concurrently (bounded by the sync semaphore)
+    account_igsid_str = str(account.igsid) if account.igsid else None
+    unnamed = [
+        pid for pid, data in participants_map.items()
+        if not data['participant_name'] and pid != account_igsid_str
+    ]
+    if unnamed:
+        print(f"🔍 Resolving usernames for {len(unnamed)} participant(s)...")
+        resolved = await asyncio.gather(*(
+            _resolve_username_async(client, sem, pid, access_token) for pid in unnamed
+        ))
+        for pid, name in zip(unnamed, resolved):
+            if name:
+                participants_map[pid]['participant_name'] = name
+    
+    conversations_created, conversations_updated = await asyncio.to_thread(
+        _apply_participants, db, account, user_id, account_id, participants_map
+    )
+    return {
+        "conversations_created": conversations_created,
+        "conversations_updated": conversations_updated,
+        "total_participants": len(participants_map)
+    }
+
+
+async def _background_sync_conversations(user_id: int, account_id: int, limit: int) -> None:
+    """Run a conversation sync in its own DB session so the request can return immediately."""
+    from app.db.session import SessionLocal
+    db = SessionLocal()
+    try:
+        _last_sync_results[account_id] = await sync_instagram_conversations(user_id, account_id, db, limit)
+    except Exception as e:
+        print(f"[Sync] Background conversation sync error for account {account_id}: {str(e)}")
+        _last_sync_results[account_id] = {"success": False, "error": str(e)}
+    finally:
+        _sync_in_flight.discard(account_id)
+        db.close()
+
+
+def schedule_conversation_sync(user_id: int, account_id: int, limit: int = 50) -> bool:
+    """
+    Start a background conversation sync for an account (fire-and-forget).
+    Returns False if a sync for this account is already running in this process.
+    """
+    if account_id in _sync_in_flight:
+        return False
+    _sync_in_flight.add(account_id)
+    task = asyncio.create_task(_background_sync_conversations(user_id, account_id, limit))
+    _sync_tasks.add(task)
+    task.add_done_callback(_sync_tasks.discard)
+    return True
+
+
+def get_last_sync_result(account_id: int) -> Optional[Dict]:
+    """Result of the last finished background sync for this account in this process, if any."""
+    return _last_sync_results.get(account_id)
+
+
 def sync_conversation_messages(
     conversation_id: int,
     user_id: int,
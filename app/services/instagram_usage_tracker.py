@@ -4,6 +4,7 @@ Handles usage limits and resets for Free (lifetime) and Pro (monthly) tiers.
 """
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
+from app.db.upsert import upsert_tracker
 from app.models.instagram_global_tracker import InstagramGlobalTracker
 from app.models.user import User
 from app.models.instagram_account import InstagramAccount
@@ -14,6 +15,8 @@ def get_or_create_tracker(user_id: int, instagram_id: str, db: Session) -> Insta
     """
     Get or create an InstagramGlobalTracker for the given (user_id, IGSID) combination.
     If tracker exists, return it. If not, create a new one.
+    A newly created tracker is persisted by the caller's next commit (read-only
+    callers such as the plan checks commit right after reading it).
     """
     if not instagram_id:
         raise ValueError("instagram_id (IGSID) is required")
@@ -21,25 +24,8 @@ def get_or_create_tracker(user_id: int, instagram_id: str, db: Session) -> Insta
         raise ValueError("user_id is required")
     
     try:
-        tracker = db.query(InstagramGlobalTracker).filter(
-            InstagramGlobalTracker.user_id == user_id,
-            InstagramGlobalTracker.instagram_id == instagram_id
-        ).first()
-        
-        if not tracker:
-            tracker = InstagramGlobalTracker(
-                user_id=user_id,
-                instagram_id=instagram_id,
-                dms_sent_count=0,
-                rules_created_count=0,
-                last_reset_date=datetime.utcnow()
-            )
-            db.add(tracker)
-            db.commit()
-            db.refresh(tracker)
-            print(f"✅ Created new InstagramGlobalTracker for user {user_id}, IGSID: {instagram_id}")
-        
-        return tracker
+        # Single INSERT ... ON CONFLICT ... RETURNING; no commit (caller's transaction owns the write)
+        return upsert_tracker(db, user_id, instagram_id)
     except Exception as e:
         # Check if error is due to missing user_id column (migration not run)
         error_msg = str(e).lower()
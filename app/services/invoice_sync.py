@@ -0,0 +1,199 @@
+"""
+Incremental Dodo invoice sync helpers (used by app.api.routes.dodo._sync_invoices_from_dodo_api).
+
+Every GET /users/invoices used to start a background sync that paged through
+all of the customer's payments and upserted them one query at a time. Now:
+
+- Watermark: invoice_sync_states keeps the newest payment created_at per Dodo
+  customer. The next sync asks only for payments created since then, minus
+  WATERMARK_OVERLAP so a payment that was still processing last time gets its
+  final status. A customer without a watermark gets one full sync.
+- Bulk upsert: all fetched payments are written by one
+  INSERT ... ON CONFLICT (provider_payment_id) DO UPDATE.
+- Debounce: claim_invoice_sync() lets one background sync per user start at
+  most every INVOICE_SYNC_DEBOUNCE_SECONDS, and never two at once.
+
+Older payments that change afterwards (refunds, disputes) still arrive
+through the payment webhooks.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.invoice import Invoice
+from app.models.invoice_sync_state import InvoiceSyncState
+
+INVOICE_SYNC_DEBOUNCE_SECONDS = int(os.getenv("INVOICE_SYNC_DEBOUNCE_SECONDS", "300"))
+WATERMARK_OVERLAP = timedelta(hours=24)
+
+# user_id -> monotonic time the last background sync started
+_sync_started: Dict[int, float] = {}
+_sync_running: set = set()
+_sync_lock = threading.Lock()
+
+
+def claim_invoice_sync(user_id: int) -> bool:
+    """True if a background sync may start for user_id now (call release_invoice_sync when it ends)."""
+    now = time.monotonic()
+    with _sync_lock:
+        if user_id in _sync_running:
+            return False
+        started = _sync_started.get(user_id)
+        if started is not None and now - started < INVOICE_SYNC_DEBOUNCE_SECONDS:
+            return False
+        _sync_running.add(user_id)
+        _sync_started[user_id] = now
+        if len(_sync_started) > 10000:
+            cutoff = now - INVOICE_SYNC_DEBOUNCE_SECONDS
+            for uid in [u for u, t in _sync_started.items() if t < cutoff]:
+                del _sync_started[uid]
+        return True
+
+
+def release_invoice_sync(user_id: int) -> None:
+    with _sync_lock:
+        _sync_running.discard(user_id)
+
+
+def parse_dodo_time(value: Optional[str]) -> Optional[datetime]:
+    """Dodo ISO timestamp -> naive UTC datetime (None if missing or unparseable)."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def payment_to_invoice_row(user_id: int, payment: dict) -> Optional[dict]:
+    """invoices row values for one Dodo payment, or None if it has no id or amount."""
+    payment_id = payment.get("payment_id") or payment.get("id")
+    total_amount = payment.get("total_amount") or payment.get("amount")
+    if not total_amount or not payment_id:
+        return None
+    # Dodo API sends amount in minor units (e.g. cents). Store exact decimal (e.g. 11.81) — never round.
+    return {
+        "user_id": user_id,
+        "provider": "dodo",
+        "provider_invoice_id": payment.get("invoice_id"),
+        "provider_payment_id": payment_id,
+        "amount": (Decimal(str(total_amount)) / 100).quantize(Decimal("0.01")),
+        "currency": (payment.get("currency") or "USD").upper(),
+        "status": (payment.get("status") or "succeeded").lower(),
+        "invoice_url": payment.get("invoice_url"),
+        "paid_at": parse_dodo_time(payment.get("created_at") or payment.get("created")),
+    }
+
+
+def sync_since(db: Session, customer_id: str) -> Optional[datetime]:
+    """created_at lower bound for the next fetch, or None for a full sync."""
+    last_payment_at = db.execute(
+        select(InvoiceSyncState.last_payment_at).where(InvoiceSyncState.dodo_customer_id == customer_id)
+    ).scalar()
+    if last_payment_at is None:
+        return None
+    return last_payment_at - WATERMARK_OVERLAP
+
+
+def _without_invoice_id_clashes(db: Session, rows: List[dict]) -> List[dict]:
+    """
+    Drop rows whose invoice id is already stored under a different payment id:
+    the upsert conflicts on provider_payment_id, and a second unique violation
+    on provider_invoice_id would fail the whole statement.
+
+    A row stored by the webhook with the invoice id but no payment id yet is
+    claimed instead: its provider_payment_id is set here, so the upsert below
+    updates it (status, amount, ...) like the old match by invoice id did.
+    """
+    invoice_ids = [row["provider_invoice_id"] for row in rows if row["provider_invoice_id"]]
+    if not invoice_ids:
+        return rows
+    stored = dict(db.execute(
+        select(Invoice.provider_invoice_id, Invoice.provider_payment_id)
+        .where(Invoice.provider_invoice_id.in_(invoice_ids))
+    ).all())
+    unclaimed = [row for row in rows if row["provider_invoice_id"] in stored and stored[row["provider_invoice_id"]] is None]
+    payment_ids_in_use = set()
+    if unclaimed:
+        payment_ids_in_use = set(db.execute(
+            select(Invoice.provider_payment_id)
+            .where(Invoice.provider_payment_id.in_([row["provider_payment_id"] for row in unclaimed]))
+        ).scalars())
+    table = Invoice.__table__
+    kept = []
+    for row in rows:
+        invoice_id = row["provider_invoice_id"]
+        if invoice_id in stored and stored[invoice_id] is None and row["provider_payment_id"] not in payment_ids_in_use:
+            db.execute(
+                update(table)
+                .where(table.c.provider_invoice_id == invoice_id, table.c.provider_payment_id.is_(None))
+                .values(provider_payment_id=row["provider_payment_id"])
+            )
+        elif invoice_id in stored and stored[invoice_id] != row["provider_payment_id"]:
+            print(f"[Dodo] Skipping payment {row['provider_payment_id']}: invoice {invoice_id} is stored for another payment")
+            continue
+        kept.append(row)
+    return kept
+
+
+def upsert_invoices(db: Session, rows: List[dict]) -> Tuple[int, int]:
+    """
+    Insert or update all rows in one statement keyed by provider_payment_id.
+    Does not commit. Returns (created, updated).
+    """
+    # ON CONFLICT can't touch the same row twice in one statement: last occurrence wins
+    rows = list({row["provider_payment_id"]: row for row in rows}.values())
+    rows = _without_invoice_id_clashes(db, rows)
+    if not rows:
+        return 0, 0
+    stmt = insert(Invoice.__table__).values(rows)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Invoice.__table__.c.provider_payment_id],
+        set_={
+            "amount": excluded.amount,
+            "currency": excluded.currency,
+            "status": excluded.status,
+            "invoice_url": func.coalesce(excluded.invoice_url, Invoice.__table__.c.invoice_url),
+            "paid_at": func.coalesce(excluded.paid_at, Invoice.__table__.c.paid_at),
+            "provider_invoice_id": func.coalesce(Invoice.__table__.c.provider_invoice_id, excluded.provider_invoice_id),
+            "updated_at": func.timezone("utc", func.now()),
+        },
+    ).returning(literal_column("xmax = 0"))  # True for inserted rows
+    inserted = [row[0] for row in db.execute(stmt)]
+    created = sum(1 for was_inserted in inserted if was_inserted)
+    return created, len(inserted) - created
+
+
+def save_sync_watermark(db: Session, customer_id: str, user_id: int, rows: List[dict]) -> None:
+    """Advance the customer's watermark to the newest payment in rows (never backwards). Does not commit."""
+    newest = max((row for row in rows if row["paid_at"]), key=lambda row: row["paid_at"], default=None)
+    table = InvoiceSyncState.__table__
+    stmt = insert(table).values(
+        dodo_customer_id=customer_id,
+        user_id=user_id,
+        last_payment_at=newest["paid_at"] if newest else None,
+        last_payment_id=newest["provider_payment_id"] if newest else None,
+        synced_at=datetime.utcnow(),
+    )
+    advance = func.coalesce(stmt.excluded.last_payment_at > table.c.last_payment_at, table.c.last_payment_at.is_(None))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.dodo_customer_id],
+        set_={
+            "user_id": stmt.excluded.user_id,
+            "last_payment_at": func.greatest(table.c.last_payment_at, stmt.excluded.last_payment_at),
+            "last_payment_id": case((advance, stmt.excluded.last_payment_id), else_=table.c.last_payment_id),
+            "synced_at": stmt.excluded.synced_at,
+        },
+    )
+    db.execute(stmt)
@@ -10,8 +10,12 @@ from sqlalchemy.orm import Session
 from app.models.automation_rule import AutomationRule
 from app.models.captured_lead import CapturedLead
 from app.models.automation_rule_stats import AutomationRuleStats
+from app.db.upsert import increment_rule_stats
 from app.models.instagram_account import InstagramAccount
-from app.services.lead_capture_email_validation import validate_lead_capture_email
+from app.services.lead_capture_email_validation import (
+    validate_lead_capture_email,
+    validate_lead_capture_email_async,
+)
 
 
 def validate_email(email: str) -> Tuple[bool, str, Optional[str]]:
@@ -23,6 +27,15 @@ def validate_email(email: str) -> Tuple[bool, str, Optional[str]]:
     return validate_lead_capture_email(email)
 
 
+async def validate_email_async(email: str) -> Tuple[bool, str, Optional[str]]:
+    """
+    validate_email for async callers: the DNS layer is awaited, not run on the event loop.
+
+    Returns: (is_valid, error_message, normalized_email_or_none)
+    """
+    return await validate_lead_capture_email_async(email)
+
+
 def validate_phone(phone: str) -> Tuple[bool, str]:
     """
     Validate phone number format (international support).
@@ -83,7 +96,7 @@ def get_current_flow_step(rule: AutomationRule, user_id: str) -> Optional[Dict[s
     return flow[0] if flow else None
 
 
-def process_lead_capture_step(
+async def process_lead_capture_step(
     rule: AutomationRule,
     user_message: str,
     sender_id: str,
@@ -119,7 +132,7 @@ def process_lead_capture_step(
         normalized_email: Optional[str] = None
 
         if field_type == "email" or validation == "email":
-            is_valid, error_message, normalized_email = validate_email(user_message.strip())
+            is_valid, error_message, normalized_email = await validate_email_async(user_message.strip())
         elif field_type == "phone" or validation == "phone":
             is_valid, error_message = validate_phone(user_message.strip())
         else:
@@ -240,52 +253,11 @@ def update_automation_stats(rule_id: int, event_type: str, db: Session):
     event_type: "triggered" | "dm_sent" | "comment_replied" | "lead_captured" | "follow_button_clicked" | "profile_visit" | "im_following_clicked" | "follower_gained"
     """
     try:
-        # Try to get existing stats
-        stats = db.query(AutomationRuleStats).filter(
-            AutomationRuleStats.automation_rule_id == rule_id
-        ).first()
-        
-        if not stats:
-            # Create new stats record
-            stats = AutomationRuleStats(
-                automation_rule_id=rule_id,
-                total_triggers=0,
-                total_dms_sent=0,
-                total_comments_replied=0,
-                total_leads_captured=0
-            )
-            db.add(stats)
-        
-        # Update counters
-        if event_type == "triggered":
-            stats.total_triggers += 1
-            stats.last_triggered_at = datetime.utcnow()
-        elif event_type == "dm_sent":
-            stats.total_dms_sent += 1
-        elif event_type == "comment_replied":
-            stats.total_comments_replied += 1
-        elif event_type == "lead_captured":
-            stats.total_leads_captured += 1
-            stats.last_lead_captured_at = datetime.utcnow()
-        elif event_type == "follow_button_clicked":
-            stats.total_follow_button_clicks += 1
-            stats.last_follow_button_clicked_at = datetime.utcnow()
-        elif event_type == "profile_visit":
-            stats.total_profile_visits += 1
-            stats.last_profile_visit_at = datetime.utcnow()
-        elif event_type == "im_following_clicked":
-            stats.total_im_following_clicks += 1
-            stats.last_im_following_clicked_at = datetime.utcnow()
-        elif event_type == "follower_gained":
-            # FIX ISSUE 3: Track follower gain count
-            if not hasattr(stats, 'total_followers_gained'):
-                # Field doesn't exist yet, skip for now (will be added via migration)
-                print(f"⚠️ total_followers_gained field not found in stats, skipping update")
-            else:
-                stats.total_followers_gained = (stats.total_followers_gained or 0) + 1
-                print(f"✅ Follower gain count incremented for rule {rule_id}")
-        
-        stats.updated_at = datetime.utcnow()
+        # Single INSERT ... ON CONFLICT (automation_rule_id) DO UPDATE (see app.db.upsert)
+        if event_type == "follower_gained" and "total_followers_gained" not in AutomationRuleStats.__table__.c:
+            # Field doesn't exist yet, skip for now (will be added via migration)
+            print(f"⚠️ total_followers_gained field not found in stats, skipping update")
+        increment_rule_stats(db, rule_id, event_type)
         db.commit()
     except Exception as e:
         print(f"⚠️ Error updating automation stats: {str(e)}")
@@ -12,7 +12,10 @@ import re
 from collections import Counter
 from typing import Optional, Tuple
 
-from email_validator import EmailNotValidError, validate_email as validate_email_rfc
+from email_validator import EmailNotValidError, ValidatedEmail, validate_email as validate_email_rfc
+
+from app.services.email_domain_cache import check_domain_deliverable, check_domain_deliverable_async
+from app.utils.domain_blocklist import DISPOSABLE, PLACEHOLDER, get_matcher
 
 
 def _email_check_deliverability() -> bool:
@@ -61,32 +64,6 @@ _LAYER3_EXACT_LOCAL_PART = frozenset(
     }
 )
 
-_LAYER4_DISPOSABLE_DOMAINS = frozenset(
-    {
-        "mailinator.com",
-        "guerrillamail.com",
-        "tempmail.com",
-        "throwam.com",
-        "yopmail.com",
-        "sharklasers.com",
-        "trashmail.com",
-        "maildrop.cc",
-        "dispostable.com",
-        "fakeinbox.com",
-        "spamgourmet.com",
-        "10minutemail.com",
-        "test.com",
-        "example.com",
-        "fake.com",
-        "demo.com",
-        "sample.com",
-        "temp.com",
-        "abc.com",
-        "xyz.com",
-    }
-)
-
-
 def _split_local_domain(raw: str) -> Optional[Tuple[str, str]]:
     s = raw.strip()
     if "@" not in s:
@@ -165,7 +142,8 @@ def _layer3_keyboard_pattern_local(local: str) -> bool:
 
 
 def _layer4_disposable_domain(domain: str) -> bool:
-    return domain.strip().lower() in _LAYER4_DISPOSABLE_DOMAINS
+    # Shared compiled blocklist: disposable providers plus placeholder domains (example.com, ...)
+    return get_matcher().matches(domain, DISPOSABLE | PLACEHOLDER)
 
 
 _GIBBERISH_MSG = "That does not look like a real email. Please enter the address you actually use."
@@ -173,28 +151,24 @@ _DISPOSABLE_MSG = "Disposable or test email addresses are not allowed. Please us
 _FORMAT_MSG = "Please enter a valid email address (check spelling and domain)."
 
 
-def validate_lead_capture_email(email: str) -> Tuple[bool, str, Optional[str]]:
+def _validate_offline(email: str) -> Tuple[Tuple[bool, str, Optional[str]], Optional[ValidatedEmail]]:
     """
-    Layered validation (no third-party HTTP APIs):
-      1) Basic format (single @, TLD dot, no spaces)
-      2) Gibberish heuristics on local part (+ repeated rare bigram)
-      3) Keyboard / throwaway local tokens
-      4) Disposable domain blocklist
-      5) RFC + optional DNS MX/A (email-validator)
+    Layers 1–4 plus RFC syntax, without DNS.
 
-    Returns: (is_valid, error_message, normalized_email_or_none)
+    Returns (result, info): info is set only when the email passed and the DNS
+    layer is still to run on info.ascii_domain / info.domain.
     """
     if not email or not email.strip():
-        return False, "Email cannot be empty.", None
+        return (False, "Email cannot be empty.", None), None
 
     raw = email.strip()
 
     if not _layer1_format_ok(raw):
-        return False, _FORMAT_MSG, None
+        return (False, _FORMAT_MSG, None), None
 
     parsed = _split_local_domain(raw)
     if not parsed:
-        return False, _FORMAT_MSG, None
+        return (False, _FORMAT_MSG, None), None
     local_raw, domain_raw = parsed
 
     if len(local_raw) < 4:
@@ -202,29 +176,64 @@ def validate_lead_capture_email(email: str) -> Tuple[bool, str, Optional[str]]:
             False,
             "Email address is too short before @. Please enter your full address.",
             None,
-        )
+        ), None
     if not re.search(r"[a-zA-Z]", local_raw):
-        return False, "Email address must contain at least one letter.", None
+        return (False, "Email address must contain at least one letter.", None), None
 
     if _layer2_gibberish_local(local_raw):
-        return False, _GIBBERISH_MSG, None
+        return (False, _GIBBERISH_MSG, None), None
 
     if _layer3_keyboard_pattern_local(local_raw):
-        return False, _GIBBERISH_MSG, None
+        return (False, _GIBBERISH_MSG, None), None
 
     if _layer4_disposable_domain(domain_raw):
-        return False, _DISPOSABLE_MSG, None
+        return (False, _DISPOSABLE_MSG, None), None
 
-    check_mx = _email_check_deliverability()
-    timeout = _email_dns_timeout_sec() if check_mx else None
     try:
-        info = validate_email_rfc(
-            raw,
-            check_deliverability=check_mx,
-            timeout=timeout,
-        )
-        normalized_lower = info.normalized.lower()
+        info = validate_email_rfc(raw, check_deliverability=False)
     except EmailNotValidError:
+        return (False, _FORMAT_MSG, None), None
+
+    return (True, "", info.normalized.lower()), info
+
+
+def validate_lead_capture_email(email: str) -> Tuple[bool, str, Optional[str]]:
+    """
+    Layered validation (no third-party HTTP APIs):
+      1) Basic format (single @, TLD dot, no spaces)
+      2) Gibberish heuristics on local part (+ repeated rare bigram)
+      3) Keyboard / throwaway local tokens
+      4) Disposable domain blocklist
+      5) RFC syntax + optional DNS MX/A (cached per domain, see email_domain_cache)
+
+    Blocks on the DNS lookup after a cache miss; async code uses
+    validate_lead_capture_email_async instead.
+
+    Returns: (is_valid, error_message, normalized_email_or_none)
+    """
+    result, info = _validate_offline(email)
+    if info is None or not _email_check_deliverability():
+        return result
+
+    # MX/A lookup through the per-domain cache (pre-seeded top providers, coalesced, hard timeout).
+    # None = lookup timed out: accept, like email-validator's "unknown deliverability".
+    deliverable = check_domain_deliverable(
+        info.ascii_domain, timeout=_email_dns_timeout_sec(), domain_i18n=info.domain
+    )
+    if deliverable is False:
         return False, _FORMAT_MSG, None
+    return result
+
 
-    return True, "", normalized_lower
+async def validate_lead_capture_email_async(email: str) -> Tuple[bool, str, Optional[str]]:
+    """Same as validate_lead_capture_email, but awaits the DNS layer instead of blocking the event loop."""
+    result, info = _validate_offline(email)
+    if info is None or not _email_check_deliverability():
+        return result
+
+    deliverable = await check_domain_deliverable_async(
+        info.ascii_domain, timeout=_email_dns_timeout_sec(), domain_i18n=info.domain
+    )
+    if deliverable is False:
+        return False, _FORMAT_MSG, None
+    return result
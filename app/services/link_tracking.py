@@ -0,0 +1,312 @@
+"""
+Short tracking links and off-request-path click logging.
+
+generate_tracking_url() stores each link once in tracked_links under a short
+code derived from its contents, so the DM carries /api/analytics/r/{code}
+instead of the target URL plus every id in a query string. Resolved links are
+immutable and kept in an in-process LRU; a cache miss is one primary-key read.
+
+The redirect handler never waits on the database for the click itself:
+record_click() appends the event to an in-memory buffer and a background
+thread writes buffered clicks every LINK_CLICK_FLUSH_SECONDS as one bulk INSERT
+into analytics_events plus one stats increment per rule. A normal exit flushes;
+a hard crash loses at most one interval of clicks.
+"""
+import atexit
+import hashlib
+import os
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.analytics_event import AnalyticsEvent, EventType
+from app.models.tracked_link import TrackedLink
+from app.services.metrics import record_cache
+
+CODE_LENGTH = 10
+_MAX_CODE_LENGTH = 16
+_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+LINK_CACHE_SIZE = int(os.getenv("TRACKED_LINK_CACHE_SIZE", "20000"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("LINK_CLICK_FLUSH_SECONDS", "2"))
+_MAX_PENDING_CLICKS = 50000  # Flush early if a burst fills the buffer
+
+
+class ResolvedLink(NamedTuple):
+    code: Optional[str]  # None for legacy query-string links
+    target_url: str
+    user_id: int
+    rule_id: Optional[int]
+    media_id: Optional[str]
+    instagram_account_id: Optional[int]
+    is_profile: bool
+
+
+def is_instagram_profile_url(url: str) -> bool:
+    u = (url or "").lower()
+    if "instagram.com" not in u:
+        return False
+    rest = u.split("instagram.com")[-1].strip("/").split("?")[0]
+    return len(rest) > 0 and "/" not in rest
+
+
+# code -> ResolvedLink, most recently used last
+_link_cache: "OrderedDict[str, ResolvedLink]" = OrderedDict()
+_link_cache_lock = threading.Lock()
+
+# (link, clicked_at) not yet written
+_pending_clicks: List[Tuple[ResolvedLink, datetime]] = []
+_pending_lock = threading.Lock()
+
+_flusher_thread: Optional[threading.Thread] = None
+_flusher_stop = threading.Event()
+_flush_now = threading.Event()
+
+
+# -- codes and the link cache ---------------------------------------------------
+
+def _make_code(target_url: str, rule_id, user_id, media_id, instagram_account_id, length: int) -> str:
+    digest = hashlib.sha256(
+        f"{target_url}\x00{rule_id}\x00{user_id}\x00{media_id}\x00{instagram_account_id}".encode()
+    ).digest()
+    n = int.from_bytes(digest, "big")
+    chars = []
+    for _ in range(length):
+        n, r = divmod(n, len(_ALPHABET))
+        chars.append(_ALPHABET[r])
+    return "".join(chars)
+
+
+def _link_from_row(row) -> ResolvedLink:
+    return ResolvedLink(
+        code=row.code,
+        target_url=row.target_url,
+        user_id=row.user_id,
+        rule_id=row.rule_id,
+        media_id=row.media_id,
+        instagram_account_id=row.instagram_account_id,
+        is_profile=is_instagram_profile_url(row.target_url),
+    )
+
+
+def cache_link(link: ResolvedLink) -> None:
+    with _link_cache_lock:
+        _link_cache[link.code] = link
+        _link_cache.move_to_end(link.code)
+        while len(_link_cache) > LINK_CACHE_SIZE:
+            _link_cache.popitem(last=False)
+
+
+def get_cached_link(code: str) -> Optional[ResolvedLink]:
+    with _link_cache_lock:
+        link = _link_cache.get(code)
+        if link is not None:
+            _link_cache.move_to_end(code)
+    record_cache("tracked_link", link is not None)
+    return link
+
+
+def _same_link(link, values: dict) -> bool:
+    return all(getattr(link, k) == v for k, v in values.items())
+
+
+def _insert_or_select(table, code: str, values: dict):
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING, unioned with a SELECT of the existing row
+    (as app.db.upsert._insert_or_select): one round-trip, and an existing link is never written.
+    """
+    ins = (
+        pg_insert(table)
+        .values(code=code, created_at=datetime.utcnow(), **values)
+        .on_conflict_do_nothing(index_elements=[table.c.code])
+        .returning(*table.c)
+        .cte("ins")
+    )
+    existing = select(*table.c).where(table.c.code == code)
+    return union_all(select(*ins.c), existing).limit(1)
+
+
+def create_tracked_link(
+    target_url: str,
+    rule_id: Optional[int],
+    user_id: int,
+    media_id: Optional[str] = None,
+    instagram_account_id: Optional[int] = None,
+) -> str:
+    """
+    Store the link (idempotent: same contents -> same code) and return its code.
+    A link already in the LRU needs no database work; otherwise one statement
+    inserts it or reads the existing row. Commits on its own connection so the
+    link exists before the DM is sent.
+    """
+    from app.db.session import engine
+
+    values = {
+        "target_url": target_url,
+        "user_id": user_id,
+        "rule_id": rule_id,
+        "media_id": media_id,
+        "instagram_account_id": instagram_account_id,
+    }
+    code = _make_code(target_url, rule_id, user_id, media_id, instagram_account_id, CODE_LENGTH)
+    cached = get_cached_link(code)
+    if cached is not None and _same_link(cached, values):
+        return code
+
+    table = TrackedLink.__table__
+    with engine.begin() as conn:
+        for length in range(CODE_LENGTH, _MAX_CODE_LENGTH + 1):
+            code = _make_code(target_url, rule_id, user_id, media_id, instagram_account_id, length)
+            row = conn.execute(_insert_or_select(table, code, values)).fetchone()
+            if row is None:
+                # Inserted by a concurrent transaction after our snapshot: neither branch saw it
+                row = conn.execute(select(table).where(table.c.code == code)).fetchone()
+            if _same_link(row, values):
+                cache_link(_link_from_row(row))
+                return code
+            # Different link already owns this prefix (hash collision): use a longer code
+    raise RuntimeError("Could not allocate a tracking link code")
+
+
+def resolve_link(code: str) -> Optional[ResolvedLink]:
+    """Link for code from the LRU, else one primary-key read (result cached)."""
+    link = get_cached_link(code)
+    if link is not None:
+        return link
+    if not code or len(code) > _MAX_CODE_LENGTH:
+        return None
+
+    from app.db.session import engine
+
+    table = TrackedLink.__table__
+    with engine.connect() as conn:
+        row = conn.execute(select(table).where(table.c.code == code)).fetchone()
+    if row is None:
+        return None
+    link = _link_from_row(row)
+    cache_link(link)
+    return link
+
+
+# -- click buffering ----------------------------------------------------------------
+
+def record_click(link: ResolvedLink, clicked_at: Optional[datetime] = None) -> None:
+    """Queue a click for the background writer; never touches the database."""
+    with _pending_lock:
+        if len(_pending_clicks) >= _MAX_PENDING_CLICKS:
+            del _pending_clicks[: _MAX_PENDING_CLICKS // 10]  # DB down for a long time: drop the oldest
+        _pending_clicks.append((link, clicked_at or datetime.utcnow()))
+        pending = len(_pending_clicks)
+    _ensure_flusher_started()
+    if pending >= _MAX_PENDING_CLICKS // 2:
+        _flush_now.set()
+
+
+def _event_row(link: ResolvedLink, clicked_at: datetime) -> dict:
+    metadata = {"url": link.target_url, "clicked_at": clicked_at.isoformat()}
+    if link.is_profile:
+        metadata["source"] = "visit_profile_button"
+    if link.code:
+        metadata["short_code"] = link.code
+    return {
+        "user_id": link.user_id,
+        "rule_id": link.rule_id,
+        "instagram_account_id": link.instagram_account_id,
+        "media_id": link.media_id,
+        "event_type": EventType.PROFILE_VISIT if link.is_profile else EventType.LINK_CLICKED,
+        "event_metadata": metadata,
+        "created_at": clicked_at,
+    }
+
+
+def _write_clicks(db, clicks: List[Tuple[ResolvedLink, datetime]]) -> None:
+    from app.db.upsert import increment_rule_stats
+
+    db.execute(insert(AnalyticsEvent.__table__), [_event_row(link, at) for link, at in clicks])
+    profile_visits = Counter(link.rule_id for link, _ in clicks if link.is_profile and link.rule_id)
+    for rule_id, count in profile_visits.items():
+        increment_rule_stats(db, rule_id, "profile_visit", amount=count)
+
+
+def flush_link_clicks() -> int:
+    """
+    Write all buffered clicks. Returns the number written. If the batch fails
+    (e.g. a rule was deleted in the meantime) clicks are retried one by one and
+    the ones that still fail are dropped, so one bad row can't block the rest.
+    """
+    with _pending_lock:
+        if not _pending_clicks:
+            return 0
+        batch = list(_pending_clicks)
+        _pending_clicks.clear()
+
+    from app.db.session import SessionLocal
+
+    written = 0
+    db = SessionLocal()
+    try:
+        try:
+            _write_clicks(db, batch)
+            db.commit()
+            written = len(batch)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Failed to write {len(batch)} link clicks as a batch, retrying individually: {str(e)}")
+            for click in batch:
+                try:
+                    _write_clicks(db, [click])
+                    db.commit()
+                    written += 1
+                except Exception as row_error:
+                    db.rollback()
+                    print(f"⚠️ Dropping link click for rule_id={click[0].rule_id}: {str(row_error)}")
+    finally:
+        db.close()
+
+    if written:
+        try:
+            from app.api.routes.analytics import invalidate_analytics_cache_for_user
+            for user_id in {link.user_id for link, _ in batch}:
+                invalidate_analytics_cache_for_user(user_id)
+        except ImportError:
+            pass
+    return written
+
+
+def _flush_loop() -> None:
+    while not _flusher_stop.is_set():
+        _flush_now.wait(FLUSH_INTERVAL_SECONDS)
+        _flush_now.clear()
+        try:
+            flush_link_clicks()
+        except Exception as e:
+            print(f"⚠️ Link click flush failed: {str(e)}")
+
+
+def _ensure_flusher_started() -> None:
+    global _flusher_thread
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+    with _pending_lock:
+        if _flusher_thread is not None and _flusher_thread.is_alive():
+            return
+        _flusher_stop.clear()
+        _flusher_thread = threading.Thread(target=_flush_loop, name="link-click-flusher", daemon=True)
+        _flusher_thread.start()
+
+
+def stop_link_click_flusher() -> None:
+    """Stop the background flusher and write whatever is still pending."""
+    _flusher_stop.set()
+    _flush_now.set()
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        _flusher_thread.join(timeout=5)
+    if _pending_clicks:
+        flush_link_clicks()
+
+
+atexit.register(stop_link_click_flusher)
@@ -0,0 +1,206 @@
+"""
+URL -> media metadata (content type, size, checksum) for DM attachments.
+
+send_dm needs to know whether an attachment URL is an image, video or audio.
+For extensionless URLs it used to issue a blocking HEAD on every send, so a
+campaign sending one video to 10k people made 10k HEAD requests. The registry
+answers from an in-process LRU instead:
+
+- our own uploads (an /uploads/ path on one of our public hosts, see
+  _own_hosts) are registered when they are uploaded (see upload_dm_media);
+  on another process the first lookup reads the media_refs/media_assets row
+  (or, for uploads older than media_refs, the file's magic bytes on disk),
+  then it is cached. A miss is cached too.
+- external URLs get one background HEAD per URL, on a small pool, started
+  when an automation rule referencing them is saved (warm_rule_media) or on
+  the first lookup. send_dm never waits for it: until the answer is cached it
+  falls back to the URL's extension. A failed HEAD is retried at most every
+  MEDIA_REGISTRY_RETRY_SECONDS.
+
+So a campaign sending one URL to 10k people never waits on the network.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Set
+from urllib.parse import urlparse
+
+CACHE_SIZE = int(os.getenv("MEDIA_REGISTRY_CACHE_SIZE", "5000"))
+RETRY_SECONDS = int(os.getenv("MEDIA_REGISTRY_RETRY_SECONDS", "600"))
+_HEAD_TIMEOUT_SECONDS = float(os.getenv("MEDIA_REGISTRY_HEAD_TIMEOUT_SECONDS", "5"))
+_OWN_MEDIA_PREFIX = "/uploads/"
+# Every base URL upload URLs have been built from (see upload._public_base_url)
+_OWN_HOST_ENV_VARS = ("MEDIA_PUBLIC_URL", "API_PUBLIC_URL", "BASE_URL", "NEXT_PUBLIC_API_URL")
+# Automation config keys holding DM attachment URLs (see upload_dm_media)
+_RULE_MEDIA_KEYS = ("dm_media_url", "dm_voice_message_url")
+
+
+class MediaInfo(NamedTuple):
+    content_type: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+# url -> MediaInfo, most recently used last
+_registry: "OrderedDict[str, MediaInfo]" = OrderedDict()
+_registry_lock = threading.Lock()
+_resolving: Dict[str, Future] = {}  # url -> in-flight HEAD
+_failed_until: Dict[str, float] = {}  # url -> monotonic time before which we don't look it up again
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="media-registry")
+
+
+def media_kind(content_type: Optional[str]) -> Optional[str]:
+    """Instagram attachment type ("image" / "video" / "audio") for a MIME type."""
+    ct = (content_type or "").lower()
+    if ct.startswith("video/"):
+        return "video"
+    if ct.startswith("audio/"):
+        return "audio"
+    if ct.startswith("image/"):
+        return "image"
+    return None
+
+
+def register_media(url: str, info: MediaInfo) -> None:
+    with _registry_lock:
+        _registry[url] = info
+        _registry.move_to_end(url)
+        while len(_registry) > CACHE_SIZE:
+            _registry.popitem(last=False)
+
+
+def get_cached_media(url: str) -> Optional[MediaInfo]:
+    with _registry_lock:
+        info = _registry.get(url)
+        if info is not None:
+            _registry.move_to_end(url)
+        return info
+
+
+def _own_hosts() -> Set[str]:
+    hosts = set()
+    for name in _OWN_HOST_ENV_VARS:
+        host = urlparse(os.getenv(name, "")).netloc.lower()
+        if host:
+            hosts.add(host)
+    return hosts
+
+
+def is_own_media_url(url: str) -> bool:
+    """True for URLs served from our /uploads mount on one of our public hosts."""
+    parsed = urlparse(url)
+    return (parsed.path or "").startswith(_OWN_MEDIA_PREFIX) and parsed.netloc.lower() in _own_hosts()
+
+
+def _recently_failed(url: str) -> bool:
+    return _failed_until.get(url, 0) > time.monotonic()
+
+
+def _mark_failed(url: str) -> None:
+    with _registry_lock:
+        if len(_failed_until) >= CACHE_SIZE:
+            _failed_until.clear()
+        _failed_until[url] = time.monotonic() + RETRY_SECONDS
+
+
+def _sniff_local_file(path: str) -> Optional[MediaInfo]:
+    from app.services.media_store import UPLOADS_ROOT, SNIFF_BYTES, sniff_content_type
+
+    local = (UPLOADS_ROOT.parent / path.lstrip("/")).resolve()
+    if not (local.is_relative_to(UPLOADS_ROOT.resolve()) and local.is_file()):
+        return None
+    with open(local, "rb") as f:
+        content_type = sniff_content_type(f.read(SNIFF_BYTES))
+    return MediaInfo(content_type, local.stat().st_size) if content_type else None
+
+
+def _lookup_own_upload(path: str) -> Optional[MediaInfo]:
+    """Metadata for one of our uploads: the media_refs row, else magic bytes of the file on local disk (older uploads)."""
+    try:
+        from app.db.session import SessionLocal
+        from app.models.media_asset import MediaAsset, MediaRef
+
+        db = SessionLocal()
+        try:
+            row = (
+                db.query(MediaAsset.content_type, MediaAsset.size_bytes, MediaAsset.sha256)
+                .join(MediaRef, MediaRef.sha256 == MediaAsset.sha256)
+                .filter(MediaRef.public_path == path.lstrip("/"))
+                .first()
+            )
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"⚠️ [MEDIA REGISTRY] Lookup failed for {path}: {str(e)}")
+        row = None
+    if row:
+        return MediaInfo(row[0], row[1], row[2])
+    return _sniff_local_file(path)
+
+
+def _resolve_external(url: str) -> Optional[MediaInfo]:
+    import requests
+
+    try:
+        resp = requests.head(url, allow_redirects=True, timeout=_HEAD_TIMEOUT_SECONDS)
+        content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        size = resp.headers.get("Content-Length")
+        if resp.status_code < 400 and content_type:
+            info = MediaInfo(content_type, int(size) if size and size.isdigit() else None)
+            register_media(url, info)
+            print(f"✅ [MEDIA REGISTRY] {url[:80]} -> {content_type}")
+            return info
+        print(f"⚠️ [MEDIA REGISTRY] HEAD {url[:80]} returned {resp.status_code} without a usable Content-Type")
+    except Exception as e:
+        print(f"⚠️ [MEDIA REGISTRY] HEAD failed for {url[:80]}: {str(e)}")
+    finally:
+        with _registry_lock:
+            _resolving.pop(url, None)
+    _mark_failed(url)
+    return None
+
+
+def _lookup_own(url: str) -> Optional[MediaInfo]:
+    if _recently_failed(url):
+        return None
+    info = _lookup_own_upload(urlparse(url).path)
+    if info is not None:
+        register_media(url, info)
+    else:
+        _mark_failed(url)
+    return info
+
+
+def _start_resolve(url: str) -> Optional[Future]:
+    """The in-flight HEAD for url, starting one unless it failed recently."""
+    with _registry_lock:
+        future = _resolving.get(url)
+        if future is None and not _recently_failed(url):
+            # Submitted under the lock: the worker can't remove it before it is stored
+            future = _executor.submit(_resolve_external, url)
+            _resolving[url] = future
+        return future
+
+
+def lookup_media(url: str) -> Optional[MediaInfo]:
+    """
+    Cached metadata for url, or None when unknown. Never blocks on the network:
+    own uploads are resolved from disk / DB, external URLs in the background.
+    """
+    info = get_cached_media(url)
+    if info is not None:
+        return info
+    if is_own_media_url(url):
+        return _lookup_own(url)
+    _start_resolve(url)
+    return None
+
+
+def warm_rule_media(config: Optional[dict]) -> None:
+    """Start resolving an automation rule's attachment URLs when it is saved, so sends find them cached."""
+    for key in _RULE_MEDIA_KEYS:
+        url = str((config or {}).get(key) or "").strip()
+        if url:
+            lookup_media(url)
@@ -0,0 +1,173 @@
+"""
+Content-addressed storage for DM media uploads.
+
+Uploads are streamed to a temp file in chunks on a small thread pool (never on
+the event loop), hashed while they stream, then moved to
+
+    uploads/dm-media/blobs/{sha256[:2]}/{sha256}{ext}
+
+so identical media is stored once however often it is uploaded. Each user gets
+a reference at uploads/dm-media/{user_id}/{sha256}{ext} (a hard link to the
+blob, so the existing /uploads static mount serves it and deleting a user's
+directory never breaks another user's media), recorded in media_refs. The MIME
+type is sniffed from the file's first bytes and stored in media_assets together
+with size and checksum, so later sends don't have to work it out again.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.media_asset import MediaAsset, MediaRef
+
+UPLOADS_ROOT = Path(__file__).resolve().parent.parent.parent / "uploads"
+MEDIA_DIR = UPLOADS_ROOT / "dm-media"
+BLOB_DIR = MEDIA_DIR / "blobs"
+_TMP_DIR = BLOB_DIR / "tmp"
+
+SNIFF_BYTES = 64
+_POOL_SIZE = int(os.getenv("MEDIA_UPLOAD_POOL_SIZE", "4"))
+_executor = ThreadPoolExecutor(max_workers=_POOL_SIZE, thread_name_prefix="media-upload")
+
+EXTENSIONS: Dict[str, str] = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "video/mp4": ".mp4",
+    "video/quicktime": ".mov",
+    "video/webm": ".webm",
+    "audio/mpeg": ".mp3",
+    "audio/mp3": ".mp3",
+    "audio/mp4": ".m4a",
+    "audio/x-m4a": ".m4a",
+    "audio/ogg": ".ogg",
+    "audio/wav": ".wav",
+    "audio/webm": ".webm",
+}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    return _executor
+
+
+def sniff_content_type(head: bytes, declared: str = "") -> Optional[str]:
+    """MIME type from magic bytes, or None when the format isn't recognised."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand in (b"M4A ", b"M4B "):
+            return "audio/mp4"
+        return "audio/mp4" if declared.startswith("audio/") else "video/mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "audio/webm" if declared.startswith("audio/") else "video/webm"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "audio/mpeg"
+    return None
+
+
+class StoredMedia(NamedTuple):
+    sha256: str
+    size: int
+    content_type: str
+    public_path: str  # relative to the site root, e.g. uploads/dm-media/7/ab12....mp4
+
+
+class MediaUploadWriter:
+    """Temp file + running sha256. write() is meant to run on the upload thread pool."""
+
+    def __init__(self):
+        _TMP_DIR.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=_TMP_DIR, prefix=f"{uuid.uuid4().hex}_")
+        self._file = os.fdopen(fd, "wb")
+        self.tmp_path = Path(path)
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+
+    def write(self, data: bytes) -> None:
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[: SNIFF_BYTES - len(self.head)]
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def abort(self) -> None:
+        try:
+            self._file.close()
+        finally:
+            self.tmp_path.unlink(missing_ok=True)
+
+    def commit(self, db, user_id: int, content_type: str, original_filename: Optional[str]) -> StoredMedia:
+        """Move the temp file into place (or drop it if the blob exists), link it for the user, record it."""
+        self._file.close()
+        sha = self._hash.hexdigest()
+        ext = EXTENSIONS.get(content_type, "")
+        blob_path = BLOB_DIR / sha[:2] / f"{sha}{ext}"
+        try:
+            if blob_path.exists():
+                self.tmp_path.unlink(missing_ok=True)  # Same bytes already stored
+            else:
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(self.tmp_path, blob_path)
+            public_path = _link_user_ref(user_id, blob_path)
+        except Exception:
+            self.tmp_path.unlink(missing_ok=True)
+            raise
+
+        now = datetime.utcnow()
+        db.execute(
+            insert(MediaAsset).values(
+                sha256=sha,
+                content_type=content_type,
+                size_bytes=self.size,
+                storage_path=str(blob_path.relative_to(UPLOADS_ROOT)),
+                created_at=now,
+            ).on_conflict_do_nothing(index_elements=[MediaAsset.sha256])
+        )
+        db.execute(
+            insert(MediaRef).values(
+                user_id=user_id,
+                sha256=sha,
+                public_path=public_path,
+                original_filename=original_filename,
+                created_at=now,
+            ).on_conflict_do_nothing(index_elements=[MediaRef.user_id, MediaRef.sha256])
+        )
+        db.commit()
+        return StoredMedia(sha, self.size, content_type, public_path)
+
+
+def _link_user_ref(user_id: int, blob_path: Path) -> str:
+    """Hard-link the blob into the user's directory (copy if the filesystem can't link)."""
+    user_dir = MEDIA_DIR / str(user_id)
+    user_dir.mkdir(parents=True, exist_ok=True)
+    ref_path = user_dir / blob_path.name
+    if not ref_path.exists():
+        try:
+            os.link(blob_path, ref_path)
+        except FileExistsError:
+            pass  # Concurrent upload of the same file by the same user
+        except OSError:
+            shutil.copyfile(blob_path, ref_path)
+    return str(ref_path.relative_to(UPLOADS_ROOT.parent))
@@ -0,0 +1,120 @@
+"""
+Thread reads keyed by conversation_id.
+
+GET /conversations/{username}/messages has to find the conversation first
+(participant id, "Unknown" names, username matching) and falls back to
+sender/recipient OR scans over messages for rows that were never linked to a
+conversation, paging with OFFSET. The by-id endpoint skips all of that:
+
+- read_thread_page(): ORDER BY created_at DESC, id DESC with a (created_at, id)
+  keyset cursor, served by ix_messages_conversation_created_id (alembic 022),
+  so every page is one index range scan of `limit` entries however long the
+  thread is.
+- Messages stored without conversation_id (before conversations existed, or
+  by old code paths) are linked in batches by link_unlinked_messages(). Reads
+  call ensure_messages_linked(), which does that once per account per process;
+  the partial index ix_messages_unlinked makes the check free afterwards.
+"""
+import threading
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.message import Message
+
+LINK_BATCH_SIZE = 5000
+
+# Accounts whose unlinked messages were already linked by this process
+_linked_accounts: Set[int] = set()
+_linked_lock = threading.Lock()
+
+_UNLINKED_BATCH = text("""
+    SELECT id FROM messages
+    WHERE instagram_account_id = :account_id AND conversation_id IS NULL AND id > :after_id
+    ORDER BY id
+    LIMIT :batch_size
+""")
+
+# The participant is the recipient of our messages and the sender of theirs
+_LINK_BATCH = text("""
+    UPDATE messages m SET conversation_id = c.id
+    FROM conversations c
+    WHERE m.id = ANY(:ids)
+      AND c.instagram_account_id = m.instagram_account_id
+      AND c.user_id = m.user_id
+      AND c.participant_id = CASE WHEN m.is_from_bot THEN m.recipient_id ELSE m.sender_id END
+""")
+
+
+def link_unlinked_messages(db: Session, account_id: int, batch_size: int = LINK_BATCH_SIZE) -> int:
+    """
+    Set conversation_id on the account's unlinked messages, batch_size rows per
+    UPDATE. Messages with no matching conversation are left as they are.
+    Does not commit. Returns the number of messages linked.
+    """
+    linked, after_id = 0, 0
+    while True:
+        ids = [row[0] for row in db.execute(
+            _UNLINKED_BATCH, {"account_id": account_id, "after_id": after_id, "batch_size": batch_size}
+        )]
+        if not ids:
+            return linked
+        linked += db.execute(_LINK_BATCH, {"ids": ids}).rowcount
+        if len(ids) < batch_size:
+            return linked
+        after_id = ids[-1]
+
+
+def ensure_messages_linked(db: Session, account_id: int) -> int:
+    """
+    Link the account's unlinked messages once per process (commits if anything
+    was linked, and rebuilds the inbox counters whose unread depends on links).
+    Never fails the read that calls it. Returns the number of messages linked.
+    """
+    with _linked_lock:
+        if account_id in _linked_accounts:
+            return 0
+    try:
+        linked = link_unlinked_messages(db, account_id)
+        if linked:
+            from app.services.inbox_counters import reconcile_inbox_counters
+            reconcile_inbox_counters(db, account_id)
+            db.commit()
+            print(f"🔗 Linked {linked} message(s) to their conversations for account {account_id}")
+    except Exception as e:
+        print(f"⚠️ Linking messages for account {account_id} failed: {str(e)}")
+        db.rollback()
+        return 0
+    with _linked_lock:
+        _linked_accounts.add(account_id)
+    return linked
+
+
+def make_cursor(message) -> str:
+    """Opaque "load older" cursor pointing just below message."""
+    return f"{message.created_at.isoformat()}_{message.id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) from make_cursor(); raises ValueError for anything else."""
+    created_at, _, message_id = cursor.rpartition("_")
+    return datetime.fromisoformat(created_at), int(message_id)
+
+
+def read_thread_page(
+    db: Session,
+    conversation_id: int,
+    limit: int,
+    before: Optional[Tuple] = None,
+) -> Tuple[List[Message], bool]:
+    """
+    Newest-first page of a conversation's messages strictly older than the
+    (created_at, id) cursor `before`. Returns (messages oldest first, has_more).
+    """
+    query = db.query(Message).filter(Message.conversation_id == conversation_id)
+    if before is not None:
+        query = query.filter(tuple_(Message.created_at, Message.id) < tuple_(*before))
+    raw = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+    return list(reversed(raw[:limit])), len(raw) > limit
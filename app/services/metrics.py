@@ -0,0 +1,282 @@
+"""
+Prometheus metrics, exposed at GET /metrics.
+
+What is measured (metric names as scraped):
+
+- webhook_ack_seconds{source}: receipt to response of POST /api/instagram/webhook
+  and POST /webhooks/dodo
+- webhook_stage_seconds{stage}: account_resolve, rule_match, pre_dm, send
+- graph_api_request_seconds{endpoint} and graph_api_errors_total{endpoint, kind}:
+  every HTTP call made by app.utils.instagram_api (error rate = errors / count)
+- http_request_seconds, db_queries_per_request and db_query_seconds_per_request,
+  all by {route, method} (route is the path template, e.g. /api/analytics/media/{media_id})
+- background_tasks_active{kind} and background_task_seconds{kind, outcome}:
+  automation actions and invoice syncs started with asyncio.create_task
+- delayed_actions_pending{kind}: actions sleeping until their scheduled send
+- cache_requests_total{cache, result}: hits and misses of the in-memory caches
+  (hit ratio = hit / (hit + miss))
+
+Several workers (uvicorn --workers, gunicorn): set PROMETHEUS_MULTIPROC_DIR to
+an empty, writable directory before the server starts and clear it on every
+deploy. Each process then writes its samples there and /metrics aggregates
+all of them, whichever worker answers. Without it, /metrics reports only the
+answering process, which is exact for a single uvicorn process.
+
+Set METRICS_TOKEN to require `Authorization: Bearer <token>` on /metrics.
+If prometheus_client isn't installed, every helper is a no-op and /metrics
+answers 503, so instrumentation never breaks a request.
+"""
+import asyncio
+import functools
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # pragma: no cover - exercised only without the package
+    prometheus_client = None
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_TASK_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+_QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value) -> None:
+        pass
+
+    def inc(self, amount=1) -> None:
+        pass
+
+    def dec(self, amount=1) -> None:
+        pass
+
+
+def _histogram(name: str, documentation: str, labels, buckets=_LATENCY_BUCKETS):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _counter(name: str, documentation: str, labels):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Counter(name, documentation, labels)
+
+
+def _gauge(name: str, documentation: str, labels):
+    if prometheus_client is None:
+        return _NoopMetric()
+    # livesum: sum over running processes, dead workers drop out
+    return Gauge(name, documentation, labels, multiprocess_mode="livesum")
+
+
+WEBHOOK_ACK_SECONDS = _histogram("webhook_ack_seconds", "Webhook receipt to response", ["source"])
+WEBHOOK_STAGE_SECONDS = _histogram("webhook_stage_seconds", "Webhook processing time per stage", ["stage"])
+GRAPH_API_SECONDS = _histogram("graph_api_request_seconds", "Instagram Graph API call latency", ["endpoint"])
+GRAPH_API_ERRORS = _counter("graph_api_errors", "Failed Instagram Graph API calls", ["endpoint", "kind"])
+HTTP_REQUEST_SECONDS = _histogram("http_request_seconds", "Request latency", ["route", "method"])
+DB_QUERIES_PER_REQUEST = _histogram(
+    "db_queries_per_request", "SQL statements run by one request", ["route", "method"], buckets=_QUERY_COUNT_BUCKETS
+)
+DB_SECONDS_PER_REQUEST = _histogram("db_query_seconds_per_request", "Time in SQL statements per request", ["route", "method"])
+BACKGROUND_TASKS = _gauge("background_tasks_active", "Background tasks running", ["kind"])
+BACKGROUND_TASK_SECONDS = _histogram(
+    "background_task_seconds", "Background task duration", ["kind", "outcome"], buckets=_TASK_BUCKETS
+)
+DELAYED_ACTIONS = _gauge("delayed_actions_pending", "Actions waiting for their scheduled send", ["kind"])
+CACHE_REQUESTS = _counter("cache_requests", "In-memory cache lookups", ["cache", "result"])
+
+# [statement count, seconds] of the current request (None outside requests)
+_request_db: ContextVar[Optional[List[float]]] = ContextVar("request_db", default=None)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Time a block as one webhook processing stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        WEBHOOK_STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def observe_stage_since(stage: str, started: float) -> None:
+    """Record a stage that began at time.perf_counter() value `started` (for inline blocks)."""
+    WEBHOOK_STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+
+def timed_stage(stage: str):
+    """Decorator form of observe_stage for sync and async functions."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with observe_stage(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with observe_stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_graph_call(endpoint: str, started: float, status_code: Optional[int] = None, error: Optional[Exception] = None) -> None:
+    """Record one Graph API HTTP call: latency, plus an error if it raised or wasn't a 2xx."""
+    GRAPH_API_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+    if error is not None:
+        GRAPH_API_ERRORS.labels(endpoint, type(error).__name__).inc()
+    elif status_code is None or not 200 <= status_code < 300:
+        GRAPH_API_ERRORS.labels(endpoint, f"http_{status_code}").inc()
+
+
+def background_task(kind: str):
+    """Decorator for coroutines run with asyncio.create_task: active gauge plus duration by outcome."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            BACKGROUND_TASKS.labels(kind).inc()
+            started, outcome = time.perf_counter(), "error"
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                BACKGROUND_TASKS.labels(kind).dec()
+                BACKGROUND_TASK_SECONDS.labels(kind, outcome).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def delayed_action(kind: str):
+    """Count an action as pending while it waits (wrap the sleep before a scheduled send)."""
+    DELAYED_ACTIONS.labels(kind).inc()
+    try:
+        yield
+    finally:
+        DELAYED_ACTIONS.labels(kind).dec()
+
+
+# -- database -----------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    totals = _request_db.get()
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += elapsed
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; count it here
+    conn = context.connection
+    if conn is not None:
+        _after_cursor_execute(conn, None, None, None, None, False)
+
+
+def install_db_metrics(engine) -> None:
+    """Count statements and their time per request (read by MetricsMiddleware)."""
+    from sqlalchemy import event
+
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+# -- ASGI -----------------------------------------------------------------------------
+
+def route_label(scope) -> str:
+    """
+    Path template of the matched route, e.g. /api/analytics/media/{media_id}.
+    Included routers only know their own part of the template, so the prefix
+    is taken from the request path (same number of leading segments).
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    if ":path}" in template:
+        return template  # Segment counts don't line up; keep cardinality bounded
+    parts = scope.get("path", "").split("/")
+    depth = template.count("/")
+    prefix = "/".join(parts[:len(parts) - depth]) if depth < len(parts) else ""
+    return prefix + template
+
+
+class MetricsMiddleware:
+    """
+    Per-request latency and DB usage by route template. Pure ASGI (not
+    BaseHTTPMiddleware) so streaming responses (SSE inbox) pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        totals = [0, 0.0]
+        token = _request_db.set(totals)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_db.reset(token)
+            route = route_label(scope)
+            method = scope.get("method", "")
+            HTTP_REQUEST_SECONDS.labels(route, method).observe(time.perf_counter() - started)
+            DB_QUERIES_PER_REQUEST.labels(route, method).observe(totals[0])
+            DB_SECONDS_PER_REQUEST.labels(route, method).observe(totals[1])
+
+
+def _registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+async def metrics_endpoint(request):
+    """GET /metrics in the Prometheus text format."""
+    from starlette.responses import PlainTextResponse, Response
+
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "")
+        if not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+            return PlainTextResponse("Unauthorized", status_code=401)
+    if prometheus_client is None:
+        return PlainTextResponse("prometheus_client is not installed", status_code=503)
+    return Response(
+        prometheus_client.generate_latest(_registry()),
+        media_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
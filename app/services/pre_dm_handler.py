@@ -10,7 +10,8 @@ from app.models.automation_rule import AutomationRule
 from app.models.captured_lead import CapturedLead
 from app.models.instagram_account import InstagramAccount
 from app.models.follower import Follower
-from app.services.lead_capture import validate_email, validate_phone, update_automation_stats
+from app.services.lead_capture import validate_email_async, validate_phone, update_automation_stats
+from app.services.metrics import timed_stage
 from app.utils.disposable_email import is_disposable_email
 
 
@@ -251,7 +252,7 @@ def is_follow_me_intent(message_text: str) -> bool:
     return False
 
 
-def check_if_email_response(message_text: str) -> Tuple[bool, Optional[str]]:
+async def check_if_email_response(message_text: str) -> Tuple[bool, Optional[str]]:
     """
     Check if a message text looks like an email address.
     Returns: (is_email: bool, email_address: str | None)
@@ -269,13 +270,14 @@ def check_if_email_response(message_text: str) -> Tuple[bool, Optional[str]]:
     if matches:
         # Validate the first email found
         email = matches[0]
-        is_valid, _, normalized = validate_email(email)
+        is_valid, _, normalized = await validate_email_async(email)
         if is_valid and normalized:
             return True, normalized
     
     return False, None
 
 
+@timed_stage("pre_dm")
 async def process_pre_dm_actions(
     rule: AutomationRule,
     sender_id: str,
@@ -454,7 +456,7 @@ async def process_pre_dm_actions(
         # We already sent the first message; this is a reply (comment or DM)
         if state.get("follow_request_sent") or state.get("email_request_sent"):
             if incoming_message:
-                is_email, email_address = check_if_email_response(incoming_message)
+                is_email, email_address = await check_if_email_response(incoming_message)
                 if is_email:
                     # Reject disposable/temp domains (same blocklist as sign-up)
                     if is_disposable_email(email_address):
@@ -643,7 +645,7 @@ async def process_pre_dm_actions(
         if state.get("follow_request_sent") or state.get("phone_request_sent"):
             if incoming_message:
                 # Reject email when we asked for phone: do not accept email as valid
-                is_email_like, _ = check_if_email_response(incoming_message)
+                is_email_like, _ = await check_if_email_response(incoming_message)
                 if is_email_like:
                     print(f"⚠️ [PHONE FLOW] User sent email while we asked for phone — rejecting, asking for phone again")
                     return {
@@ -1176,7 +1178,7 @@ async def process_pre_dm_actions(
             }
         
         # For DM triggers, check if it's an email
-        is_email, email_address = check_if_email_response(incoming_message)
+        is_email, email_address = await check_if_email_response(incoming_message)
         if is_email:
             # Reject disposable/temp domains (same blocklist as sign-up)
             if is_disposable_email(email_address):
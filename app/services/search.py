@@ -0,0 +1,254 @@
+"""
+Search over DM messages (per Instagram account) and captured leads (per user).
+
+Both searches use the search_vector generated columns and indexes from
+alembic 023 and return results in two relevance tiers, newest first within
+each tier:
+
+1. "exact": every word of the query appears (websearch syntax, so "quoted
+   phrases", OR and -exclusions work), via the GIN index on search_vector
+2. "partial": not an exact match, but every word is a prefix of a word in the
+   text or, when pg_trgm is installed, the query is a substring of the text
+   (emails, phone fragments, partial usernames), via the trigram GIN index
+
+Pagination is keyset: the cursor is (tier, timestamp, id) of the last row
+returned, so page N costs the same as page 1.
+
+The planner can't be trusted to choose between walking the owner's recency
+index and intersecting GIN posting lists: words it has no statistics for
+(absent, rare, new) get a flat estimate, and walking a million rows for a
+word that isn't there takes hundreds of milliseconds. So each tier picks its
+plan from what it sees in the newest rows (_tier_rows):
+
+- newest WINDOW_ROWS rows: enough matches there covers common words
+- some matches but not enough: walk up to MAX_WALK_ROWS newest rows
+- no matches (or still short): every match through the GIN index, which is
+  cheap exactly because the word is rare
+
+That keeps lookups in the low milliseconds on accounts with millions of
+messages (see scripts/bench_search.py).
+"""
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+SEARCH_CONFIG = "simple"
+MIN_QUERY_CHARS = 2
+MAX_QUERY_CHARS = 200
+_PREVIEW_CHARS = 300
+WINDOW_ROWS = 2000  # newest rows scanned before anything else
+MAX_WALK_ROWS = 50000  # cap on the recency walk when the window found some matches
+_TIERS = ("exact", "partial")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Expressions must match the generated columns / trigram indexes in alembic 023
+_MESSAGE_TEXT = "coalesce(m.message_text, m.content, '')"
+_LEAD_TEXT = "coalesce(l.name, '') || ' ' || coalesce(l.email, '') || ' ' || coalesce(l.phone, '')"
+
+_trgm_available: Optional[bool] = None
+_trgm_lock = threading.Lock()
+
+
+class InvalidSearch(ValueError):
+    """Query or cursor that can't be searched (shown to the client as a 400)."""
+
+
+@dataclass
+class SearchQuery:
+    q: str
+    prefix: str  # to_tsquery input: word1:* & word2:*
+    pattern: str  # ILIKE pattern for the substring match
+
+
+def parse_query(q: Optional[str]) -> SearchQuery:
+    q = (q or "").strip()[:MAX_QUERY_CHARS]
+    words = _WORD_RE.findall(q.lower())
+    if len(q) < MIN_QUERY_CHARS or not words:
+        raise InvalidSearch(f"Search needs at least {MIN_QUERY_CHARS} characters including a letter or digit")
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return SearchQuery(q=q, prefix=" & ".join(f"{word}:*" for word in words), pattern=f"%{escaped}%")
+
+
+def encode_cursor(tier: str, at: datetime, row_id: int) -> str:
+    return f"{tier}_{at.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        tier, rest = cursor.split("_", 1)
+        at, _, row_id = rest.rpartition("_")
+        if tier not in _TIERS:
+            raise ValueError(tier)
+        return tier, datetime.fromisoformat(at), int(row_id)
+    except ValueError:
+        raise InvalidSearch("Invalid cursor")
+
+
+def trigram_available(db: Session) -> bool:
+    """Whether pg_trgm is installed (checked once per process)."""
+    global _trgm_available
+    if _trgm_available is None:
+        with _trgm_lock:
+            if _trgm_available is None:
+                _trgm_available = db.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).scalar() is not None
+    return _trgm_available
+
+
+def _match_sql(tier: str, text_expr: str, alias: str, use_trgm: bool) -> str:
+    exact = f"{alias}.search_vector @@ websearch_to_tsquery('{SEARCH_CONFIG}', :q)"
+    if tier == "exact":
+        return exact
+    partial = f"{alias}.search_vector @@ to_tsquery('{SEARCH_CONFIG}', :prefix)"
+    if use_trgm:
+        partial = f"({partial} OR ({text_expr}) ILIKE :pattern)"
+    return f"{partial} AND NOT ({exact})"
+
+
+def _window_sql(columns: str, table: str, alias: str, ts_column: str, where: str, match: str) -> str:
+    order = f"ORDER BY {alias}.{ts_column} DESC, {alias}.id DESC"
+    return (
+        f"SELECT {columns} FROM (SELECT {alias}.* FROM {table} {alias} WHERE {where} {order} LIMIT :window) {alias} "
+        f"WHERE {match} {order} LIMIT :need"
+    )
+
+
+def _index_sql(columns: str, table: str, alias: str, ts_column: str, where: str, match: str) -> str:
+    return (
+        f"WITH hits AS MATERIALIZED (SELECT {columns} FROM {table} {alias} WHERE {where} AND {match}) "
+        f"SELECT * FROM hits ORDER BY {ts_column} DESC, id DESC LIMIT :need"
+    )
+
+
+def _tier_rows(db: Session, sql_args: Tuple, params: Dict, need: int) -> List[Dict]:
+    """
+    Up to `need` rows of one tier, newest first. Scans the newest WINDOW_ROWS
+    rows first; if some matched, up to MAX_WALK_ROWS; if that still isn't
+    enough (or nothing matched), collects every match through the GIN index.
+    """
+    params = dict(params, need=need)
+    rows = list(db.execute(text(_window_sql(*sql_args)), dict(params, window=WINDOW_ROWS)).mappings())
+    if len(rows) == need:
+        return rows
+    if rows:
+        rows = list(db.execute(text(_window_sql(*sql_args)), dict(params, window=MAX_WALK_ROWS)).mappings())
+        if len(rows) == need:
+            return rows
+    return list(db.execute(text(_index_sql(*sql_args)), params).mappings())
+
+
+def _search(
+    db: Session,
+    columns: str,
+    table: str,
+    alias: str,
+    owner_sql: str,
+    ts_column: str,
+    text_expr: str,
+    params: Dict,
+    query: SearchQuery,
+    limit: int,
+    cursor: Optional[str],
+) -> Tuple[List[Dict], Optional[str]]:
+    """Run the tier queries until limit + 1 rows are found. Returns (rows, next cursor)."""
+    position = decode_cursor(cursor)
+    use_trgm = trigram_available(db)
+    params = dict(params, q=query.q, prefix=query.prefix, pattern=query.pattern)
+    start = _TIERS.index(position[0]) if position else 0
+    rows: List[Dict] = []
+    for tier in _TIERS[start:]:
+        where = owner_sql
+        if position and position[0] == tier:
+            where += f" AND ({alias}.{ts_column}, {alias}.id) < (:cursor_at, :cursor_id)"
+            params.update(cursor_at=position[1], cursor_id=position[2])
+        match = _match_sql(tier, text_expr, alias, use_trgm)
+        sql_args = (columns, table, alias, ts_column, where, match)
+        for row in _tier_rows(db, sql_args, params, limit + 1 - len(rows)):
+            rows.append(dict(row, match=tier))
+        if len(rows) > limit:
+            break
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last["match"], last[ts_column], last["id"])
+
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    account_id: int,
+    q: Optional[str],
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """Messages of one account matching q: exact matches first, then partial, newest first."""
+    query = parse_query(q)
+    rows, next_cursor = _search(
+        db,
+        columns=(
+            "m.id, m.conversation_id, m.message_text, m.content, m.is_from_bot, "
+            "m.sender_id, m.sender_username, m.recipient_id, m.recipient_username, m.created_at"
+        ),
+        table="messages",
+        alias="m",
+        owner_sql="m.instagram_account_id = :account_id AND m.user_id = :user_id",
+        ts_column="created_at",
+        text_expr=_MESSAGE_TEXT,
+        params={"account_id": account_id, "user_id": user_id},
+        query=query,
+        limit=limit,
+        cursor=cursor,
+    )
+    results = []
+    for row in rows:
+        body = row["message_text"] or row["content"] or ""
+        results.append({
+            "id": row["id"],
+            "conversation_id": row["conversation_id"],
+            "text": body[:_PREVIEW_CHARS],
+            "is_from_bot": row["is_from_bot"],
+            "participant_id": row["recipient_id"] if row["is_from_bot"] else row["sender_id"],
+            "participant_username": row["recipient_username"] if row["is_from_bot"] else row["sender_username"],
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+            "match": row["match"],
+        })
+    return results, next_cursor
+
+
+def search_leads(
+    db: Session,
+    user_id: int,
+    q: Optional[str],
+    account_id: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """Captured leads of a user (optionally one account) matching q on name, email or phone."""
+    query = parse_query(q)
+    owner_sql = "l.user_id = :user_id"
+    if account_id is not None:
+        owner_sql += " AND l.instagram_account_id = :account_id"
+    rows, next_cursor = _search(
+        db,
+        columns="l.id, l.instagram_account_id, l.automation_rule_id, l.name, l.email, l.phone, l.captured_at",
+        table="captured_leads",
+        alias="l",
+        owner_sql=owner_sql,
+        ts_column="captured_at",
+        text_expr=_LEAD_TEXT,
+        params={"user_id": user_id, "account_id": account_id},
+        query=query,
+        limit=limit,
+        cursor=cursor,
+    )
+    for row in rows:
+        row["captured_at"] = row["captured_at"].isoformat() if row["captured_at"] else None
+    return rows, next_cursor
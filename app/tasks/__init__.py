@@ -1,11 +1,15 @@
 from app.tasks.instagram_tasks import (
     fetch_followers_for_account,
     fetch_all_followers,
-    process_automation_rules
+    process_automation_rules,
+    process_automation_chunk,
+    summarize_automation_run
 )
 
 __all__ = [
     'fetch_followers_for_account',
     'fetch_all_followers',
-    'process_automation_rules'
+    'process_automation_rules',
+    'process_automation_chunk',
+    'summarize_automation_run'
 ]
@@ -1,11 +1,21 @@
-import json
-from datetime import datetime
+import os
+import time
+import uuid
+
+from celery import chord, group
+
 from app.celery_app import celery_app
 from app.db.session import SessionLocal
+from app.models.automation_rule import AutomationRule
 from app.models.instagram_account import InstagramAccount
-from app.models.follower import Follower
-from app.services.instagram_client import InstagramClient
-from app.utils.encryption import decrypt_credentials
+from app.services.follower_ingest import ingest_followers
+from app.services import instagram_client_pool
+
+AUTOMATION_CHUNK_SIZE = int(os.getenv("AUTOMATION_CHUNK_SIZE", "25"))
+AUTOMATION_ACCOUNT_BUDGET_SECONDS = float(os.getenv("AUTOMATION_ACCOUNT_BUDGET_SECONDS", "60"))
+AUTOMATION_LOCK_KEY = "automation:process_automation_rules:lock"
+# Upper bound on how long a crashed run (no callback or errback) blocks later beats
+AUTOMATION_LOCK_TTL_SECONDS = int(os.getenv("AUTOMATION_LOCK_TTL_SECONDS", "1800"))
 
 
 @celery_app.task(name="fetch_followers_for_account")
@@ -21,39 +31,22 @@ def fetch_followers_for_account(instagram_account_id: int):
         if not ig_account:
             return {"status": "error", "message": "Account not found or inactive"}
 
-        # Decrypt credentials
-        credentials_json = decrypt_credentials(ig_account.encrypted_credentials)
-        credentials = json.loads(credentials_json)
-
-        # Authenticate Instagram client
-        client = InstagramClient()
-        client.authenticate(credentials["username"], credentials["password"])
+        # Reuse the pooled client (saved session, at most one login per process)
+        client = instagram_client_pool.get_client(ig_account)
 
         # Fetch followers
-        followers = client.get_followers()
-
-        # Store followers
-        for follower in followers:
-            existing = db.query(Follower).filter(
-                Follower.instagram_account_id == instagram_account_id,
-                Follower.username == follower["username"]
-            ).first()
-
-            if not existing:
-                new_follower = Follower(
-                    instagram_account_id=instagram_account_id,
-                    username=follower["username"],
-                    user_id=follower.get("user_id"),
-                    full_name=follower.get("full_name"),
-                    fetched_at=datetime.utcnow()
-                )
-                db.add(new_follower)
-
-        db.commit()
+        try:
+            followers = client.get_followers()
+        except Exception:
+            instagram_client_pool.invalidate(ig_account.id)
+            raise
+
+        # Store followers: one username load, set diff, chunked bulk writes
+        ingest_result = ingest_followers(db, instagram_account_id, followers)
         return {
             "status": "success",
             "account_id": instagram_account_id,
-            "followers_count": len(followers)
+            **ingest_result
         }
 
     except Exception as e:
@@ -85,23 +78,159 @@ def fetch_all_followers():
     finally:
         db.close()
 
+def _get_redis():
+    import redis
+    from app.celery_app import REDIS_URL
+    return redis.Redis.from_url(REDIS_URL)
+
+
+# Compare-and-delete so a run never releases a lock taken by a later run
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _release_automation_lock(token: str) -> None:
+    try:
+        _get_redis().eval(_RELEASE_LOCK_SCRIPT, 1, AUTOMATION_LOCK_KEY, token)
+    except Exception as e:
+        print(f"⚠️ Failed to release automation run lock: {str(e)}")
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 @celery_app.task(name="process_automation_rules")
 def process_automation_rules():
-    """Run automation engine for all active accounts"""
+    """
+    Coordinator for the automation beat.
+
+    Finds the accounts that actually have active new_follower rules (one query),
+    splits them into chunks and dispatches a chord of process_automation_chunk
+    workers whose callback aggregates the run. A Redis lock prevents a beat from
+    starting while the previous run is still going. The callback releases it,
+    or the chord's error callback if a chunk fails; its TTL bounds how long a
+    crashed worker can block later beats.
+    """
+    token = uuid.uuid4().hex
+    try:
+        acquired = _get_redis().set(AUTOMATION_LOCK_KEY, token, nx=True, ex=AUTOMATION_LOCK_TTL_SECONDS)
+    except Exception as e:
+        return {"status": "error", "message": f"Could not acquire run lock: {str(e)}"}
+    if not acquired:
+        print("⏭️ Previous automation run still in progress, skipping this beat")
+        return {"status": "skipped", "reason": "previous run still in progress"}
+
+    db = SessionLocal()
+    try:
+        account_ids = [
+            account_id for (account_id,) in db.query(AutomationRule.instagram_account_id).join(
+                InstagramAccount, InstagramAccount.id == AutomationRule.instagram_account_id
+            ).filter(
+                InstagramAccount.is_active == True,
+                AutomationRule.trigger_type == "new_follower",
+                AutomationRule.is_active == True
+            ).distinct().order_by(AutomationRule.instagram_account_id).all()
+        ]
+    except Exception:
+        _release_automation_lock(token)
+        raise
+    finally:
+        db.close()
+
+    if not account_ids:
+        _release_automation_lock(token)
+        return {"status": "success", "accounts_scheduled": 0, "chunks": 0}
+
+    chunks = list(_chunks(account_ids, AUTOMATION_CHUNK_SIZE))
+    callback = summarize_automation_run.s(time.time(), token)
+    callback.on_error(release_automation_run_lock.si(token))
+    chord(group(process_automation_chunk.s(chunk) for chunk in chunks))(callback)
+
+    return {"status": "scheduled", "accounts_scheduled": len(account_ids), "chunks": len(chunks)}
+
+
+@celery_app.task(name="process_automation_chunk")
+def process_automation_chunk(account_ids):
+    """
+    Run the new_follower trigger for one chunk of accounts.
+
+    Each account gets AUTOMATION_ACCOUNT_BUDGET_SECONDS; an account that runs out
+    leaves its unprocessed followers for the next beat (processed ones are marked,
+    see AutomationEngine.process_new_follower_trigger). Errors are counted per
+    account so one bad account never fails the chord.
+    """
+    from app.services.automation_engine import AutomationEngine
+
+    started = time.monotonic()
+    stats = {
+        "accounts_processed": 0,
+        "accounts_failed": 0,
+        "accounts_budget_exhausted": 0,
+        "new_followers": 0,
+        "actions_executed": 0,
+    }
     db = SessionLocal()
     try:
-        from app.services.automation_engine import AutomationEngine
         engine = AutomationEngine(db)
-        
-        active_accounts = db.query(InstagramAccount).filter(
-            InstagramAccount.is_active == True
-        ).all()
-        
-        results = []
-        for account in active_accounts:
-            result = engine.process_new_follower_trigger(account.id)
-            results.append(result)
-        
-        return {"status": "success", "accounts_processed": len(results)}
+        for account_id in account_ids:
+            deadline = time.monotonic() + AUTOMATION_ACCOUNT_BUDGET_SECONDS
+            try:
+                result = engine.process_new_follower_trigger(account_id, deadline=deadline)
+            except Exception as e:
+                db.rollback()
+                stats["accounts_failed"] += 1
+                print(f"❌ Automation failed for account {account_id}: {str(e)}")
+                continue
+            stats["accounts_processed"] += 1
+            stats["new_followers"] += result.get("new_followers_count", 0)
+            stats["actions_executed"] += result.get("actions_executed", 0)
+            if result.get("budget_exhausted"):
+                stats["accounts_budget_exhausted"] += 1
     finally:
         db.close()
+
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    return stats
+
+
+@celery_app.task(name="summarize_automation_run")
+def summarize_automation_run(chunk_results, started_at: float, lock_token: str):
+    """Chord callback: aggregate chunk stats into per-run throughput and release the run lock."""
+    try:
+        totals = {
+            "accounts_processed": 0,
+            "accounts_failed": 0,
+            "accounts_budget_exhausted": 0,
+            "new_followers": 0,
+            "actions_executed": 0,
+        }
+        for result in chunk_results or []:
+            for key in totals:
+                totals[key] += (result or {}).get(key, 0)
+
+        elapsed = max(time.time() - started_at, 0.001)
+        summary = {
+            "status": "success",
+            "chunks": len(chunk_results or []),
+            **totals,
+            "run_seconds": round(elapsed, 3),
+            "accounts_per_second": round(totals["accounts_processed"] / elapsed, 2),
+            "actions_per_second": round(totals["actions_executed"] / elapsed, 2),
+        }
+        print(f"📊 Automation run: {summary}")
+        return summary
+    finally:
+        _release_automation_lock(lock_token)
+
+
+@celery_app.task(name="release_automation_run_lock")
+def release_automation_run_lock(lock_token: str):
+    """Chord error callback: a chunk failed, so summarize_automation_run won't run; free the next beat."""
+    print("⚠️ Automation run failed before its summary, releasing the run lock")
+    _release_automation_lock(lock_token)
@@ -3,7 +3,6 @@ Analytics utility functions for tracking events and generating tracking URLs.
 """
 import os
 import requests
-from urllib.parse import quote
 from typing import Optional
 
 
@@ -70,7 +69,8 @@ def generate_tracking_url(
     instagram_account_id: Optional[int] = None
 ) -> str:
     """
-    Generate a tracking URL that logs clicks and redirects to the target URL.
+    Generate a short tracking URL that logs clicks and redirects to the target URL.
+    The link is stored in tracked_links under a short code (see app.services.link_tracking).
     
     Args:
         target_url: The destination URL to redirect to
@@ -82,26 +82,10 @@ def generate_tracking_url(
     Returns:
         str: Tracking URL that will log the click and redirect
     """
-    base_url = get_base_url()
-    
-    # Build query parameters
-    params = {
-        "url": target_url,
-        "rule_id": rule_id,
-        "user_id": user_id
-    }
-    
-    if media_id:
-        params["media_id"] = media_id
-    
-    if instagram_account_id:
-        params["instagram_account_id"] = instagram_account_id
-    
-    # Build the tracking URL
-    query_string = "&".join([f"{k}={quote(str(v))}" for k, v in params.items()])
-    tracking_url = f"{base_url}/api/analytics/track/redirect?{query_string}"
-    
-    return tracking_url
+    from app.services.link_tracking import create_tracked_link
+
+    code = create_tracked_link(target_url, rule_id, user_id, media_id, instagram_account_id)
+    return f"{get_base_url()}/api/analytics/r/{code}"
 
 
 def log_analytics_event_sync(
@@ -1,5 +1,4 @@
 import os
-import requests
 import base64
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
@@ -8,6 +7,7 @@ from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.backends import default_backend
 import json
+from app.utils.jwks import get_jwks_provider
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -53,19 +53,12 @@ def verify_token(token: str) -> dict:
 
 def get_supabase_jwks():
     """
-    Fetch Supabase JWKS (JSON Web Key Set) for ECC P-256 public keys.
+    Get Supabase JWKS (JSON Web Key Set) from {SUPABASE_URL}/auth/v1/.well-known/jwks.json.
+    Served from the shared provider in app.utils.jwks.
     """
     if not SUPABASE_URL:
         return None
-    
-    try:
-        jwks_url = f"{SUPABASE_URL}/.well-known/jwks.json"
-        response = requests.get(jwks_url, timeout=5)
-        if response.status_code == 200:
-            return response.json()
-    except Exception as e:
-        print(f"[AUTH] Failed to fetch JWKS: {str(e)}")
-    return None
+    return get_jwks_provider(SUPABASE_URL).get_jwks()
 
 
 def base64url_decode(data):
@@ -139,13 +132,8 @@ def verify_supabase_token(token: str) -> dict:
                 print("[AUTH] SUPABASE_URL not set. Cannot verify ES256 tokens.")
                 return None
             
-            # Fetch JWKS and get public key
-            jwks = get_supabase_jwks()
-            if not jwks:
-                print("[AUTH] Failed to fetch JWKS for ES256 verification")
-                return None
-            
-            public_key_pem = get_public_key_from_jwks(jwks, kid)
+            # Public key from the shared JWKS provider (PEM converted once per kid)
+            public_key_pem = get_jwks_provider(SUPABASE_URL).get_public_key_pem(kid)
             if not public_key_pem:
                 print(f"[AUTH] Public key not found for kid: {kid}")
                 return None
@@ -190,22 +178,20 @@ def verify_supabase_token(token: str) -> dict:
         
         # Try ES256
         if kid and SUPABASE_URL:
-            jwks = get_supabase_jwks()
-            if jwks:
-                public_key_pem = get_public_key_from_jwks(jwks, kid)
-                if public_key_pem:
-                    try:
-                        payload = jwt.decode(
-                            token,
-                            public_key_pem,
-                            algorithms=["ES256"],
-                            audience="authenticated",
-                            options={"verify_aud": True}
-                        )
-                        print(f"[AUTH] Successfully verified token with ES256")
-                        return payload
-                    except JWTError:
-                        pass
+            public_key_pem = get_jwks_provider(SUPABASE_URL).get_public_key_pem(kid)
+            if public_key_pem:
+                try:
+                    payload = jwt.decode(
+                        token,
+                        public_key_pem,
+                        algorithms=["ES256"],
+                        audience="authenticated",
+                        options={"verify_aud": True}
+                    )
+                    print(f"[AUTH] Successfully verified token with ES256")
+                    return payload
+                except JWTError:
+                    pass
         
         # Try HS256
         if SUPABASE_JWT_SECRET:
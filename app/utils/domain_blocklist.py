@@ -0,0 +1,281 @@
+"""
+Compiled email-domain blocklist shared by sign-up, DM email capture and the
+lead-capture validator.
+
+The text lists in app/data are compiled into one binary file: a sorted array of
+reversed-label keys ("mailinator.com" -> "com.mailinator") with a flags byte
+per key saying which list(s) it came from, plus an open-addressing hash index
+(crc32, linear probing) over that array. Workers mmap that file, so the ~100k
+entries live once in the page cache instead of once per process as a Python
+set, and a lookup is one hash probe per domain suffix:
+
+    x.y.mailinator.com -> com, com.mailinator, com.mailinator.y, ...
+
+so subdomains of a listed domain match too. Entry syntax in the text lists:
+
+    mailinator.com      the domain and every subdomain
+    *.example.net       subdomains only (not example.net itself)
+    temp*mail.com       glob over the whole domain (kept out of the sorted
+                        array and matched with one compiled regex; use sparingly)
+
+The compiled file records a digest of the source lists. If it is missing or
+stale it is rebuilt (atomically, so concurrent workers never see a partial
+file); if app/data is read-only the compiled bytes are kept in memory instead.
+Every BLOCKLIST_RELOAD_CHECK_SECONDS the sources are stat()ed and the matcher
+is swapped for a fresh one when they changed (hot reload, no restart needed).
+
+Build ahead of time with: python scripts/build_domain_blocklist.py
+"""
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from fnmatch import translate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# List flags (bitmask stored per key)
+DISPOSABLE = 1  # temp-mail providers: rejected everywhere
+PLACEHOLDER = 2  # example/test domains: rejected by lead capture only
+ALL_KINDS = DISPOSABLE | PLACEHOLDER
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SOURCES: Tuple[Tuple[str, int], ...] = (
+    (os.path.join(_DATA_DIR, "disposable_email_blocklist.txt"), DISPOSABLE),
+    (os.path.join(_DATA_DIR, "placeholder_email_domains.txt"), PLACEHOLDER),
+)
+COMPILED_PATH = os.getenv(
+    "DOMAIN_BLOCKLIST_COMPILED_PATH", os.path.join(_DATA_DIR, "email_domain_blocklist.bin")
+)
+RELOAD_CHECK_SECONDS = float(os.getenv("BLOCKLIST_RELOAD_CHECK_SECONDS", "30"))
+
+_MAGIC = b"DBL1"
+# magic, key count, hash slot count, pattern section length, source digest
+_HEADER = struct.Struct("<4sIII16s")
+_OFFSET = struct.Struct("<I")
+
+
+def _reverse_labels(domain: str) -> str:
+    return ".".join(reversed(domain.split(".")))
+
+
+def sources_digest(sources: Sequence[Tuple[str, int]] = SOURCES) -> bytes:
+    """Digest of the source lists' contents (missing files count as empty)."""
+    digest = hashlib.sha256(_MAGIC)
+    for path, flag in sources:
+        digest.update(f"{os.path.basename(path)}:{flag}\n".encode())
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.digest()[:16]
+
+
+def compile_blocklist(sources: Sequence[Tuple[str, int]] = SOURCES) -> bytes:
+    """Compile the text lists into the binary format described in the module docstring."""
+    keys: Dict[bytes, int] = {}
+    patterns: Dict[str, int] = {}
+    for path, flag in sources:
+        if not os.path.isfile(path):
+            print(f"⚠️ Domain blocklist source not found: {path}")
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = line.strip().lower().rstrip(".")
+                if not entry or entry.startswith("#"):
+                    continue
+                if entry.startswith("*.") and "*" not in entry[2:]:
+                    key = (_reverse_labels(entry[2:]) + ".*").encode()
+                elif "*" in entry:
+                    patterns[entry] = patterns.get(entry, 0) | flag
+                    continue
+                else:
+                    key = _reverse_labels(entry).encode()
+                keys[key] = keys.get(key, 0) | flag
+
+    sorted_keys = sorted(keys)
+    offsets = bytearray()
+    blob = bytearray()
+    for key in sorted_keys:
+        offsets += _OFFSET.pack(len(blob))
+        blob += key
+    offsets += _OFFSET.pack(len(blob))
+    flags = bytes(keys[k] for k in sorted_keys)
+
+    # Hash index: slot -> key index + 1 (0 = empty), load factor <= 0.5
+    slot_count = 1 << max(4, (2 * len(sorted_keys)).bit_length())
+    slots = [0] * slot_count
+    for i, key in enumerate(sorted_keys):
+        slot = zlib.crc32(key) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = i + 1
+    index = struct.pack(f"<{slot_count}I", *slots)
+    pattern_section = "".join(f"{flag}\t{p}\n" for p, flag in sorted(patterns.items())).encode()
+
+    header = _HEADER.pack(
+        _MAGIC, len(sorted_keys), slot_count, len(pattern_section), sources_digest(sources)
+    )
+    return header + index + bytes(offsets) + flags + bytes(blob) + pattern_section
+
+
+def write_compiled(data: bytes, path: str = COMPILED_PATH) -> None:
+    """Write atomically: readers mmap either the old file or the complete new one."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class CompiledDomainMatcher:
+    """Read-only matcher over a compiled blocklist (mmap or bytes)."""
+
+    def __init__(self, buf, origin: str = "memory"):
+        magic, count, slot_count, patterns_len, digest = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a compiled domain blocklist")
+        self.origin = origin
+        self.digest = digest
+        self.count = count
+        self._buf = buf
+        view = memoryview(buf)
+        pos = _HEADER.size
+        self._slots = view[pos:pos + 4 * slot_count].cast("I")
+        self._mask = slot_count - 1
+        pos += 4 * slot_count
+        self._offsets = view[pos:pos + 4 * (count + 1)].cast("I")
+        pos += 4 * (count + 1)
+        self._flags = view[pos:pos + count]
+        pos += count
+        self._keys_base = pos
+        pos += self._offsets[count]
+        self._patterns: List[Tuple[int, "re.Pattern[str]"]] = []
+        for line in bytes(buf[pos:pos + patterns_len]).decode().splitlines():
+            flag, pattern = line.split("\t", 1)
+            self._patterns.append((int(flag), re.compile(translate(pattern))))
+        self._kind_counts: Optional[Dict[int, int]] = None
+
+    def _flags_for(self, key: bytes) -> int:
+        slots, offsets, buf, base, mask = self._slots, self._offsets, self._buf, self._keys_base, self._mask
+        slot = zlib.crc32(key) & mask
+        while True:
+            i = slots[slot]
+            if not i:
+                return 0
+            start = base + offsets[i - 1]
+            end = base + offsets[i]
+            if end - start == len(key) and buf[start:end] == key:
+                return self._flags[i - 1]
+            slot = (slot + 1) & mask
+
+    def match_flags(self, domain: str, kinds: int = ALL_KINDS) -> int:
+        """Flags of the first list entry (limited to kinds) matching domain, or 0."""
+        domain = domain.strip().lower().rstrip(".")
+        if not domain:
+            return 0
+        labels = domain.split(".")
+        key = b""
+        for depth, label in enumerate(reversed(labels)):
+            key = key + b"." + label.encode("utf-8", "ignore") if depth else label.encode("utf-8", "ignore")
+            flags = self._flags_for(key) & kinds
+            if not flags and depth < len(labels) - 1:
+                # "*.parent" entries match strict subdomains of parent
+                flags = self._flags_for(key + b".*") & kinds
+            if flags:
+                return flags
+        for flag, rx in self._patterns:
+            if flag & kinds and rx.match(domain):
+                return flag & kinds
+        return 0
+
+    def matches(self, domain: str, kinds: int = ALL_KINDS) -> bool:
+        return bool(self.match_flags(domain, kinds))
+
+    def count_kind(self, kind: int) -> int:
+        """Number of entries (keys and patterns) carrying kind."""
+        if self._kind_counts is None:
+            counts: Dict[int, int] = {}
+            for flags in list(self._flags) + [f for f, _ in self._patterns]:
+                counts[flags] = counts.get(flags, 0) + 1
+            self._kind_counts = counts
+        return sum(n for flags, n in self._kind_counts.items() if flags & kind)
+
+
+def _open_compiled(path: str) -> Optional[CompiledDomainMatcher]:
+    try:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return CompiledDomainMatcher(buf, origin=path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def load_matcher(
+    sources: Sequence[Tuple[str, int]] = SOURCES, compiled_path: str = COMPILED_PATH
+) -> CompiledDomainMatcher:
+    """mmap the compiled file, (re)building it first when missing or out of date."""
+    expected = sources_digest(sources)
+    matcher = _open_compiled(compiled_path)
+    if matcher is not None and matcher.digest == expected:
+        return matcher
+
+    started = time.perf_counter()
+    data = compile_blocklist(sources)
+    try:
+        write_compiled(data, compiled_path)
+        matcher = _open_compiled(compiled_path)
+    except OSError as e:
+        print(f"⚠️ Could not write compiled blocklist to {compiled_path}: {str(e)} (keeping it in memory)")
+        matcher = None
+    if matcher is None or matcher.digest != expected:
+        matcher = CompiledDomainMatcher(data)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"✅ Domain blocklist compiled: {matcher.count} entries in {elapsed_ms:.0f} ms")
+    return matcher
+
+
+_matcher: Optional[CompiledDomainMatcher] = None
+_stat_snapshot: Optional[tuple] = None
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+def _stat_sources() -> tuple:
+    snapshot = []
+    for path in [p for p, _ in SOURCES] + [COMPILED_PATH]:
+        try:
+            st = os.stat(path)
+            snapshot.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            snapshot.append(None)
+    return tuple(snapshot)
+
+
+def reload_matcher() -> CompiledDomainMatcher:
+    """Load (or reload) the process-wide matcher. In-flight lookups keep using the old one."""
+    global _matcher, _stat_snapshot, _next_check
+    with _lock:
+        matcher = load_matcher(SOURCES, COMPILED_PATH)
+        _matcher = matcher
+        # Stat after loading: load_matcher may have just rewritten the compiled file
+        _stat_snapshot = _stat_sources()
+        _next_check = time.monotonic() + RELOAD_CHECK_SECONDS
+        return matcher
+
+
+def get_matcher() -> CompiledDomainMatcher:
+    """Process-wide matcher; re-checks the source files at most every RELOAD_CHECK_SECONDS."""
+    global _next_check
+    matcher = _matcher
+    if matcher is None:
+        return reload_matcher()
+    if time.monotonic() >= _next_check:
+        _next_check = time.monotonic() + RELOAD_CHECK_SECONDS
+        if _stat_sources() != _stat_snapshot:
+            print("🔄 Domain blocklist changed on disk, reloading")
+            return reload_matcher()
+    return matcher
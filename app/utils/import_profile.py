@@ -0,0 +1,92 @@
+"""
+Import-time profiling based on `python -X importtime`.
+
+Used by the optional startup report (IMPORT_TIME_REPORT=1), by
+scripts/import_time_report.py and by the import-time budget test.
+The import is measured in a fresh subprocess, so the numbers reflect a real
+cold start and not whatever the current process already has loaded.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    """Parse `-X importtime` stderr lines ("import time: self | cumulative | name")."""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        if not self_us.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        timings.append(ImportTiming(name.strip(), int(self_us), int(cumulative_us), depth))
+    return timings
+
+
+def profile_imports(module: str = "app.main", env: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns total_ms (cumulative time of module itself), the parsed timings and
+    the set of module names loaded afterwards (from sys.modules, which unlike
+    -X importtime also covers importlib.import_module calls).
+    """
+    proc_env = dict(os.environ)
+    proc_env.update(env or {})
+    result = subprocess.run(
+        [
+            sys.executable, "-X", "importtime", "-c",
+            f"import {module}, sys; print('\\n'.join(sorted(sys.modules)))",
+        ],
+        cwd=str(_PROJECT_ROOT),
+        env=proc_env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    timings = parse_importtime(result.stderr)
+    own = [t for t in timings if t.module == module and t.depth == 0]
+    total_us = own[-1].cumulative_us if own else sum(t.self_us for t in timings)
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "timings": timings,
+        "modules": set(result.stdout.split()),
+    }
+
+
+def format_import_report(profile: Dict, top: int = 15) -> str:
+    """Human-readable summary: total time plus the slowest top-level packages and first-party modules."""
+    timings = profile["timings"]
+    packages: Dict[str, int] = {}
+    for t in timings:
+        if t.depth == 0 or "." in t.module:
+            continue
+        packages[t.module] = max(packages.get(t.module, 0), t.cumulative_us)
+    first_party = sorted((t for t in timings if t.module.startswith("app.")), key=lambda t: -t.self_us)
+
+    lines = [f"⏱️ import {profile['module']}: {profile['total_ms']:.0f} ms"]
+    lines.append("  Slowest packages (cumulative):")
+    for name, us in sorted(packages.items(), key=lambda kv: -kv[1])[:top]:
+        lines.append(f"    {us / 1000:8.1f} ms  {name}")
+    lines.append("  Slowest app modules (self):")
+    for t in first_party[:top]:
+        lines.append(f"    {t.self_us / 1000:8.1f} ms  {t.module}")
+    return "\n".join(lines)
@@ -4,10 +4,25 @@ Instagram Graph API utility functions for sending messages and replies.
 import time
 import requests
 
+from app.services.metrics import observe_graph_call, timed_stage
+
 # Instagram private reply / DM text limit (conservative to avoid Meta "unknown error")
 PRIVATE_REPLY_MESSAGE_MAX_LENGTH = 500
 
 
+def _post(endpoint: str, url: str, **kwargs) -> requests.Response:
+    """requests.post, recording latency and errors under graph_api_*{endpoint}."""
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, **kwargs)
+    except Exception as e:
+        observe_graph_call(endpoint, started, error=e)
+        raise
+    observe_graph_call(endpoint, started, status_code=response.status_code)
+    return response
+
+
+@timed_stage("send")
 def send_public_comment_reply(comment_id: str, message: str, instagram_access_token: str) -> dict:
     """
     Send a PUBLIC reply to an Instagram comment (visible on the post/reel).
@@ -50,7 +65,7 @@ def send_public_comment_reply(comment_id: str, message: str, instagram_access_to
         "Authorization": f"Bearer {instagram_access_token}"
     }
     
-    response = requests.post(url, json=payload, headers=headers)
+    response = _post("comment_reply", url, json=payload, headers=headers)
     
     if response.status_code != 200:
         error_detail = response.text
@@ -66,6 +81,7 @@ def send_public_comment_reply(comment_id: str, message: str, instagram_access_to
     return result
 
 
+@timed_stage("send")
 def send_private_reply(comment_id: str, message: str, page_access_token: str, page_id: str = None, quick_replies: list = None) -> dict:
     """
     Send a private reply to an Instagram comment with optional quick replies.
@@ -146,7 +162,7 @@ def send_private_reply(comment_id: str, message: str, page_access_token: str, pa
     }
     
     def _do_post():
-        return requests.post(url, json=payload, headers=headers)
+        return _post("private_reply", url, json=payload, headers=headers)
     
     response = _do_post()
     if response.status_code != 200:
@@ -161,6 +177,7 @@ def send_private_reply(comment_id: str, message: str, page_access_token: str, pa
     return result
 
 
+@timed_stage("send")
 def send_dm(recipient_id: str, message: str, page_access_token: str, page_id: str = None, buttons: list = None, quick_replies: list = None, media_url: str = None, media_type: str = None, card_image_url: str = None, card_title: str = None, card_subtitle: str = None, card_button: dict = None) -> dict:
     """
     Send a direct message to an Instagram user with optional buttons/quick replies/media.
@@ -214,8 +231,16 @@ def send_dm(recipient_id: str, message: str, page_access_token: str, page_id: st
         if "localhost" in media_url_clean or "127.0.0.1" in media_url_clean:
             print(f"⚠️ Skipping media attachment: URL must be publicly accessible (localhost/127.0.0.1 not reachable by Instagram)")
         else:
-            # Infer media_type from URL if not provided (common extensions)
+            # Infer media_type if not provided: media registry (filled at upload time, so our own
+            # .webm voice notes aren't mistaken for video), then common extensions. Never waits on the network.
+            from app.services.media_registry import get_cached_media, is_own_media_url, lookup_media, media_kind
+
             inferred_type = media_type
+            if not inferred_type:
+                info = get_cached_media(media_url_clean)
+                if info is None and is_own_media_url(media_url_clean):
+                    info = lookup_media(media_url_clean)
+                inferred_type = media_kind(info.content_type) if info else None
             if not inferred_type:
                 lower = media_url_clean.lower()
                 if any(ext in lower for ext in (".mp3", ".m4a", ".ogg", ".wav", ".aac")):
@@ -225,20 +250,12 @@ def send_dm(recipient_id: str, message: str, page_access_token: str, page_id: st
                 elif any(ext in lower for ext in (".jpg", ".jpeg", ".png", ".gif", ".webp")):
                     inferred_type = "image"
                 else:
-                    # Extensionless URL detected (LogicDM uploads)! Dynamically check Content-Type
-                    try:
-                        print(f"🔍 [MEDIA CHECK] Checking MIME type for extensionless URL...")
-                        head_req = requests.head(media_url_clean, allow_redirects=True, timeout=5)
-                        content_type = head_req.headers.get("Content-Type", "").lower()
-                        if "video" in content_type:
-                            inferred_type = "video"
-                        elif "audio" in content_type:
-                            inferred_type = "audio"
-                        else:
-                            inferred_type = "image"
-                        print(f"✅ [MEDIA CHECK] Detected {content_type} -> Set to {inferred_type}")
-                    except Exception as e:
-                        print(f"⚠️ [MEDIA CHECK] Failed to get headers: {e}. Defaulting to image.")
+                    # Extensionless external URL not resolved yet (normally warmed when the rule was saved):
+                    # start its background HEAD for later sends and default to image for this one
+                    info = lookup_media(media_url_clean)
+                    inferred_type = media_kind(info.content_type) if info else None
+                    if not inferred_type:
+                        print(f"⚠️ [MEDIA CHECK] Could not determine media type for extensionless URL. Defaulting to image.")
                         inferred_type = "image"
             if inferred_type not in ("image", "video", "audio"):
                 inferred_type = "image"
@@ -252,7 +269,7 @@ def send_dm(recipient_id: str, message: str, page_access_token: str, page_id: st
                         }
                     }
                 }
-                resp = requests.post(api_url, json=media_payload, headers=headers)
+                resp = _post("dm_media", api_url, json=media_payload, headers=headers)
                 if resp.status_code == 200:
                     print(f"✅ Media ({inferred_type}) sent successfully")
                     # If no text/buttons/quick_replies, we're done
@@ -300,7 +317,7 @@ def send_dm(recipient_id: str, message: str, page_access_token: str, page_id: st
                         }
                     }
                 }
-                resp = requests.post(api_url, json=card_payload, headers=headers)
+                resp = _post("dm_card", api_url, json=card_payload, headers=headers)
                 if resp.status_code == 200:
                     print(f"✅ Card sent successfully")
                     if not (message and str(message).strip()) and not (quick_replies and len(quick_replies) > 0):
@@ -463,7 +480,7 @@ def send_dm(recipient_id: str, message: str, page_access_token: str, page_id: st
         "message": message_payload
     }
     
-    response = requests.post(api_url, json=payload, headers=headers)
+    response = _post("dm", api_url, json=payload, headers=headers)
     
     if response.status_code != 200:
         error_detail = response.text
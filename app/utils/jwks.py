@@ -0,0 +1,169 @@
+"""
+Single Supabase JWKS provider shared by every token verification path.
+
+- Parsed public keys are kept by kid, so JWK -> key (and -> PEM) conversion
+  happens once per key, not once per request.
+- A daemon thread refreshes the set JWKS_REFRESH_AHEAD_SECONDS before the TTL
+  runs out, so requests normally never wait on Supabase.
+- When a request does have to fetch (cold start, or a kid we have not seen
+  after a key rotation), the fetch is single-flight: one thread fetches, the
+  others wait for its result instead of piling onto Supabase.
+- Unknown-kid refetches are rate limited so random kids can't be used to make
+  us hammer the JWKS endpoint.
+- If Supabase is down, previously fetched keys keep working for
+  JWKS_STALE_MAX_SECONDS.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import jwt  # PyJWT
+import requests
+from cryptography.hazmat.primitives import serialization
+
+JWKS_TTL_SECONDS = int(os.getenv("JWKS_TTL_SECONDS", "3600"))
+JWKS_REFRESH_AHEAD_SECONDS = int(os.getenv("JWKS_REFRESH_AHEAD_SECONDS", "300"))
+JWKS_STALE_MAX_SECONDS = 86400  # Keep using old keys for up to 24h if Supabase is unreachable
+JWKS_FETCH_TIMEOUT_SECONDS = 10
+JWKS_UNKNOWN_KID_MIN_INTERVAL_SECONDS = 30
+
+
+class JWKSProvider:
+    def __init__(self, jwks_url: str):
+        self.jwks_url = jwks_url
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._pem_by_kid: Dict[str, str] = {}
+        self._raw: Optional[dict] = None
+        self._fetched_at: Optional[float] = None
+        self._last_fetch_attempt = 0.0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()  # single-flight: only the holder talks to Supabase
+        self._refresher: Optional[threading.Thread] = None
+
+    # -- fetching -----------------------------------------------------------
+
+    def _fetch(self) -> bool:
+        """Fetch and parse the key set; on failure the current keys are kept."""
+        self._last_fetch_attempt = time.time()
+        try:
+            print(f"[AUTH] Fetching JWKS from: {self.jwks_url}")
+            r = requests.get(self.jwks_url, timeout=JWKS_FETCH_TIMEOUT_SECONDS)
+            r.raise_for_status()
+            raw = r.json()
+        except Exception as e:
+            print(f"[AUTH] JWKS fetch failed: {str(e)}")
+            return False
+
+        keys: Dict[str, jwt.PyJWK] = {}
+        for jwk in raw.get("keys", []):
+            kid = jwk.get("kid")
+            if not kid:
+                continue
+            try:
+                keys[kid] = jwt.PyJWK(jwk)
+            except Exception as e:
+                print(f"[AUTH] Skipping unusable JWKS key {kid}: {str(e)}")
+
+        with self._lock:
+            self._raw = raw
+            self._keys = keys
+            self._pem_by_kid = {}
+            self._fetched_at = time.time()
+        print(f"[AUTH] Successfully fetched JWKS with {len(keys)} keys")
+        return True
+
+    def _refresh_single_flight(self, is_still_needed) -> None:
+        """Fetch unless another thread already did while we waited for the fetch lock."""
+        with self._fetch_lock:
+            if not is_still_needed():
+                return
+            self._fetch()
+
+    def _is_fresh(self) -> bool:
+        return self._fetched_at is not None and time.time() - self._fetched_at < JWKS_TTL_SECONDS
+
+    def _is_usable(self) -> bool:
+        return self._fetched_at is not None and time.time() - self._fetched_at < JWKS_STALE_MAX_SECONDS
+
+    # -- background refresh -------------------------------------------------
+
+    def _refresh_loop(self) -> None:
+        backoff = 5
+        while True:
+            fetched_at = self._fetched_at or 0
+            wait = fetched_at + JWKS_TTL_SECONDS - JWKS_REFRESH_AHEAD_SECONDS - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            with self._fetch_lock:
+                ok = self._fetch()
+            if ok:
+                backoff = 5
+            else:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 300)
+
+    def _ensure_refresher(self) -> None:
+        if self._refresher is not None:
+            return
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="jwks-refresher", daemon=True)
+            self._refresher.start()
+
+    # -- public API ---------------------------------------------------------
+
+    def get_jwks(self) -> Optional[dict]:
+        """Raw JWKS document (fresh or, if Supabase is unreachable, stale up to 24h)."""
+        if not self._is_fresh():
+            self._refresh_single_flight(lambda: not self._is_fresh())
+        self._ensure_refresher()
+        return self._raw if self._is_usable() else None
+
+    def get_signing_key(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        """
+        Parsed key for kid. Refetches (single-flight, rate limited) when the kid is
+        unknown, e.g. right after Supabase rotated its signing keys.
+        """
+        if self.get_jwks() is None:
+            return None
+        key = self._keys.get(kid) if kid else None
+        if key is None and kid:
+            if time.time() - self._last_fetch_attempt >= JWKS_UNKNOWN_KID_MIN_INTERVAL_SECONDS:
+                self._refresh_single_flight(lambda: kid not in self._keys)
+            key = self._keys.get(kid)
+        return key
+
+    def get_public_key_pem(self, kid: Optional[str]) -> Optional[str]:
+        """PEM form of the key for kid (for python-jose callers), converted once per key."""
+        pem = self._pem_by_kid.get(kid) if kid else None
+        if pem is not None:
+            return pem
+        key = self.get_signing_key(kid)
+        if key is None:
+            return None
+        pem = key.key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ).decode()
+        with self._lock:
+            self._pem_by_kid[kid] = pem
+        return pem
+
+    def has_keys(self) -> bool:
+        return bool(self._keys) and self._is_usable()
+
+
+_providers: Dict[str, JWKSProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_jwks_provider(supabase_url: str) -> JWKSProvider:
+    """Process-wide provider for a Supabase project URL (keys are served by the Auth service, under /auth/v1)."""
+    jwks_url = f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    with _providers_lock:
+        provider = _providers.get(jwks_url)
+        if provider is None:
+            provider = _providers[jwks_url] = JWKSProvider(jwks_url)
+        return provider
@@ -161,6 +161,7 @@ def check_rule_limit(user_id: int, db: Session, instagram_account_id: int = None
             
             # Check global tracker limit (persistent across disconnect/reconnect)
             is_allowed, error_message = check_global_rule_limit(tracker, user.plan_tier)
+            db.commit()  # Persist a tracker created just now
             if not is_allowed:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -202,6 +203,7 @@ def check_rule_limit(user_id: int, db: Session, instagram_account_id: int = None
                 if tracker.rules_created_count > max_rules_created:
                     max_rules_created = tracker.rules_created_count
                     limiting_account = account
+        db.commit()  # Persist trackers created just now
         
         # Check if any account has reached the limit (only if max_rules is not unlimited)
         if max_rules != -1 and max_rules_created >= max_rules:
@@ -303,6 +305,7 @@ def check_dm_limit(user_id: int, db: Session, instagram_account_id: int = None)
             
             # Check global tracker limit (lifetime for free tier, monthly for pro/enterprise)
             is_allowed, error_message = check_global_dm_limit(tracker, user.plan_tier)
+            db.commit()  # Persist a tracker created just now
             if not is_allowed:
                 print(f"⚠️ Global DM limit reached for IGSID {account.igsid}: {error_message}")
                 return False
@@ -0,0 +1,24 @@
+"""
+One-shot schema bootstrap (see app/db/bootstrap.py).
+Render startCommand runs: python bootstrap_schema.py && python run_migrations.py && uvicorn ...
+Safe to run repeatedly and from several processes at once: it takes a Postgres
+advisory lock and does nothing when the stored schema fingerprint already matches.
+
+Usage: python bootstrap_schema.py [--force]
+"""
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.db.bootstrap import bootstrap_schema  # noqa: E402 — needs DATABASE_URL from .env
+
+
+if __name__ == "__main__":
+    try:
+        bootstrap_schema(force="--force" in sys.argv)
+    except Exception as e:
+        print(f"❌ Schema bootstrap failed: {str(e)}")
+        sys.exit(1)
+    sys.exit(0)
@@ -1,14 +1,29 @@
 """
 Run schema migrations before the app starts.
-Render startCommand runs: python run_migrations.py && uvicorn ...
+Render startCommand runs: python bootstrap_schema.py && python run_migrations.py && uvicorn ...
 So every auto-deploy from git runs all migrations with no manual step.
 
 Add new migration modules to MIGRATIONS (same order as app/main.py startup).
 Migrations must be idempotent (safe to run multiple times).
+
+Applied migrations are recorded in the legacy_migrations ledger (name, file
+checksum, applied_at, duration). A migration whose file is unchanged since it
+was applied is skipped without being imported, so deploy time no longer grows
+with the migration history; editing a migration file makes it run again.
+The runner holds a Postgres advisory lock so concurrent deploys never interleave.
+
+Usage: python run_migrations.py [--force]   (--force re-runs every migration)
 """
+import hashlib
 import importlib.util
 import os
 import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+load_dotenv()
 
 # Migrations to run on every deploy, in order. Each must define run_migration() and be idempotent.
 # Order matches app/main.py startup so Render auto-deploy runs all migrations with no manual step.
@@ -30,32 +45,110 @@ MIGRATIONS = [
     "add_free_tier_usage_migration",
 ]
 
+# Distinct from app.db.bootstrap.BOOTSTRAP_LOCK_ID
+MIGRATIONS_LOCK_ID = 7_402_117_002
+
+
+def file_checksum(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _get_engine():
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    if db_url.startswith("postgres://"):
+        db_url = "postgresql://" + db_url[10:]
+    return create_engine(db_url)
+
+
+def _ensure_ledger(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS legacy_migrations (
+            name VARCHAR(255) PRIMARY KEY,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            duration_ms INTEGER
+        )
+    """))
+    conn.commit()
+
 
-def run():
+def _applied_checksums(conn):
+    rows = conn.execute(text("SELECT name, checksum FROM legacy_migrations")).fetchall()
+    return {name: checksum for name, checksum in rows}
+
+
+def _record(conn, name, checksum, duration_ms):
+    conn.execute(text("""
+        INSERT INTO legacy_migrations (name, checksum, applied_at, duration_ms)
+        VALUES (:name, :checksum, NOW(), :duration_ms)
+        ON CONFLICT (name) DO UPDATE SET
+            checksum = EXCLUDED.checksum,
+            applied_at = EXCLUDED.applied_at,
+            duration_ms = EXCLUDED.duration_ms
+    """), {"name": name, "checksum": checksum, "duration_ms": duration_ms})
+    conn.commit()
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def run(force=False):
     root = os.path.dirname(os.path.abspath(__file__))
     os.chdir(root)
-    ran = 0
-    for name in MIGRATIONS:
-        path = os.path.join(root, f"{name}.py")
-        if not os.path.exists(path):
-            print(f"⚠️ Skip {name}: file not found")
-            continue
-        print(f"▶ Running {name}...")
-        spec = importlib.util.spec_from_file_location(name, path)
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        if not hasattr(mod, "run_migration"):
-            print(f"⚠️ No run_migration() in {name}")
-            continue
-        ok = mod.run_migration()
-        if not ok:
-            print(f"❌ {name} failed")
-            return False
-        ran += 1
-    print(f"✅ Migrations completed ({ran} ran)")
+    started = time.monotonic()
+    ran = skipped = 0
+
+    engine = _get_engine()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+        conn.commit()
+        try:
+            _ensure_ledger(conn)
+            applied = {} if force else _applied_checksums(conn)
+
+            for name in MIGRATIONS:
+                path = os.path.join(root, f"{name}.py")
+                if not os.path.exists(path):
+                    print(f"⚠️ Skip {name}: file not found")
+                    continue
+                checksum = file_checksum(path)
+                if applied.get(name) == checksum:
+                    skipped += 1
+                    continue
+
+                reason = "changed" if name in applied else "new"
+                print(f"▶ Running {name} ({reason})...")
+                t0 = time.monotonic()
+                mod = _load(name, path)
+                if not hasattr(mod, "run_migration"):
+                    print(f"⚠️ No run_migration() in {name}")
+                    continue
+                # Only an explicit True is recorded: anything else fails the deploy and is retried next time
+                ok = mod.run_migration()
+                duration_ms = int((time.monotonic() - t0) * 1000)
+                if ok is not True:
+                    print(f"❌ {name} failed after {duration_ms} ms")
+                    return False
+                _record(conn, name, checksum, duration_ms)
+                print(f"✅ {name} applied in {duration_ms} ms")
+                ran += 1
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+            conn.commit()
+    engine.dispose()
+
+    total_ms = int((time.monotonic() - started) * 1000)
+    print(f"✅ Migrations completed ({ran} ran, {skipped} unchanged skipped) in {total_ms} ms")
     return True
 
 
 if __name__ == "__main__":
-    success = run()
+    success = run(force="--force" in sys.argv)
     sys.exit(0 if success else 1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compiled domain blocklist against the old per-process Python set.
+
+Pads the real blocklist with synthetic domains up to --domains entries, then
+reports lookup latency (p50/p99 for hits, subdomain hits and misses) and the
+resident memory each approach adds to a worker, split into private (RssAnon,
+paid by every worker) and file-backed (RssFile: the mmap'd pages, which sit in
+the shared page cache once for all workers).
+
+Run from project root:
+  python scripts/bench_domain_blocklist.py
+  python scripts/bench_domain_blocklist.py --domains 250000 --lookups 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils.domain_blocklist import DISPOSABLE, SOURCES, load_matcher
+
+
+def _rss_kib():
+    """(private, file-backed) resident KiB from /proc/self/status."""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                values[line.split(":")[0]] = int(line.split()[1])
+    return values.get("RssAnon", 0), values.get("RssFile", 0)
+
+
+def _rss_delta(before):
+    after = _rss_kib()
+    return after[0] - before[0], after[1] - before[1]
+
+
+def _random_domain(rng: random.Random) -> str:
+    name = "".join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(6, 14)))
+    return f"{name}.{rng.choice(['com', 'net', 'org', 'io', 'xyz', 'co.uk'])}"
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def _time_lookups(fn, domains):
+    samples = []
+    for d in domains:
+        t0 = time.perf_counter_ns()
+        fn(d)
+        samples.append(time.perf_counter_ns() - t0)
+    return _percentiles(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--domains", type=int, default=150_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    real_path = SOURCES[0][0]
+    with open(real_path, encoding="utf-8") as f:
+        domains = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    while len(domains) < args.domains:
+        domains.append(_random_domain(rng))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "blocklist.txt")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write("\n".join(domains))
+        compiled = os.path.join(tmp, "blocklist.bin")
+
+        gc.collect()
+        before = _rss_kib()
+        old_set = {d.lower() for d in domains}
+        set_kib = _rss_delta(before)
+
+        load_matcher([(src, DISPOSABLE)], compiled)  # compile once, like the build step
+        gc.collect()
+        before = _rss_kib()
+        matcher = load_matcher([(src, DISPOSABLE)], compiled)
+        hits = rng.choices(domains, k=args.lookups)
+        sub_hits = [f"x{i}.{d}" for i, d in enumerate(hits)]
+        misses = [_random_domain(rng) + ".invalid" for _ in range(args.lookups)]
+        for d in hits + misses:  # touch the pages a long-running worker would have resident
+            matcher.matches(d)
+        matcher_kib = _rss_delta(before)
+        file_kib = os.path.getsize(compiled) // 1024
+
+        print(f"Domain blocklist benchmark: {len(domains)} domains, {args.lookups} lookups per case")
+        print(f"  compiled file: {file_kib} KiB (shared page cache)")
+        print("  RSS added per worker (private / shared file-backed):")
+        print(f"    python set        {set_kib[0]:7d} KiB / {set_kib[1]:6d} KiB")
+        print(f"    compiled matcher  {matcher_kib[0]:7d} KiB / {matcher_kib[1]:6d} KiB")
+        print("  latency p50 / p99 (µs)")
+        cases = [("hit", hits), ("subdomain hit", sub_hits), ("miss", misses)]
+        for label, sample in cases:
+            p50, p99 = _time_lookups(lambda d: matcher.matches(d, DISPOSABLE), sample)
+            print(f"    matcher {label:<14} {p50 / 1000:6.2f} / {p99 / 1000:6.2f}")
+        for label, sample in cases:
+            p50, p99 = _time_lookups(lambda d: d.lower() in old_set, sample)
+            print(f"    set     {label:<14} {p50 / 1000:6.2f} / {p99 / 1000:6.2f}  (exact match only)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark message and lead search (app/services/search.py) on stress-test data.
+
+Seed first (messages per load-test account, see scripts/seed_stress_test.py):
+  python scripts/seed_stress_test.py --email you@example.com --messages 1000000
+  python scripts/seed_stress_test.py --email you@example.com --messages-only --messages 1000000
+
+Then, from project root with DATABASE_URL set:
+  python scripts/bench_search.py --email you@example.com
+  python scripts/bench_search.py --user-id 42 --runs 200
+
+Each case calls the search service directly (one DB session, no HTTP), so the
+numbers are query + result building. Target: p99 in the low milliseconds for
+every case, including deep pages and words that appear in most messages.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.services.search import search_leads, search_messages
+
+
+def _report(label: str, samples, hits) -> None:
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] / 1e6  # noqa: E731
+    print(f"  {label:<28} hits {hits:4d}  p50 {pick(0.5):6.2f} ms  p95 {pick(0.95):6.2f} ms  p99 {pick(0.99):6.2f} ms")
+
+
+def _time(fn, runs: int):
+    samples, hits = [], 0
+    for _ in range(runs):
+        t0 = time.perf_counter_ns()
+        results = fn()
+        samples.append(time.perf_counter_ns() - t0)
+        hits = len(results)
+    return samples, hits
+
+
+def _deep_page_cursor(db, user_id: int, account_id: int, q: str, pages: int):
+    cursor = None
+    for _ in range(pages):
+        _, cursor = search_messages(db, user_id, account_id, q, 20, cursor)
+        if cursor is None:
+            break
+    return cursor
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", help="User email (from backend users table)")
+    parser.add_argument("--user-id", type=int, help="users.id (instead of --email)")
+    parser.add_argument("--runs", type=int, default=100, help="runs per case")
+    args = parser.parse_args()
+    if not (args.email or args.user_id):
+        parser.error("need --email or --user-id")
+
+    db = SessionLocal()
+    try:
+        user_id = args.user_id or db.execute(
+            text("SELECT id FROM users WHERE email = :email"), {"email": args.email}
+        ).scalar()
+        account = db.execute(text("""
+            SELECT a.id, count(m.id) FROM instagram_accounts a JOIN messages m ON m.instagram_account_id = a.id
+            WHERE a.user_id = :uid AND a.username LIKE 'load_test_%'
+            GROUP BY a.id ORDER BY count(m.id) DESC LIMIT 1
+        """), {"uid": user_id}).fetchone()
+        if not user_id or not account:
+            print("ERROR: no load_test_* account with messages for this user. Seed with --messages first.")
+            return 1
+        account_id, total = account
+        needles = [row[0] for row in db.execute(text("""
+            SELECT substring(message_text from 'ref[0-9]+') FROM messages
+            WHERE instagram_account_id = :aid AND message_text ~ 'ref[0-9]' LIMIT 50
+        """), {"aid": account_id})]
+        trgm = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar() is not None
+        print(f"Account {account_id}: {total:,} messages; pg_trgm {'installed' if trgm else 'not installed'}; {args.runs} runs per case\n")
+
+        rng = random.Random(7)
+        messages = lambda q, cursor=None: (  # noqa: E731
+            lambda: search_messages(db, user_id, account_id, q, 20, cursor)[0]
+        )
+        cases = [
+            ("common word (order)", messages("order")),
+            ("topic word (refund)", messages("refund")),
+            ("two words (refund shipping)", messages("refund shipping")),
+            ("phrase (\"price order\")", messages('"price order"')),
+            ("prefix (subscr)", messages("subscr")),
+            ("no match (zebra)", messages("zebra")),
+            ("common word, page 50", messages("order", _deep_page_cursor(db, user_id, account_id, "order", 50))),
+        ]
+        if needles:
+            cases.append(("rare token (ref<n>)", lambda: search_messages(db, user_id, account_id, rng.choice(needles), 20)[0]))
+        cases += [
+            ("leads: email fragment", lambda: search_leads(db, user_id, "load_test_lead_3")[0]),
+            ("leads: name words", lambda: search_leads(db, user_id, "load test lead")[0]),
+        ]
+
+        print("Search latency (service call, 20 results per page):")
+        for label, fn in cases:
+            fn()  # Warm the cache for this plan
+            _report(label, *_time(fn, args.runs))
+        db.rollback()
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Compile app/data/*_email_*.txt into the mmap-able blocklist used by
+app.utils.domain_blocklist (runs at build time on Render, so workers only map it).
+
+Run from project root:
+  python scripts/build_domain_blocklist.py
+  python scripts/build_domain_blocklist.py --output /tmp/email_domain_blocklist.bin
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils.domain_blocklist import COMPILED_PATH, CompiledDomainMatcher, compile_blocklist, write_compiled
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=COMPILED_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    data = compile_blocklist()
+    write_compiled(data, args.output)
+    matcher = CompiledDomainMatcher(data)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"✅ {matcher.count} entries, {len(data) / 1024:.0f} KiB -> {args.output} ({elapsed_ms:.0f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
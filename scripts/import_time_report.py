@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Print an import-time report for a module (default app.main), measured with
+`python -X importtime` in a fresh interpreter.
+
+Run from project root:
+  python scripts/import_time_report.py
+  python scripts/import_time_report.py app.tasks --top 25
+  LAZY_ROUTERS=0 python scripts/import_time_report.py   # compare with eager routers
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils.import_profile import format_import_report, profile_imports
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    profile = profile_imports(args.module)
+    print(format_import_report(profile, top=args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
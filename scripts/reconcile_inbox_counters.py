@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Rebuild inbox_counters (conversations, messages in/out, unread) and
+conversations.unread_count from the messages table.
+
+The counters are maintained when messages are stored; run this after bulk
+deletes, imports or manual fixes, or if a stats screen ever looks off.
+
+Run from project root:
+  python scripts/reconcile_inbox_counters.py
+  python scripts/reconcile_inbox_counters.py --account-id 42
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.db.session import SessionLocal
+from app.services.inbox_counters import reconcile_inbox_counters
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--account-id", type=int, default=None, help="Only this Instagram account (default: all)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rows = reconcile_inbox_counters(db, args.account_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Reconcile failed: {str(e)}")
+        return 1
+    finally:
+        db.close()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"✅ Reconciled inbox counters for {rows} account(s) ({elapsed_ms:.0f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,8 @@ target user_id (or use --email / --supabase-id), then seeds:
   - 5,000 analytics events (1,000 per account) as "media post"–like data
   - 1,000 DmLog rows (200 per account) as automation logs
   - 3,000 captured leads (600 per account) for "Recent Email leads" load-test
+  - optionally, --messages N DM messages per account (with conversations) for
+    inbox / search load-tests (see scripts/bench_search.py)
 
 Uses bulk inserts for performance. Run from project root:
   python scripts/seed_stress_test.py
@@ -22,6 +24,9 @@ e.g. run:
 
   Leads-only (use existing load-test accounts):
   python scripts/seed_stress_test.py --email you@example.com --leads-only
+
+  Messages only (existing load-test accounts), e.g. 1M messages per account:
+  python scripts/seed_stress_test.py --email you@example.com --messages-only --messages 1000000
 """
 
 from __future__ import annotations
@@ -48,17 +53,29 @@ if _database_url and _database_url.startswith("postgres://"):
     os.environ["DATABASE_URL"] = "postgresql://" + _database_url[10:]
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import sessionmaker
 
 from app.models.analytics_event import AnalyticsEvent, EventType
 from app.models.automation_rule import AutomationRule
 from app.models.captured_lead import CapturedLead
+from app.models.conversation import Conversation
 from app.models.dm_log import DmLog
 from app.models.instagram_account import InstagramAccount
+from app.models.message import Message
 
 BATCH_SIZE = 1000
 MEDIA_TYPES = ("IMAGE", "VIDEO", "CAROUSEL")
 PLACEHOLDER_CREDENTIALS = "load_test_placeholder"
+MESSAGE_BATCH_SIZE = 5000
+MESSAGES_PER_CONVERSATION = 40
+# Zipf-ish vocabulary: a few words appear in most messages, most words are rare
+COMMON_WORDS = ("hi", "hello", "thanks", "please", "price", "order", "link", "yes", "ok", "info")
+TOPIC_WORDS = (
+    "shipping", "refund", "size", "colour", "discount", "coupon", "delivery", "tracking", "invoice",
+    "wholesale", "collab", "giveaway", "restock", "preorder", "exchange", "warranty", "catalog",
+    "tutorial", "webinar", "booking", "appointment", "consultation", "subscription", "membership",
+)
 
 
 def get_session():
@@ -131,17 +148,76 @@ def _seed_leads_only(sess, user_id: int, account_ids: list[int], account_to_rule
     print(f"  Inserted {len(leads)} captured leads.")
 
 
+def _message_text(rng: random.Random, i: int) -> str:
+    words = [rng.choice(COMMON_WORDS) for _ in range(rng.randint(1, 4))]
+    words += [rng.choice(TOPIC_WORDS) for _ in range(rng.randint(0, 2))]
+    if rng.random() < 0.01:
+        words.append(f"ref{i}")  # Unique token: a needle for "rare word" searches
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def _seed_messages(sess, user_id: int, account_ids: list[int], account_usernames: dict[int, str], per_account: int) -> None:
+    """Conversations + per_account messages per account, inserted in MESSAGE_BATCH_SIZE batches."""
+    rng = random.Random(42)
+    base_ts = datetime.utcnow()
+    for aid in account_ids:
+        n_conversations = max(1, per_account // MESSAGES_PER_CONVERSATION)
+        participants = [f"load_test_participant_{aid}_{c}" for c in range(n_conversations)]
+        sess.execute(pg_insert(Conversation.__table__).on_conflict_do_nothing(), [{
+            "user_id": user_id,
+            "instagram_account_id": aid,
+            "participant_id": pid,
+            "participant_name": pid,
+            "updated_at": base_ts,
+            "created_at": base_ts,
+        } for pid in participants])
+        conversation_ids = dict(sess.execute(
+            text("SELECT participant_id, id FROM conversations WHERE instagram_account_id = :aid"), {"aid": aid}
+        ).fetchall())
+        own = f"load_test_igsid_{aid}"
+        for start in range(0, per_account, MESSAGE_BATCH_SIZE):
+            batch = []
+            for i in range(start, min(per_account, start + MESSAGE_BATCH_SIZE)):
+                pid = participants[i % n_conversations]
+                from_bot = rng.random() < 0.4
+                body = _message_text(rng, i)
+                batch.append({
+                    "user_id": user_id,
+                    "instagram_account_id": aid,
+                    "conversation_id": conversation_ids[pid],
+                    "sender_id": own if from_bot else pid,
+                    "sender_username": account_usernames[aid] if from_bot else pid,
+                    "recipient_id": pid if from_bot else own,
+                    "recipient_username": pid if from_bot else account_usernames[aid],
+                    "message_text": body,
+                    "content": body,
+                    "is_from_bot": from_bot,
+                    "has_attachments": False,
+                    "created_at": base_ts - timedelta(minutes=per_account - i),
+                })
+            sess.execute(Message.__table__.insert(), batch)
+            sess.commit()
+            print(f"  account {aid}: {min(per_account, start + MESSAGE_BATCH_SIZE)}/{per_account} messages", end="\r")
+        print(f"  account {aid}: {per_account} messages in {n_conversations} conversations")
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
-        description="Seed stress-test data (5 accounts, 5k events, 1k DmLogs, 3k leads) for a user."
+        description="Seed stress-test data (5 accounts, 5k events, 1k DmLogs, 3k leads, optional messages) for a user."
     )
     parser.add_argument("--email", type=str, help="User email (from backend users table)")
     parser.add_argument("--supabase-id", type=str, dest="supabase_id", help="Supabase Auth UID")
     parser.add_argument("--leads-only", action="store_true", help="Only seed 3k leads; use existing load_test_* accounts")
+    parser.add_argument("--messages", type=int, default=0, help="Also seed this many DM messages per account")
+    parser.add_argument("--messages-only", action="store_true", help="Only seed --messages; use existing load_test_* accounts")
     args = parser.parse_args()
 
-    if args.leads_only and not (args.email or args.supabase_id):
-        print("ERROR: --leads-only requires --email or --supabase-id.")
+    if (args.leads_only or args.messages_only) and not (args.email or args.supabase_id):
+        print("ERROR: --leads-only / --messages-only require --email or --supabase-id.")
+        sys.exit(1)
+    if args.messages_only and args.messages <= 0:
+        print("ERROR: --messages-only requires --messages N.")
         sys.exit(1)
 
     print("Stress-test seeder — bulk data for pagination/lists/speed testing\n")
@@ -168,6 +244,21 @@ def main() -> None:
     try:
         ensure_user_exists(sess, user_id)
 
+        if args.messages_only:
+            rows = sess.execute(
+                text("SELECT id, username FROM instagram_accounts WHERE user_id = :uid AND username LIKE 'load_test_%' ORDER BY id"),
+                {"uid": user_id},
+            ).fetchall()
+            if not rows:
+                print("ERROR: No load_test_* accounts found for this user. Run full seed first.")
+                sys.exit(1)
+            print(f"Bulk-inserting {args.messages:,} messages per load-test account...")
+            _seed_messages(sess, user_id, [r[0] for r in rows], {r[0]: r[1] for r in rows}, args.messages)
+            sess.execute(text("ANALYZE messages"))
+            sess.commit()
+            print("\nDone. Messages seeded.")
+            return
+
         if args.leads_only:
             # Use existing load-test accounts; ensure rules; seed 3k leads only
             print("Leads-only mode: using existing load_test_* accounts.\n")
@@ -297,8 +388,14 @@ def main() -> None:
         # 5. Bulk-insert 3,000 captured leads (600 per account)
         print("Bulk-inserting 3,000 captured leads (600 per account)...")
         _seed_leads_only(sess, user_id, account_ids, account_to_rule)
-
         sess.commit()
+
+        if args.messages > 0:
+            print(f"Bulk-inserting {args.messages:,} messages per account...")
+            _seed_messages(sess, user_id, account_ids, account_usernames, args.messages)
+            sess.execute(text("ANALYZE messages"))
+            sess.commit()
+
         print("\nDone. Stress-test data seeded successfully.")
     except Exception as e:
         sess.rollback()
@@ -306,7 +403,12 @@ def main() -> None:
         raise
     finally:
         sess.close()
-        if args.leads_only:
+        if args.messages_only:
+            print("\n--- Cleanup (messages only) ---\n")
+            print("DELETE FROM messages WHERE instagram_account_id IN (SELECT id FROM instagram_accounts WHERE username LIKE 'load_test_%');")
+            print("DELETE FROM conversations WHERE instagram_account_id IN (SELECT id FROM instagram_accounts WHERE username LIKE 'load_test_%');")
+            print()
+        elif args.leads_only:
             print("\n--- Cleanup (leads only) ---\n")
             print("DELETE FROM captured_leads WHERE instagram_account_id IN (SELECT id FROM instagram_accounts WHERE username LIKE 'load_test_%');")
             print()
@@ -324,7 +426,11 @@ def main() -> None:
             print("-- 4. Analytics events for load-test accounts")
             print("DELETE FROM analytics_events WHERE instagram_account_id IN (SELECT id FROM instagram_accounts WHERE username LIKE 'load_test_%');")
             print()
-            print("-- 5. Load-test Instagram accounts")
+            print("-- 5. Messages and conversations for load-test accounts (if seeded with --messages)")
+            print("DELETE FROM messages WHERE instagram_account_id IN (SELECT id FROM instagram_accounts WHERE username LIKE 'load_test_%');")
+            print("DELETE FROM conversations WHERE instagram_account_id IN (SELECT id FROM instagram_accounts WHERE username LIKE 'load_test_%');")
+            print()
+            print("-- 6. Load-test Instagram accounts")
             print("DELETE FROM instagram_accounts WHERE username LIKE 'load_test_%';")
             print()
 
@@ -0,0 +1,43 @@
+"""Tests for audience_activity write-coalescing and VIP cache (no database)."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def activity(monkeypatch):
+    from app.services import audience_activity
+
+    monkeypatch.setattr(audience_activity, "_ensure_flusher_started", lambda: None)
+    audience_activity._pending_touches.clear()
+    audience_activity._vip_cache.clear()
+    yield audience_activity
+    audience_activity._pending_touches.clear()
+    audience_activity._vip_cache.clear()
+
+
+def test_touch_keeps_latest_timestamp_per_sender(activity):
+    now = datetime.utcnow()
+    activity.touch_audience("123", 1, now)
+    activity.touch_audience("123", 1, now - timedelta(seconds=5))
+    activity.touch_audience("123", 1, now + timedelta(seconds=5))
+    activity.touch_audience("456", 1, now)
+
+    assert activity._pending_touches == {
+        ("123", 1): now + timedelta(seconds=5),
+        ("456", 1): now,
+    }
+
+
+def test_only_vip_status_is_cached(activity):
+    activity.cache_vip_status("1", 1, {"is_converted": False, "has_email": True})
+    assert activity.get_cached_vip_status("1", 1) is None
+
+    vip = {"is_converted": True, "has_email": True, "has_phone": True, "is_following": True}
+    activity.cache_vip_status("2", 1, vip)
+    assert activity.get_cached_vip_status("2", 1) == vip
+    assert activity.get_cached_vip_status("2", 2) is None
+
+    activity.invalidate_vip_status("2", 1)
+    assert activity.get_cached_vip_status("2", 1) is None
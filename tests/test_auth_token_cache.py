@@ -0,0 +1,58 @@
+"""Tests for the verified-token claims cache in app.dependencies.auth."""
+
+import time
+
+import jwt
+
+from app.dependencies import auth
+
+SECRET = "test-secret-for-hs256-signing-key-32b"
+
+
+def _token(exp_in: int) -> str:
+    claims = {"sub": "sub-1", "email": "a@example.com", "aud": "authenticated", "exp": int(time.time()) + exp_in}
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+def test_verified_claims_are_cached_until_exp(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SECRET)
+    token = _token(600)
+    calls = []
+    real_decode = jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+
+    first = auth.verify_supabase_token(f"Bearer {token}")
+    second = auth.verify_supabase_token(f"Bearer {token}")
+
+    assert first == second
+    assert first["sub"] == "sub-1"
+    assert len(calls) == 1
+
+
+def test_expired_cache_entry_is_not_used():
+    key = auth._token_hash("expired-token")
+    auth._claims_cache[key] = ({"sub": "x"}, time.time() - 1)
+
+    assert auth._cache_get(auth._claims_cache, key) is None
+    assert key not in auth._claims_cache
+
+
+def test_invalidate_user_cache_drops_mappings():
+    auth._cache_put(auth._user_id_cache, "k1", 42, time.time() + 60)
+    auth._cache_put(auth._user_id_cache, "k2", 7, time.time() + 60)
+
+    auth.invalidate_user_cache(42)
+
+    assert auth._cache_get(auth._user_id_cache, "k1") is None
+    assert auth._cache_get(auth._user_id_cache, "k2") == 7
+
+
+def test_user_id_cache_is_capped_below_token_exp(monkeypatch):
+    token = _token(3600)
+    exp = time.time() + 3600
+    monkeypatch.setattr(auth, "verify_supabase_token", lambda authorization: {"sub": "sub-9", "email": "b@example.com", "exp": exp})
+    monkeypatch.setattr(auth, "_resolve_user_id", lambda db, email, sub: 9)
+
+    assert auth.get_current_user_id(f"Bearer {token}", db=None) == 9
+    _, expires_at = auth._user_id_cache[auth._token_hash(token)]
+    assert expires_at <= time.time() + auth._USER_ID_CACHE_TTL_SECONDS < exp
@@ -0,0 +1,67 @@
+"""Tests for the Dodo billing webhook inbox: ordering keys, retries and the acknowledge-only endpoint (fake DB)."""
+
+import json
+from datetime import datetime, timedelta
+
+import prometheus_client
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import webhooks
+from app.db.session import get_db
+from app.services import billing_events
+
+
+def test_events_are_ordered_by_subscription_then_customer_then_payment():
+    data = {"subscription_id": "sub_1", "customer": {"customer_id": "cus_1"}, "payment_id": "pay_1"}
+    assert billing_events.ordering_key({"data": data}) == "sub:sub_1"
+    data.pop("subscription_id")
+    assert billing_events.ordering_key({"data": data}) == "cus:cus_1"
+    assert billing_events.ordering_key({"data": {"payment_id": "pay_1"}}) == "pay:pay_1"
+    assert billing_events.ordering_key({}) == "none"
+
+
+def test_event_time_prefers_the_payload_timestamp():
+    assert billing_events.event_time({"timestamp": "2026-05-01T10:00:00+02:00"}, "0") == datetime(2026, 5, 1, 8, 0)
+    assert billing_events.event_time({}, "1767225600") == datetime(2026, 1, 1)
+    assert billing_events.retry_delay(1) == timedelta(seconds=5)
+    assert billing_events.retry_delay(3) == timedelta(seconds=20)
+    assert billing_events.retry_delay(50) == timedelta(hours=1)
+
+
+def test_webhook_only_stores_the_event_and_acknowledges(monkeypatch, fake_db):
+    stored, woken = {}, []
+
+    def enqueue(db, webhook_id, event, webhook_timestamp=None):
+        is_new = webhook_id not in stored
+        stored.setdefault(webhook_id, event)
+        return is_new
+
+    monkeypatch.setattr(webhooks, "DODO_WEBHOOK_SECRET", "")
+    monkeypatch.setattr(billing_events, "enqueue_billing_event", enqueue)
+    monkeypatch.setattr(billing_events, "wake_billing_event_worker", lambda: woken.append(True))
+    monkeypatch.setattr(webhooks, "apply_dodo_event", lambda db, data: (_ for _ in ()).throw(AssertionError("applied inline")))
+
+    db = fake_db()
+    app = FastAPI()
+    app.include_router(webhooks.router, prefix="/webhooks")
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+
+    body = json.dumps({"type": "subscription.cancelled", "data": {"subscription_id": "sub_1"}})
+    for _ in range(2):
+        response = client.post("/webhooks/dodo", content=body, headers={"webhook-id": "msg_1"})
+        assert response.status_code == 200
+    assert list(stored) == ["msg_1"]
+    assert woken == [True]  # The redelivery was a no-op
+    assert db.commits == 2
+
+    # Without a webhook-id the body is the dedup key
+    client.post("/webhooks/dodo", content=body)
+    client.post("/webhooks/dodo", content=body)
+    assert len(stored) == 2 and len(woken) == 2
+
+    # Rejected deliveries are timed too
+    acks = prometheus_client.REGISTRY.get_sample_value("webhook_ack_seconds_count", {"source": "dodo"})
+    assert client.post("/webhooks/dodo", content="[]").status_code == 400
+    assert prometheus_client.REGISTRY.get_sample_value("webhook_ack_seconds_count", {"source": "dodo"}) == acks + 1
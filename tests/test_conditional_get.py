@@ -0,0 +1,54 @@
+"""Tests for ETag / If-None-Match handling via version stamps (fake DB, no Postgres)."""
+
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from app.services import data_versions
+
+
+def _client(db, calls):
+    app = FastAPI()
+
+    @app.get("/stats")
+    def stats(request: Request, response: Response, account_id: int = 1):
+        cached = data_versions.not_modified(
+            request, response, db, "stats", 7, "account", "conversations",
+            account_id=account_id, require=("account",),
+        )
+        if cached is not None:
+            return cached
+        calls.append(account_id)
+        return {"total": 3}
+
+    return TestClient(app)
+
+
+def test_matching_etag_short_circuits_before_the_endpoint_body(fake_db):
+    db, calls = fake_db(row=(4, 1, 10, "2026-01-01")), []
+    client = _client(db, calls)
+    first = client.get("/stats")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == data_versions.CACHE_CONTROL
+
+    again = client.get("/stats", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert calls == [1]
+
+    db.row = (4, 1, 11, "2026-01-01")  # New conversation
+    assert client.get("/stats", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_no_etag_when_required_source_is_missing(fake_db):
+    db, calls = fake_db(row=(0, None, None, None)), []  # Account not owned by the user
+    response = _client(db, calls).get("/stats")
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+
+def test_etag_comparison_is_weak():
+    assert data_versions._etag_matches('"abc", W/"def"', 'W/"def"')
+    assert data_versions._etag_matches('"def"', 'W/"def"')
+    assert not data_versions._etag_matches('W/"de"', 'W/"def"')
@@ -0,0 +1,65 @@
+"""Tests for the compiled, mmap-shared email domain blocklist."""
+
+import os
+
+from app.utils import domain_blocklist
+from app.utils.domain_blocklist import DISPOSABLE, PLACEHOLDER, load_matcher
+
+
+def _write(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def test_suffix_wildcard_and_glob_entries(tmp_path):
+    src = tmp_path / "disposable.txt"
+    placeholder = tmp_path / "placeholder.txt"
+    _write(src, ["# comment", "Mailinator.com", "*.wild.net", "temp*mail.org"])
+    _write(placeholder, ["example.com"])
+    matcher = load_matcher([(str(src), DISPOSABLE), (str(placeholder), PLACEHOLDER)], str(tmp_path / "bl.bin"))
+
+    assert matcher.matches("mailinator.com")
+    assert matcher.matches("x.y.MAILINATOR.com")
+    assert not matcher.matches("notmailinator.com")
+    assert matcher.matches("a.wild.net") and not matcher.matches("wild.net")
+    assert matcher.matches("temp-fast-mail.org")
+    assert matcher.matches("example.com", PLACEHOLDER)
+    assert not matcher.matches("example.com", DISPOSABLE)
+    assert matcher.count_kind(DISPOSABLE) == 3
+
+
+def test_stale_compiled_file_is_rebuilt(tmp_path):
+    src = tmp_path / "disposable.txt"
+    compiled = str(tmp_path / "bl.bin")
+    _write(src, ["one.com"])
+    assert load_matcher([(str(src), DISPOSABLE)], compiled).matches("one.com")
+
+    _write(src, ["two.com"])
+    matcher = load_matcher([(str(src), DISPOSABLE)], compiled)
+    assert matcher.matches("two.com") and not matcher.matches("one.com")
+    assert matcher.origin == compiled
+
+
+def test_hot_reload_picks_up_source_edits(tmp_path, monkeypatch):
+    src = tmp_path / "disposable.txt"
+    _write(src, ["one.com"])
+    monkeypatch.setattr(domain_blocklist, "SOURCES", ((str(src), DISPOSABLE),))
+    monkeypatch.setattr(domain_blocklist, "COMPILED_PATH", str(tmp_path / "bl.bin"))
+    monkeypatch.setattr(domain_blocklist, "RELOAD_CHECK_SECONDS", 0)
+    monkeypatch.setattr(domain_blocklist, "_matcher", None)
+
+    assert domain_blocklist.get_matcher().matches("one.com")
+    _write(src, ["one.com", "fresh.io"])
+    os.utime(src, ns=(0, os.stat(src).st_mtime_ns + 1_000_000))
+    assert domain_blocklist.get_matcher().matches("mx.fresh.io")
+
+
+def test_shipped_lists_cover_subdomains_and_placeholders():
+    from app.services.lead_capture_email_validation import _layer4_disposable_domain
+    from app.utils.disposable_email import is_disposable_email
+
+    assert is_disposable_email("a@x.mailinator.com")
+    assert not is_disposable_email("a@gmail.com")
+    assert not is_disposable_email("a@example.com")
+    assert _layer4_disposable_domain("example.com")
+    assert _layer4_disposable_domain("tempmail.com")
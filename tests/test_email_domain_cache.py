@@ -0,0 +1,66 @@
+"""Tests for cached, coalesced MX deliverability checks."""
+
+import threading
+import time
+
+from email_validator import EmailUndeliverableError
+from email_validator import deliverability
+
+from app.services import email_domain_cache
+
+
+def test_top_providers_never_hit_dns(monkeypatch):
+    monkeypatch.setattr(deliverability, "validate_email_deliverability", lambda *a, **kw: 1 / 0)
+
+    assert email_domain_cache.check_domain_deliverable("gmail.com", timeout=1) is True
+
+
+def test_concurrent_checks_share_one_lookup_and_cache_it(monkeypatch):
+    calls = []
+
+    def slow_lookup(domain, domain_i18n, timeout=None):
+        calls.append(domain)
+        time.sleep(0.05)
+        return {"mx": [(10, "mx." + domain)]}
+
+    monkeypatch.setattr(deliverability, "validate_email_deliverability", slow_lookup)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(
+            email_domain_cache.check_domain_deliverable("coalesce-test.example", timeout=2)
+        ))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [True] * 8
+    assert calls == ["coalesce-test.example"]
+    assert email_domain_cache.get_cached_deliverability("coalesce-test.example") is True
+
+
+def test_undeliverable_is_negatively_cached(monkeypatch):
+    calls = []
+
+    def no_mx(domain, domain_i18n, timeout=None):
+        calls.append(domain)
+        raise EmailUndeliverableError("no MX")
+
+    monkeypatch.setattr(deliverability, "validate_email_deliverability", no_mx)
+
+    assert email_domain_cache.check_domain_deliverable("no-mx-test.example", timeout=1) is False
+    assert email_domain_cache.check_domain_deliverable("no-mx-test.example", timeout=1) is False
+    assert len(calls) == 1
+
+
+def test_timeout_returns_unknown_and_is_not_cached(monkeypatch):
+    def hang(domain, domain_i18n, timeout=None):
+        time.sleep(0.3)
+        return {"mx": [(10, "mx")]}
+
+    monkeypatch.setattr(deliverability, "validate_email_deliverability", hang)
+
+    assert email_domain_cache.check_domain_deliverable("slow-test.example", timeout=0.05) is None
+    assert email_domain_cache.get_cached_deliverability("slow-test.example") is None
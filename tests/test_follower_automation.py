@@ -0,0 +1,105 @@
+"""Tests for the new_follower automation: processed followers are marked and skipped, failed runs release the lock."""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.follower import Follower
+from app.services import automation_engine
+from app.services.automation_engine import AutomationEngine
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Follower.__table__.create(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_budget_cut_resumes_with_unprocessed_followers_in_order(monkeypatch):
+    db = _session()
+    now = datetime.utcnow()
+    # Inserted newest first: processing must still go oldest first
+    for i, minutes_ago in enumerate((5, 10, 20, 30)):
+        db.add(Follower(instagram_account_id=1, username=f"u{i}", fetched_at=now - timedelta(minutes=minutes_ago)))
+    db.add(Follower(instagram_account_id=1, username="old", fetched_at=now - timedelta(hours=2)))
+    db.commit()
+
+    sent = []
+    engine = AutomationEngine(db)
+    monkeypatch.setattr(engine, "get_active_rules", lambda account_id, trigger: ["rule"])
+    monkeypatch.setattr(engine, "execute_rule", lambda account_id, rule, follower: sent.append(follower["username"]) or True)
+
+    clock = iter([0.0, 0.0, 5.0])  # Budget runs out before the third follower
+    monkeypatch.setattr(automation_engine.time, "monotonic", lambda: next(clock))
+    result = engine.process_new_follower_trigger(1, deadline=1.0)
+    assert result["budget_exhausted"] and result["actions_executed"] == 2
+    assert sent == ["u3", "u2"]
+
+    monkeypatch.setattr(automation_engine.time, "monotonic", lambda: 0.0)
+    result = engine.process_new_follower_trigger(1, deadline=1.0)
+    assert not result["budget_exhausted"] and result["new_followers_count"] == 2
+    assert sent == ["u3", "u2", "u1", "u0"]
+
+    assert engine.process_new_follower_trigger(1)["new_followers_count"] == 0
+    assert db.query(Follower).filter(Follower.automation_processed_at.is_(None)).count() == 1  # "old"
+
+
+def test_login_failure_leaves_followers_for_the_next_run(monkeypatch):
+    from types import SimpleNamespace
+
+    db = _session()
+    now = datetime.utcnow()
+    for i in range(3):
+        db.add(Follower(instagram_account_id=1, user_id=f"{i + 100}", username=f"u{i}", fetched_at=now - timedelta(minutes=i)))
+    db.commit()
+
+    account = SimpleNamespace(id=1, user_id=7, username="shop")
+    rule = SimpleNamespace(action_type="send_dm", config={"message": "Hi {username}"})
+    logins, sent = [], []
+
+    def get_client(acc):
+        logins.append(acc.id)
+        if len(logins) == 1:
+            raise RuntimeError("challenge_required")
+        return SimpleNamespace(send_dm=lambda ids, message: sent.append((ids, message)))
+
+    monkeypatch.setattr(automation_engine.instagram_client_pool, "get_client", get_client)
+    monkeypatch.setattr(automation_engine, "check_dm_limit", lambda *a, **kw: None)
+    monkeypatch.setattr(automation_engine, "log_dm_sent", lambda **kw: None)
+
+    engine = AutomationEngine(db)
+    monkeypatch.setattr(engine, "get_account", lambda account_id: account)
+    monkeypatch.setattr(engine, "get_active_rules", lambda account_id, trigger: [rule])
+    result = engine.process_new_follower_trigger(1)
+    assert result["retry_later"] and result["actions_executed"] == 0
+    assert logins == [1]  # Stopped at the first follower
+    assert db.query(Follower).filter(Follower.automation_processed_at.is_(None)).count() == 3
+
+    engine = AutomationEngine(db)  # Next beat
+    monkeypatch.setattr(engine, "get_account", lambda account_id: account)
+    monkeypatch.setattr(engine, "get_active_rules", lambda account_id, trigger: [rule])
+    result = engine.process_new_follower_trigger(1)
+    assert not result["retry_later"] and result["actions_executed"] == 3
+    assert [message for _, message in sent] == ["Hi u2", "Hi u1", "Hi u0"]
+    assert db.query(Follower).filter(Follower.automation_processed_at.is_(None)).count() == 0
+
+
+def test_failed_chunk_releases_run_lock(monkeypatch, fake_db):
+    from app.tasks import instagram_tasks
+
+    class _Redis:
+        def set(self, *args, **kwargs):
+            return True
+
+    dispatched = []
+    monkeypatch.setattr(instagram_tasks, "_get_redis", lambda: _Redis())
+    monkeypatch.setattr(instagram_tasks, "SessionLocal", lambda: fake_db(query_rows=[(1,), (2,)]))
+    monkeypatch.setattr(instagram_tasks, "chord", lambda header: dispatched.append)
+
+    assert instagram_tasks.process_automation_rules()["status"] == "scheduled"
+    (callback,) = dispatched
+    (errback,) = callback.options["link_error"]
+    assert errback["task"] == "release_automation_run_lock"
+    assert errback["args"] == callback.args[1:]  # Same lock token
+    assert errback["immutable"]
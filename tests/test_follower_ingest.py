@@ -0,0 +1,23 @@
+"""Tests for the follower set diff used by bulk follower ingestion."""
+
+from app.services.follower_ingest import diff_followers
+
+
+def test_diff_classifies_new_refollowed_and_removed():
+    active = {"alice", "bob", "carol"}
+    unfollowed = {"dave", "erin"}
+    fetched = {"alice", "carol", "dave", "frank"}
+
+    new, refollowed, removed = diff_followers(active, unfollowed, fetched)
+
+    assert new == {"frank"}
+    assert refollowed == {"dave"}
+    assert removed == {"bob"}
+
+
+def test_diff_first_fetch_is_all_new():
+    new, refollowed, removed = diff_followers(set(), set(), {"a", "b"})
+
+    assert new == {"a", "b"}
+    assert refollowed == set()
+    assert removed == set()
@@ -0,0 +1,57 @@
+"""Import-time budget for app.main and lazy router loading."""
+
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.router_loader import LazyRouterLoader, LazyRouterMiddleware, RouterSpec
+from app.utils.import_profile import parse_importtime, profile_imports
+
+# The profiled subprocess gets conftest's placeholder DATABASE_URL so importing app.db.session needs no real DB
+_ENV = {"DATABASE_URL": os.environ["DATABASE_URL"], "LAZY_ROUTERS": "1"}
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2500"))
+
+
+def test_parse_importtime():
+    output = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   app.db",
+        "import time:      2000 |       5000 | app.main",
+    ])
+
+    timings = parse_importtime(output)
+
+    assert [(t.module, t.self_us, t.cumulative_us, t.depth) for t in timings] == [
+        ("app.db", 120, 120, 1),
+        ("app.main", 2000, 5000, 0),
+    ]
+
+
+def test_app_main_defers_heavy_imports():
+    profile = profile_imports("app.main", env=_ENV)
+
+    assert "instagrapi" not in profile["modules"]
+    assert "app.api.routes.instagram" not in profile["modules"]
+
+
+def test_app_main_import_budget():
+    profile = profile_imports("app.main", env=_ENV)
+
+    assert profile["total_ms"] <= IMPORT_TIME_BUDGET_MS, (
+        f"import app.main took {profile['total_ms']} ms (budget {IMPORT_TIME_BUDGET_MS} ms)"
+    )
+
+
+def test_lazy_router_is_included_on_first_request():
+    app = FastAPI()
+    loader = LazyRouterLoader(app, [RouterSpec("app.api.routes.leads", "/api", ["Leads"])])
+    app.add_middleware(LazyRouterMiddleware, loader=loader)
+    client = TestClient(app)
+
+    assert loader.pending
+    response = client.get("/api/leads")
+
+    assert not loader.pending
+    assert response.status_code != 404
@@ -0,0 +1,51 @@
+"""Tests for per-account inbox counters: when they are bumped and the stats read path (no database)."""
+
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app.api.routes import instagram
+from app.db import upsert
+from app.models.conversation import Conversation
+from app.services import inbox_counters
+
+
+def test_upsert_reports_insert_from_xmax(fake_db):
+    conversation = SimpleNamespace(id=5)
+    db = fake_db(respond=lambda statement, params: SimpleNamespace(one=lambda: (conversation, False)))
+    assert upsert.upsert_conversation(db, 7, 3, "177") == (conversation, False)
+    sql = str(db.statements[0][0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT" in sql and sql.endswith("(xmax = 0) AS inserted")
+
+
+def test_only_inserted_conversations_are_counted(monkeypatch, fake_db):
+    calls = []
+    monkeypatch.setattr(inbox_counters, "increment_inbox_counters", lambda db, *a, **kw: calls.append((a, kw)))
+    conversation = SimpleNamespace(id=5)
+    for inserted in (True, False):
+        monkeypatch.setattr(upsert, "upsert_conversation", lambda db, **kw: (conversation, inserted))
+        assert instagram.get_or_create_conversation(fake_db(), 7, 3, "177") is conversation
+    assert calls == [((3, 7), {"conversations": 1})]
+
+
+def test_outgoing_message_marks_conversation_read_in_one_statement(fake_db):
+    db = fake_db()
+    conversation = Conversation(id=5, instagram_account_id=3, user_id=7, unread_count=4)
+    inbox_counters.record_outgoing(db, conversation)
+    assert len(db.statements) == 1
+    statement, params = db.statements[0]
+    sql = str(statement)
+    assert "FOR UPDATE" in sql and "inbox_counters" in sql
+    assert params == {"conversation_id": 5, "account_id": 3, "user_id": 7}
+    assert conversation.unread_count == 0
+
+
+def test_stats_read_is_a_primary_key_get_and_missing_rows_are_reconciled_once(fake_db):
+    row = SimpleNamespace(conversations=2, messages_in=10, messages_out=4, unread=1)
+    db = fake_db(rows={3: row})
+    assert inbox_counters.get_inbox_counters(db, 3) is row
+    assert db.statements == [] and db.commits == 0
+
+    db = fake_db(rowcount=0)  # Account not found: nothing written, nothing committed
+    assert inbox_counters.get_inbox_counters(db, 9) is None
+    assert len(db.statements) == 2 and db.commits == 0
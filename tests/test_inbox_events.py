@@ -0,0 +1,87 @@
+"""Tests for the inbox event hub: payloads, fan-out to subscribers, SSE framing (no database)."""
+
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.services import inbox_events
+
+
+def _conversation():
+    return SimpleNamespace(id=5, participant_id="177", participant_name="jane", last_message="hi",
+                           updated_at=datetime(2026, 1, 2, 3, 4, 5))
+
+
+def _message(**overrides):
+    fields = dict(id=9, message_id="m_1", message_text="hi", content="hi", is_from_bot=False,
+                  sender_username="jane", recipient_username="shop", has_attachments=False,
+                  attachments=None, created_at=datetime(2026, 1, 2, 3, 4, 5))
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def test_payload_stays_under_notify_limit():
+    payload = json.loads(inbox_events._build_payload(3, _conversation(), _message()))
+    assert payload["account_id"] == 3
+    assert payload["message"]["conversation_id"] == 5
+    assert payload["conversation"]["updated_at"] == "2026-01-02T03:04:05"
+
+    big = _message(message_text="x" * 5000, attachments=[{"url": "https://cdn/" + "a" * 9000}])
+    encoded = inbox_events._build_payload(3, _conversation(), big)
+    assert len(encoded.encode()) <= inbox_events._MAX_PAYLOAD_BYTES
+    assert json.loads(encoded)["message"]["truncated"] is True
+
+
+def test_non_ascii_text_is_cut_in_bytes_to_fit():
+    emoji = "\U0001F600"
+    conversation = _conversation()
+    conversation.last_message = emoji * 1000
+    encoded = inbox_events._build_payload(3, conversation, _message(message_text=emoji * 1000))
+    assert len(encoded.encode()) <= inbox_events._MAX_PAYLOAD_BYTES
+    payload = json.loads(encoded)
+    assert payload["message"]["truncated"] is True
+    assert 0 < len(payload["message"]["text"]) < 1000 and set(payload["message"]["text"]) == {emoji}
+    assert payload["conversation"]["last_message"] == emoji * 1000
+
+    small = json.loads(inbox_events._build_payload(3, _conversation(), _message(message_text=emoji * 1000)))
+    assert small["message"]["text"] == emoji * 1000  # Measured unescaped: 4 bytes per emoji, fits
+
+
+def test_failed_notify_does_not_fail_the_callers_transaction(fake_db):
+    def respond(statement, params):
+        raise RuntimeError("payload string too long")
+
+    db = fake_db(respond=respond)
+    inbox_events.publish_message_stored(db, 3, _conversation(), _message())
+    assert db.savepoints == 1 and len(db.statements) == 1
+
+
+def test_dispatch_fans_out_per_account_and_resyncs_slow_subscribers(monkeypatch):
+    monkeypatch.setattr(inbox_events, "_ensure_listener_started", lambda: None)
+    monkeypatch.setattr(inbox_events, "MAX_QUEUED_EVENTS", 2)
+
+    async def scenario():
+        mine = inbox_events.subscribe(3)
+        other = inbox_events.subscribe(4)
+        try:
+            raw = inbox_events._build_payload(3, _conversation(), _message())
+            assert inbox_events.dispatch(raw) == 1
+            await asyncio.sleep(0)
+            event = mine.queue.get_nowait()
+            assert other.queue.empty()
+            frames = inbox_events.format_sse(event)
+            assert frames.startswith("event: conversation_updated\n")
+            assert "event: new_message\ndata: " in frames
+
+            for _ in range(3):
+                inbox_events.dispatch(raw)
+            await asyncio.sleep(0)
+            assert mine.queue.qsize() == 1
+            assert mine.queue.get_nowait() == inbox_events.RESYNC_EVENT
+        finally:
+            inbox_events.unsubscribe(3, mine)
+            inbox_events.unsubscribe(4, other)
+        assert inbox_events.subscriber_count() == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+"""Tests for the per-account instagrapi client pool."""
+
+from types import SimpleNamespace
+
+from app.services import instagram_client_pool
+
+
+def _fake_login(calls):
+    def login(account):
+        calls.append(account.id)
+        return object()
+    return login
+
+
+def test_pool_logs_in_once_per_account(monkeypatch):
+    calls = []
+    monkeypatch.setattr(instagram_client_pool, "_login", _fake_login(calls))
+    instagram_client_pool.clear_pool()
+
+    account = SimpleNamespace(id=1)
+    first = instagram_client_pool.get_client(account)
+    second = instagram_client_pool.get_client(account)
+    instagram_client_pool.get_client(SimpleNamespace(id=2))
+
+    assert first is second
+    assert calls == [1, 2]
+
+
+def test_invalidate_and_idle_eviction_force_new_login(monkeypatch):
+    calls = []
+    monkeypatch.setattr(instagram_client_pool, "_login", _fake_login(calls))
+    instagram_client_pool.clear_pool()
+    account = SimpleNamespace(id=7)
+
+    instagram_client_pool.get_client(account)
+    instagram_client_pool.invalidate(7)
+    instagram_client_pool.get_client(account)
+
+    monkeypatch.setattr(instagram_client_pool, "IDLE_SECONDS", 0)
+    instagram_client_pool.get_client(account)
+
+    assert calls == [7, 7, 7]
+
+
+
+def test_session_settings_are_saved_outside_the_callers_session(monkeypatch, tmp_path):
+    import app.db.session
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import sessionmaker
+    from app.models.follower import Follower
+    from app.models.instagram_account import InstagramAccount
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE instagram_accounts (id INTEGER PRIMARY KEY, encrypted_session_settings VARCHAR)"))
+        conn.execute(text("INSERT INTO instagram_accounts (id) VALUES (3)"))
+    monkeypatch.setattr(app.db.session, "engine", engine)
+    monkeypatch.setattr(instagram_client_pool, "encrypt_credentials", lambda value: "enc:" + value)
+
+    # The caller has unrelated pending work in its own session
+    caller = sessionmaker(bind=engine)()
+    pending = Follower(instagram_account_id=3, username="someone")
+    caller.add(pending)
+
+    account = InstagramAccount(id=3)
+    instagram_client_pool._save_session_settings(account, SimpleNamespace(dump_settings=lambda: {"uuid": "x"}))
+
+    assert pending in caller.new
+    assert account.encrypted_session_settings == 'enc:{"uuid": "x"}'
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT encrypted_session_settings FROM instagram_accounts WHERE id = 3")).scalar()
+    assert stored == 'enc:{"uuid": "x"}'
+
+
+def test_account_locks_are_a_fixed_set_of_stripes():
+    stripes = instagram_client_pool._ACCOUNT_LOCK_STRIPES
+    assert instagram_client_pool._account_lock(5) is instagram_client_pool._account_lock(5)
+    assert instagram_client_pool._account_lock(5) is instagram_client_pool._account_lock(5 + stripes)
+    for account_id in range(10 * stripes):
+        instagram_client_pool._account_lock(account_id)
+    assert len(instagram_client_pool._account_locks) == stripes
@@ -0,0 +1,120 @@
+"""Tests for the conversation sync: message pagination, watermark advancement and latest-message merge (no database)."""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import httpx
+
+from app.services import instagram_sync
+
+
+def _msg(i):
+    return {"id": f"m{i}", "created_time": f"2026-01-01T10:{i:02d}:00+0000", "message": f"hi {i}"}
+
+
+def _pages(newest, count, page_size=20, fail_page=None):
+    """Graph-style pages of `count` messages newest first; fail_page answers 500."""
+    messages = [_msg(i) for i in range(newest, newest - count, -1)]
+
+    def handler(request):
+        page = int(request.url.params.get("page", "0"))
+        if page == fail_page:
+            return httpx.Response(500, json={"error": {"message": "boom"}})
+        chunk = messages[page * page_size:(page + 1) * page_size]
+        body = {"data": chunk}
+        if (page + 1) * page_size < len(messages):
+            body["paging"] = {"next": f"https://graph.instagram.com/v21.0/c1/messages?page={page + 1}"}
+        return httpx.Response(200, json=body)
+
+    return handler
+
+
+def _fetch(handler, since=None):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await instagram_sync._fetch_new_messages(client, asyncio.Semaphore(1), "c1", "token", since)
+    return asyncio.run(run())
+
+
+def test_fetch_stops_at_watermark_and_reports_complete():
+    messages, complete = _fetch(_pages(50, 50), since=datetime(2026, 1, 1, 10, 30))
+    assert [m["id"] for m in messages] == [f"m{i}" for i in range(50, 30, -1)]
+    assert complete
+
+    messages, complete = _fetch(_pages(30, 30))
+    assert len(messages) == 30 and complete
+
+
+def test_failed_page_or_cap_never_claims_a_full_fetch(monkeypatch):
+    assert _fetch(_pages(50, 50), since=datetime(2026, 1, 1, 10, 0)) is not None
+    # Second page fails: nothing is returned, not the first page
+    assert _fetch(_pages(59, 60, fail_page=1)) is None
+
+    monkeypatch.setattr(instagram_sync, "MAX_MESSAGES_PER_CONVERSATION", 25)
+    messages, complete = _fetch(_pages(59, 60), since=datetime(2026, 1, 1, 10, 0))
+    assert len(messages) == 25 and not complete
+    messages, complete = _fetch(_pages(59, 60), since=datetime(2026, 1, 1, 10, 40))
+    assert len(messages) == 19 and complete
+
+
+def test_watermark_moves_only_after_complete_fetch():
+    old, new = datetime(2026, 1, 1), datetime(2026, 2, 1)
+    assert instagram_sync._next_watermark(old, new, True) == new
+    assert instagram_sync._next_watermark(old, new, False) == old
+    assert instagram_sync._next_watermark(None, new, False) is None
+    assert instagram_sync._next_watermark(old, None, True) == old
+
+
+def test_store_skips_failed_and_holds_watermark_for_capped(monkeypatch, fake_db):
+    conversations = {}
+
+    def fake_upsert(db, *, participant_id, **kwargs):
+        conversation = conversations.setdefault(participant_id, SimpleNamespace(id=len(conversations) + 1, synced_updated_time=None))
+        return conversation, False
+
+    monkeypatch.setattr(instagram_sync, "upsert_conversation", fake_upsert)
+    monkeypatch.setattr(instagram_sync, "_existing_message_ids", lambda db, account_id, ids: {"m1"})
+    updated = datetime(2026, 1, 2)
+    to_fetch = [
+        {"conversation_id": f"c{i}", "participant_id": f"p{i}", "participant_name": None, "updated_time": updated}
+        for i in range(3)
+    ]
+    fetched = [([_msg(1), _msg(2)], True), ([_msg(3)], False), None]
+
+    db = fake_db()
+    assert instagram_sync._store_fetched_conversations(db, 1, 7, "me", to_fetch, fetched) == (2, 2)
+    assert [m.message_id for m in db.added] == ["m2", "m3"]
+    assert conversations["p0"].synced_updated_time == updated
+    assert conversations["p1"].synced_updated_time is None
+    assert "p2" not in conversations
+    assert db.commits == 1
+
+
+def test_newest_per_participant_merges_both_sides():
+    early = SimpleNamespace(created_at=datetime(2026, 1, 1))
+    late = SimpleNamespace(created_at=datetime(2026, 1, 2))
+    latest = instagram_sync._newest_per_participant([("a", early), ("b", early), ("a", late)])
+    assert latest == {"a": late, "b": early}
+
+
+def test_scheduled_sync_is_referenced_until_it_finishes(monkeypatch):
+    results = []
+
+    async def fake_sync(user_id, account_id, db, limit):
+        await asyncio.sleep(0)
+        return {"success": True}
+
+    monkeypatch.setattr(instagram_sync, "sync_instagram_conversations", fake_sync)
+    monkeypatch.setattr("app.db.session.SessionLocal", lambda: SimpleNamespace(close=lambda: None))
+
+    async def run():
+        assert instagram_sync.schedule_conversation_sync(7, 1)
+        assert not instagram_sync.schedule_conversation_sync(7, 1)  # Already running
+        (task,) = instagram_sync._sync_tasks
+        await task
+        results.append(instagram_sync.get_last_sync_result(1))
+
+    asyncio.run(run())
+    assert results == [{"success": True}]
+    assert not instagram_sync._sync_tasks and not instagram_sync._sync_in_flight
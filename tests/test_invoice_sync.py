@@ -0,0 +1,60 @@
+"""Tests for the incremental Dodo invoice sync: payment parsing and per-user debounce (no database)."""
+
+from datetime import datetime
+from decimal import Decimal
+
+from app.services import invoice_sync
+
+
+def test_payment_row_uses_major_units_and_naive_utc():
+    row = invoice_sync.payment_to_invoice_row(7, {
+        "payment_id": "pay_1", "invoice_id": "inv_1", "total_amount": 1181,
+        "currency": "sgd", "status": "Succeeded", "created_at": "2026-02-01T10:00:00+02:00",
+    })
+    assert row["amount"] == Decimal("11.81")
+    assert (row["currency"], row["status"], row["user_id"]) == ("SGD", "succeeded", 7)
+    assert row["paid_at"] == datetime(2026, 2, 1, 8, 0)
+    assert invoice_sync.payment_to_invoice_row(7, {"payment_id": "pay_2"}) is None
+    assert invoice_sync.parse_dodo_time("not a date") is None
+
+
+def test_background_sync_is_debounced_per_user(monkeypatch):
+    monkeypatch.setattr(invoice_sync, "_sync_started", {})
+    monkeypatch.setattr(invoice_sync, "_sync_running", set())
+    clock = [1000.0]
+    monkeypatch.setattr(invoice_sync.time, "monotonic", lambda: clock[0])
+
+    assert invoice_sync.claim_invoice_sync(1)
+    assert not invoice_sync.claim_invoice_sync(1)  # Still running
+    assert invoice_sync.claim_invoice_sync(2)
+    invoice_sync.release_invoice_sync(1)
+    assert not invoice_sync.claim_invoice_sync(1)  # Finished, but within the debounce window
+
+    clock[0] += invoice_sync.INVOICE_SYNC_DEBOUNCE_SECONDS
+    assert invoice_sync.claim_invoice_sync(1)
+
+
+def test_webhook_row_without_payment_id_is_claimed_not_skipped():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.models.invoice import Invoice
+
+    engine = create_engine("sqlite://")
+    Invoice.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        Invoice(user_id=1, provider_invoice_id="inv_1", provider_payment_id=None, amount=1, currency="USD"),
+        Invoice(user_id=1, provider_invoice_id="inv_2", provider_payment_id="pay_other", amount=1, currency="USD"),
+    ])
+    db.commit()
+
+    rows = [
+        {"provider_invoice_id": "inv_1", "provider_payment_id": "pay_1"},
+        {"provider_invoice_id": "inv_2", "provider_payment_id": "pay_2"},
+        {"provider_invoice_id": None, "provider_payment_id": "pay_3"},
+    ]
+    kept = invoice_sync._without_invoice_id_clashes(db, rows)
+    assert [row["provider_payment_id"] for row in kept] == ["pay_1", "pay_3"]
+    # The upsert now conflicts on pay_1 and updates the webhook's row
+    assert db.query(Invoice.provider_payment_id).filter(Invoice.provider_invoice_id == "inv_1").scalar() == "pay_1"
@@ -0,0 +1,95 @@
+"""Tests for the shared JWKS provider (single-flight fetch, parsed keys by kid, unknown-kid refetch)."""
+
+import json
+import threading
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from app.utils import jwks
+
+
+def _jwk(kid):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public_jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    public_jwk.update({"kid": kid, "alg": "ES256", "use": "sig"})
+    return private_key, public_jwk
+
+
+class _FakeResponse:
+    def __init__(self, body):
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+def _serve(monkeypatch, key_sets, delay=0.0):
+    """Patch requests.get to return key_sets[min(n, last)] on the n-th fetch; returns the call log."""
+    calls = []
+
+    def fake_get(url, timeout):
+        calls.append(url)
+        time.sleep(delay)
+        return _FakeResponse({"keys": key_sets[min(len(calls) - 1, len(key_sets) - 1)]})
+
+    monkeypatch.setattr(jwks.requests, "get", fake_get)
+    monkeypatch.setattr(jwks.JWKSProvider, "_ensure_refresher", lambda self: None)
+    return calls
+
+
+def test_concurrent_cold_start_fetches_once(monkeypatch):
+    private_key, public_jwk = _jwk("k1")
+    calls = _serve(monkeypatch, [[public_jwk]], delay=0.05)
+    provider = jwks.JWKSProvider("https://example.supabase.co/auth/v1/.well-known/jwks.json")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.get_signing_key("k1"))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r is not None and r.key_id == "k1" for r in results)
+    token = jwt.encode({"sub": "u"}, private_key, algorithm="ES256", headers={"kid": "k1"})
+    assert jwt.decode(token, results[0].key, algorithms=["ES256"])["sub"] == "u"
+
+
+def test_unknown_kid_triggers_rate_limited_refetch(monkeypatch):
+    _, old_jwk = _jwk("old")
+    _, new_jwk = _jwk("new")
+    calls = _serve(monkeypatch, [[old_jwk], [old_jwk, new_jwk]])
+    monkeypatch.setattr(jwks, "JWKS_UNKNOWN_KID_MIN_INTERVAL_SECONDS", 0)
+    provider = jwks.JWKSProvider("https://example.supabase.co/auth/v1/.well-known/jwks.json")
+
+    assert provider.get_signing_key("old") is not None
+    assert provider.get_signing_key("new") is not None
+    assert len(calls) == 2
+
+    monkeypatch.setattr(jwks, "JWKS_UNKNOWN_KID_MIN_INTERVAL_SECONDS", 3600)
+    assert provider.get_signing_key("bogus") is None
+    assert len(calls) == 2
+
+
+def test_pem_is_converted_once_per_kid(monkeypatch):
+    _, public_jwk = _jwk("k1")
+    _serve(monkeypatch, [[public_jwk]])
+    provider = jwks.JWKSProvider("https://example.supabase.co/auth/v1/.well-known/jwks.json")
+
+    first = provider.get_public_key_pem("k1")
+    second = provider.get_public_key_pem("k1")
+
+    assert first.startswith("-----BEGIN PUBLIC KEY-----")
+    assert first is second
+
+
+def test_provider_uses_the_auth_service_jwks_url():
+    # Supabase publishes the key set under the Auth service path, not the project root
+    provider = jwks.get_jwks_provider("https://example.supabase.co/")
+    assert provider.jwks_url == "https://example.supabase.co/auth/v1/.well-known/jwks.json"
+    assert jwks.get_jwks_provider("https://example.supabase.co") is provider
@@ -72,3 +72,22 @@ def test_returns_normalized_on_success(no_dns):
     ok, _, norm = validate_email("  Jane.Smith@DOMAIN.COM ")
     assert ok is True
     assert norm == "jane.smith@domain.com"
+
+
+def test_async_variant_awaits_dns_without_the_blocking_check(monkeypatch):
+    import asyncio
+
+    from app.services import lead_capture_email_validation as validation
+    from app.services.lead_capture import validate_email_async
+
+    async def undeliverable(domain, timeout, domain_i18n=None):
+        return domain != "nomx-async.example"
+
+    monkeypatch.setenv("EMAIL_CHECK_DELIVERABILITY", "true")
+    monkeypatch.setattr(validation, "check_domain_deliverable_async", undeliverable)
+    monkeypatch.setattr(validation, "check_domain_deliverable", lambda *a, **kw: 1 / 0)
+
+    ok, _, norm = asyncio.run(validate_email_async("jane.smith@nomx-async.example"))
+    assert ok is False and norm is None
+    ok, _, norm = asyncio.run(validate_email_async("Jane.Smith@Domain.com"))
+    assert ok is True and norm == "jane.smith@domain.com"
@@ -0,0 +1,99 @@
+"""Tests for short tracking links: code generation, LRU and DB-free redirects."""
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import link_tracking
+from app.services.link_tracking import ResolvedLink
+
+
+@pytest.fixture
+def tracking(monkeypatch):
+    monkeypatch.setattr(link_tracking, "_ensure_flusher_started", lambda: None)
+    link_tracking._link_cache.clear()
+    link_tracking._pending_clicks.clear()
+    yield link_tracking
+    link_tracking._link_cache.clear()
+    link_tracking._pending_clicks.clear()
+
+
+@pytest.fixture
+def client(tracking, monkeypatch):
+    from app.api.routes import analytics
+
+    monkeypatch.setattr(analytics, "resolve_link", lambda code: None)  # cache miss = unknown code, no DB
+    app = FastAPI()
+    app.include_router(analytics.router, prefix="/api/analytics")
+    return TestClient(app)
+
+
+def test_codes_are_short_stable_and_distinct():
+    a = link_tracking._make_code("https://x.io", 1, 2, None, None, 10)
+    assert a == link_tracking._make_code("https://x.io", 1, 2, None, None, 10)
+    assert len(a) == 10 and a.isalnum()
+    assert a != link_tracking._make_code("https://x.io", 1, 3, None, None, 10)
+    assert link_tracking._make_code("https://x.io", 1, 2, None, None, 12).startswith(a)
+
+
+def test_lru_evicts_least_recently_used(tracking, monkeypatch):
+    monkeypatch.setattr(tracking, "LINK_CACHE_SIZE", 2)
+    for code in ("a", "b"):
+        tracking.cache_link(ResolvedLink(code, "https://x.io", 1, 1, None, None, False))
+    tracking.get_cached_link("a")
+    tracking.cache_link(ResolvedLink("c", "https://x.io", 1, 1, None, None, False))
+
+    assert list(tracking._link_cache) == ["a", "c"]
+
+
+def test_create_is_one_statement_then_served_from_the_lru(tracking, monkeypatch, fake_db):
+    from contextlib import contextmanager
+    from types import SimpleNamespace
+
+    import app.db.session
+
+    def respond(statement, params):
+        row = SimpleNamespace(code=code, target_url="https://x.io", user_id=2, rule_id=1, media_id=None,
+                              instagram_account_id=None)
+        return SimpleNamespace(fetchone=lambda: row)
+
+    code = tracking._make_code("https://x.io", 1, 2, None, None, tracking.CODE_LENGTH)
+    conn = fake_db(respond=respond)
+    monkeypatch.setattr(app.db.session, "engine", SimpleNamespace(begin=contextmanager(lambda: (yield conn))))
+
+    assert tracking.create_tracked_link("https://x.io", 1, 2) == code
+    assert len(conn.statements) == 1
+    sql = str(conn.statements[0][0])
+    assert "ON CONFLICT" in sql and "RETURNING" in sql and "UNION ALL" in sql
+
+    assert tracking.create_tracked_link("https://x.io", 1, 2) == code
+    assert len(conn.statements) == 1  # LRU hit: no database work
+
+
+def test_short_link_redirects_and_queues_click(client, tracking):
+    tracking.cache_link(ResolvedLink("abc123", "https://www.instagram.com/brand", 7, 3, "m1", 5, True))
+
+    r = client.get("/api/analytics/r/abc123", headers={"user-agent": "Instagram 300"}, follow_redirects=False)
+    assert r.status_code == 302
+    assert r.headers["location"] == "instagram://user?username=brand"
+
+    r = client.get("/api/analytics/r/missing", follow_redirects=False)
+    assert r.status_code == 404
+
+    (link, _), = tracking._pending_clicks
+    row = tracking._event_row(link, _)
+    assert row["event_type"].value == "profile_visit"
+    assert row["event_metadata"]["short_code"] == "abc123"
+
+
+def test_legacy_query_string_link_still_tracked(client, tracking):
+    r = client.get(
+        "/api/analytics/track/redirect",
+        params={"url": "https://example.org/page", "rule_id": 3, "user_id": 7},
+        follow_redirects=False,
+    )
+    assert r.status_code == 302
+    assert r.headers["location"] == "https://example.org/page"
+    (link, _), = tracking._pending_clicks
+    assert (link.code, link.rule_id, link.is_profile) == (None, 3, False)
@@ -0,0 +1,75 @@
+"""Tests for the /uploads media server: caching headers, ETag/304, ranges, fetch counting (no database)."""
+
+import pytest
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from fastapi.testclient import TestClient
+
+from app.api import media_files
+
+SHA = "ab" * 32
+BODY = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_files, "_ensure_flusher_started", lambda: None)
+    media_files._pending_fetches.clear()
+    user_dir = tmp_path / "dm-media" / "7"
+    user_dir.mkdir(parents=True)
+    (user_dir / f"{SHA}.mp4").write_bytes(BODY)
+    (user_dir / "legacy_promo.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+    (tmp_path / "dm-media" / "blobs" / "tmp").mkdir(parents=True)
+    (tmp_path / "dm-media" / "blobs" / "tmp" / "partial").write_bytes(b"x")
+    app = Starlette(routes=[Mount("/uploads", app=media_files.MediaFiles(str(tmp_path)))])
+    yield TestClient(app)
+    media_files._pending_fetches.clear()
+
+
+def test_content_addressed_file_is_immutable_with_sha_etag(client):
+    r = client.get(f"/uploads/dm-media/7/{SHA}.mp4")
+    assert r.status_code == 200
+    assert r.content == BODY
+    assert r.headers["etag"] == f'"{SHA}"'
+    assert r.headers["cache-control"] == media_files.IMMUTABLE_CACHE_CONTROL
+    assert r.headers["content-type"] == "video/mp4"
+    assert r.headers["accept-ranges"] == "bytes"
+    assert media_files._pending_fetches == {f"uploads/dm-media/7/{SHA}.mp4": 1}
+
+    legacy = client.get("/uploads/dm-media/7/legacy_promo.png")
+    assert legacy.headers["cache-control"] == media_files.LEGACY_CACHE_CONTROL
+    assert legacy.headers["etag"] != f'"{SHA}"'
+
+
+def test_if_none_match_returns_304_without_body(client):
+    r = client.get(f"/uploads/dm-media/7/{SHA}.mp4", headers={"if-none-match": f'"other", "{SHA}"'})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == f'"{SHA}"'
+    assert media_files._pending_fetches == {}
+
+
+def test_ranges(client):
+    url = f"/uploads/dm-media/7/{SHA}.mp4"
+    r = client.get(url, headers={"range": "bytes=100-199"})
+    assert r.status_code == 206
+    assert r.content == BODY[100:200]
+    assert r.headers["content-range"] == f"bytes 100-199/{len(BODY)}"
+
+    assert client.get(url, headers={"range": "bytes=-10"}).content == BODY[-10:]
+    assert client.get(url, headers={"range": "bytes=10000-"}).content == BODY[10000:]
+    assert client.get(url, headers={"range": "bytes=20000-"}).status_code == 416
+    # Multi-range and stale If-Range fall back to the whole file
+    assert client.get(url, headers={"range": "bytes=0-1,5-6"}).status_code == 200
+    assert client.get(url, headers={"range": "bytes=0-1", "if-range": '"stale"'}).status_code == 200
+
+
+def test_head_and_rejected_paths(client):
+    head = client.head(f"/uploads/dm-media/7/{SHA}.mp4")
+    assert head.status_code == 200
+    assert head.headers["content-length"] == str(len(BODY))
+    assert client.get("/uploads/dm-media/blobs/tmp/partial").status_code == 404
+    assert client.get("/uploads/dm-media/7/../../../etc/passwd").status_code == 404
+    assert client.get("/uploads/dm-media/7/missing.mp4").status_code == 404
+    assert client.post(f"/uploads/dm-media/7/{SHA}.mp4").status_code == 405
@@ -0,0 +1,117 @@
+"""Tests for the media registry used by send_dm (no network on the send path)."""
+
+import threading
+
+import pytest
+
+from app.services import media_registry
+from app.services.media_registry import MediaInfo
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    media_registry._registry.clear()
+    media_registry._failed_until.clear()
+    monkeypatch.setattr(media_registry, "_lookup_own_upload", lambda path: None)
+    for name in media_registry._OWN_HOST_ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("API_PUBLIC_URL", "https://api.example.com")
+    yield media_registry
+    media_registry._registry.clear()
+    media_registry._failed_until.clear()
+
+
+def _capture_posts(monkeypatch):
+    import requests
+
+    posts = []
+
+    class _Resp:
+        status_code = 200
+        text = "{}"
+
+        def json(self):
+            return {}
+
+    monkeypatch.setattr(requests, "head", lambda *a, **kw: pytest.fail("HEAD on the send path"))
+    monkeypatch.setattr(requests, "post", lambda url, json=None, **kw: posts.append(json) or _Resp())
+    return posts
+
+
+def test_send_dm_uses_registered_type_without_head(registry, monkeypatch):
+    from app.utils.instagram_api import send_dm
+
+    posts = _capture_posts(monkeypatch)
+    url = "https://api.example.com/uploads/dm-media/7/abc.webm"
+    registry.register_media(url, MediaInfo("audio/webm", 1234, "abc"))
+
+    send_dm("123", "", "token", page_id="1", media_url=url)
+
+    assert posts[0]["message"]["attachment"]["type"] == "audio"
+
+
+def test_external_extensionless_url_is_resolved_in_background_once(registry, monkeypatch):
+    import requests
+
+    heads = []
+    done = threading.Event()
+
+    class _Head:
+        status_code = 200
+        headers = {"Content-Type": "video/mp4; codecs=avc1", "Content-Length": "99"}
+
+    def fake_head(url, **kw):
+        heads.append(url)
+        done.wait(1)
+        return _Head()
+
+    monkeypatch.setattr(requests, "head", fake_head)
+    url = "https://cdn.example.net/media/abc123"
+
+    assert registry.lookup_media(url) is None
+    assert registry.lookup_media(url) is None  # already resolving: no second HEAD
+    done.set()
+    for _ in range(100):
+        if registry.get_cached_media(url):
+            break
+        threading.Event().wait(0.01)
+
+    assert heads == [url]
+    assert registry.lookup_media(url) == MediaInfo("video/mp4", 99)
+    assert registry.media_kind(registry.lookup_media(url).content_type) == "video"
+
+
+def test_own_media_needs_our_host_and_misses_are_cached(registry, monkeypatch):
+    lookups = []
+    monkeypatch.setattr(registry, "_lookup_own_upload", lambda path: lookups.append(path))
+    monkeypatch.setattr(registry, "_start_resolve", lambda url: None)
+
+    assert registry.is_own_media_url("https://api.example.com/uploads/dm-media/1/a")
+    assert not registry.is_own_media_url("https://cdn.example.com/uploads/x")
+    assert not registry.is_own_media_url("https://api.example.com/static/a.png")
+
+    url = "https://api.example.com/uploads/dm-media/1/gone"
+    assert registry.lookup_media(url) is None
+    assert registry.lookup_media(url) is None
+    assert lookups == ["/uploads/dm-media/1/gone"]
+
+
+def test_send_never_waits_and_saved_rules_warm_the_registry(registry, monkeypatch):
+    from app.utils.instagram_api import send_dm
+
+    posts = _capture_posts(monkeypatch)
+    started = []
+    monkeypatch.setattr(registry, "_start_resolve", started.append)
+    url = "https://cdn.example.com/uploads/voice-note"
+
+    send_dm("123", "", "token", page_id="1", media_url=url)  # Cold: no HEAD inline, extension fallback
+    assert posts[0]["message"]["attachment"]["type"] == "image"
+    assert started == [url]
+
+    registry.warm_rule_media({"dm_voice_message_url": f" {url} ", "dm_media_url": "", "message": "hi"})
+    assert started == [url, url]
+
+    registry.register_media(url, MediaInfo("audio/mpeg"))  # The background HEAD finished
+    send_dm("456", "", "token", page_id="1", media_url=url)
+    assert posts[1]["message"]["attachment"]["type"] == "audio"
+    assert started == [url, url]
@@ -0,0 +1,57 @@
+"""Tests for streamed, content-addressed DM media uploads (no database)."""
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import upload
+from app.dependencies.auth import get_current_user_id
+from app.services import media_store
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+MP4 = b"\x00\x00\x00\x18ftypisom" + b"\x01" * 5000
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, fake_db):
+    monkeypatch.setattr(media_store, "UPLOADS_ROOT", tmp_path / "uploads")
+    monkeypatch.setattr(media_store, "MEDIA_DIR", tmp_path / "uploads" / "dm-media")
+    monkeypatch.setattr(media_store, "BLOB_DIR", tmp_path / "uploads" / "dm-media" / "blobs")
+    monkeypatch.setattr(media_store, "_TMP_DIR", tmp_path / "uploads" / "dm-media" / "blobs" / "tmp")
+    monkeypatch.setattr(upload, "SessionLocal", fake_db)
+    app = FastAPI()
+    app.include_router(upload.router, prefix="/upload")
+    app.dependency_overrides[get_current_user_id] = lambda: 7
+    return TestClient(app)
+
+
+def test_identical_uploads_are_stored_once(client, tmp_path):
+    first = client.post("/upload/dm-media", files={"file": ("promo.mp4", MP4, "video/mp4")})
+    again = client.post("/upload/dm-media", files={"file": ("copy.mp4", MP4, "video/mp4")})
+    assert first.status_code == 200, first.text
+    body = first.json()
+    assert body["url"] == again.json()["url"]
+    assert body["url"].endswith(f"/uploads/dm-media/7/{body['sha256']}.mp4")
+    assert (body["content_type"], body["size"]) == ("video/mp4", len(MP4))
+
+    blobs = [p for p in (tmp_path / "uploads/dm-media/blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 1
+    assert (tmp_path / "uploads/dm-media/7" / blobs[0].name).read_bytes() == MP4
+
+
+def test_mime_type_is_sniffed_not_trusted(client):
+    r = client.post("/upload/dm-media", files={"file": ("photo", PNG, "application/octet-stream")})
+    assert r.status_code == 200, r.text
+    assert r.json()["content_type"] == "image/png"
+
+    r = client.post("/upload/dm-media", files={"file": ("evil.exe", b"MZ" + b"\x00" * 100, "application/x-msdownload")})
+    assert r.status_code == 400
+
+
+def test_oversized_upload_is_aborted_and_cleaned_up(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "MAX_FILE_SIZE", 1000)
+    r = client.post("/upload/dm-media", files={"file": ("big.mp4", MP4, "video/mp4")})
+    assert r.status_code == 400
+    assert "too large" in r.json()["detail"]
+    assert not [p for p in (tmp_path / "uploads").rglob("*") if p.is_file()]
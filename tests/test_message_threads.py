@@ -0,0 +1,49 @@
+"""Tests for conversation-id thread reads: cursors and once-per-account linking (no database)."""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import message_threads
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    message = SimpleNamespace(id=42, created_at=datetime(2026, 1, 2, 3, 4, 5, 678))
+    assert message_threads.parse_cursor(message_threads.make_cursor(message)) == (message.created_at, 42)
+    for bad in ("", "42", "yesterday_42", "2026-01-02T03:04:05_x"):
+        with pytest.raises(ValueError):
+            message_threads.parse_cursor(bad)
+
+
+def _unlinked_db(fake_db, unlinked_ids):
+    """Answers the id-batch SELECT from unlinked_ids; each UPDATE links the ids it was given."""
+    def respond(statement, params):
+        if "UPDATE" in str(statement):
+            return SimpleNamespace(rowcount=len(params["ids"]))
+        after, size = params["after_id"], params["batch_size"]
+        return [(i,) for i in unlinked_ids if i > after][:size]
+
+    return fake_db(respond=respond)
+
+
+def _updates(db):
+    return [params["ids"] for statement, params in db.statements if "UPDATE" in str(statement)]
+
+
+def test_unlinked_messages_are_linked_in_batches(fake_db):
+    db = _unlinked_db(fake_db, range(1, 8))
+    assert message_threads.link_unlinked_messages(db, 3, batch_size=3) == 7
+    assert _updates(db) == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_linking_runs_once_per_account_per_process(monkeypatch, fake_db):
+    monkeypatch.setattr(message_threads, "_linked_accounts", set())
+    from app.services import inbox_counters
+    monkeypatch.setattr(inbox_counters, "reconcile_inbox_counters", lambda db, account_id: 1)
+
+    db = _unlinked_db(fake_db, [5, 9])
+    assert message_threads.ensure_messages_linked(db, 3) == 2
+    assert db.commits == 1
+    assert message_threads.ensure_messages_linked(db, 3) == 0
+    assert _updates(db) == [[5, 9]]
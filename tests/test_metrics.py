@@ -0,0 +1,86 @@
+"""Tests for the Prometheus metrics surface: cache counters, Graph API errors, per-request DB usage, /metrics auth."""
+
+import prometheus_client
+from sqlalchemy import create_engine, text
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.services import metrics
+
+
+def _sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_cache_and_graph_call_counters():
+    hits = _sample("cache_requests_total", cache="test_cache", result="hit")
+    misses = _sample("cache_requests_total", cache="test_cache", result="miss")
+    metrics.record_cache("test_cache", True)
+    metrics.record_cache("test_cache", True)
+    metrics.record_cache("test_cache", False)
+    assert _sample("cache_requests_total", cache="test_cache", result="hit") == hits + 2
+    assert _sample("cache_requests_total", cache="test_cache", result="miss") == misses + 1
+
+    calls = _sample("graph_api_request_seconds_count", endpoint="test_dm")
+    started = metrics.time.perf_counter()
+    metrics.observe_graph_call("test_dm", started, status_code=200)
+    metrics.observe_graph_call("test_dm", started, status_code=400)
+    metrics.observe_graph_call("test_dm", started, error=TimeoutError())
+    assert _sample("graph_api_request_seconds_count", endpoint="test_dm") == calls + 3
+    assert _sample("graph_api_errors_total", endpoint="test_dm", kind="http_400") >= 1
+    assert _sample("graph_api_errors_total", endpoint="test_dm", kind="TimeoutError") >= 1
+
+
+def _app(engine):
+    def items(request):
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[
+        Route("/items/{item_id}", items),
+        Route("/metrics", metrics.metrics_endpoint),
+    ])
+    app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+def test_middleware_counts_queries_per_route_template(monkeypatch):
+    engine = create_engine("sqlite://")
+    metrics.install_db_metrics(engine)
+    metrics.install_db_metrics(engine)  # Idempotent: statements are not counted twice
+    client = TestClient(_app(engine))
+
+    labels = {"route": "/items/{item_id}", "method": "GET"}
+    requests_before = _sample("db_queries_per_request_count", **labels)
+    queries_before = _sample("db_queries_per_request_sum", **labels)
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+    assert _sample("db_queries_per_request_count", **labels) == requests_before + 2
+    assert _sample("db_queries_per_request_sum", **labels) == queries_before + 6
+
+    # Statements outside a request are not attributed to one
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert _sample("db_queries_per_request_sum", **labels) == queries_before + 6
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert 'db_queries_per_request_count{method="GET",route="/items/{item_id}"}' in response.text
+
+
+def test_route_label_restores_included_router_prefix():
+    class _Route:
+        def __init__(self, path):
+            self.path_format = path
+
+    assert metrics.route_label({"path": "/api/instagram/webhook", "route": _Route("/webhook")}) == "/api/instagram/webhook"
+    assert metrics.route_label({"path": "/api/analytics/r/abc", "route": _Route("/r/{code}")}) == "/api/analytics/r/{code}"
+    assert metrics.route_label({"path": "/users/", "route": _Route("/")}) == "/users/"
+    assert metrics.route_label({"path": "/nope"}) == "unmatched"
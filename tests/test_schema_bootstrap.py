@@ -0,0 +1,23 @@
+"""Tests for the one-shot schema bootstrap: when the fingerprint is recorded (no database)."""
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from app.db import bootstrap
+
+
+def _recorded(db):
+    return [params for statement, params in db.statements if "INSERT INTO schema_bootstrap" in str(statement)]
+
+
+def test_fingerprint_is_recorded_only_after_every_step_succeeded(monkeypatch, fake_db):
+    monkeypatch.setattr(bootstrap, "get_stored_fingerprint", lambda conn: None)
+    monkeypatch.setattr(bootstrap, "schema_fingerprint", lambda: "f" * 64)
+
+    for steps_ok, expected in ((False, []), (True, [{"fingerprint": "f" * 64}])):
+        db = fake_db()
+        monkeypatch.setattr(bootstrap, "engine", SimpleNamespace(connect=contextmanager(lambda: (yield db))))
+        monkeypatch.setattr(bootstrap, "_run_bootstrap_steps", lambda: steps_ok)
+        assert bootstrap.bootstrap_schema() is True
+        assert _recorded(db) == expected
+        assert "pg_advisory_unlock" in str(db.statements[-1][0])
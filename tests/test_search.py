@@ -0,0 +1,98 @@
+"""Tests for message / lead search: query parsing, cursors and plan fall-through (no database)."""
+
+from datetime import datetime
+
+import pytest
+
+from app.services import search
+
+
+def test_parse_query_builds_prefix_and_escaped_pattern():
+    query = search.parse_query("  Refund 50%_off ")
+    assert query.q == "Refund 50%_off"
+    assert query.prefix == "refund:* & 50:* & _off:*"
+    assert query.pattern == "%Refund 50\\%\\_off%"
+    for bad in (None, "", "a", "  !! "):
+        with pytest.raises(search.InvalidSearch):
+            search.parse_query(bad)
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    at = datetime(2026, 3, 4, 5, 6, 7, 89)
+    assert search.decode_cursor(search.encode_cursor("partial", at, 17)) == ("partial", at, 17)
+    assert search.decode_cursor(None) is None
+    for bad in ("x", "fuzzy_2026-03-04T05:06:07_1", "exact_yesterday_1", "exact_2026-03-04T05:06:07_x"):
+        with pytest.raises(search.InvalidSearch):
+            search.decode_cursor(bad)
+
+
+class _Result(list):
+    def mappings(self):
+        return self
+
+
+def _plan(statement, params):
+    sql = str(statement)
+    tier = "partial" if "NOT (" in sql else "exact"
+    return tier, "index" if "MATERIALIZED" in sql else params["window"]
+
+
+def _search_db(fake_db, matches):
+    """Answers each plan from a list of matching rows, newest first."""
+    def respond(statement, params):
+        if "pg_extension" in str(statement):
+            return _Result([None])
+        tier, window = _plan(statement, params)
+        rows = [row for row in matches[tier] if "cursor_id" not in params or row["id"] < params["cursor_id"]]
+        if window != "index":
+            rows = [row for row in rows if row["id"] > 1000 - window]
+        return _Result(rows[:params["need"]])
+
+    return fake_db(respond=respond)
+
+
+def _plans(db):
+    return [_plan(statement, params) for statement, params in db.statements if "pg_extension" not in str(statement)]
+
+
+def _rows(ids):
+    return [{"id": i, "created_at": datetime(2026, 1, 1, 0, 0, i % 60)} for i in ids]
+
+
+def _run(db, limit, cursor=None):
+    return search._search(
+        db, columns="m.id, m.created_at", table="messages", alias="m", owner_sql="m.user_id = :user_id",
+        ts_column="created_at", text_expr="m.message_text", params={"user_id": 1},
+        query=search.parse_query("refund"), limit=limit, cursor=cursor,
+    )
+
+
+@pytest.fixture(autouse=True)
+def _small_plans(monkeypatch):
+    monkeypatch.setattr(search, "_trgm_available", False)
+    monkeypatch.setattr(search, "WINDOW_ROWS", 10)
+    monkeypatch.setattr(search, "MAX_WALK_ROWS", 100)
+
+
+def test_common_word_is_served_by_the_window(fake_db):
+    db = _search_db(fake_db, {"exact": _rows(range(999, 900, -1)), "partial": []})
+    rows, cursor = _run(db, 3)
+    assert [row["id"] for row in rows] == [999, 998, 997]
+    assert _plans(db) == [("exact", 10)]
+    assert cursor.startswith("exact_")
+
+
+def test_sparse_word_walks_further_and_absent_word_uses_the_index(fake_db):
+    db = _search_db(fake_db, {"exact": _rows([995, 950, 940]), "partial": []})
+    rows, _ = _run(db, 2)
+    assert [row["id"] for row in rows] == [995, 950]
+    assert _plans(db) == [("exact", 10), ("exact", 100)]
+
+    db = _search_db(fake_db, {"exact": _rows([50]), "partial": _rows([40, 30])})
+    rows, cursor = _run(db, 2)
+    assert [(row["id"], row["match"]) for row in rows] == [(50, "exact"), (40, "partial")]
+    assert _plans(db) == [("exact", 10), ("exact", "index"), ("partial", 10), ("partial", "index")]
+
+    rows, cursor = _run(db, 2, cursor)
+    assert [(row["id"], row["match"]) for row in rows] == [(30, "partial")]
+    assert cursor is None
@@ -26,7 +26,7 @@ def run_migration():
     try:
         with engine.connect() as conn:
             # Check database type
-            db_type = str(engine.url).split("://")[0]
+            db_type = engine.dialect.name
             
             if db_type == "postgresql":
                 # Option 1: Update Supabase auth.users metadata if limits are stored there
@@ -22,7 +22,7 @@ def run_migration():
     try:
         with engine.connect() as conn:
             # Check database type
-            db_type = str(engine.url).split("://")[0]
+            db_type = engine.dialect.name
             
             def table_exists(table_name: str) -> bool:
                 """Check if a table exists"""
@@ -112,9 +112,8 @@ def run_migration():
             return True
 
     except Exception as e:
-        print(f"⚠️ Error updating account_limit: {str(e)}")
-        # Don't fail - migration is idempotent and may not be needed if using plan_limits.py
-        return True
+        print(f"❌ Error updating account_limit: {str(e)}")
+        return False
 
 
 if __name__ == "__main__":